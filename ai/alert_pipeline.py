@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+SAPP Alert Pipeline
+Entrega de alertas em lote ao backend, desacoplada do loop de scoring
+"""
+
+import asyncio
+import threading
+import time
+from itertools import islice
+from typing import Awaitable, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Faixa de histerese: um nível só é rebaixado quando o score cai esta
+# distância abaixo do limite que o ativou
+ALERT_HYSTERESIS = 0.05
+
+# Espera máxima entre tentativas após falha no envio (segundos)
+MAX_RETRY_DELAY = 30.0
+
+
+def alert_to_dict(alert) -> Dict:
+    """Serializa um RiskAlert para o corpo JSON do backend"""
+    return {
+        "position_id": int(alert.position_id),
+        "alert_type": alert.alert_type,
+        "message": alert.message,
+        "risk_score": float(alert.risk_score),
+        "timestamp": alert.timestamp.isoformat(),
+        "recommendation": alert.recommendation
+    }
+
+
+class AlertPipeline:
+    """
+    Fila limitada de alertas com uma thread de envio dedicada. Alertas
+    repetidos da mesma posição ainda não enviados são fundidos (vale o mais
+    recente) e os pendentes são enviados em lote quando a fila atinge
+    batch_size ou quando o mais antigo espera flush_interval segundos.
+    submit nunca bloqueia em I/O.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Dict]], bool], max_pending: int = 10000,
+                 batch_size: int = 200, flush_interval: float = 0.5):
+        self.send_batch = send_batch
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, Dict] = {}  # position_id → alerta mais recente, em ordem de chegada
+        self._oldest = 0.0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._stopped = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.on_delivered: Optional[Callable[[List[Dict]], None]] = None  # chamado com cada lote aceito
+        self.stats = dict.fromkeys(('submitted', 'coalesced', 'dropped', 'sent', 'batches', 'failures'), 0)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, alert) -> bool:
+        """Enfileira um alerta (False se descartado por fila cheia)"""
+        return self.submit_payload(alert_to_dict(alert))
+
+    def submit_payload(self, payload: Dict) -> bool:
+        """Enfileira um alerta já serializado (ex.: vindo de um worker de scoring)"""
+        with self._condition:
+            self.stats['submitted'] += 1
+            position_id = payload["position_id"]
+            if position_id in self._pending:
+                self._pending[position_id] = payload
+                self.stats['coalesced'] += 1
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.stats['dropped'] += 1
+                return False
+            if not self._pending:
+                # Primeiro pendente: a thread de envio passa a contar o flush_interval
+                self._oldest = time.monotonic()
+                self._notify()
+            self._pending[position_id] = payload
+            if len(self._pending) >= self.batch_size:
+                self._notify()
+            return True
+
+    def _notify(self):
+        """Acorda o envio (thread ou corrotina); chamado com o lock adquirido"""
+        self._condition.notify()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def start(self):
+        """Inicia a thread de envio"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-pipeline", daemon=True)
+        self._thread.start()
+
+    def request_stop(self):
+        """Pede o fim do envio (thread ou corrotina) sem esperar"""
+        with self._condition:
+            self._running = False
+            self._notify()
+        self._stopped.set()
+
+    def stop(self, timeout: float = 5.0):
+        """Envia o que estiver pendente e para a thread de envio"""
+        self.request_stop()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def flush(self) -> int:
+        """Envia todos os alertas pendentes na thread atual; retorna quantos foram enviados"""
+        sent = 0
+        while True:
+            batch = self._take(force=True)
+            if not batch or not self._send(batch):
+                return sent
+            sent += len(batch)
+
+    def _take(self, force: bool) -> List[Dict]:
+        """Retira até batch_size alertas se algum gatilho de envio foi atingido"""
+        with self._condition:
+            if not self._pending:
+                return []
+            due = time.monotonic() - self._oldest >= self.flush_interval
+            if not (force or due or len(self._pending) >= self.batch_size):
+                return []
+            batch = []
+            for position_id in list(islice(self._pending, self.batch_size)):
+                batch.append(self._pending.pop(position_id))
+            self._oldest = time.monotonic()
+            return batch
+
+    def _send(self, batch: List[Dict]) -> bool:
+        """Envia um lote; em caso de falha devolve à fila os alertas não substituídos"""
+        try:
+            delivered = self.send_batch(batch)
+        except Exception as e:
+            logger.error(f"❌ Erro ao enviar lote de alertas: {e}")
+            delivered = False
+        return self._delivered(batch, delivered)
+
+    def _delivered(self, batch: List[Dict], delivered: bool) -> bool:
+        """Contabiliza o resultado do envio de um lote"""
+        if delivered:
+            with self._condition:
+                self.stats['sent'] += len(batch)
+                self.stats['batches'] += 1
+            if self.on_delivered is not None:
+                self.on_delivered(batch)
+            return True
+        with self._condition:
+            self.stats['failures'] += 1
+            requeued = {payload["position_id"]: payload for payload in batch if payload["position_id"] not in self._pending}
+            if requeued:
+                self._pending = {**requeued, **self._pending}
+                self._oldest = time.monotonic()
+            return False
+
+    def _run(self):
+        """Loop da thread de envio"""
+        retry_delay = self.flush_interval
+        while True:
+            with self._condition:
+                if not self._running:
+                    break
+                if self._pending:
+                    wait = self._oldest + self.flush_interval - time.monotonic()
+                    if len(self._pending) < self.batch_size and wait > 0:
+                        self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+
+            batch = self._take(force=False)
+            if batch:
+                if self._send(batch):
+                    retry_delay = self.flush_interval
+                else:
+                    # Backend indisponível: aguardar antes de tentar de novo
+                    self._stopped.wait(retry_delay)
+                    retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+
+        self.flush()
+
+    async def run_async(self, send_batch: Callable[[List[Dict]], Awaitable[bool]]):
+        """
+        Versão asyncio da thread de envio: send_batch é uma corrotina e a
+        espera pelos gatilhos de tamanho/tempo acontece no event loop
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+        self._stopped.clear()
+        retry_delay = self.flush_interval
+        try:
+            while self._running:
+                with self._condition:
+                    if not self._pending:
+                        timeout = None
+                    elif len(self._pending) >= self.batch_size:
+                        timeout = 0.0
+                    else:
+                        timeout = max(0.0, self._oldest + self.flush_interval - time.monotonic())
+                if timeout != 0.0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+
+                batch = self._take(force=False)
+                if batch:
+                    if await self._send_async(send_batch, batch):
+                        retry_delay = self.flush_interval
+                    elif self._running:
+                        # Backend indisponível: aguardar antes de tentar de novo
+                        try:
+                            await asyncio.wait_for(self._wait_stopped(), retry_delay)
+                        except asyncio.TimeoutError:
+                            pass
+                        retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+
+            # Enviar o que restou antes de sair
+            while True:
+                batch = self._take(force=True)
+                if not batch or not await self._send_async(send_batch, batch):
+                    break
+        finally:
+            with self._condition:
+                self._loop = None
+                self._wakeup = None
+
+    async def _wait_stopped(self):
+        while self._running:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _send_async(self, send_batch: Callable[[List[Dict]], Awaitable[bool]], batch: List[Dict]) -> bool:
+        try:
+            delivered = await send_batch(batch)
+        except Exception as e:
+            logger.error(f"❌ Erro ao enviar lote de alertas: {e}")
+            delivered = False
+        return self._delivered(batch, delivered)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+SAPP Async HTTP Client
+Versão asyncio do cliente do backend: conexões keep-alive reaproveitadas,
+timeouts, retentativas de GET, single-flight e cache curto
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from http_client import BackendHTTPError, DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_RETRIES
+
+# Status de GET repetidos automaticamente
+RETRY_STATUS = (502, 503, 504)
+
+
+class _Connection:
+    """Conexão HTTP/1.1 aberta com o backend"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncBackendClient:
+    """
+    Cliente HTTP do backend para o modo asyncio, com a mesma interface do
+    BackendClient. Até pool_size conexões ficam abertas e são reaproveitadas.
+    """
+
+    def __init__(self, base_url: str, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise ValueError(f"Apenas http:// é suportado no modo asyncio: {base_url}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.retries = retries
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self.stats = dict.fromkeys(('requests', 'cache_hits', 'joined', 'connections'), 0)
+
+    async def get_json(self, path: str, ttl: float = 0.0) -> Any:
+        """GET com cache de ttl segundos e single-flight (BackendHTTPError para status != 200)"""
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] > time.monotonic():
+            self.stats['cache_hits'] += 1
+            return cached[1]
+        future = self._in_flight.get(path)
+        if future is not None:
+            self.stats['joined'] += 1
+            return await asyncio.shield(future)
+
+        future = self._in_flight[path] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._request_with_retry(path)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # evita aviso de exceção não lida sem seguidores
+            raise
+        else:
+            if ttl > 0:
+                self._cache[path] = (time.monotonic() + ttl, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._in_flight[path]
+
+    async def post_json(self, path: str, body: Any) -> Any:
+        """POST com corpo JSON (sem retentativa automática)"""
+        status, value = await self._request('POST', path, body)
+        if status != 200:
+            raise BackendHTTPError(path, status)
+        return value
+
+    async def get_many(self, paths: Iterable[str], ttl: float = 0.0) -> Dict[str, Any]:
+        """GETs concorrentes; o valor de cada caminho é o JSON ou a exceção"""
+        paths = list(dict.fromkeys(paths))
+        results = await asyncio.gather(*(self.get_json(path, ttl) for path in paths), return_exceptions=True)
+        return dict(zip(paths, results))
+
+    def invalidate(self, path: Optional[str] = None):
+        """Descarta uma resposta do cache (ou todas)"""
+        if path is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(path, None)
+
+    async def close(self):
+        """Fecha as conexões ociosas"""
+        while self._idle:
+            connection = self._idle.pop()
+            connection.close()
+
+    async def _request_with_retry(self, path: str) -> Any:
+        delay = 0.05
+        for attempt in range(self.retries + 1):
+            try:
+                status, value = await self._request('GET', path)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                if attempt == self.retries:
+                    raise
+            else:
+                if status == 200:
+                    return value
+                if status not in RETRY_STATUS or attempt == self.retries:
+                    raise BackendHTTPError(path, status)
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    async def _request(self, method: str, path: str, body: Any = None) -> Tuple[int, Any]:
+        self.stats['requests'] += 1
+        payload = b"" if body is None else json.dumps(body).encode()
+        head = (
+            f"{method} {self.prefix}{path} HTTP/1.1\r\n"
+            f"Host: {self.netloc}\r\n"
+            "Connection: keep-alive\r\n"
+            "Accept: application/json\r\n"
+            + (f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n" if body is not None else "")
+            + "\r\n"
+        ).encode()
+
+        async with self._slots:
+            reused = bool(self._idle)
+            connection = self._idle.pop() if reused else await self._connect()
+            try:
+                connection.writer.write(head + payload)
+                status, keep_alive, data = await asyncio.wait_for(self._read_response(connection), self.timeout[1])
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection.close()
+                if not reused or method != 'GET':
+                    # POST não é repetido: o servidor pode já ter processado o corpo
+                    # (quem chama decide, ex.: o AlertPipeline recoloca o lote na fila)
+                    raise
+                # Conexão ociosa fechada pelo servidor: tentar uma vez em conexão nova
+                connection = await self._connect()
+                try:
+                    connection.writer.write(head + payload)
+                    status, keep_alive, data = await asyncio.wait_for(self._read_response(connection), self.timeout[1])
+                except BaseException:
+                    connection.close()
+                    raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if keep_alive:
+                self._idle.append(connection)
+            else:
+                connection.close()
+
+        value = json.loads(data) if data else None
+        return status, value
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout[0])
+        self.stats['connections'] += 1
+        return _Connection(reader, writer)
+
+    async def _read_response(self, connection: _Connection) -> Tuple[int, bool, bytes]:
+        reader = connection.reader
+        status_line = await reader.readuntil(b"\r\n")
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b';')[0], 16)
+                if size == 0:
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b"".join(chunks)
+        elif 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        else:
+            data = await reader.read()
+            headers['connection'] = 'close'
+
+        connection_header = headers.get('connection', '').lower()
+        keep_alive = connection_header != 'close' if version == b"HTTP/1.1" else connection_header == 'keep-alive'
+        return int(status), keep_alive, data
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+SAPP Async WebSocket
+Cliente WebSocket mínimo (RFC 6455) sobre asyncio streams, para o modo asyncio do analisador
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+# Sufixo fixo do handshake (RFC 6455, seção 1.3)
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Maior mensagem aceita do servidor (bytes)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+# Silêncio do servidor antes de enviar um ping (s)
+IDLE_TIMEOUT = 30.0
+
+# Espera por qualquer frame depois do ping antes de dar a conexão como morta (s)
+PING_TIMEOUT = 10.0
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    """Falha de handshake ou de protocolo"""
+
+
+def accept_key(key: bytes) -> bytes:
+    """Valor esperado de Sec-WebSocket-Accept para a chave enviada"""
+    return base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest())
+
+
+def apply_mask(payload: bytes, mask: bytes) -> bytes:
+    """Aplica (ou remove) a máscara XOR de 4 bytes"""
+    if not payload:
+        return payload
+    size = len(payload)
+    repeated = (mask * (size // 4 + 1))[:size]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(size, 'big')
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+    """Monta um frame final (FIN) com o payload inteiro"""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    size = len(payload)
+    if size < 126:
+        header.append(mask_bit | size)
+    elif size < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', size)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', size)
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    return bytes(header) + key + apply_mask(payload, key)
+
+
+class AsyncWebSocket:
+    """
+    Conexão WebSocket aberta; iterar devolve as mensagens de texto/binárias.
+
+    Se o servidor fica idle_timeout segundos em silêncio o cliente envia um
+    ping; sem nenhum frame em ping_timeout a conexão (meio aberta) é fechada
+    com WebSocketError, para quem lê reconectar.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 idle_timeout: Optional[float] = IDLE_TIMEOUT, ping_timeout: float = PING_TIMEOUT):
+        self.reader = reader
+        self.writer = writer
+        self.idle_timeout = idle_timeout
+        self.ping_timeout = ping_timeout
+        self.closed = False
+
+    async def _read_frame(self) -> Tuple[bool, int, bytes]:
+        first, second = await self.reader.readexactly(2)
+        size = second & 0x7F
+        if size == 126:
+            size = struct.unpack('!H', await self.reader.readexactly(2))[0]
+        elif size == 127:
+            size = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+        if size > MAX_MESSAGE_BYTES:
+            raise WebSocketError(f"Frame de {size} bytes excede o limite")
+        mask = await self.reader.readexactly(4) if second & 0x80 else None
+        payload = await self.reader.readexactly(size) if size else b""
+        if mask is not None:
+            payload = apply_mask(payload, mask)
+        return bool(first & 0x80), first & 0x0F, payload
+
+    async def _next_frame(self) -> Tuple[bool, int, bytes]:
+        """Próximo frame com prazo de leitura (a leitura só é cancelada ao desistir da conexão)"""
+        if self.idle_timeout is None:
+            return await self._read_frame()
+        read = asyncio.ensure_future(self._read_frame())
+        try:
+            done, _ = await asyncio.wait((read,), timeout=self.idle_timeout)
+            if not done:
+                await self._send_frame(OP_PING, b"")
+                done, _ = await asyncio.wait((read,), timeout=self.ping_timeout)
+            if not done:
+                await self._close_transport()
+                raise WebSocketError(f"Sem resposta do servidor em {self.idle_timeout + self.ping_timeout:.0f}s")
+            return read.result()
+        finally:
+            if not read.done():
+                read.cancel()
+
+    async def recv(self) -> Optional[str]:
+        """Próxima mensagem (str para texto, bytes para binário; None quando a conexão fecha)"""
+        if self.closed:
+            return None
+        fragments = []
+        message_opcode = None
+        try:
+            while True:
+                fin, opcode, payload = await self._next_frame()
+                if opcode == OP_PING:
+                    await self._send_frame(OP_PONG, payload)
+                    continue
+                if opcode == OP_PONG:
+                    continue
+                if opcode == OP_CLOSE:
+                    await self._close_transport(payload[:2])
+                    return None
+                if opcode != OP_CONTINUATION:
+                    message_opcode = opcode
+                fragments.append(payload)
+                if sum(map(len, fragments)) > MAX_MESSAGE_BYTES:
+                    raise WebSocketError("Mensagem excede o limite")
+                if fin:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed = True
+            return None
+
+        message = b"".join(fragments)
+        return message.decode('utf-8') if message_opcode == OP_TEXT else message
+
+    async def send(self, message):
+        """Envia uma mensagem de texto (str) ou binária (bytes)"""
+        if isinstance(message, str):
+            await self._send_frame(OP_TEXT, message.encode('utf-8'))
+        else:
+            await self._send_frame(OP_BINARY, bytes(message))
+
+    async def _send_frame(self, opcode: int, payload: bytes):
+        self.writer.write(encode_frame(opcode, payload))
+        await self.writer.drain()
+
+    async def close(self, code: int = 1000):
+        """Fecha a conexão (frame de close e encerramento do socket)"""
+        if not self.closed:
+            try:
+                await self._send_frame(OP_CLOSE, struct.pack('!H', code))
+            except (ConnectionError, RuntimeError):
+                pass
+            await self._close_transport()
+
+    async def _close_transport(self, code: bytes = b""):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if code:
+                self.writer.write(encode_frame(OP_CLOSE, code))
+            self.writer.close()
+            await self.writer.wait_closed()
+        except (ConnectionError, RuntimeError):
+            pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.recv()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+async def connect(url: str, timeout: float = 5.0, idle_timeout: Optional[float] = IDLE_TIMEOUT,
+                  ping_timeout: float = PING_TIMEOUT) -> AsyncWebSocket:
+    """Abre a conexão e faz o handshake de upgrade (ws:// ou wss://)"""
+    parts = urlsplit(url)
+    secure = parts.scheme == 'wss'
+    if parts.scheme not in ('ws', 'wss'):
+        raise WebSocketError(f"URL WebSocket inválida: {url}")
+    host = parts.hostname
+    port = parts.port or (443 if secure else 80)
+    path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+    context = None
+    if secure:
+        import ssl
+        context = ssl.create_default_context()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=context), timeout)
+    key = base64.b64encode(os.urandom(16))
+    request = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key.decode()}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n"
+    )
+    try:
+        writer.write(request.encode())
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+        writer.close()
+        raise WebSocketError(f"Handshake incompleto: {e}")
+    except BaseException:
+        # Timeout, erro de TLS/socket ou cancelamento: não deixar o socket aberto
+        writer.close()
+        raise
+
+    lines = head.decode('latin-1').split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if lines[0].split()[1:2] != ['101'] or headers.get('sec-websocket-accept', '').encode() != accept_key(key):
+        writer.close()
+        raise WebSocketError(f"Handshake recusado: {lines[0]}")
+    return AsyncWebSocket(reader, writer, idle_timeout, ping_timeout)
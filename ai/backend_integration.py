@@ -4,17 +4,58 @@ SAPP Backend Integration
 Integração da IA com o backend Node.js
 """
 
-import requests
 import json
-import websocket
 import threading
 import time
 from datetime import datetime
 from typing import Dict, List, Optional
 import logging
 
+from http_client import BackendClient, BackendHTTPError
+from async_http_client import AsyncBackendClient
+from price_decoder import PRICE_SECTIONS
+from startup import Readiness
+
 logger = logging.getLogger(__name__)
 
+# Validade das respostas em cache (segundos)
+PRICES_TTL = 0.5
+POSITIONS_TTL = 1.0
+RISK_TTL = 1.0
+
+# Alterações de posições desde uma versão (ver position_sync)
+POSITION_CHANGES_PATH = "/api/positions/changes"
+
+def _is_price_snapshot(data: Dict) -> bool:
+    """Mensagem com os preços de todos os mercados (initial_data/price_update ou o formato 'prices')"""
+    return 'prices' in data or all(section in data for section in PRICE_SECTIONS)
+
+def _position_changes_path(since: int, limit: int, full: bool) -> str:
+    return f"{POSITION_CHANGES_PATH}?since={since}&limit={limit}" + ("&full=1" if full else "")
+
+def _listing_change(record: Dict) -> Dict:
+    """
+    Posição de GET /api/positions no formato das alterações: registros com
+    pernas passam direto; os do backend (asset/side/size/collateral, com
+    leg2_asset opcional) viram as pernas do spread, como em toPositionChange
+    do backend
+    """
+    if 'leg1_market' in record:
+        return dict(record, position_id=record.get('position_id', record.get('id')))
+    direction = -1 if record.get('side') == 'Short' else 1
+    spread = bool(record.get('leg2_asset'))
+    return {
+        'position_id': record['id'],
+        'status': record.get('status', 'Active'),
+        'leg1_market': record['asset'],
+        'leg2_market': record['leg2_asset'] if spread else record['asset'],
+        'leg1_size': direction * record['size'],
+        'leg2_size': -direction * record['leg2_size'] if spread else 0,
+        'margin': record['collateral'],
+        'entry_spread': record['entry_price'] - record['leg2_entry_price'] if spread else 0.0,
+        'timestamp': record.get('timestamp'),
+    }
+
 class SAPPBackendIntegration:
     """Integração com o backend SAPP"""
     
@@ -23,11 +64,16 @@ class SAPPBackendIntegration:
         self.ws_url = ws_url
         self.ws = None
         self.connected = False
+        self.readiness = Readiness()  # WebSocket aberto e primeiro snapshot completo de preços
         self.positions = {}
+        self.client = BackendClient(backend_url)
+        self._async_client: Optional[AsyncBackendClient] = None
         
     def connect_websocket(self):
         """Conecta ao WebSocket do backend"""
         try:
+            import websocket  # websocket-client só é carregado por quem usa o feed em thread
+            
             self.ws = websocket.WebSocketApp(
                 self.ws_url,
                 on_open=self._on_open,
@@ -43,11 +89,13 @@ class SAPPBackendIntegration:
             
         except Exception as e:
             logger.error(f"❌ Erro ao conectar WebSocket: {e}")
+            self.readiness.abort(e)
             
     def _on_open(self, ws):
         """Callback de conexão aberta"""
         logger.info("🔗 WebSocket conectado")
         self.connected = True
+        self.readiness.mark('open')
         
     def _on_message(self, ws, message):
         """Callback de mensagem recebida"""
@@ -58,6 +106,8 @@ class SAPPBackendIntegration:
             # Processar dados de preços
             if 'prices' in data:
                 self._process_price_update(data['prices'])
+            if not self.readiness.is_set() and _is_price_snapshot(data):
+                self.readiness.mark('prices')
                 
         except Exception as e:
             logger.error(f"❌ Erro ao processar mensagem: {e}")
@@ -66,11 +116,15 @@ class SAPPBackendIntegration:
         """Callback de erro"""
         logger.error(f"❌ Erro WebSocket: {error}")
         self.connected = False
+        if not self.readiness.is_set():
+            self.readiness.abort(error)
         
     def _on_close(self, ws, close_status_code, close_msg):
         """Callback de conexão fechada"""
         logger.info("🔌 WebSocket desconectado")
         self.connected = False
+        if not self.readiness.is_set():
+            self.readiness.abort(f"conexão fechada ({close_status_code})")
         
     def _process_price_update(self, prices: Dict):
         """Processa atualização de preços"""
@@ -94,43 +148,172 @@ class SAPPBackendIntegration:
     def get_positions(self) -> List[Dict]:
         """Obtém posições do backend"""
         try:
-            response = requests.get(f"{self.backend_url}/api/positions")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"❌ Erro ao obter posições: {response.status_code}")
-                return []
-                
+            return self.client.get_json("/api/positions", ttl=POSITIONS_TTL)
+            
+        except BackendHTTPError as e:
+            logger.error(f"❌ Erro ao obter posições: {e.status_code}")
+            return []
         except Exception as e:
             logger.error(f"❌ Erro na requisição: {e}")
             return []
             
+    def get_position_changes(self, since: int, limit: int, full: bool = False) -> Dict:
+        """
+        Página de posições abertas, alteradas e fechadas após a versão since
+        (full: listagem completa das ativas). Lança BackendHTTPError (410:
+        histórico anterior a since descartado).
+        """
+        return self.client.get_json(_position_changes_path(since, limit, full))
+
+    def get_position_listing(self) -> List[Dict]:
+        """
+        Posições ativas de GET /api/positions no formato das alterações
+        (sincronização sem a rota de alterações; erros são propagados)
+        """
+        records = self.client.get_json("/api/positions")
+        return [_listing_change(record) for record in records] if isinstance(records, list) else records
+            
     def send_alert(self, alert: Dict):
         """Envia alerta para o backend"""
         try:
-            response = requests.post(
-                f"{self.backend_url}/api/alerts",
-                json=alert,
-                headers={'Content-Type': 'application/json'}
-            )
+            self.client.post_json("/api/alerts", alert)
+            logger.info("✅ Alerta enviado com sucesso")
             
-            if response.status_code == 200:
-                logger.info("✅ Alerta enviado com sucesso")
-            else:
-                logger.error(f"❌ Erro ao enviar alerta: {response.status_code}")
-                
+        except BackendHTTPError as e:
+            logger.error(f"❌ Erro ao enviar alerta: {e.status_code}")
         except Exception as e:
             logger.error(f"❌ Erro ao enviar alerta: {e}")
             
+    def send_alerts(self, alerts: List[Dict]) -> bool:
+        """Envia um lote de alertas para o backend (True se aceito)"""
+        try:
+            self.client.post_json("/api/alerts/batch", {"alerts": alerts})
+            logger.info(f"✅ {len(alerts)} alertas enviados com sucesso")
+            return True
+
+        except BackendHTTPError as e:
+            logger.error(f"❌ Erro ao enviar lote de alertas: {e.status_code}")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Erro ao enviar lote de alertas: {e}")
+            return False
+
     def get_price_data(self, market: str) -> Optional[Dict]:
         """Obtém dados de preço de um mercado"""
         try:
-            response = requests.get(f"{self.backend_url}/api/prices/{market}")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return None
+            return self.client.get_json(f"/api/prices/{market}", ttl=PRICES_TTL)
                 
+        except BackendHTTPError:
+            return None
         except Exception as e:
             logger.error(f"❌ Erro ao obter preço de {market}: {e}")
             return None
+
+    def get_prices(self, markets: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Obtém dados de preço de vários mercados em paralelo (todos os preços
+        do backend em uma requisição se markets não for informado)
+        """
+        if markets is None:
+            try:
+                return self.client.get_json("/api/prices", ttl=PRICES_TTL)
+            except Exception as e:
+                logger.error(f"❌ Erro ao obter preços: {e}")
+                return {}
+
+        results = self.client.get_many((f"/api/prices/{market}" for market in markets), ttl=PRICES_TTL)
+        prices = {}
+        for market in markets:
+            value = results[f"/api/prices/{market}"]
+            if isinstance(value, Exception):
+                if not isinstance(value, BackendHTTPError):
+                    logger.error(f"❌ Erro ao obter preço de {market}: {value}")
+                value = None
+            prices[market] = value
+        return prices
+
+    def get_risk(self, position_id) -> Optional[Dict]:
+        """Obtém a análise de risco do backend para uma posição"""
+        return self.get_risks([position_id]).get(position_id)
+
+    def get_risks(self, position_ids: List) -> Dict:
+        """Obtém a análise de risco de várias posições em paralelo"""
+        results = self.client.get_many((f"/api/risk/{position_id}" for position_id in position_ids), ttl=RISK_TTL)
+        risks = {}
+        for position_id in position_ids:
+            value = results[f"/api/risk/{position_id}"]
+            if isinstance(value, Exception):
+                if not isinstance(value, BackendHTTPError):
+                    logger.error(f"❌ Erro ao obter risco da posição {position_id}: {value}")
+                value = None
+            risks[position_id] = value
+        return risks
+
+    # ----- modo asyncio -----
+
+    @property
+    def async_client(self) -> AsyncBackendClient:
+        """Cliente asyncio (criado no primeiro uso, dentro do event loop)"""
+        if self._async_client is None:
+            self._async_client = AsyncBackendClient(self.backend_url)
+        return self._async_client
+
+    async def get_positions_async(self) -> List[Dict]:
+        """Obtém posições do backend (modo asyncio)"""
+        try:
+            return await self.async_client.get_json("/api/positions", ttl=POSITIONS_TTL)
+
+        except BackendHTTPError as e:
+            logger.error(f"❌ Erro ao obter posições: {e.status_code}")
+            return []
+        except Exception as e:
+            logger.error(f"❌ Erro na requisição: {e}")
+            return []
+
+    async def get_position_changes_async(self, since: int, limit: int, full: bool = False) -> Dict:
+        """Página de alterações de posições (modo asyncio; ver get_position_changes)"""
+        return await self.async_client.get_json(_position_changes_path(since, limit, full))
+
+    async def get_position_listing_async(self) -> List[Dict]:
+        """Posições ativas no formato das alterações (modo asyncio; ver get_position_listing)"""
+        records = await self.async_client.get_json("/api/positions")
+        return [_listing_change(record) for record in records] if isinstance(records, list) else records
+
+    async def send_alerts_async(self, alerts: List[Dict]) -> bool:
+        """Envia um lote de alertas para o backend (modo asyncio)"""
+        try:
+            await self.async_client.post_json("/api/alerts/batch", {"alerts": alerts})
+            logger.info(f"✅ {len(alerts)} alertas enviados com sucesso")
+            return True
+
+        except BackendHTTPError as e:
+            logger.error(f"❌ Erro ao enviar lote de alertas: {e.status_code}")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Erro ao enviar lote de alertas: {e}")
+            return False
+
+    async def get_prices_async(self, markets: List[str]) -> Dict[str, Optional[Dict]]:
+        """Obtém dados de preço de vários mercados em paralelo (modo asyncio)"""
+        results = await self.async_client.get_many((f"/api/prices/{market}" for market in markets), ttl=PRICES_TTL)
+        prices = {}
+        for market in markets:
+            value = results[f"/api/prices/{market}"]
+            if isinstance(value, Exception):
+                if not isinstance(value, BackendHTTPError):
+                    logger.error(f"❌ Erro ao obter preço de {market}: {value}")
+                value = None
+            prices[market] = value
+        return prices
+
+    async def close_async(self):
+        """Fecha as conexões do cliente asyncio"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def close(self):
+        """Encerra o WebSocket e as conexões HTTP"""
+        if self.ws:
+            self.ws.close()
+        self.client.close()
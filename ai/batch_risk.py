@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+SAPP Batch Risk Engine
+Cálculo vetorizado do score de risco para todo o livro de posições
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Faixas, pesos e o pipeline padrão vivem em risk_factors (reexportados aqui)
+from risk_factors import (
+    SPREAD_CHANGE_BINS, SPREAD_CHANGE_SCORES, MARGIN_RATIO_BINS, MARGIN_RATIO_SCORES,
+    LIQUIDATION_BINS, LIQUIDATION_SCORES, FACTOR_WEIGHTS, MARGIN_REQUIREMENT, NEUTRAL_SCORE,
+    DEFAULT_PIPELINE, FactorFrame, FactorPipeline, tier_index
+)
+
+# Níveis de alerta na ordem dos códigos de tier (0 = sem alerta)
+ALERT_LEVELS = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+
+
+class MarketRegistry:
+    """Interna nomes de mercado em ids inteiros estáveis"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, market: str) -> int:
+        """Retorna o id do mercado, registrando-o se for novo"""
+        market_id = self._ids.get(market)
+        if market_id is None:
+            market_id = len(self.names)
+            self._ids[market] = market_id
+            self.names.append(market)
+        return market_id
+
+    def get(self, market: str) -> Optional[int]:
+        """Retorna o id do mercado ou None se não registrado"""
+        return self._ids.get(market)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, market: str) -> bool:
+        return market in self._ids
+
+    def price_vector(self, prices: Dict[str, float]) -> np.ndarray:
+        """Monta o vetor de preços indexado por id (0 = preço indisponível)"""
+        vector = np.zeros(len(self.names), dtype=np.float64)
+        for market, price in prices.items():
+            market_id = self._ids.get(market)
+            if market_id is not None and price:
+                vector[market_id] = price
+        return vector
+
+
+@dataclass
+class BookColumns:
+    """Livro de posições em formato colunar"""
+    position_ids: np.ndarray
+    leg1_ids: np.ndarray
+    leg2_ids: np.ndarray
+    leg1_size: np.ndarray
+    leg2_size: np.ndarray
+    margin: np.ndarray
+    entry_spread: np.ndarray
+
+    @classmethod
+    def from_positions(cls, positions: Iterable, registry: MarketRegistry) -> 'BookColumns':
+        """Converte objetos PositionData em colunas"""
+        positions = list(positions)
+        count = len(positions)
+        columns = cls.empty(count)
+        for row, position in enumerate(positions):
+            columns.position_ids[row] = position.position_id
+            columns.leg1_ids[row] = registry.intern(position.leg1_market)
+            columns.leg2_ids[row] = registry.intern(position.leg2_market)
+            columns.leg1_size[row] = position.leg1_size
+            columns.leg2_size[row] = position.leg2_size
+            columns.margin[row] = position.margin
+            columns.entry_spread[row] = position.entry_spread
+        return columns
+
+    @classmethod
+    def empty(cls, count: int) -> 'BookColumns':
+        """Cria colunas vazias com capacidade para count posições"""
+        return cls(
+            position_ids=np.zeros(count, dtype=np.int64),
+            leg1_ids=np.zeros(count, dtype=np.int32),
+            leg2_ids=np.zeros(count, dtype=np.int32),
+            leg1_size=np.zeros(count, dtype=np.int64),
+            leg2_size=np.zeros(count, dtype=np.int64),
+            margin=np.zeros(count, dtype=np.int64),
+            entry_spread=np.zeros(count, dtype=np.float64)
+        )
+
+    def take(self, rows) -> 'BookColumns':
+        """Retorna um subconjunto das colunas"""
+        return BookColumns(
+            position_ids=self.position_ids[rows],
+            leg1_ids=self.leg1_ids[rows],
+            leg2_ids=self.leg2_ids[rows],
+            leg1_size=self.leg1_size[rows],
+            leg2_size=self.leg2_size[rows],
+            margin=self.margin[rows],
+            entry_spread=self.entry_spread[rows]
+        )
+
+    def __len__(self) -> int:
+        return len(self.position_ids)
+
+
+@dataclass
+class BatchRiskScores:
+    """Scores de risco calculados para um conjunto de posições"""
+    position_ids: np.ndarray
+    factors: Dict[str, np.ndarray]  # score por fator do pipeline
+    total: np.ndarray
+    current_spread: np.ndarray  # NaN quando os preços não estão disponíveis
+    required_margin: np.ndarray  # 0 quando os preços não estão disponíveis
+
+    @classmethod
+    def from_frame(cls, position_ids: np.ndarray, frame: FactorFrame) -> 'BatchRiskScores':
+        """Scores de uma avaliação do pipeline de fatores"""
+        current_spread = frame.values['current_spread']
+        required_margin = frame.values['required_margin']
+        valid = frame.valid
+        if not valid.all():
+            current_spread = np.where(valid, current_spread, np.nan)
+            required_margin = np.where(valid, required_margin, 0.0)
+        return cls(position_ids=position_ids, factors=dict(frame.scores), total=frame.total,
+                   current_spread=current_spread, required_margin=required_margin)
+
+    @property
+    def volatility(self) -> Optional[np.ndarray]:
+        return self.factors.get('volatility')
+
+    @property
+    def margin(self) -> Optional[np.ndarray]:
+        return self.factors.get('margin')
+
+    @property
+    def trend(self) -> Optional[np.ndarray]:
+        return self.factors.get('trend')
+
+    @property
+    def liquidation(self) -> Optional[np.ndarray]:
+        return self.factors.get('liquidation')
+
+    def tiers(self, risk_thresholds: Dict[str, float], band: float = 0.0) -> np.ndarray:
+        """
+        Código de tier por posição (0 = sem alerta, 1..4 = LOW..CRITICAL),
+        opcionalmente com os limites rebaixados em band
+        """
+        bins = np.array([risk_thresholds[level] for level in ALERT_LEVELS]) - band
+        return tier_index(self.total, bins, strict=False).astype(np.int8)
+
+    def __len__(self) -> int:
+        return len(self.position_ids)
+
+
+def column_inputs(columns: BookColumns, prices: np.ndarray,
+                  volatility_scores: Optional[np.ndarray] = None) -> Dict[str, Optional[np.ndarray]]:
+    """Entradas do pipeline de fatores a partir das colunas e do vetor (ou matriz) de preços"""
+    return {
+        'leg1_price': prices[..., columns.leg1_ids],
+        'leg2_price': prices[..., columns.leg2_ids],
+        'leg1_size': columns.leg1_size,
+        'leg2_size': columns.leg2_size,
+        'margin': columns.margin,
+        'entry_spread': columns.entry_spread,
+        'pair_volatility': volatility_scores,
+    }
+
+
+def score_columns(columns: BookColumns, prices: np.ndarray, volatility_scores: Optional[np.ndarray] = None,
+                  pipeline: Optional[FactorPipeline] = None) -> BatchRiskScores:
+    """
+    Avalia o pipeline de fatores (o padrão: volatilidade, margem, tendência e
+    liquidação) em uma única passada. volatility_scores substitui, onde não
+    for NaN, o fator de volatilidade baseado na mudança do spread (ex.:
+    volatilidade realizada do par).
+
+    prices pode ser uma matriz (cenários × mercados): os resultados ganham
+    a mesma dimensão inicial (cenários × posições).
+    """
+    frame = (pipeline or DEFAULT_PIPELINE).evaluate(column_inputs(columns, prices, volatility_scores), retain=False)
+    return BatchRiskScores.from_frame(columns.position_ids, frame)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+SAPP Benchmark
+Benchmarks offline dos caminhos críticos do analisador com livros e ticks sintéticos
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_risk import BookColumns
+from position_book import PositionBook
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+# Mercados e preços de referência dos livros sintéticos
+MARKETS = {
+    "WTI": 63.0, "Brent": 67.0, "NaturalGas": 2.9,
+    "Gold": 3732.0, "Silver": 43.2,
+    "Wheat": 5.4, "Corn": 4.2, "Soybeans": 10.1,
+    "BTC": 60000.0, "ETH": 3000.0, "XLM": 0.12, "SOL": 150.0
+}
+CRYPTO_MARKETS = ("BTC", "ETH", "XLM", "SOL")
+PAIRS = [
+    ("WTI", "Brent"), ("Brent", "NaturalGas"), ("Gold", "Silver"),
+    ("Corn", "Wheat"), ("Soybeans", "Corn"), ("BTC", "ETH"), ("SOL", "XLM")
+]
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_TICKS = 20000
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+# Tempo máximo de cada benchmark (as chamadas restantes são descartadas)
+DEFAULT_BUDGET_SECONDS = 10.0
+
+# Fração das posições com margem apertada (as demais ficam abaixo do tier LOW)
+STRESSED_FRACTION = 0.05
+
+# Limite de posições avaliadas uma a uma no benchmark escalar
+SCALAR_SAMPLE = 20000
+
+
+@dataclass
+class BenchmarkResult:
+    """Resultado de um benchmark"""
+    name: str
+    size: int               # posições no livro
+    operations: int         # unidades processadas (posições, ticks ou chamadas)
+    unit: str
+    seconds: float
+    throughput: float       # unidades por segundo
+    latency_ms: Dict[str, float]  # percentis por chamada
+    peak_memory_bytes: int  # pico de alocação durante uma chamada (tracemalloc, 0 = não medido)
+    max_rss_bytes: int      # pico de memória residente do processo até o fim do benchmark
+
+
+def synthetic_book(count: int, seed: int = 0) -> PositionBook:
+    """Livro determinístico de posições de spread nos pares de PAIRS"""
+    rng = np.random.default_rng(seed)
+    book = PositionBook(capacity=max(count, 1))
+    prices = np.array([MARKETS[market] for market in MARKETS])
+    for market in MARKETS:
+        book.registry.intern(market)
+
+    pair_ids = np.array([(book.registry.get(leg1), book.registry.get(leg2)) for leg1, leg2 in PAIRS])
+    pairs = pair_ids[rng.integers(0, len(PAIRS), count)]
+    leg1_price = prices[pairs[:, 0]]
+    leg2_price = prices[pairs[:, 1]]
+
+    # Tamanhos com notional parecido nas duas pernas
+    notional = rng.choice([1e4, 1e5, 1e6], count)
+    leg1_size = np.maximum(1, notional / leg1_price).astype(np.int64)
+    leg2_size = -np.maximum(1, notional / leg2_price).astype(np.int64)
+
+    required = 0.2 * np.maximum(leg1_size * leg1_price, -leg2_size * leg2_price)
+    cushion = np.where(rng.random(count) < STRESSED_FRACTION,
+                       rng.uniform(0.9, 1.6, count), rng.uniform(3.0, 10.0, count))
+
+    columns = BookColumns.empty(count)
+    columns.position_ids[:] = np.arange(1, count + 1)
+    columns.leg1_ids[:] = pairs[:, 0]
+    columns.leg2_ids[:] = pairs[:, 1]
+    columns.leg1_size[:] = leg1_size
+    columns.leg2_size[:] = leg2_size
+    columns.margin[:] = (required * cushion).astype(np.int64)
+    columns.entry_spread[:] = (leg1_price - leg2_price) * rng.uniform(0.995, 1.005, count)
+    book.insert_columns(columns)
+    return book
+
+
+def synthetic_ticks(count: int, seed: int = 0) -> List[str]:
+    """
+    Mensagens WebSocket determinísticas (passeio aleatório dos preços) nos três
+    formatos aceitos por _on_message: 'prices', 'crypto' e 'commodity'
+    """
+    rng = np.random.default_rng(seed)
+    names = list(MARKETS)
+    prices = np.array([MARKETS[market] for market in names])
+    commodities = [index for index, market in enumerate(names) if market not in CRYPTO_MARKETS]
+    crypto = [index for index, market in enumerate(names) if market in CRYPTO_MARKETS]
+
+    messages = []
+    for tick in range(count):
+        kind = ("prices", "commodity", "crypto")[tick % 3]
+        pool = crypto if kind == "crypto" else commodities if kind == "commodity" else range(len(names))
+        touched = rng.choice(list(pool), size=min(3, len(pool)), replace=False)
+        prices[touched] *= np.exp(rng.normal(0, 0.0005, len(touched)))
+        payload = {names[index]: {"price": round(float(prices[index]), 6)} for index in touched}
+        messages.append(json.dumps({kind: payload}))
+    return messages
+
+
+def synthetic_frames(count: int, seed: int = 0) -> List[str]:
+    """
+    Mensagens no formato do websocket-server.js ('price_update' com as seções
+    'crypto' e 'commodities' completas, como o backend envia a cada ciclo)
+    """
+    rng = np.random.default_rng(seed)
+    names = list(MARKETS)
+    prices = np.array([MARKETS[market] for market in names])
+    start_ms = 1_700_000_000_000
+
+    messages = []
+    for tick in range(count):
+        prices *= np.exp(rng.normal(0, 0.0005, len(names)))
+        timestamp = start_ms + tick * 1000
+        sections = {"crypto": {}, "commodities": {}}
+        for market, price in zip(names, prices.tolist()):
+            section = "crypto" if market in CRYPTO_MARKETS else "commodities"
+            sections[section][market] = {"price": round(price, 6), "source": "Reflector", "timestamp": timestamp}
+        messages.append(json.dumps({"type": "price_update", "timestamp": timestamp, **sections}))
+    return messages
+
+
+def _latency_percentiles(samples_ns: List[int]) -> Dict[str, float]:
+    samples = np.array(samples_ns, dtype=np.float64) / 1e6
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p90": float(np.percentile(samples, 90)),
+        "p99": float(np.percentile(samples, 99)),
+        "max": float(samples.max())
+    }
+
+
+@contextmanager
+def _discarded_logs():
+    """Mantém o custo de formatação dos logs, mas descarta a saída"""
+    root = logging.getLogger()
+    streams = []
+    with open(os.devnull, "w") as devnull:
+        for handler in root.handlers:
+            if isinstance(handler, logging.StreamHandler):
+                streams.append((handler, handler.setStream(devnull)))
+        try:
+            yield
+        finally:
+            for handler, stream in streams:
+                handler.setStream(stream)
+
+
+def measure(name: str, size: int, unit: str, calls: List[Callable], units_per_call: int = 1,
+            memory: bool = True, reset: Optional[Callable] = None,
+            budget_seconds: float = DEFAULT_BUDGET_SECONDS) -> BenchmarkResult:
+    """
+    Executa as chamadas medindo a latência de cada uma (até esgotar o orçamento
+    de tempo). O pico de memória vem de uma repetição da última chamada sob
+    tracemalloc, precedida de reset() quando a chamada depende de estado.
+    """
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + budget_seconds
+    for call in calls:
+        call_start = time.perf_counter_ns()
+        call()
+        latencies.append(time.perf_counter_ns() - call_start)
+        if time.perf_counter() > deadline:
+            break
+    elapsed = time.perf_counter() - start
+
+    peak = 0
+    if memory:
+        if reset is not None:
+            reset()
+        tracemalloc.start()
+        try:
+            calls[-1]()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    operations = len(latencies) * units_per_call
+    return BenchmarkResult(
+        name=name,
+        size=size,
+        operations=operations,
+        unit=unit,
+        seconds=elapsed,
+        throughput=operations / elapsed if elapsed > 0 else float("inf"),
+        latency_ms=_latency_percentiles(latencies),
+        peak_memory_bytes=peak,
+        max_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    )
+
+
+def _mark_all_dirty(analyzer: SAPPRealRiskAnalyzer):
+    with analyzer._dirty_lock:
+        analyzer._dirty_positions = set(analyzer.positions)
+
+
+def benchmark_size(size: int, ticks: int, seed: int = 0,
+                   budget_seconds: float = DEFAULT_BUDGET_SECONDS) -> List[BenchmarkResult]:
+    """Roda todos os benchmarks para um tamanho de livro"""
+    def measure_budgeted(*args, **kwargs) -> BenchmarkResult:
+        return measure(*args, budget_seconds=budget_seconds, **kwargs)
+
+    results = []
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.current_prices.update(MARKETS)
+
+    # Carga do livro (colunas + índices do analisador)
+    def load():
+        analyzer.positions = synthetic_book(size, seed)
+    results.append(measure_budgeted("book_load", size, "positions", [load], units_per_call=size))
+    results.append(measure_budgeted("initial_rescore", size, "positions", [analyzer.rescore_pending],
+                           units_per_call=size, reset=lambda: _mark_all_dirty(analyzer)))
+
+    # Score escalar em uma amostra do livro
+    sample = np.random.default_rng(seed).choice(np.arange(1, size + 1), min(size, SCALAR_SAMPLE), replace=False)
+    views = [analyzer.positions[int(position_id)] for position_id in sample]
+    results.append(measure_budgeted("score_scalar", size, "positions",
+                           [lambda view=view: analyzer._calculate_risk_score(view) for view in views],
+                           memory=False))
+
+    # Score em lote e resumo de risco
+    repeats = max(3, min(50, 10_000_000 // size))
+    results.append(measure_budgeted("score_batch", size, "positions",
+                           [analyzer.calculate_risk_scores_batch] * repeats, units_per_call=size))
+    results.append(measure_budgeted("risk_summary", size, "calls", [analyzer.get_risk_summary] * repeats))
+
+    # Ingestão de ticks (JSON + atualização de preços + trigger book)
+    messages = synthetic_ticks(ticks, seed)
+    results.append(measure_budgeted("on_message", size, "ticks",
+                           [lambda message=message: analyzer._on_message(None, message) for message in messages],
+                           memory=False))
+    decoded = [json.loads(message) for message in messages]
+    updates = [message.get("prices") or message.get("crypto") or message.get("commodity") for message in decoded]
+    results.append(measure_budgeted("process_price_update", size, "ticks",
+                           [lambda update=update: analyzer._process_price_update(update) for update in updates],
+                           memory=False))
+
+    # Decodificação tipada das mensagens do backend (sem atualizar preços)
+    frames = synthetic_frames(ticks, seed)
+    results.append(measure_budgeted("decode_frames", size, "frames",
+                           [lambda frame=frame: analyzer.price_decoder.decode(frame) for frame in frames],
+                           memory=False))
+
+    # Tick até o reprocessamento das posições afetadas
+    def tick_to_rescore(message):
+        analyzer._on_message(None, message)
+        analyzer.rescore_pending()
+    results.append(measure_budgeted("tick_to_rescore", size, "ticks",
+                           [lambda message=message: tick_to_rescore(message) for message in reversed(messages)],
+                           memory=False))
+    return results
+
+
+def _environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, ticks: int = DEFAULT_TICKS, seed: int = 0,
+                   output: Optional[str] = DEFAULT_OUTPUT,
+                   budget_seconds: float = DEFAULT_BUDGET_SECONDS) -> Dict:
+    """Executa a suíte e grava o resultado em JSON"""
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "environment": _environment(),
+        "config": {"sizes": list(sizes), "ticks": ticks, "seed": seed, "budget_seconds": budget_seconds},
+        "results": []
+    }
+    with _discarded_logs():
+        for size in sizes:
+            report["results"].extend(asdict(result) for result in benchmark_size(size, ticks, seed, budget_seconds))
+
+    if output:
+        with open(output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    return report
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    """Exibe os resultados (e a variação contra um relatório anterior)"""
+    previous = {}
+    if baseline:
+        previous = {(result["name"], result["size"]): result for result in baseline["results"]}
+
+    print(f"{'benchmark':<22}{'posições':>10}{'vazão':>16}{'p50 ms':>10}{'p99 ms':>10}{'memória':>12}{'RSS':>12}")
+    for result in report["results"]:
+        line = (f"{result['name']:<22}{result['size']:>10,}"
+                f"{result['throughput']:>12,.0f} {result['unit'][:3]}/s"
+                f"{result['latency_ms']['p50']:>10.3f}{result['latency_ms']['p99']:>10.3f}"
+                + (f"{result['peak_memory_bytes'] / 1e6:>10.1f}MB" if result['peak_memory_bytes'] else f"{'-':>12}")
+                + f"{result['max_rss_bytes'] / 1e6:>10.0f}MB")
+        old = previous.get((result["name"], result["size"]))
+        if old:
+            line += f"  ({result['throughput'] / old['throughput']:.2f}x)"
+        print(line)
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Benchmarks offline do SAPP Risk Analyzer")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="tamanhos do livro")
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS, help="ticks sintéticos por tamanho")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help="tempo máximo por benchmark (segundos)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="arquivo JSON de saída")
+    parser.add_argument("--compare", help="relatório JSON anterior para comparação")
+    args = parser.parse_args()
+
+    print("⏱️ SAPP AI - BENCHMARKS")
+    print("=" * 60)
+    report = run_benchmarks(args.sizes, args.ticks, args.seed, args.output, args.budget)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+    print_report(report, baseline)
+    print()
+    print(f"💾 Resultados gravados em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
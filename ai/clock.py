@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+SAPP Clock
+Relógio do analisador: o real (padrão) ou um relógio virtual avançado pelos
+timestamps dos ticks, para reproduzir horas de mercado em segundos
+"""
+
+import threading
+import time
+from datetime import datetime
+
+
+class SystemClock:
+    """Relógio real: monotônico para prazos, de parede para timestamps"""
+
+    monotonic = staticmethod(time.monotonic)
+    monotonic_ns = staticmethod(time.monotonic_ns)
+    time_ns = staticmethod(time.time_ns)
+    now = staticmethod(datetime.now)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """Espera o evento por até timeout segundos"""
+        return event.wait(timeout)
+
+
+class VirtualClock:
+    """
+    Relógio virtual em ns desde a época. Só avança quando mandado (nunca
+    volta); esperar equivale a avançar o tempo pedido, sem dormir. Leituras
+    monotônicas e de parede são o mesmo instante.
+    """
+
+    def __init__(self, start_ns: int = 0):
+        self._ns = start_ns
+
+    def advance_to(self, timestamp_ns: int):
+        """Avança até timestamp_ns (instantes anteriores são ignorados)"""
+        if timestamp_ns > self._ns:
+            self._ns = timestamp_ns
+
+    def advance(self, seconds: float):
+        self._ns += int(seconds * 1e9)
+
+    def monotonic(self) -> float:
+        return self._ns / 1e9
+
+    def monotonic_ns(self) -> int:
+        return self._ns
+
+    def time_ns(self) -> int:
+        return self._ns
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self._ns / 1e9)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        if not event.is_set():
+            self.advance(timeout)
+        return event.is_set()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+SAPP Market Covariance
+Matriz de covariância EWMA entre mercados, atualizada incrementalmente a cada tick
+"""
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+from batch_risk import BookColumns, MarketRegistry
+
+# Meia-vida padrão do decaimento exponencial
+DEFAULT_HALFLIFE_SECONDS = 600.0
+
+# Abaixo deste ganho acumulado as somas são renormalizadas (evita overflow)
+MIN_GAIN = 1e-150
+
+
+def market_exposures(columns: BookColumns, prices: np.ndarray) -> np.ndarray:
+    """Exposição (tamanho × preço) por mercado, indexada pelos ids do registry do livro"""
+    exposures = np.bincount(
+        columns.leg1_ids, weights=columns.leg1_size * prices[columns.leg1_ids], minlength=len(prices)
+    )
+    exposures += np.bincount(
+        columns.leg2_ids, weights=columns.leg2_size * prices[columns.leg2_ids], minlength=len(prices)
+    )
+    return exposures
+
+
+class CovarianceMatrix:
+    """
+    Covariância dos retornos de todos os mercados como taxa por segundo.
+    Cada tick soma o produto externo dos retornos apenas dos mercados que
+    mudaram (O(k²) para k mercados no tick); o decaimento é aplicado por um
+    ganho global em vez de multiplicar a matriz inteira a cada tick.
+    """
+
+    def __init__(self, halflife_seconds: float = DEFAULT_HALFLIFE_SECONDS, capacity: int = 64):
+        self.halflife_seconds = halflife_seconds
+        self.registry = MarketRegistry()
+        self.updates = 0
+        self._last_prices = np.zeros(capacity, dtype=np.float64)
+        self._sums = np.zeros((capacity, capacity), dtype=np.float64)
+        self._elapsed = 0.0  # soma ponderada dos intervalos (segundos)
+        self._gain = 1.0  # decaimento acumulado; novas contribuições entram divididas por ele
+        self._last_timestamp_ns: Optional[int] = None
+
+    def _grow(self, size: int):
+        capacity = len(self._last_prices)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2)
+        last_prices = np.zeros(new_capacity, dtype=np.float64)
+        last_prices[:capacity] = self._last_prices
+        sums = np.zeros((new_capacity, new_capacity), dtype=np.float64)
+        sums[:capacity, :capacity] = self._sums
+        self._last_prices = last_prices
+        self._sums = sums
+
+    def update(self, prices: Dict[str, float], timestamp_ns: int):
+        """Incorpora os preços de um tick (apenas mercados presentes em prices)"""
+        if self._last_timestamp_ns is not None:
+            interval = max(timestamp_ns - self._last_timestamp_ns, 0) / 1e9
+            gain = self._gain * math.exp(-math.log(2) * interval / self.halflife_seconds)
+            if gain < MIN_GAIN:
+                # Renormalizar antes de dividir: após um intervalo longo (fim de semana,
+                # snapshot antigo) o ganho chega a 0 e o histórico decaído some
+                self._sums *= gain
+                self._elapsed = self._elapsed * gain + interval
+                self._gain = 1.0
+            else:
+                self._gain = gain
+                self._elapsed += interval / gain
+        self._last_timestamp_ns = timestamp_ns
+
+        ids = []
+        returns = []
+        for market, price in prices.items():
+            if not price:
+                continue
+            market_id = self.registry.intern(market)
+            if market_id >= len(self._last_prices):
+                self._grow(market_id + 1)
+            previous = self._last_prices[market_id]
+            if previous and price != previous:
+                ids.append(market_id)
+                returns.append(price / previous - 1.0)
+            self._last_prices[market_id] = price
+
+        if ids:
+            ids = np.array(ids)
+            returns = np.array(returns)
+            self._sums[np.ix_(ids, ids)] += np.outer(returns, returns) / self._gain
+            self.updates += 1
+
+    def covariance(self, horizon_seconds: float = 1.0) -> np.ndarray:
+        """Matriz de covariância dos retornos no horizonte (ordem do registry)"""
+        size = len(self.registry)
+        if self._elapsed <= 0:
+            return np.zeros((size, size))
+        return self._sums[:size, :size] * (horizon_seconds / self._elapsed)
+
+    def correlation(self) -> np.ndarray:
+        """Matriz de correlação (0 fora da diagonal para mercados sem variação)"""
+        size = len(self.registry)
+        sums = self._sums[:size, :size]
+        std = np.sqrt(np.diag(sums))
+        scale = np.outer(std, std)
+        correlation = np.divide(sums, scale, out=np.zeros((size, size)), where=scale > 0)
+        np.fill_diagonal(correlation, 1.0)
+        return correlation
+
+    def variance(self, exposures: np.ndarray, horizon_seconds: float = 1.0) -> float:
+        """Variância do P&L no horizonte para exposições indexadas pelo registry"""
+        if self._elapsed <= 0:
+            return 0.0
+        active = np.flatnonzero(exposures)
+        if not len(active):
+            return 0.0
+        weights = exposures[active]
+        quadratic = weights @ self._sums[np.ix_(active, active)] @ weights
+        return max(float(quadratic), 0.0) * (horizon_seconds / self._elapsed)
+
+    def align(self, registry: MarketRegistry, values: np.ndarray) -> np.ndarray:
+        """Converte um vetor indexado por outro registry para os ids desta matriz"""
+        result = np.zeros(len(self.registry), dtype=np.float64)
+        for market_id, market in enumerate(registry.names):
+            own_id = self.registry.get(market)
+            if own_id is not None:
+                result[own_id] += values[market_id]
+        return result
+
+    def export_state(self) -> Dict:
+        """Cópia das somas e do decaimento acumulado para snapshot"""
+        return {
+            'halflife_seconds': self.halflife_seconds,
+            'markets': list(self.registry.names),
+            'updates': self.updates,
+            'last_prices': self._last_prices.copy(),
+            'sums': self._sums.copy(),
+            'elapsed': self._elapsed,
+            'gain': self._gain,
+            'last_timestamp_ns': self._last_timestamp_ns,
+        }
+
+    def restore_state(self, state: Dict):
+        """Substitui o estado pelo de export_state (os arrays são usados sem cópia)"""
+        self.halflife_seconds = state['halflife_seconds']
+        self.registry = MarketRegistry()
+        for market in state['markets']:
+            self.registry.intern(market)
+        self.updates = state['updates']
+        self._last_prices, self._sums = state['last_prices'], state['sums']
+        self._elapsed = state['elapsed']
+        self._gain = state['gain']
+        self._last_timestamp_ns = state['last_timestamp_ns']
+
+    def __len__(self) -> int:
+        return len(self.registry)
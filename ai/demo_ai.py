@@ -7,6 +7,7 @@ Demonstração da IA de análise de risco com cenários realistas
 import sys
 import os
 import time
+import logging
 from datetime import datetime, timedelta
 
 # Adicionar o diretório atual ao path
@@ -219,4 +220,5 @@ def main():
         print(f"❌ Erro na demonstração: {e}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     main()
@@ -7,6 +7,7 @@ Demonstra exatamente como o fluxo funciona
 import sys
 import os
 import time
+import logging
 import json
 from datetime import datetime
 
@@ -14,6 +15,7 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+from stress import ScenarioSet
 
 def demo_fluxo_completo():
     """Demonstra o fluxo completo do WebSocket"""
@@ -167,9 +169,29 @@ def demo_fluxo_completo():
         # Pausa para dramatizar
         time.sleep(2)
     
+    # Stress test: todos os cenários avaliados de uma vez
+    print("⚡ STRESS TEST (todos os cenários em uma passada):")
+    print("-" * 50)
+    scenarios = ScenarioSet.from_prices(
+        [cenario["nome"] for cenario in cenarios],
+        [cenario["precos"] for cenario in cenarios]
+    ).concat(ScenarioSet.from_shocks(
+        ["WTI -10%", "Brent +10%"],
+        [{"WTI": -0.10}, {"Brent": 0.10}]
+    ))
+    result = analyzer.run_stress_test(scenarios)
+    for index in range(len(result)):
+        resumo = result.scenario(index)
+        position_id, score = resumo["worst_positions"][0]
+        print(f"   {resumo['name']:<20} score {score:.2f} | "
+              f"HIGH/CRITICAL: {resumo['tiers']['HIGH'] + resumo['tiers']['CRITICAL']} | "
+              f"déficit de margem: ${resumo['margin_shortfall']:,.0f}")
+    print()
+    
     # Resumo final
     print("📈 RESUMO FINAL:")
     print("-" * 30)
+    analyzer.rescore_pending()  # o resumo lê os scores em cache
     summary = analyzer.get_risk_summary()
     print(f"Total de posições: {summary['total_positions']}")
     print(f"Posições de alto risco: {summary['high_risk_positions']}")
@@ -194,4 +216,5 @@ def main():
         traceback.print_exc()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+SAPP HTTP Client
+Cliente HTTP compartilhado para o backend: pool de conexões keep-alive,
+timeouts, retentativas, requisições concorrentes, single-flight e cache curto
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Timeouts padrão (conexão, leitura) em segundos
+DEFAULT_TIMEOUT = (2.0, 5.0)
+
+# Conexões mantidas abertas com o backend (e limite de requisições simultâneas)
+DEFAULT_POOL_SIZE = 16
+
+# Retentativas de GET em falhas de conexão e respostas 502/503/504
+DEFAULT_RETRIES = 3
+
+
+class BackendHTTPError(Exception):
+    """Resposta do backend com status diferente de 200"""
+
+    def __init__(self, path: str, status_code: int):
+        super().__init__(f"{path}: HTTP {status_code}")
+        self.path = path
+        self.status_code = status_code
+
+
+def _create_session(pool_size: int, retries: int):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=0.05,
+                  status_forcelist=(502, 503, 504), allowed_methods=frozenset({'GET'}),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class BackendClient:
+    """
+    Cliente HTTP do backend. Uma única Session mantém as conexões abertas;
+    GETs simultâneos para o mesmo caminho viram uma só requisição em voo
+    (single-flight) e respostas podem ser guardadas por alguns segundos (ttl).
+    """
+
+    def __init__(self, base_url: str, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.retries = retries
+        self._session = None  # criada no primeiro uso (ver session)
+
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._cache: Dict[str, Tuple[float, Any]] = {}  # caminho → (expira em, json)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = dict.fromkeys(('requests', 'cache_hits', 'joined'), 0)
+
+    @property
+    def session(self):
+        """
+        Session do requests, criada no primeiro uso: importar requests custa
+        dezenas de ms na partida, e o modo asyncio nem chega a usá-lo
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = _create_session(self.pool_size, self.retries)
+        return self._session
+
+    def get_json(self, path: str, ttl: float = 0.0) -> Any:
+        """
+        GET com cache de ttl segundos e single-flight. Lança BackendHTTPError
+        para status diferente de 200 (erros não são guardados no cache).
+        """
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] > time.monotonic():
+                self.stats['cache_hits'] += 1
+                return cached[1]
+            future = self._in_flight.get(path)
+            leader = future is None
+            if leader:
+                future = self._in_flight[path] = Future()
+            else:
+                self.stats['joined'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = self._request('GET', path)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[path]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[path]
+            if ttl > 0:
+                self._cache[path] = (time.monotonic() + ttl, value)
+        future.set_result(value)
+        return value
+
+    def post_json(self, path: str, body: Any) -> Any:
+        """POST com corpo JSON (sem retentativa automática)"""
+        return self._request('POST', path, body)
+
+    def get_many(self, paths: Iterable[str], ttl: float = 0.0) -> Dict[str, Any]:
+        """
+        GETs concorrentes pelo pool de conexões. O valor de cada caminho é o
+        JSON da resposta ou a exceção da requisição.
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return {}
+        futures = {path: self._pool().submit(self.get_json, path, ttl) for path in paths}
+        results = {}
+        for path, future in futures.items():
+            error = future.exception()
+            results[path] = error if error is not None else future.result()
+        return results
+
+    def invalidate(self, path: Optional[str] = None):
+        """Descarta uma resposta do cache (ou todas)"""
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(path, None)
+
+    def close(self):
+        """Fecha as conexões e a pool de threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="backend-http")
+            return self._executor
+
+    def _request(self, method: str, path: str, body: Any = None) -> Any:
+        with self._lock:
+            self.stats['requests'] += 1
+        response = self.session.request(method, f"{self.base_url}{path}", json=body, timeout=self.timeout)
+        if response.status_code != 200:
+            raise BackendHTTPError(path, response.status_code)
+        return response.json() if response.content else None
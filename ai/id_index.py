@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+SAPP Id Index
+Índice position_id → linha compartilhado pelo livro de posições, estado de
+risco e livro de gatilhos: array denso para os ids sequenciais do contrato,
+dicionário apenas para ids fora da faixa densa
+"""
+
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+# Faixa densa mínima (ids abaixo dela nunca vão para o dicionário)
+DENSE_MIN = 1 << 16
+
+
+class IdIndex:
+    """
+    Mapeia position_id → linha (-1 quando ausente). A faixa densa cresce até
+    max(4 × capacity, DENSE_MIN), com capacity mantida pelo dono (número de
+    linhas alocadas); ids acima disso ficam no dicionário esparso.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.capacity = capacity
+        self._dense = np.full(0, -1, dtype=np.int32)
+        self._sparse: Dict[int, int] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, position_id: int) -> bool:
+        return self.get(position_id) >= 0
+
+    def get(self, position_id: int) -> int:
+        """Linha do id (-1 se ausente)"""
+        if 0 <= position_id < len(self._dense):
+            row = int(self._dense[position_id])
+            if row >= 0:
+                return row
+        return self._sparse.get(position_id, -1)
+
+    def __getitem__(self, position_id: int) -> int:
+        row = self.get(position_id)
+        if row < 0:
+            raise KeyError(position_id)
+        return row
+
+    def _dense_limit(self) -> int:
+        return max(4 * self.capacity, DENSE_MIN)
+
+    def _reserve(self, size: int):
+        if size > len(self._dense):
+            dense = np.full(size, -1, dtype=np.int32)
+            dense[:len(self._dense)] = self._dense
+            self._dense = dense
+
+    def set(self, position_id: int, row: int):
+        """Associa o id à linha (inclusão ou troca de linha)"""
+        if position_id in self._sparse:
+            self._sparse[position_id] = row
+            return
+        if 0 <= position_id < len(self._dense):
+            if self._dense[position_id] < 0:
+                self._count += 1
+            self._dense[position_id] = row
+            return
+        self._count += 1
+        limit = self._dense_limit()
+        if 0 <= position_id < limit:
+            current = len(self._dense)
+            self._reserve(min(max(position_id + 1, current + max(current // 4, 1024)), limit))
+            self._dense[position_id] = row
+        else:
+            self._sparse[position_id] = row
+
+    def pop(self, position_id: int) -> int:
+        """Remove o id e devolve a linha que ocupava (-1 se ausente)"""
+        row = self._sparse.pop(position_id, -1)
+        if row < 0 and 0 <= position_id < len(self._dense):
+            row = int(self._dense[position_id])
+            self._dense[position_id] = -1
+        if row >= 0:
+            self._count -= 1
+        return row
+
+    def lookup(self, position_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids pedidos (int64) e suas linhas (-1 para ausentes)"""
+        if not isinstance(position_ids, np.ndarray):
+            position_ids = list(position_ids)
+        ids = np.asarray(position_ids, dtype=np.int64)
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        dense = (ids >= 0) & (ids < len(self._dense))
+        rows[dense] = self._dense[ids[dense]]
+        if self._sparse:
+            for index in np.flatnonzero(rows < 0).tolist():
+                rows[index] = self._sparse.get(int(ids[index]), -1)
+        return ids, rows
+
+    def insert_many(self, position_ids: np.ndarray, rows: np.ndarray):
+        """Inclui em lote ids ainda ausentes (sem repetição)"""
+        if not len(position_ids):
+            return
+        dense = (position_ids >= 0) & (position_ids < self._dense_limit())
+        if dense.any():
+            self._reserve(int(position_ids[dense].max()) + 1)
+            self._dense[position_ids[dense]] = rows[dense]
+        for position_id, row in zip(position_ids[~dense].tolist(), rows[~dense].tolist()):
+            self._sparse[position_id] = row
+        self._count += len(position_ids)
+
+    def items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids (em ordem) e linhas de todas as entradas"""
+        ids = np.flatnonzero(self._dense >= 0)
+        rows = self._dense[ids].astype(np.int64)
+        if self._sparse:
+            sparse_ids = np.array(sorted(self._sparse), dtype=np.int64)
+            sparse_rows = np.array([self._sparse[i] for i in sparse_ids.tolist()], dtype=np.int64)
+            ids = np.concatenate((ids, sparse_ids))
+            rows = np.concatenate((rows, sparse_rows))
+        return ids.astype(np.int64), rows
+
+    def clear(self):
+        self._dense[:] = -1
+        self._sparse.clear()
+        self._count = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Memória do array denso (o dicionário esparso não entra na conta)"""
+        return self._dense.nbytes
+
+    def export_state(self) -> Dict:
+        """Cópia do índice para snapshot"""
+        sparse = sorted(self._sparse.items())
+        return {
+            'dense': self._dense.copy(),
+            'sparse_ids': np.array([position_id for position_id, _ in sparse], dtype=np.int64),
+            'sparse_rows': np.array([row for _, row in sparse], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict, capacity: int) -> 'IdIndex':
+        """Índice a partir de export_state (o array denso é usado sem cópia)"""
+        index = cls(capacity)
+        index._dense = state['dense']
+        index._sparse = dict(zip(state['sparse_ids'].tolist(), state['sparse_rows'].tolist()))
+        index._count = int((index._dense >= 0).sum()) + len(index._sparse)
+        return index
+
+    @classmethod
+    def from_items(cls, position_ids: np.ndarray, rows: np.ndarray, capacity: int) -> 'IdIndex':
+        """Índice com as entradas dadas"""
+        index = cls(capacity)
+        index.insert_many(np.asarray(position_ids, dtype=np.int64), np.asarray(rows, dtype=np.int64))
+        return index
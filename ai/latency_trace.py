@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+SAPP Latency Trace
+Atribuição da latência tick → alerta por etapa do pipeline do analisador,
+com agregação em histogramas e exportação no formato Chrome Trace Event
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+import logging
+
+from metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+# Etapas de um tick, na ordem: backend → recebimento, decodificação, índice/trigger book,
+# espera pelo ciclo de scoring e scoring
+TICK_STAGES = ('network', 'decode', 'index', 'wait', 'scoring')
+
+# Etapas de um alerta gerado por um tick
+ALERT_STAGES = ('enqueue', 'delivery')
+
+# Alerta CRITICAL entregue acima deste tempo desde o recebimento do tick é registrado como atrasado (s)
+LATE_ALERT_SECONDS = 1.0
+
+# Traces completos mantidos para exportação
+DEFAULT_TRACE_CAPACITY = 10000
+
+
+class TickTrace:
+    """Carimbos monotônicos (perf_counter_ns) de um tick ao longo do pipeline"""
+
+    __slots__ = ('tick_id', 'sent_ns', 'received_wall_ns', 'received_ns', 'decoded_ns',
+                 'indexed_ns', 'scoring_ns', 'scored_ns')
+
+    def __init__(self, tick_id: int, received_ns: int, received_wall_ns: int):
+        self.tick_id = tick_id
+        self.received_ns = received_ns
+        self.received_wall_ns = received_wall_ns
+        self.sent_ns = received_wall_ns  # timestamp do backend (relógio de parede), quando informado
+        self.decoded_ns = 0
+        self.indexed_ns = 0
+        self.scoring_ns = 0
+        self.scored_ns = 0
+
+    def stages(self) -> Dict[str, int]:
+        """Duração de cada etapa já concluída (ns); rede pelo relógio de parede"""
+        stages = {'network': self.received_wall_ns - self.sent_ns}
+        previous = self.received_ns
+        for stage, stamp in zip(TICK_STAGES[1:], (self.decoded_ns, self.indexed_ns, self.scoring_ns, self.scored_ns)):
+            if not stamp:
+                break
+            stages[stage] = stamp - previous
+            previous = stamp
+        return stages
+
+
+class AlertTrace:
+    """Alerta enfileirado, ligado ao tick mais antigo do ciclo de scoring que o gerou"""
+
+    __slots__ = ('position_id', 'alert_type', 'tick', 'enqueued_ns', 'delivered_ns')
+
+    def __init__(self, position_id: int, alert_type: str, tick: TickTrace, enqueued_ns: int):
+        self.position_id = position_id
+        self.alert_type = alert_type
+        self.tick = tick
+        self.enqueued_ns = enqueued_ns
+        self.delivered_ns = 0
+
+    def stages(self) -> Dict[str, int]:
+        stages = self.tick.stages()
+        stages['enqueue'] = self.enqueued_ns - self.tick.scored_ns
+        stages['delivery'] = self.delivered_ns - self.enqueued_ns
+        return stages
+
+    @property
+    def total_ns(self) -> int:
+        """Do recebimento do tick à entrega do alerta"""
+        return self.delivered_ns - self.tick.received_ns
+
+
+class LatencyTracer:
+    """
+    Acompanha cada tick do recebimento ao scoring e cada alerta até a entrega.
+    Um ciclo de scoring cobre todos os ticks que marcaram posições desde o
+    ciclo anterior; seus alertas são atribuídos ao tick mais antigo (pior caso).
+    Alertas fundidos na fila seguem a regra do pipeline: vale o mais recente.
+    """
+
+    def __init__(self, metrics: Optional[MetricsRegistry] = None, capacity: int = DEFAULT_TRACE_CAPACITY,
+                 late_alert_seconds: float = LATE_ALERT_SECONDS):
+        self.enabled = True
+        self.late_alert_seconds = late_alert_seconds
+        self._next_id = 0
+        self._pending: List[TickTrace] = []            # ticks aguardando o próximo ciclo de scoring
+        self._in_flight: Dict[int, AlertTrace] = {}    # position_id → alerta na fila de envio
+        self._lock = threading.Lock()
+        self.ticks = deque(maxlen=capacity)            # traces de ticks concluídos
+        self.alerts = deque(maxlen=capacity)           # traces de alertas entregues
+        self.late_alerts = deque(maxlen=100)
+        self.epoch_ns = time.perf_counter_ns()
+
+        metrics = metrics if metrics is not None else MetricsRegistry()
+        self._histograms = {
+            stage: metrics.latency_histogram(f"trace_{stage}_seconds", f"Latência da etapa {stage} (tick → alerta)")
+            for stage in TICK_STAGES + ALERT_STAGES
+        }
+        self._total = metrics.latency_histogram("trace_tick_to_alert_seconds", "Do recebimento do tick à entrega do alerta")
+        self._late = metrics.counter("late_critical_alerts_total", "Alertas CRITICAL entregues com atraso")
+
+    # ----- carimbos (chamados pelo analisador) -----
+
+    def received(self) -> Optional[TickTrace]:
+        """Abre o trace de um tick recém-chegado"""
+        if not self.enabled:
+            return None
+        self._next_id += 1
+        return TickTrace(self._next_id, time.perf_counter_ns(), time.time_ns())
+
+    def indexed(self, trace: TickTrace, sent_ns: Optional[int], awaits_scoring: bool):
+        """
+        Tick aplicado ao índice/trigger book. Com posições marcadas, fica à espera
+        do próximo ciclo de scoring; caso contrário o trace termina aqui.
+        Chamado com o lock das posições marcadas (ordem consistente com o ciclo).
+        """
+        trace.indexed_ns = time.perf_counter_ns()
+        if sent_ns:
+            trace.sent_ns = sent_ns
+        if awaits_scoring:
+            self._pending.append(trace)
+        else:
+            self._finish_tick(trace)
+
+    def take_pending(self) -> List[TickTrace]:
+        """Ticks cobertos pelo ciclo de scoring que está começando (chamado com o mesmo lock)"""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def scored(self, traces: List[TickTrace], scoring_ns: int, scored_ns: int):
+        """Carimba o início e o fim do ciclo de scoring nos ticks que ele cobriu"""
+        for trace in traces:
+            trace.scoring_ns = scoring_ns
+            trace.scored_ns = scored_ns
+            self._finish_tick(trace)
+
+    def enqueued(self, trace: TickTrace, position_id: int, alert_type: str):
+        """Alerta gerado pelo ciclo do tick entrou na fila de envio"""
+        with self._lock:
+            self._in_flight[position_id] = AlertTrace(position_id, alert_type, trace, time.perf_counter_ns())
+
+    def delivered(self, batch: List[Dict]):
+        """Lote aceito pelo backend (callback do AlertPipeline)"""
+        now = time.perf_counter_ns()
+        completed = []
+        with self._lock:
+            for payload in batch:
+                alert = self._in_flight.pop(payload["position_id"], None)
+                if alert is not None:
+                    alert.delivered_ns = now
+                    completed.append(alert)
+
+        for alert in completed:
+            self.alerts.append(alert)
+            stages = alert.stages()
+            for stage in ALERT_STAGES:
+                self._histograms[stage].observe(stages[stage])
+            total = alert.total_ns
+            self._total.observe(total)
+            if alert.alert_type == 'CRITICAL' and total > self.late_alert_seconds * 1e9:
+                self._late.inc()
+                self.late_alerts.append(alert)
+                stage, duration = max(stages.items(), key=lambda item: item[1])
+                logger.warning(
+                    f"🐢 Alerta CRÍTICO da posição {alert.position_id} entregue em {total / 1e6:.1f} ms; "
+                    f"etapa mais lenta: {stage} ({duration / 1e6:.1f} ms) - "
+                    + ", ".join(f"{name}={value / 1e6:.1f}ms" for name, value in stages.items())
+                )
+
+    def _finish_tick(self, trace: TickTrace):
+        # Ticks terminam na thread do WebSocket (sem scoring) ou na do scoring
+        stages = trace.stages()
+        with self._lock:
+            self.ticks.append(trace)
+            for stage, duration in stages.items():
+                self._histograms[stage].observe(duration)
+
+    # ----- agregação e exportação -----
+
+    def breakdown(self, percentiles=(50, 99)) -> Dict[str, Dict[str, float]]:
+        """Percentis (ms) de cada etapa e do total tick → alerta"""
+        result = {}
+        for stage, histogram in list(self._histograms.items()) + [('total', self._total)]:
+            if histogram.count:
+                result[stage] = {f"p{q:g}": histogram.percentile(q) * 1e3 for q in percentiles}
+                result[stage]["count"] = histogram.count
+        return result
+
+    def export_trace(self, path: str) -> int:
+        """
+        Grava os traces concluídos no formato Chrome Trace Event (chrome://tracing,
+        Perfetto). Retorna o número de eventos gravados.
+        """
+        events = []
+
+        def add(name, start_ns, end_ns, tid, args):
+            events.append({
+                "name": name, "ph": "X", "pid": 1, "tid": tid,
+                "ts": (start_ns - self.epoch_ns) / 1e3, "dur": max(0, end_ns - start_ns) / 1e3,
+                "args": args
+            })
+
+        for trace in list(self.ticks):
+            args = {"tick_id": trace.tick_id, "network_ms": (trace.received_wall_ns - trace.sent_ns) / 1e6}
+            stamps = (trace.received_ns, trace.decoded_ns, trace.indexed_ns, trace.scoring_ns, trace.scored_ns)
+            for stage, start, end in zip(TICK_STAGES[1:], stamps, stamps[1:]):
+                if not end:
+                    break
+                add(stage, start, end, "tick", args)
+
+        for alert in list(self.alerts):
+            args = {"tick_id": alert.tick.tick_id, "position_id": alert.position_id, "alert_type": alert.alert_type}
+            add("tick_to_alert", alert.tick.received_ns, alert.delivered_ns, "alert", args)
+            add("enqueue", alert.tick.scored_ns, alert.enqueued_ns, "alert", args)
+            add("delivery", alert.enqueued_ns, alert.delivered_ns, "alert", args)
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
@@ -8,21 +8,60 @@ import sys
 import os
 import time
 import signal
+import asyncio
+import argparse
+import logging
 from datetime import datetime
+from typing import Optional
 
 # Adicionar o diretório atual ao path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from risk_analyzer import SAPPRiskAnalyzer, PositionData
+from real_risk_analyzer import SAPPRealRiskAnalyzer
 from backend_integration import SAPPBackendIntegration
+from profiling import RuntimeProfiler, PROFILE_MODES, DEFAULT_PROFILE_SECONDS, DEFAULT_PROFILE_DIR
+from snapshot import DEFAULT_SNAPSHOT_INTERVAL
+from startup import StartupTimer, DEFAULT_READY_TIMEOUT
+
+# Fim dos imports: fecha a primeira fase da partida (interpretador + módulos)
+_IMPORTED = time.perf_counter()
+
+# Intervalo entre resumos de risco (segundos)
+STATUS_INTERVAL = 60
+
+# Fase da partida de cada marco de prontidão (ver startup.Readiness)
+READY_PHASES = {'open': 'conexão', 'prices': 'preços', 'scored': 'primeiro score'}
 
 class SAPP_AI_Main:
     """Classe principal da IA SAPP"""
     
-    def __init__(self):
-        self.analyzer = SAPPRiskAnalyzer()
+    def __init__(self, use_async: bool = False, metrics_port: Optional[int] = None,
+                 trace_file: Optional[str] = None, shards: Optional[int] = None, profile_mode: Optional[str] = None,
+                 profile_seconds: float = DEFAULT_PROFILE_SECONDS, profile_dir: str = DEFAULT_PROFILE_DIR,
+                 record_dir: Optional[str] = None, snapshot_path: Optional[str] = None,
+                 snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL, ready_timeout: float = DEFAULT_READY_TIMEOUT):
+        self.startup = StartupTimer()
+        self.startup.mark('imports', _IMPORTED)
+        self.use_async = use_async
+        self.metrics_port = metrics_port
+        self.trace_file = trace_file
+        self.shards = shards
+        self.record_dir = record_dir
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.profile_mode = profile_mode
+        self.profile_seconds = profile_seconds
+        self.ready_timeout = ready_timeout
+        # O modo asyncio usa o analisador com dados reais (feed WebSocket próprio)
+        self.analyzer = SAPPRealRiskAnalyzer() if use_async else SAPPRiskAnalyzer()
+        # Só o analisador de dados reais instrumenta seus pontos de entrada; a amostragem vale para ambos
+        self.profiler = getattr(self.analyzer, 'profiler', None) or RuntimeProfiler()
+        self.profiler.output_dir = profile_dir
         self.backend = SAPPBackendIntegration()
         self.running = False
+        self._stop_async: Optional[asyncio.Event] = None
+        self.startup.mark('inicialização')
         
     def start(self):
         """Inicia o sistema de IA"""
@@ -31,18 +70,29 @@ class SAPP_AI_Main:
         print(f"⏰ Iniciado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print()
         
+        self._start_profiling()
         try:
             # Conectar ao backend
             print("🔗 Conectando ao backend...")
             self.backend.connect_websocket()
-            time.sleep(2)  # Aguardar conexão
+            readiness = self.backend.readiness
+            if readiness.wait('prices', self.ready_timeout):
+                self._mark_ready(readiness, ('open', 'prices'))
+            else:
+                print(f"⚠️ Feed sem snapshot de preços ({readiness.error or f'{self.ready_timeout:.0f}s'}): "
+                      f"iniciando sem ele")
+                self.startup.mark('feed')
             
             # Iniciar analisador
             print("🚀 Iniciando analisador de risco...")
             self.analyzer.start_monitoring()
+            self.startup.mark('analisador')
             
             self.running = True
             print("✅ Sistema de IA iniciado com sucesso!")
+            if self.analyzer.readiness.wait('scored', self.ready_timeout):
+                self._mark_ready(self.analyzer.readiness, ('scored',))
+            print(f"⏱️ Partida: {self.startup.report()}")
             print()
             
             # Loop principal
@@ -55,12 +105,133 @@ class SAPP_AI_Main:
             print(f"❌ Erro no sistema: {e}")
             self.stop()
             
+    def _mark_ready(self, readiness, stages):
+        """Fecha as fases da partida nos instantes dos marcos de prontidão alcançados"""
+        for stage in stages:
+            if readiness.is_set(stage):
+                self.startup.mark(READY_PHASES[stage], readiness.marks[stage])
+                
+    async def _report_startup(self):
+        """Tempo de cada fase até o primeiro score (modo asyncio: os marcos vêm do feed do analisador)"""
+        readiness = self.analyzer.readiness
+        if not await readiness.wait_async('prices', self.ready_timeout):
+            print(f"⚠️ Feed sem preços de todos os mercados após {self.ready_timeout:.0f}s")
+        await readiness.wait_async('scored', self.ready_timeout)
+        self._mark_ready(readiness, READY_PHASES)
+        print(f"⏱️ Partida: {self.startup.report()}")
+        
     def stop(self):
         """Para o sistema de IA"""
         self.running = False
         self.analyzer.stop_monitoring()
+        self._stop_profiling()
         print("✅ Sistema de IA parado")
         
+    def _start_profiling(self):
+        """Janela de profiling pedida na linha de comando (as demais vêm por sinal)"""
+        if self.profile_mode and self.profiler.start(self.profile_seconds, self.profile_mode):
+            print(f"🔬 Profiling ({self.profile_mode}) por {self.profile_seconds:.0f}s → {self.profiler.output_dir}/")
+            
+    def _stop_profiling(self):
+        """Encerra uma janela em andamento gravando o que já foi coletado"""
+        if self.profiler.active:
+            self.profiler.stop()
+            result = self.profiler.wait(5)
+            if result:
+                print(f"🔬 Profiling gravado em {result['pstats']} e {result['collapsed']}")
+        
+    async def start_async(self):
+        """Inicia o sistema no modo asyncio (feed, scoring, alertas e resumo no mesmo event loop)"""
+        print("🧠 SAPP AI - Sistema de Análise de Risco (asyncio)")
+        print("=" * 50)
+        print(f"⏰ Iniciado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print()
+        
+        loop = asyncio.get_running_loop()
+        self._stop_async = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop_async.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # sem suporte a sinais no loop (ex.: Windows ou thread secundária)
+        try:
+            self.profiler.install_signal_handlers(self.profile_seconds, loop)
+        except (NotImplementedError, RuntimeError):
+            pass
+        self._start_profiling()
+                
+        if self.metrics_port is not None:
+            self.analyzer.serve_metrics(self.metrics_port)
+            
+        print("🚀 Iniciando analisador de risco...")
+        if self.snapshot_path:
+            self._restore_snapshot()
+            self.startup.mark('snapshot')
+        if self.shards:
+            self.analyzer.start_sharding(self.shards)
+            print(f"🧩 Scoring distribuído em {self.shards} processos")
+            self.startup.mark('shards')
+        if self.record_dir:
+            self.analyzer.start_recording(self.record_dir)
+            print(f"📼 Gravando ticks em {self.record_dir}/")
+        monitor = asyncio.create_task(self.analyzer.run_async())
+        startup = asyncio.create_task(self._report_startup())
+        self.startup.mark('analisador')
+        self.running = True
+        print("✅ Sistema de IA iniciado com sucesso!")
+        print()
+        
+        try:
+            await self._main_loop_async(monitor)
+        finally:
+            print("\n🛑 Parando sistema de IA...")
+            startup.cancel()
+            self.running = False
+            self.analyzer.stop_monitoring()
+            await monitor
+            self._stop_profiling()
+            if self.analyzer.metrics_server is not None:
+                self.analyzer.metrics_server.close()
+            if self.trace_file:
+                events = self.analyzer.export_latency_trace(self.trace_file)
+                print(f"🧭 {events} eventos de latência gravados em {self.trace_file}")
+            print("✅ Sistema de IA parado")
+            
+    def _restore_snapshot(self):
+        """Retoma o estado do último snapshot (e dos ticks gravados depois dele) e agenda os próximos"""
+        if os.path.exists(self.snapshot_path):
+            try:
+                result = self.analyzer.restore_snapshot(self.snapshot_path, self.record_dir)
+                print(f"♻️ Estado restaurado de {self.snapshot_path}: {result.positions} posições, "
+                      f"{result.ticks} ticks reaplicados; scores válidos em {result.seconds * 1e3:.0f} ms")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Snapshot ignorado ({e}): partida a frio")
+        if self.shards:
+            print("⚠️ Snapshots periódicos indisponíveis com --shards (o estado de risco fica nos workers)")
+            return
+        self.analyzer.start_snapshots(self.snapshot_path, self.snapshot_interval)
+        print(f"💾 Snapshot do estado a cada {self.snapshot_interval:.0f}s em {self.snapshot_path}")
+            
+    def stop_async(self):
+        """Pede a parada do modo asyncio (seguro a partir de outra thread)"""
+        loop = self.analyzer._loop
+        if loop is not None and self._stop_async is not None:
+            loop.call_soon_threadsafe(self._stop_async.set)
+            
+    async def _main_loop_async(self, monitor: asyncio.Task):
+        """Resumo de risco periódico até o pedido de parada (ou fim do monitoramento)"""
+        stop = asyncio.create_task(self._stop_async.wait())
+        try:
+            while True:
+                summary = self.analyzer.get_risk_summary()
+                print(f"📊 Status: {summary}")
+                done, _ = await asyncio.wait({stop, monitor}, timeout=STATUS_INTERVAL,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if done:
+                    return
+        finally:
+            stop.cancel()
+        
     def _main_loop(self):
         """Loop principal do sistema"""
         while self.running:
@@ -85,11 +256,53 @@ def signal_handler(sig, frame):
 
 def main():
     """Função principal"""
+    parser = argparse.ArgumentParser(description="SAPP AI - análise de risco")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="executar feed, scoring e alertas em um único event loop asyncio")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="expor métricas do Prometheus em http://127.0.0.1:PORTA/metrics (modo --async)")
+    parser.add_argument("--trace-file", default=None,
+                        help="gravar os traces de latência tick → alerta (Chrome Trace Event) ao parar (modo --async)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="reprocessar as posições em N processos com preços em memória compartilhada (modo --async)")
+    parser.add_argument("--record-ticks", dest="record_dir", default=None,
+                        help="gravar os ticks recebidos no diário binário em DIR (modo --async)")
+    parser.add_argument("--snapshot", dest="snapshot_path", default=None,
+                        help="retomar do snapshot do estado em ARQUIVO (com os ticks de --record-ticks gravados "
+                             "depois dele) e gravá-lo periodicamente e ao parar (modo --async)")
+    parser.add_argument("--snapshot-interval", type=float, default=DEFAULT_SNAPSHOT_INTERVAL,
+                        help="intervalo entre snapshots (segundos)")
+    parser.add_argument("--ready-timeout", type=float, default=DEFAULT_READY_TIMEOUT,
+                        help="espera máxima pelo feed (WebSocket aberto e preços de todos os mercados) "
+                             "antes de iniciar sem ele (segundos)")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None,
+                        help="abrir uma janela de profiling na partida (a qualquer momento: SIGUSR1 = "
+                             "amostragem, SIGUSR2 = determinístico)")
+    parser.add_argument("--profile-seconds", type=float, default=DEFAULT_PROFILE_SECONDS,
+                        help="duração de cada janela de profiling (segundos)")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR,
+                        help="diretório dos resultados (.pstats e pilhas .collapsed para flamegraph)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    profiling = dict(profile_mode=args.profile, profile_seconds=args.profile_seconds, profile_dir=args.profile_dir,
+                     ready_timeout=args.ready_timeout)
+    
+    if args.use_async:
+        ai_system = SAPP_AI_Main(use_async=True, metrics_port=args.metrics_port, trace_file=args.trace_file,
+                                 shards=args.shards, record_dir=args.record_dir, snapshot_path=args.snapshot_path,
+                                 snapshot_interval=args.snapshot_interval, **profiling)
+        asyncio.run(ai_system.start_async())
+        return
+    if args.metrics_port is not None or args.trace_file or args.shards or args.record_dir or args.snapshot_path:
+        print("⚠️ Métricas, traces, shards, gravação de ticks e snapshots disponíveis apenas com o analisador "
+              "de dados reais (--async)")
+        
     # Configurar handler para Ctrl+C
     signal.signal(signal.SIGINT, signal_handler)
     
     # Criar e iniciar sistema
-    ai_system = SAPP_AI_Main()
+    ai_system = SAPP_AI_Main(**profiling)
+    ai_system.profiler.install_signal_handlers(args.profile_seconds)
     ai_system.start()
 
 if __name__ == "__main__":
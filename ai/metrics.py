@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+SAPP Metrics
+Registro de métricas (contadores, gauges e histogramas log-lineares no
+estilo HDR) exposto no formato texto do Prometheus por HTTP local.
+
+O registro não usa lock: cada métrica deve ter um único escritor (no
+analisador, a thread do WebSocket ou a do scoring; no modo asyncio, o
+event loop). A coleta lê cópias e pode ver uma observação pela metade.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Bits de precisão dos histogramas: erro relativo máximo de 1/2^(SUB_BITS-1) (~1,6%)
+SUB_BITS = 7
+_HALF = 1 << (SUB_BITS - 1)
+
+# Maior valor distinto registrado (valores acima caem no último bucket); ~18 min em ns
+MAX_TRACKABLE = 1 << 40
+
+# Limites exportados (na unidade exposta) dos histogramas de latência e de contagem
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+                 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+
+# Porta padrão do endpoint /metrics
+DEFAULT_METRICS_PORT = 9108
+
+# Content-Type da exposição em texto do Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _bucket_index(value: int) -> int:
+    """Índice do bucket log-linear de um valor inteiro >= 0"""
+    bits = value.bit_length()
+    if bits <= SUB_BITS:
+        return value
+    shift = bits - SUB_BITS
+    return (shift << (SUB_BITS - 1)) + (value >> shift)
+
+
+def _bucket_bounds(index: int):
+    """Menor e maior valor representados por um bucket"""
+    if index < 2 * _HALF:
+        return index, index
+    shift = index // _HALF - 1
+    mantissa = index - shift * _HALF
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monotônico (ou lido de uma função no momento da coleta)"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.get())}"]
+
+
+class Gauge:
+    """Valor instantâneo (definido explicitamente ou lido de uma função na coleta)"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.get())}"]
+
+
+class Histogram:
+    """
+    Histograma log-linear de valores inteiros (ns, contagens). Cada observação
+    custa um bit_length e um incremento; percentis têm erro relativo <= 1,6%.
+    scale converte a unidade registrada na exposta (1e-9: ns → segundos).
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, scale: float = 1.0, buckets: Sequence[float] = COUNT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.scale = scale
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (_bucket_index(MAX_TRACKABLE) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value: int):
+        """Registra um valor inteiro na unidade do histograma"""
+        if value < 0:
+            value = 0
+        index = _bucket_index(value) if value < MAX_TRACKABLE else len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @contextmanager
+    def time(self):
+        """Mede a duração do bloco em ns (histogramas com scale=1e-9)"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter_ns() - start)
+
+    def percentile(self, q: float) -> float:
+        """Percentil q (0-100) na unidade exposta (limite superior do bucket)"""
+        counts = list(self.counts)
+        count = self.count
+        largest = self.max
+        if not count:
+            return 0.0
+        rank = max(1, int(-(-q * count // 100)))
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(_bucket_bounds(index)[1], largest) * self.scale
+        return largest * self.scale
+
+    def samples(self) -> List[str]:
+        count, total = self.count, self.total
+        nonzero = [(index, bucket_count) for index, bucket_count in enumerate(self.counts) if bucket_count]
+
+        lines = []
+        cumulative = 0
+        position = 0
+        for bound in self.buckets:
+            limit = bound / self.scale
+            while position < len(nonzero) and _bucket_bounds(nonzero[position][0])[0] <= limit:
+                cumulative += nonzero[position][1]
+                position += 1
+            lines.append(f'{self.name}_bucket{{le="{_format_value(float(bound))}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {_format_value(total * self.scale)}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Métricas nomeadas; o mesmo nome devolve a mesma métrica"""
+
+    def __init__(self, prefix: str = "sapp_"):
+        self.prefix = prefix
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        full_name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Métrica {full_name} já registrada como {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> Counter:
+        return self._get_or_create(Counter, name, help, function)
+
+    def gauge(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, help, function)
+
+    def histogram(self, name: str, help: str, scale: float = 1.0,
+                  buckets: Sequence[float] = COUNT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, scale, buckets)
+
+    def latency_histogram(self, name: str, help: str) -> Histogram:
+        """Histograma de durações registradas em ns e expostas em segundos"""
+        return self.histogram(name, help, scale=1e-9, buckets=LATENCY_BUCKETS)
+
+    def __getitem__(self, name: str):
+        return self._metrics[self.prefix + name]
+
+    def render(self) -> str:
+        """Todas as métricas no formato texto do Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1") -> 'MetricsServer':
+        """Expõe GET /metrics em uma thread de fundo"""
+        return MetricsServer(self, port, host)
+
+
+class MetricsServer:
+    """Servidor HTTP local do endpoint /metrics"""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # só quem expõe o endpoint carrega
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
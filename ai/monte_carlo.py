@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+SAPP Monte Carlo VaR
+Simulação vetorizada de preços correlacionados para VaR, expected shortfall e liquidações
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+from batch_risk import BookColumns, MARGIN_REQUIREMENT
+
+# Caminhos por bloco (unidade de semente: o resultado não depende do número de processos)
+BLOCK_PATHS = 2048
+
+# Limite de elementos (caminhos × posições) avaliados de uma vez
+MAX_BLOCK_ELEMENTS = 4_000_000
+
+
+@dataclass
+class MonteCarloModel:
+    """
+    Carteira reduzida aos mercados que o livro usa. As condições de liquidação
+    são lineares nos preços finais, então cada bloco é avaliado com dois
+    produtos de matriz (caminhos × mercados) @ (mercados × posições).
+    """
+    prices: np.ndarray       # preço atual por mercado
+    factor: np.ndarray       # fator da covariância dos log-retornos no horizonte
+    drift: np.ndarray        # -σ²/2 (preço martingale)
+    net_size: np.ndarray     # tamanho líquido por mercado (P&L = Δpreço @ net_size)
+    liquidation_a: np.ndarray  # coeficientes da 1ª condição de liquidação (mercados × posições)
+    liquidation_b: np.ndarray  # coeficientes da 2ª condição
+    offset: np.ndarray       # termo constante das condições por posição
+
+    @classmethod
+    def build(cls, columns: BookColumns, prices: np.ndarray, covariance: np.ndarray) -> 'MonteCarloModel':
+        """
+        Monta o modelo a partir das colunas (preços válidos), do vetor de preços
+        e da covariância dos retornos no horizonte, ambos indexados pelo registry.
+
+        Mesma regra de _calculate_liquidation_risk_real, aplicada ao patrimônio
+        no fim do horizonte: liquidada se margem + P&L < 20% de max(|s1|·p1, |s2|·p2).
+        Como max(x, y) > e ⇔ x > e ou y > e, a regra vira min(A, B) < 0 com
+        A e B lineares nos preços finais.
+        """
+        markets, inverse = np.unique(np.concatenate([columns.leg1_ids, columns.leg2_ids]), return_inverse=True)
+        leg1 = inverse[:len(columns)]
+        leg2 = inverse[len(columns):]
+        local_prices = prices[markets]
+        local_covariance = covariance[np.ix_(markets, markets)]
+
+        # Fator via autodecomposição (tolera matrizes semidefinidas)
+        eigenvalues, eigenvectors = np.linalg.eigh(local_covariance)
+        factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+        size1 = columns.leg1_size.astype(np.float64)
+        size2 = columns.leg2_size.astype(np.float64)
+        net_size = np.bincount(leg1, weights=size1, minlength=len(markets))
+        net_size += np.bincount(leg2, weights=size2, minlength=len(markets))
+
+        count = len(columns)
+        rows = np.arange(count)
+        liquidation_a = np.zeros((len(markets), count))
+        liquidation_b = np.zeros((len(markets), count))
+        np.add.at(liquidation_a, (leg1, rows), size1 - MARGIN_REQUIREMENT * np.abs(size1))
+        np.add.at(liquidation_a, (leg2, rows), size2)
+        np.add.at(liquidation_b, (leg1, rows), size1)
+        np.add.at(liquidation_b, (leg2, rows), size2 - MARGIN_REQUIREMENT * np.abs(size2))
+        offset = columns.margin - size1 * local_prices[leg1] - size2 * local_prices[leg2]
+
+        return cls(
+            prices=local_prices,
+            factor=factor,
+            drift=-0.5 * np.diag(local_covariance),
+            net_size=net_size,
+            liquidation_a=liquidation_a,
+            liquidation_b=liquidation_b,
+            offset=offset
+        )
+
+
+@dataclass
+class VaRResult:
+    """Resultado da simulação de risco da carteira"""
+    horizon_seconds: float
+    confidence: float
+    paths: int
+    var: float                    # perda no quantil de confiança
+    expected_shortfall: float     # perda média além do VaR
+    expected_liquidations: float  # número esperado de posições liquidadas
+    liquidation_probability: float  # probabilidade de ao menos uma liquidação
+
+
+def simulate_block(model: MonteCarloModel, seed: np.random.SeedSequence, paths: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Simula um bloco de caminhos: perdas e liquidações por caminho"""
+    rng = np.random.default_rng(seed)
+    shocks = rng.standard_normal((paths, len(model.prices)))
+    terminal = model.prices * np.exp(model.drift + shocks @ model.factor.T)
+    losses = -((terminal - model.prices) @ model.net_size)
+
+    liquidations = np.zeros(paths, dtype=np.int64)
+    positions = len(model.offset)
+    chunk = max(1, MAX_BLOCK_ELEMENTS // paths)
+    for start in range(0, positions, chunk):
+        stop = min(start + chunk, positions)
+        condition = terminal @ model.liquidation_a[:, start:stop]
+        np.minimum(condition, terminal @ model.liquidation_b[:, start:stop], out=condition)
+        condition += model.offset[start:stop]
+        liquidations += np.count_nonzero(condition < 0, axis=1)
+    return losses, liquidations
+
+
+# Modelo do processo trabalhador (enviado uma vez pelo initializer)
+_worker_model: Optional[MonteCarloModel] = None
+
+
+def _init_worker(model: MonteCarloModel):
+    global _worker_model
+    _worker_model = model
+
+
+def _simulate_worker_block(task: Tuple[np.random.SeedSequence, int]) -> Tuple[np.ndarray, np.ndarray]:
+    seed, paths = task
+    return simulate_block(_worker_model, seed, paths)
+
+
+def run_monte_carlo(model: MonteCarloModel, paths: int, confidence: float, horizon_seconds: float,
+                    seed: int = 0, workers: Optional[int] = None) -> VaRResult:
+    """Executa a simulação em blocos, distribuídos em processos quando workers > 1"""
+    if not 0 < confidence < 1:
+        raise ValueError(f"Confiança deve estar entre 0 e 1: {confidence}")
+    if paths <= 0:
+        raise ValueError(f"Número de caminhos deve ser positivo: {paths}")
+    block_count = -(-paths // BLOCK_PATHS)
+    seeds = np.random.SeedSequence(seed).spawn(block_count)
+    tasks = [(seeds[block], min(BLOCK_PATHS, paths - block * BLOCK_PATHS)) for block in range(block_count)]
+
+    workers = min(workers or os.cpu_count() or 1, block_count)
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor  # multiprocessing só quando há workers
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model,)) as pool:
+            results = list(pool.map(_simulate_worker_block, tasks))
+    else:
+        results = [simulate_block(model, block_seed, block_paths) for block_seed, block_paths in tasks]
+
+    losses = np.concatenate([block_losses for block_losses, _ in results])
+    liquidations = np.concatenate([block_liquidations for _, block_liquidations in results])
+    var = float(np.quantile(losses, confidence))
+    return VaRResult(
+        horizon_seconds=horizon_seconds,
+        confidence=confidence,
+        paths=paths,
+        var=var,
+        expected_shortfall=float(losses[losses >= var].mean()),
+        expected_liquidations=float(liquidations.mean()),
+        liquidation_probability=float(np.count_nonzero(liquidations) / paths)
+    )
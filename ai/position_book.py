@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+SAPP Position Book
+Armazenamento compacto das posições em arrays NumPy pré-alocados
+"""
+
+import time
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from batch_risk import BookColumns, MarketRegistry
+from id_index import IdIndex
+
+# Marcador de slot livre na coluna de mercado (ids de mercado são uint16)
+FREE_SLOT = np.iinfo(np.uint16).max
+
+# Colunas por slot (ordem de export_state)
+COLUMNS = ('leg1_ids', 'leg2_ids', 'leg1_size', 'leg2_size', 'margin', 'entry_spread', 'current_spread', 'timestamp_ns')
+
+# Referência para converter entre relógio monotônico e datetime
+_WALL_REFERENCE_NS = time.time_ns()
+_MONOTONIC_REFERENCE_NS = time.monotonic_ns()
+
+
+def datetime_to_monotonic_ns(value: datetime) -> int:
+    """Converte um datetime para nanossegundos do relógio monotônico"""
+    return int(value.timestamp() * 1e9) - _WALL_REFERENCE_NS + _MONOTONIC_REFERENCE_NS
+
+
+def monotonic_ns_to_datetime(value: int) -> datetime:
+    """Converte nanossegundos do relógio monotônico para datetime"""
+    return datetime.fromtimestamp((value - _MONOTONIC_REFERENCE_NS + _WALL_REFERENCE_NS) / 1e9)
+
+
+class PositionSnapshot(NamedTuple):
+    """Cópia imutável de uma posição (mesmos campos de PositionData)"""
+    position_id: int
+    leg1_market: str
+    leg2_market: str
+    leg1_size: int
+    leg2_size: int
+    margin: int
+    entry_spread: float
+    current_spread: float
+    timestamp: datetime
+
+
+def _column_field(column: str, cast: Callable, notify: bool = True) -> property:
+    """Propriedade da view que lê e escreve direto na coluna do livro"""
+    def getter(view):
+        book = view._book
+        return cast(getattr(book, column)[book.slot(view.position_id)])
+
+    def setter(view, value):
+        view._book._set_field(view.position_id, column, cast(value), notify)
+
+    return property(getter, setter)
+
+
+def _market_field(column: str) -> property:
+    """Propriedade da view para o nome do mercado de uma perna"""
+    def getter(view):
+        book = view._book
+        return book.registry.names[getattr(book, column)[book.slot(view.position_id)]]
+
+    def setter(view, value):
+        book = view._book
+        book._set_field(view.position_id, column, book._intern(value), True)
+
+    return property(getter, setter)
+
+
+class PositionView:
+    """View leve de uma posição do livro, com a mesma interface de PositionData"""
+
+    __slots__ = ('_book', 'position_id')
+
+    def __init__(self, book: 'PositionBook', position_id: int):
+        self._book = book
+        self.position_id = position_id
+
+    leg1_market = _market_field('leg1_ids')
+    leg2_market = _market_field('leg2_ids')
+    leg1_size = _column_field('leg1_size', int)
+    leg2_size = _column_field('leg2_size', int)
+    margin = _column_field('margin', int)
+    entry_spread = _column_field('entry_spread', float)
+    current_spread = _column_field('current_spread', float, notify=False)
+    timestamp_ns = _column_field('timestamp_ns', int, notify=False)
+
+    @property
+    def timestamp(self) -> datetime:
+        return monotonic_ns_to_datetime(self.timestamp_ns)
+
+    @timestamp.setter
+    def timestamp(self, value: datetime):
+        self.timestamp_ns = datetime_to_monotonic_ns(value)
+
+    def snapshot(self) -> PositionSnapshot:
+        """Copia os valores atuais da posição"""
+        return self._book.snapshot(self.position_id)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PositionView):
+            return self._book is other._book and self.position_id == other.position_id
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self._book), self.position_id))
+
+    def __repr__(self) -> str:
+        return f"PositionView({self.snapshot()!r})"
+
+
+class PositionBook(MutableMapping):
+    """
+    Livro de posições com interface de dicionário (position_id → posição).
+    Cada posição ocupa um slot em colunas pré-alocadas; slots de posições
+    fechadas voltam para uma free-list. O acesso devolve PositionView.
+    """
+
+    def __init__(self, positions: Optional[Dict] = None, registry: Optional[MarketRegistry] = None,
+                 capacity: int = 1024):
+        self.registry = registry if registry is not None else MarketRegistry()
+        self._listeners: List[Callable] = []
+        self._count = 0
+        self._capacity = 0
+        self._high_water = 0
+        self._free_slots = array('i')
+        self._index = IdIndex()  # position_id → slot
+        self._grow(max(capacity, 1))
+        if positions:
+            self.update(positions)
+
+    # ----- armazenamento -----
+
+    def _grow(self, capacity: int):
+        """Realoca as colunas com a nova capacidade"""
+        size = self._capacity
+
+        def resized(column, dtype, fill):
+            new = np.full(capacity, fill, dtype=dtype)
+            if column is not None:
+                new[:size] = column[:size]
+            return new
+
+        self.leg1_ids = resized(getattr(self, 'leg1_ids', None), np.uint16, FREE_SLOT)
+        self.leg2_ids = resized(getattr(self, 'leg2_ids', None), np.uint16, FREE_SLOT)
+        self.leg1_size = resized(getattr(self, 'leg1_size', None), np.int64, 0)
+        self.leg2_size = resized(getattr(self, 'leg2_size', None), np.int64, 0)
+        self.margin = resized(getattr(self, 'margin', None), np.int64, 0)
+        self.entry_spread = resized(getattr(self, 'entry_spread', None), np.float64, 0.0)
+        self.current_spread = resized(getattr(self, 'current_spread', None), np.float64, 0.0)
+        self.timestamp_ns = resized(getattr(self, 'timestamp_ns', None), np.int64, 0)
+        self._capacity = self._index.capacity = capacity
+
+    def reserve(self, capacity: int):
+        """Garante capacidade para ao menos capacity posições"""
+        if capacity > self._capacity:
+            self._grow(capacity)
+
+    def _allocate_slot(self) -> int:
+        if self._free_slots:
+            return self._free_slots.pop()
+        if self._high_water == self._capacity:
+            self._grow(self._capacity + max(self._capacity // 4, 1024))
+        slot = self._high_water
+        self._high_water += 1
+        return slot
+
+    def _intern(self, market: str) -> int:
+        market_id = self.registry.intern(market)
+        if market_id >= FREE_SLOT:
+            raise ValueError(f"Limite de {FREE_SLOT} mercados excedido")
+        return market_id
+
+    # ----- índice position_id → slot -----
+
+    def slot(self, position_id: int) -> int:
+        """Slot da posição (KeyError se não existir)"""
+        return self._index[position_id]
+
+    def _live(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids e slots de todas as posições abertas, em ordem de id"""
+        return self._index.items()
+
+    def _lookup(self, position_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Slots dos ids pedidos e máscara dos ids que existem no livro"""
+        ids, slots = self._index.lookup(position_ids)
+        return ids, slots, slots >= 0
+
+    # ----- interface de dicionário -----
+
+    def subscribe(self, listener: Callable):
+        """Registra um callback listener(position_id, old, new)"""
+        self._listeners.append(listener)
+
+    def _notify(self, position_id: int, old, new):
+        for listener in self._listeners:
+            listener(position_id, old, new)
+
+    def __getitem__(self, position_id: int) -> PositionView:
+        position_id = int(position_id)
+        self.slot(position_id)
+        return PositionView(self, position_id)
+
+    def __setitem__(self, position_id: int, position):
+        position_id = int(position_id)
+        # Ler todos os campos antes de escrever (position pode ser uma view deste livro)
+        leg1_id = self._intern(position.leg1_market)
+        leg2_id = self._intern(position.leg2_market)
+        values = (
+            int(position.leg1_size), int(position.leg2_size), int(position.margin),
+            float(position.entry_spread), float(position.current_spread)
+        )
+        timestamp_ns = getattr(position, 'timestamp_ns', None)
+        if timestamp_ns is None:
+            timestamp = getattr(position, 'timestamp', None)
+            timestamp_ns = datetime_to_monotonic_ns(timestamp) if timestamp else time.monotonic_ns()
+
+        old = None
+        if position_id in self:
+            slot = self.slot(position_id)
+            if self._listeners:
+                old = self.snapshot(position_id)
+        else:
+            slot = self._allocate_slot()
+            self._index.set(position_id, slot)
+            self._count += 1
+
+        self.leg1_ids[slot] = leg1_id
+        self.leg2_ids[slot] = leg2_id
+        (self.leg1_size[slot], self.leg2_size[slot], self.margin[slot],
+         self.entry_spread[slot], self.current_spread[slot]) = values
+        self.timestamp_ns[slot] = timestamp_ns
+        self._notify(position_id, old, PositionView(self, position_id))
+
+    def __delitem__(self, position_id: int):
+        position_id = int(position_id)
+        slot = self.slot(position_id)
+        old = self.snapshot(position_id) if self._listeners else None
+        self._index.pop(position_id)
+        self.leg1_ids[slot] = FREE_SLOT
+        self.leg2_ids[slot] = FREE_SLOT
+        self._free_slots.append(slot)
+        self._count -= 1
+        self._notify(position_id, old, None)
+
+    def __contains__(self, position_id) -> bool:
+        try:
+            self.slot(position_id)
+            return True
+        except (KeyError, TypeError):
+            return False
+
+    def __iter__(self) -> Iterator[int]:
+        ids, _ = self._live()
+        return iter(ids.tolist())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self):
+        for position_id in list(self):
+            del self[position_id]
+
+    def __repr__(self) -> str:
+        return f"PositionBook({len(self)} posições)"
+
+    # ----- acesso colunar -----
+
+    def _set_field(self, position_id: int, column: str, value, notify: bool):
+        """Escreve um campo e notifica mudanças nas entradas do score"""
+        slot = self.slot(position_id)
+        old = self.snapshot(position_id) if notify and self._listeners else None
+        getattr(self, column)[slot] = value
+        if old is not None:
+            self._notify(position_id, old, PositionView(self, position_id))
+
+    def snapshot(self, position_id: int) -> PositionSnapshot:
+        """Cópia dos valores atuais de uma posição"""
+        slot = self.slot(position_id)
+        names = self.registry.names
+        return PositionSnapshot(
+            position_id=position_id,
+            leg1_market=names[self.leg1_ids[slot]],
+            leg2_market=names[self.leg2_ids[slot]],
+            leg1_size=int(self.leg1_size[slot]),
+            leg2_size=int(self.leg2_size[slot]),
+            margin=int(self.margin[slot]),
+            entry_spread=float(self.entry_spread[slot]),
+            current_spread=float(self.current_spread[slot]),
+            timestamp=monotonic_ns_to_datetime(int(self.timestamp_ns[slot]))
+        )
+
+    def columns(self, position_ids: Optional[Iterable[int]] = None) -> BookColumns:
+        """Colunas das posições abertas (ou apenas das posições pedidas)"""
+        if position_ids is None:
+            ids, slots = self._live()
+        else:
+            ids, slots, found = self._lookup(position_ids)
+            ids, slots = ids[found], slots[found]
+        return BookColumns(
+            position_ids=ids,
+            leg1_ids=self.leg1_ids[slots].astype(np.int32),
+            leg2_ids=self.leg2_ids[slots].astype(np.int32),
+            leg1_size=self.leg1_size[slots],
+            leg2_size=self.leg2_size[slots],
+            margin=self.margin[slots],
+            entry_spread=self.entry_spread[slots]
+        )
+
+    def insert_columns(self, columns: BookColumns, timestamp_ns: Optional[np.ndarray] = None):
+        """
+        Carga em massa a partir de colunas (ids de mercado do mesmo registry).
+        Ids já existentes são sobrescritos; ids repetidos no lote valem pela
+        última ocorrência, como em atribuições sucessivas.
+        """
+        if len(columns) and max(columns.leg1_ids.max(), columns.leg2_ids.max()) >= FREE_SLOT:
+            raise ValueError(f"Limite de {FREE_SLOT} mercados excedido")
+        position_ids = columns.position_ids
+        if len(position_ids) > 1 and not (position_ids[1:] > position_ids[:-1]).all():
+            # Fora de ordem: conferir repetidos (cada um ocuparia um slot próprio)
+            _, last = np.unique(position_ids[::-1], return_index=True)
+            if len(last) < len(position_ids):
+                keep = np.sort(len(position_ids) - 1 - last)
+                columns = columns.take(keep)
+                if timestamp_ns is not None and np.ndim(timestamp_ns):
+                    timestamp_ns = np.asarray(timestamp_ns)[keep]
+        ids, slots, found = self._lookup(columns.position_ids)
+        old = {}
+        if self._listeners:
+            old = {position_id: self.snapshot(position_id) for position_id in ids[found].tolist()}
+
+        # Alocar slots: primeiro da free-list, depois após a marca d'água
+        new_rows = np.flatnonzero(~found)
+        reuse = min(len(new_rows), len(self._free_slots))
+        fresh_end = self._high_water + len(new_rows) - reuse
+        if fresh_end > self._capacity:
+            self._grow(max(fresh_end, self._capacity + self._capacity // 4))
+        new_slots = np.arange(self._high_water - reuse, fresh_end, dtype=np.int64)
+        if reuse:
+            new_slots[:reuse] = self._free_slots[len(self._free_slots) - reuse:]
+            del self._free_slots[len(self._free_slots) - reuse:]
+        self._high_water = fresh_end
+        slots[new_rows] = new_slots
+        self._count += len(new_rows)
+
+        self._index.insert_many(ids[new_rows], new_slots)
+
+        self.leg1_ids[slots] = columns.leg1_ids
+        self.leg2_ids[slots] = columns.leg2_ids
+        self.leg1_size[slots] = columns.leg1_size
+        self.leg2_size[slots] = columns.leg2_size
+        self.margin[slots] = columns.margin
+        self.entry_spread[slots] = columns.entry_spread
+        self.current_spread[slots] = 0.0
+        self.timestamp_ns[slots] = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+
+        if self._listeners:
+            for position_id in ids.tolist():
+                self._notify(position_id, old.get(position_id), PositionView(self, position_id))
+
+    def set_current_spreads(self, position_ids: Iterable[int], spreads: np.ndarray):
+        """Atualiza o spread atual de várias posições de uma vez"""
+        _, slots, found = self._lookup(position_ids)
+        self.current_spread[slots[found]] = np.asarray(spreads, dtype=np.float64)[found]
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelas colunas e pelo índice"""
+        return (sum(getattr(self, column).nbytes for column in COLUMNS) + self._index.nbytes +
+                self._free_slots.itemsize * len(self._free_slots))
+
+    # ----- snapshot -----
+
+    def export_state(self) -> Dict:
+        """
+        Cópia do estado para snapshot: colunas até a marca d'água, índice e
+        free-list. Timestamps vão em ns do relógio de parede (o monotônico
+        não sobrevive ao reinício do processo).
+        """
+        size = self._high_water
+        columns = {column: getattr(self, column)[:size].copy() for column in COLUMNS}
+        columns['timestamp_ns'] += _WALL_REFERENCE_NS - _MONOTONIC_REFERENCE_NS
+        index = self._index.export_state()
+        return {
+            'markets': list(self.registry.names),
+            'count': self._count,
+            'columns': columns,
+            'slot_index': index['dense'],
+            'free_slots': np.array(self._free_slots, dtype=np.int32),
+            'sparse_ids': index['sparse_ids'],
+            'sparse_slots': index['sparse_rows'],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'PositionBook':
+        """Livro a partir de export_state, usando os arrays dados como colunas (sem cópia)"""
+        registry = MarketRegistry()
+        for market in state['markets']:
+            registry.intern(market)
+        book = cls(registry=registry, capacity=1)
+        columns = state['columns']
+        for column in COLUMNS:
+            setattr(book, column, columns[column])
+        book.timestamp_ns = columns['timestamp_ns'] - (_WALL_REFERENCE_NS - _MONOTONIC_REFERENCE_NS)
+        book._capacity = book._high_water = len(book.leg1_ids)
+        book._count = int(state['count'])
+        book._free_slots = array('i', state['free_slots'].astype(np.int32).tobytes())
+        book._index = IdIndex.from_state({'dense': state['slot_index'], 'sparse_ids': state['sparse_ids'],
+                                          'sparse_rows': state['sparse_slots']}, book._capacity)
+        return book
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+SAPP Position Index
+Índice reverso mercado → posições para reprocessamento incremental
+"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from batch_risk import BookColumns
+
+# Alterações pendentes toleradas antes de compactar (mínimo absoluto)
+MIN_PENDING = 1024
+
+
+class MarketPositionIndex:
+    """
+    Mapeia cada mercado (e cada par de pernas) para as posições que o usam.
+
+    A base é compactada em arrays: ids das posições em ordem, mercados das
+    pernas e grupos por mercado e por par em formato CSR (linhas da base
+    agrupadas + offsets), cerca de 30 bytes por posição. Inclusões entram
+    em conjuntos pequenos por grupo e remoções só desligam a linha da base;
+    quando as alterações passam de rebuild_ratio da base (como as escadas
+    do TriggerBook) tudo é compactado de novo.
+    """
+
+    def __init__(self, rebuild_ratio: float = 0.125):
+        self.rebuild_ratio = rebuild_ratio
+        self._names: List[str] = []
+        self._market_ids: Dict[str, int] = {}
+        self._build(np.empty(0, dtype=np.int64), np.empty((2, 0), dtype=np.int32))
+        self._columns: Optional[Tuple[BookColumns, List[str]]] = None  # ainda não indexadas (rebuild_columns)
+
+    # ----- base compactada -----
+
+    def _build(self, position_ids: np.ndarray, legs: np.ndarray):
+        """Monta a base a partir de ids (sem repetição) e mercados das pernas (2 × n)"""
+        order = np.argsort(position_ids, kind='stable')
+        self._ids = position_ids[order]
+        self._legs = legs[:, order].astype(np.int32)
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._dead = 0
+        self._width = width = len(self._names)
+
+        # Por mercado: linhas das duas pernas (uma vez só se as pernas são do mesmo mercado)
+        rows = np.arange(len(self._ids), dtype=np.int32)
+        second = self._legs[1] != self._legs[0]
+        markets = np.concatenate((self._legs[0], self._legs[1][second]))
+        entries = np.concatenate((rows, rows[second]))
+        order = np.lexsort((entries, markets))
+        self._market_rows = entries[order]
+        self._market_offsets = np.concatenate(([0], np.cumsum(np.bincount(markets, minlength=width))))
+
+        # Por par: chave leg1 × width + leg2
+        keys = self._legs[0].astype(np.int64) * width + self._legs[1]
+        order = np.argsort(keys, kind='stable')
+        self._pair_keys, starts = np.unique(keys[order], return_index=True)
+        self._pair_offsets = np.append(starts, len(keys))
+        self._pair_rows = order.astype(np.int32)
+
+        self._added: Dict[int, Tuple[int, int]] = {}
+        self._added_by_market: Dict[int, Set[int]] = {}
+        self._added_by_pair: Dict[Tuple[int, int], Set[int]] = {}
+
+    def _compact(self):
+        """Incorpora as alterações pendentes na base"""
+        ids = self._ids[self._alive]
+        legs = self._legs[:, self._alive]
+        if self._added:
+            ids = np.concatenate((ids, np.fromiter(self._added, dtype=np.int64, count=len(self._added))))
+            added = np.array(list(self._added.values()), dtype=np.int32).reshape(-1, 2).T
+            legs = np.concatenate((legs, added), axis=1)
+        self._build(ids, legs)
+
+    def _maybe_compact(self):
+        if len(self._added) + self._dead > max(MIN_PENDING, self.rebuild_ratio * len(self._ids)):
+            self._compact()
+
+    def _intern(self, market: str) -> int:
+        market_id = self._market_ids.get(market)
+        if market_id is None:
+            market_id = self._market_ids[market] = len(self._names)
+            self._names.append(market)
+        return market_id
+
+    def _alive_counts(self, rows: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Posições ainda vivas em cada grupo CSR"""
+        alive = np.concatenate(([0], np.cumsum(self._alive[rows])))
+        return alive[offsets[1:]] - alive[offsets[:-1]]
+
+    def _group(self, rows: np.ndarray) -> np.ndarray:
+        if self._dead:
+            rows = rows[self._alive[rows]]
+        return self._ids[rows]
+
+    # ----- alterações -----
+
+    def add(self, position_id: int, position):
+        """Indexa as duas pernas da posição"""
+        self._materialize()
+        self._discard(position_id)
+        legs = (self._intern(position.leg1_market), self._intern(position.leg2_market))
+        self._added[position_id] = legs
+        for market_id in set(legs):
+            self._added_by_market.setdefault(market_id, set()).add(position_id)
+        self._added_by_pair.setdefault(legs, set()).add(position_id)
+        self._maybe_compact()
+
+    def remove(self, position_id: int, position):
+        """Remove a posição do índice"""
+        self._materialize()
+        self._discard(position_id)
+        self._maybe_compact()
+
+    def _discard(self, position_id: int):
+        legs = self._added.pop(position_id, None)
+        if legs is not None:
+            for market_id in set(legs):
+                group = self._added_by_market[market_id]
+                group.discard(position_id)
+                if not group:
+                    del self._added_by_market[market_id]
+            group = self._added_by_pair[legs]
+            group.discard(position_id)
+            if not group:
+                del self._added_by_pair[legs]
+            return
+        row = int(np.searchsorted(self._ids, position_id))
+        if row < len(self._ids) and self._ids[row] == position_id and self._alive[row]:
+            self._alive[row] = False
+            self._dead += 1
+
+    def rebuild(self, positions: Dict):
+        """Reconstrói o índice a partir de todas as posições"""
+        self._columns = None
+        self._names = []
+        self._market_ids = {}
+        position_ids = np.fromiter(positions.keys(), dtype=np.int64, count=len(positions))
+        legs = np.array([(self._intern(position.leg1_market), self._intern(position.leg2_market))
+                         for position in positions.values()], dtype=np.int32).reshape(-1, 2).T
+        self._build(position_ids, legs)
+
+    def rebuild_columns(self, columns: BookColumns, names: List[str]):
+        """
+        Reconstrói o índice direto das colunas do livro (sem uma view por
+        posição). Os arrays só são montados no primeiro uso, como as
+        escadas do TriggerBook: restaurar um snapshot não espera pelo índice.
+        """
+        self._names = list(names)
+        self._market_ids = {name: market_id for market_id, name in enumerate(self._names)}
+        self._build(np.empty(0, dtype=np.int64), np.empty((2, 0), dtype=np.int32))
+        self._columns = (columns, self._names) if len(columns) else None
+
+    def _materialize(self):
+        if self._columns is None:
+            return
+        (columns, _), self._columns = self._columns, None
+        self._build(columns.position_ids.astype(np.int64), np.vstack((columns.leg1_ids, columns.leg2_ids)))
+
+    # ----- consultas -----
+
+    def positions_for(self, markets: Iterable[str]) -> Set[int]:
+        """Retorna as posições afetadas por qualquer um dos mercados"""
+        self._materialize()
+        groups = []
+        added: Set[int] = set()
+        for market in markets:
+            market_id = self._market_ids.get(market)
+            if market_id is None:
+                continue
+            if market_id < self._width:
+                start, stop = self._market_offsets[market_id], self._market_offsets[market_id + 1]
+                groups.append(self._group(self._market_rows[start:stop]))
+            added.update(self._added_by_market.get(market_id, ()))
+        affected = set(np.concatenate(groups).tolist()) if groups else set()
+        affected.update(added)
+        return affected
+
+    def positions_for_pairs(self, pairs: Iterable[Tuple[str, str]]) -> Set[int]:
+        """Retorna as posições com exatamente o par de pernas informado"""
+        self._materialize()
+        groups = []
+        added: Set[int] = set()
+        for leg1_market, leg2_market in pairs:
+            legs = (self._market_ids.get(leg1_market), self._market_ids.get(leg2_market))
+            if legs[0] is None or legs[1] is None:
+                continue
+            if legs[0] < self._width and legs[1] < self._width:
+                key = legs[0] * self._width + legs[1]
+                index = int(np.searchsorted(self._pair_keys, key))
+                if index < len(self._pair_keys) and self._pair_keys[index] == key:
+                    start, stop = self._pair_offsets[index], self._pair_offsets[index + 1]
+                    groups.append(self._group(self._pair_rows[start:stop]))
+            added.update(self._added_by_pair.get(legs, ()))
+        affected = set(np.concatenate(groups).tolist()) if groups else set()
+        affected.update(added)
+        return affected
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """Pares de pernas com ao menos uma posição"""
+        self._materialize()
+        names, width = self._names, self._width
+        keys = self._pair_keys[self._alive_counts(self._pair_rows, self._pair_offsets) > 0].tolist()
+        pairs = [(names[key // width], names[key % width]) for key in keys]
+        pairs.extend((names[leg1], names[leg2]) for leg1, leg2 in self._added_by_pair)
+        return list(dict.fromkeys(pairs))
+
+    def markets(self) -> List[str]:
+        """Mercados com pelo menos uma posição"""
+        self._materialize()
+        market_ids = np.flatnonzero(self._alive_counts(self._market_rows, self._market_offsets) > 0).tolist()
+        market_ids.extend(self._added_by_market)
+        return [self._names[market_id] for market_id in dict.fromkeys(market_ids)]
+
+    def __len__(self) -> int:
+        self._materialize()
+        return len(self._ids) - self._dead + len(self._added)
+
+    @property
+    def nbytes(self) -> int:
+        """Memória dos arrays da base (as alterações pendentes não entram na conta)"""
+        return sum(array.nbytes for array in (
+            self._ids, self._legs, self._alive, self._market_rows, self._market_offsets,
+            self._pair_keys, self._pair_offsets, self._pair_rows
+        ))
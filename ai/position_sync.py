@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+SAPP Position Sync
+Sincronização incremental das posições com o backend: a cada ciclo só as
+posições abertas, alteradas e fechadas desde a última versão aplicada são
+buscadas (em páginas) e aplicadas no livro de posições.
+
+Rota do backend: GET /api/positions/changes?since=<versão>&limit=<n>[&full=1]
+    {"changes": [{"position_id": 7, "version": 1043, "status": "Active",
+                  "leg1_market": "WTI", "leg2_market": "Brent", "leg1_size": 1000,
+                  "leg2_size": -1000, "margin": 1000000, "entry_spread": -4.0,
+                  "current_spread": -4.1, "timestamp": 1700000000000}, ...],
+     "version": 1043, "has_more": false}
+Alterações em ordem de versão; fechadas trazem status 'Closed' (ou
+'Liquidated'). HTTP 410 indica que o histórico anterior a since foi
+descartado: é feita uma sincronização completa, que lista as posições ativas
+(full=1, começando em since=0) e remove do livro as que não vieram.
+
+Backend sem a rota (HTTP 404) ou com resposta fora desse formato: se houver
+uma listagem das posições ativas (GET /api/positions), cada ciclo vira uma
+sincronização completa a partir dela.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import logging
+
+import numpy as np
+
+from http_client import BackendHTTPError
+from position_book import PositionBook, PositionSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Alterações por página
+DEFAULT_PAGE_SIZE = 1000
+
+# Status de posições que deixam o livro
+CLOSED_STATUSES = ('Closed', 'Liquidated')
+
+# fetch(since, limit, full) → página da rota de alterações
+FetchPage = Callable[[int, int, bool], Dict]
+FetchPageAsync = Callable[[int, int, bool], Awaitable[Dict]]
+
+# fetch_listing() → posições ativas no formato das alterações (sem versão)
+FetchListing = Callable[[], List[Dict]]
+FetchListingAsync = Callable[[], Awaitable[List[Dict]]]
+
+
+class PositionPageError(ValueError):
+    """Resposta da rota de alterações fora do formato esperado"""
+
+
+@dataclass
+class SyncResult:
+    """Resumo de um ciclo de sincronização"""
+    opened: int = 0
+    changed: int = 0
+    closed: int = 0
+    stale: int = 0       # alterações com versão já aplicada
+    pages: int = 0
+    full: bool = False   # sincronização completa (primeira ou após 410)
+    version: int = 0     # cursor ao fim do ciclo
+
+    @property
+    def applied(self) -> int:
+        return self.opened + self.changed + self.closed
+
+
+def _position(change: Dict, book: PositionBook, position_id: int) -> PositionSnapshot:
+    """Converte um registro de alteração (spread atual mantido se não informado)"""
+    if 'current_spread' in change:
+        current_spread = float(change['current_spread'])
+    elif position_id in book:
+        current_spread = float(book.current_spread[book.slot(position_id)])
+    else:
+        current_spread = float(change['entry_spread'])
+    timestamp = change.get('timestamp')
+    return PositionSnapshot(
+        position_id=position_id,
+        leg1_market=change['leg1_market'],
+        leg2_market=change['leg2_market'],
+        leg1_size=int(change['leg1_size']),
+        leg2_size=int(change['leg2_size']),
+        margin=int(change['margin']),
+        entry_spread=float(change['entry_spread']),
+        current_spread=current_spread,
+        timestamp=datetime.fromtimestamp(timestamp / 1000) if timestamp else datetime.now()
+    )
+
+
+class PositionSync:
+    """
+    Cursor de sincronização (maior versão aplicada) e versão de cada posição.
+    As alterações entram no livro uma a uma pela interface de dicionário: os
+    listeners do livro (índice por mercado, estado de risco, posições
+    marcadas) atualizam apenas as posições tocadas. Alterações repetidas ou
+    fora de ordem (versão <= à da posição) são ignoradas; posições fechadas
+    mantêm a versão do fechamento (lápide) até a próxima sincronização
+    completa, para que uma abertura antiga atrasada não as recrie.
+    """
+
+    def __init__(self, page_size: int = DEFAULT_PAGE_SIZE):
+        self.page_size = page_size
+        self.version = 0
+        self.versions: Dict[int, int] = {}
+        self._seen: Optional[Set[int]] = None  # posições listadas durante uma sincronização completa
+        self._restored: Optional[Tuple[np.ndarray, np.ndarray]] = None  # versões do snapshot, ainda em arrays
+
+    def reset(self):
+        """Esquece o cursor: o próximo ciclo relista todas as posições"""
+        self.version = 0
+        self.versions.clear()
+        self._restored = None
+
+    def export_state(self) -> Dict:
+        """Cursor e versões por posição para snapshot"""
+        if self._restored is not None:
+            position_ids, versions = self._restored
+        else:
+            position_ids = np.fromiter(self.versions.keys(), dtype=np.int64, count=len(self.versions))
+            versions = np.fromiter(self.versions.values(), dtype=np.int64, count=len(self.versions))
+        return {'version': self.version, 'position_ids': position_ids, 'versions': versions}
+
+    def restore_state(self, state: Dict):
+        """
+        Retoma a sincronização incremental do cursor gravado (o dicionário de
+        versões só é montado no próximo ciclo)
+        """
+        self.version = state['version']
+        self.versions = {}
+        self._restored = (state['position_ids'], state['versions'])
+
+    def sync(self, book: PositionBook, fetch: FetchPage, fetch_listing: Optional[FetchListing] = None) -> SyncResult:
+        """Busca e aplica todas as páginas de alterações desde o cursor"""
+        result = self._begin()
+        try:
+            while self.apply_page(book, fetch(self.version, self.page_size, result.full), result):
+                pass
+        except (BackendHTTPError, PositionPageError) as e:
+            if self._use_listing(e, fetch_listing):
+                return self.apply_listing(book, fetch_listing())
+            if getattr(e, 'status_code', None) != 410:
+                raise
+            logger.warning(f"⚠️ Histórico de posições expirado (versão {self.version}): sincronização completa")
+            self.reset()
+            result = self._begin()
+            while self.apply_page(book, fetch(self.version, self.page_size, result.full), result):
+                pass
+        return self._finish(book, result)
+
+    async def sync_async(self, book: PositionBook, fetch: FetchPageAsync,
+                         fetch_listing: Optional[FetchListingAsync] = None) -> SyncResult:
+        """Mesmo ciclo com fetch assíncrono (modo asyncio)"""
+        result = self._begin()
+        try:
+            while self.apply_page(book, await fetch(self.version, self.page_size, result.full), result):
+                pass
+        except (BackendHTTPError, PositionPageError) as e:
+            if self._use_listing(e, fetch_listing):
+                return self.apply_listing(book, await fetch_listing())
+            if getattr(e, 'status_code', None) != 410:
+                raise
+            logger.warning(f"⚠️ Histórico de posições expirado (versão {self.version}): sincronização completa")
+            self.reset()
+            result = self._begin()
+            while self.apply_page(book, await fetch(self.version, self.page_size, result.full), result):
+                pass
+        return self._finish(book, result)
+
+    def _use_listing(self, error: Exception, fetch_listing) -> bool:
+        """Rota de alterações ausente (404) ou resposta inválida, com listagem disponível"""
+        if fetch_listing is None:
+            return False
+        if isinstance(error, BackendHTTPError) and error.status_code != 404:
+            return False
+        logger.warning(f"⚠️ Rota de alterações indisponível ({error}): sincronização pela listagem de posições")
+        return True
+
+    def apply_listing(self, book: PositionBook, listing: List[Dict]) -> SyncResult:
+        """
+        Sincronização completa a partir da listagem das posições ativas: abre
+        e altera o que mudou e remove do livro o que não veio. Sem versões,
+        o cursor volta a 0 e o próximo ciclo tenta de novo a rota de alterações.
+        """
+        if not isinstance(listing, list):
+            raise PositionPageError(f"Listagem de posições inválida: {type(listing).__name__}")
+        self.reset()
+        result = self._begin()
+        result.pages = 1
+        for change in listing:
+            if change.get('status', 'Active') in CLOSED_STATUSES:
+                continue
+            position_id = int(change['position_id'])
+            position = _position(change, book, position_id)
+            self._seen.add(position_id)
+            if position_id in book:
+                if tuple(book.snapshot(position_id))[:-1] == tuple(position)[:-1]:
+                    continue  # inalterada (o timestamp não conta)
+                result.changed += 1
+            else:
+                result.opened += 1
+            book[position_id] = position
+        return self._finish(book, result)
+
+    def _begin(self) -> SyncResult:
+        if self._restored is not None:
+            (position_ids, versions), self._restored = self._restored, None
+            self.versions = dict(zip(position_ids.tolist(), versions.tolist()))
+        full = self.version == 0
+        self._seen = set() if full else None
+        return SyncResult(full=full)
+
+    def _finish(self, book: PositionBook, result: SyncResult) -> SyncResult:
+        if self._seen is not None:
+            # Sincronização completa: posições do livro que o backend não listou foram fechadas
+            for position_id in [position_id for position_id in book if position_id not in self._seen]:
+                del book[position_id]
+                result.closed += 1
+            self._seen = None
+        result.version = self.version
+        return result
+
+    def apply_page(self, book: PositionBook, page: Dict, result: SyncResult) -> bool:
+        """Aplica uma página de alterações; retorna True se houver mais páginas"""
+        if not isinstance(page, dict) or not isinstance(page.get('changes', []), list):
+            raise PositionPageError(f"Página de alterações inválida: {type(page).__name__}")
+        result.pages += 1
+        versions = self.versions
+        for change in page.get('changes', ()):
+            position_id = int(change['position_id'])
+            version = int(change['version'])
+            if version <= versions.get(position_id, 0):
+                result.stale += 1
+                continue
+            if change.get('status') in CLOSED_STATUSES:
+                versions[position_id] = version  # lápide
+                if position_id in book:
+                    del book[position_id]
+                    result.closed += 1
+                continue
+            if self._seen is not None:
+                self._seen.add(position_id)
+            if position_id in book:
+                result.changed += 1
+            else:
+                result.opened += 1
+            book[position_id] = _position(change, book, position_id)
+            versions[position_id] = version
+        self.version = max(self.version, int(page.get('version', self.version)))
+        return bool(page.get('has_more')) and bool(page.get('changes'))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+SAPP Price Board
+Quadro de últimos preços em memória compartilhada (multiprocessing.shared_memory),
+indexado pelo id do mercado e protegido por um seqlock: um único processo
+escreve, os workers leem direto da memória mapeada, sem pickling.
+"""
+
+import os
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from batch_risk import ALERT_LEVELS
+
+# Capacidade padrão de mercados do quadro
+DEFAULT_MARKET_CAPACITY = 1024
+
+# Campos do cabeçalho (int64)
+SEQ = 0        # contador do seqlock: ímpar durante uma escrita
+STOP = 1       # pedido de parada para os workers
+MARKETS = 2    # mercados já publicados (maior id + 1)
+_HEADER_FIELDS = 4
+
+# Campos da linha de status de cada worker (int64), escrita só pelo próprio worker
+PROCESSED = 0  # último seq aplicado e reprocessado (-1 = ainda iniciando)
+POSITIONS = 1  # posições do shard
+TIERS = 2      # contagem de posições por tier (NONE, LOW..CRITICAL)
+_STATUS_FIELDS = TIERS + len(ALERT_LEVELS) + 1
+
+# Cede o núcleo ao escritor enquanto uma escrita está em andamento
+_yield = getattr(os, 'sched_yield', lambda: time.sleep(0))
+
+
+class PriceBoard:
+    """
+    Vetor de preços compartilhado entre processos.
+
+    Escrita (publish): seq passa a ímpar, os preços são gravados e seq volta
+    a par. Leitura (read): copia o vetor entre duas leituras de seq e repete
+    se uma escrita estava em andamento ou aconteceu no meio. Cada campo é um
+    int64/float64 alinhado, gravado com uma única instrução; a ordem das
+    gravações entre processos segue o modelo de memória x86-64/TSO.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_MARKET_CAPACITY, workers: int = 1,
+                 name: Optional[str] = None, create: bool = True):
+        self.capacity = capacity
+        self.workers = workers
+        size = 8 * (_HEADER_FIELDS + workers * _STATUS_FIELDS + capacity)
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._owner = create
+        buffer = self.shm.buf
+        offset = 0
+        self.header = np.ndarray(_HEADER_FIELDS, dtype=np.int64, buffer=buffer, offset=offset)
+        offset += 8 * _HEADER_FIELDS
+        self.status = np.ndarray((workers, _STATUS_FIELDS), dtype=np.int64, buffer=buffer, offset=offset)
+        offset += 8 * workers * _STATUS_FIELDS
+        self.prices = np.ndarray(capacity, dtype=np.float64, buffer=buffer, offset=offset)
+        if create:
+            self.header[:] = 0
+            self.status[:] = 0
+            self.status[:, PROCESSED] = -1
+            self.prices[:] = 0.0
+
+    @classmethod
+    def attach(cls, name: str, capacity: int, workers: int) -> 'PriceBoard':
+        """Abre um quadro criado por outro processo"""
+        return cls(capacity, workers, name=name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def seq(self) -> int:
+        return int(self.header[SEQ])
+
+    def publish(self, market_ids: np.ndarray, prices: np.ndarray) -> int:
+        """Grava novos preços (único escritor); retorna o seq publicado"""
+        if len(market_ids) and int(market_ids.max()) >= self.capacity:
+            raise ValueError(f"Limite de {self.capacity} mercados do quadro excedido")
+        header = self.header
+        header[SEQ] += 1
+        self.prices[market_ids] = prices
+        if len(market_ids):
+            header[MARKETS] = max(int(header[MARKETS]), int(market_ids.max()) + 1)
+        header[SEQ] += 1
+        return int(header[SEQ])
+
+    def read(self, out: np.ndarray) -> Tuple[int, int]:
+        """
+        Copia um instantâneo consistente dos preços em out (tamanho capacity);
+        retorna (seq, mercados publicados)
+        """
+        header = self.header
+        while True:
+            seq = int(header[SEQ])
+            if seq & 1:
+                _yield()  # escrita em andamento
+                continue
+            markets = int(header[MARKETS])
+            np.copyto(out[:markets], self.prices[:markets])
+            if int(header[SEQ]) == seq:
+                return seq, markets
+
+    def request_stop(self):
+        self.header[STOP] = 1
+
+    @property
+    def stopping(self) -> bool:
+        return bool(self.header[STOP])
+
+    def tier_counts(self) -> np.ndarray:
+        """Posições por tier somadas sobre todos os workers"""
+        return self.status[:, TIERS:].sum(axis=0)
+
+    def close(self):
+        """Desmapeia o quadro (e o remove, no processo que o criou)"""
+        self.header = self.status = self.prices = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+SAPP Price Decoder
+Decodifica mensagens de preço do WebSocket direto em registros tipados
+(id do mercado, preço, timestamp), com despacho pelo campo 'type'
+"""
+
+import json
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from batch_risk import MarketRegistry
+
+# Backend JSON mais rápido quando disponível (mesma semântica de json.loads)
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = 'json'
+
+# Registro de um preço recebido (timestamp do backend em ns desde a época)
+TICK_DTYPE = np.dtype([('market_id', np.int32), ('price', np.float64), ('timestamp_ns', np.int64)])
+
+# Seções de preço das mensagens 'initial_data' e 'price_update' do websocket-server.js
+PRICE_SECTIONS = ('crypto', 'commodities')
+
+# Formatos sem 'type' aceitos pela versão anterior de _on_message
+LEGACY_SECTIONS = ('prices', 'crypto', 'commodity')
+
+_EMPTY = np.empty(0, dtype=TICK_DTYPE)
+_NUMBER = (int, float)
+
+
+class PriceDecoder:
+    """
+    Converte mensagens de preço em arrays TICK_DTYPE. Mercados novos são
+    registrados no MarketRegistry; entradas sem preço numérico são ignoradas.
+    """
+
+    def __init__(self, registry: MarketRegistry):
+        self.registry = registry
+        self._handlers: Dict[str, Callable[[Dict, int], np.ndarray]] = {
+            'initial_data': self._decode_sections,
+            'price_update': self._decode_sections,
+        }
+        self.stats = dict.fromkeys(('messages', 'ticks', 'ignored'), 0)
+        self.time_ns = time.time_ns  # relógio das mensagens sem timestamp
+
+    def register(self, message_type: str, handler: Callable[[Dict, int], np.ndarray]):
+        """Associa um decodificador (mensagem, timestamp_ns) → ticks a um tipo de mensagem"""
+        self._handlers[message_type] = handler
+
+    def decode(self, message: Union[str, bytes]) -> np.ndarray:
+        """Decodifica uma mensagem (ValueError se o JSON for inválido)"""
+        return self.decode_object(_loads(message))
+
+    def decode_object(self, data) -> np.ndarray:
+        """Decodifica uma mensagem já convertida de JSON"""
+        self.stats['messages'] += 1
+        if type(data) is not dict:
+            self.stats['ignored'] += 1
+            return _EMPTY
+
+        timestamp = data.get('timestamp')
+        timestamp_ns = int(timestamp * 1_000_000) if type(timestamp) in _NUMBER else self.time_ns()
+
+        handler = self._handlers.get(data.get('type'))
+        if handler is not None:
+            ticks = handler(data, timestamp_ns)
+        else:
+            ticks = self._decode_legacy(data, timestamp_ns)
+        if not len(ticks):
+            self.stats['ignored'] += 1
+        self.stats['ticks'] += len(ticks)
+        return ticks
+
+    def _decode_sections(self, data: Dict, timestamp_ns: int) -> np.ndarray:
+        market_ids: List[int] = []
+        prices: List[float] = []
+        for section in PRICE_SECTIONS:
+            entries = data.get(section)
+            if type(entries) is dict:
+                self._collect(entries, market_ids, prices)
+        return self._records(market_ids, prices, timestamp_ns)
+
+    def _decode_legacy(self, data: Dict, timestamp_ns: int) -> np.ndarray:
+        # Como antes: apenas a primeira seção presente
+        for section in LEGACY_SECTIONS:
+            entries = data.get(section)
+            if entries is not None:
+                market_ids: List[int] = []
+                prices: List[float] = []
+                if type(entries) is dict:
+                    self._collect(entries, market_ids, prices)
+                return self._records(market_ids, prices, timestamp_ns)
+        return _EMPTY
+
+    def _collect(self, entries: Dict, market_ids: List[int], prices: List[float]):
+        ids = self.registry._ids
+        intern = self.registry.intern
+        for market, entry in entries.items():
+            if type(entry) is not dict:
+                continue
+            price = entry.get('price')
+            if type(price) not in _NUMBER:
+                continue
+            market_id = ids.get(market)
+            market_ids.append(intern(market) if market_id is None else market_id)
+            prices.append(price)
+
+    @staticmethod
+    def _records(market_ids: List[int], prices: List[float], timestamp_ns: int) -> np.ndarray:
+        if not market_ids:
+            return _EMPTY
+        ticks = np.empty(len(market_ids), dtype=TICK_DTYPE)
+        ticks['market_id'] = market_ids
+        ticks['price'] = prices
+        ticks['timestamp_ns'] = timestamp_ns
+        return ticks
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+SAPP Price History
+Histórico de preços em ring buffers de capacidade fixa com estatísticas móveis
+"""
+
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Capacidade padrão de ticks por mercado
+DEFAULT_CAPACITY = 4096
+
+
+class PriceRing:
+    """
+    Ring buffer de (timestamp ns, preço) de um mercado. Média, variância,
+    mínimo e máximo da janela são mantidos incrementalmente em O(1) por tick.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.total_ticks = 0  # ticks recebidos desde o início (sequência)
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._min_queue: deque = deque()  # (sequência, preço) crescente
+        self._max_queue: deque = deque()  # (sequência, preço) decrescente
+
+    def append(self, price: float, timestamp_ns: int):
+        """Adiciona um tick, descartando o mais antigo se o buffer estiver cheio"""
+        price = float(price)
+        slot = self.total_ticks % self.capacity
+        if self.count == self.capacity:
+            self._remove_from_stats(float(self.prices[slot]))
+        self.count += 1
+
+        self.timestamps[slot] = timestamp_ns
+        self.prices[slot] = price
+        self._add_to_stats(price)
+
+        sequence = self.total_ticks
+        self.total_ticks += 1
+
+        # Filas monotônicas para mínimo e máximo da janela
+        oldest = self.total_ticks - self.count
+        while self._min_queue and self._min_queue[-1][1] >= price:
+            self._min_queue.pop()
+        self._min_queue.append((sequence, price))
+        while self._min_queue[0][0] < oldest:
+            self._min_queue.popleft()
+        while self._max_queue and self._max_queue[-1][1] <= price:
+            self._max_queue.pop()
+        self._max_queue.append((sequence, price))
+        while self._max_queue[0][0] < oldest:
+            self._max_queue.popleft()
+
+        # Recalcular exatamente a cada volta completa evita acúmulo de erro
+        if self.total_ticks % self.capacity == 0:
+            self._recompute_stats()
+
+    def _add_to_stats(self, price: float):
+        delta = price - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (price - self.mean)
+
+    def _remove_from_stats(self, price: float):
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self._m2 = 0.0
+            return
+        delta = price - self.mean
+        self.mean -= delta / self.count
+        self._m2 -= delta * (price - self.mean)
+
+    def _recompute_stats(self):
+        prices = self.prices[:self.count]
+        self.mean = float(prices.mean())
+        self._m2 = float(((prices - self.mean) ** 2).sum())
+
+    @property
+    def variance(self) -> float:
+        """Variância amostral dos preços na janela"""
+        return max(self._m2, 0.0) / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    @property
+    def min(self) -> Optional[float]:
+        return self._min_queue[0][1] if self._min_queue else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self._max_queue[0][1] if self._max_queue else None
+
+    def latest(self) -> Optional[Tuple[int, float]]:
+        """Último tick (timestamp ns, preço)"""
+        if not self.count:
+            return None
+        slot = (self.total_ticks - 1) % self.capacity
+        return int(self.timestamps[slot]), float(self.prices[slot])
+
+    def segments(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Conteúdo em ordem cronológica como até duas views (sem cópia)"""
+        if self.count < self.capacity:
+            return [(self.timestamps[:self.count], self.prices[:self.count])]
+        head = self.total_ticks % self.capacity
+        if head == 0:
+            return [(self.timestamps, self.prices)]
+        return [
+            (self.timestamps[head:], self.prices[head:]),
+            (self.timestamps[:head], self.prices[:head])
+        ]
+
+    def window(self, start_ns: int, end_ns: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Ticks com start_ns <= timestamp < end_ns como views (sem cópia)"""
+        result = []
+        for timestamps, prices in self.segments():
+            first = np.searchsorted(timestamps, start_ns, side='left')
+            last = len(timestamps) if end_ns is None else np.searchsorted(timestamps, end_ns, side='left')
+            if first < last:
+                result.append((timestamps[first:last], prices[first:last]))
+        return result
+
+    def export_state(self) -> Dict:
+        """Cópia do buffer e das estatísticas para snapshot"""
+        return {
+            'timestamps': self.timestamps.copy(),
+            'prices': self.prices.copy(),
+            'count': self.count,
+            'total_ticks': self.total_ticks,
+            'mean': self.mean,
+            'm2': self._m2,
+            'min_queue': list(self._min_queue),
+            'max_queue': list(self._max_queue),
+        }
+
+    def restore_state(self, state: Dict):
+        """Substitui o estado pelo de export_state (os arrays são usados sem cópia)"""
+        self.timestamps, self.prices = state['timestamps'], state['prices']
+        self.capacity = len(self.prices)
+        self.count = state['count']
+        self.total_ticks = state['total_ticks']
+        self.mean = state['mean']
+        self._m2 = state['m2']
+        self._min_queue = deque((sequence, price) for sequence, price in state['min_queue'])
+        self._max_queue = deque((sequence, price) for sequence, price in state['max_queue'])
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class PriceHistory:
+    """Histórico de preços por mercado com memória limitada"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._rings: Dict[str, PriceRing] = {}
+
+    def record(self, market: str, price: float, timestamp_ns: Optional[int] = None):
+        """Registra um tick de preço"""
+        ring = self._rings.get(market)
+        if ring is None:
+            ring = self._rings[market] = PriceRing(self.capacity)
+        ring.append(price, time.monotonic_ns() if timestamp_ns is None else timestamp_ns)
+
+    def stats(self, market: str) -> Optional[Dict]:
+        """Estatísticas móveis de um mercado"""
+        ring = self._rings.get(market)
+        if ring is None or not len(ring):
+            return None
+        return {
+            "count": len(ring),
+            "mean": ring.mean,
+            "std": ring.std,
+            "min": ring.min,
+            "max": ring.max,
+            "last": ring.latest()[1]
+        }
+
+    def export_state(self) -> Dict:
+        """Cópia de todos os buffers para snapshot"""
+        return {
+            'capacity': self.capacity,
+            'rings': [dict(ring.export_state(), market=market) for market, ring in self._rings.items()],
+        }
+
+    def restore_state(self, state: Dict):
+        """Substitui o histórico pelo de export_state"""
+        self.capacity = state['capacity']
+        self._rings = {}
+        for ring_state in state['rings']:
+            ring = self._rings[ring_state['market']] = PriceRing(0)
+            ring.restore_state(ring_state)
+
+    def __getitem__(self, market: str) -> PriceRing:
+        return self._rings[market]
+
+    def get(self, market: str) -> Optional[PriceRing]:
+        return self._rings.get(market)
+
+    def __contains__(self, market: str) -> bool:
+        return market in self._rings
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rings)
+
+    def __len__(self) -> int:
+        return len(self._rings)
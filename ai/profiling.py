@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+SAPP Profiling
+Profiling sob demanda do serviço em execução: amostragem de todas as threads
+ou cProfile nos pontos de entrada do analisador, por uma janela limitada,
+com resultados em pstats e pilhas colapsadas (flamegraph.pl, speedscope)
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('sampling', 'deterministic')
+
+# Janela padrão de coleta (segundos) e intervalo entre amostras
+DEFAULT_PROFILE_SECONDS = 30.0
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+DEFAULT_PROFILE_DIR = "profiles"
+
+# Sinais que iniciam uma janela de profiling (ausentes no Windows)
+PROFILE_SIGNALS = {
+    getattr(signal, name): mode
+    for name, mode in (('SIGUSR1', 'sampling'), ('SIGUSR2', 'deterministic'))
+    if hasattr(signal, name)
+}
+
+
+class _SampledStats:
+    """Amostras convertidas para o formato aceito por pstats.Stats"""
+
+    def __init__(self, stacks: Dict[Tuple, int], interval: float):
+        self.stats = {}
+        for key, count in stacks.items():
+            frames = key[1:]
+            weight = count * interval
+            seen = set()
+            for depth, frame in enumerate(frames):
+                cc, nc, tt, ct, callers = self.stats.get(frame, (0, 0, 0.0, 0.0, {}))
+                leaf = depth == len(frames) - 1
+                if frame not in seen:  # recursão conta o tempo inclusivo uma vez
+                    seen.add(frame)
+                    cc += count
+                    ct += weight
+                nc += count
+                if leaf:
+                    tt += weight
+                if depth:
+                    caller = frames[depth - 1]
+                    ccc, cnc, ctt, cct = callers.get(caller, (0, 0, 0.0, 0.0))
+                    callers[caller] = (ccc + count, cnc + count, ctt + (weight if leaf else 0.0), cct + weight)
+                self.stats[frame] = (cc, nc, tt, ct, callers)
+
+    def create_stats(self):
+        pass
+
+
+class RuntimeProfiler:
+    """
+    Janela de profiling iniciada em tempo de execução (sem reiniciar o serviço).
+
+    - 'sampling': uma thread amostra a pilha de todas as threads a cada
+      interval segundos (sys._current_frames); custo baixo e independente
+      do código monitorado.
+    - 'deterministic': além da amostragem, cProfile nas chamadas feitas via
+      call() (callbacks do WebSocket, ciclos de scoring), uma instância por
+      thread, combinadas no fim.
+
+    Ao fim da janela grava <prefixo>.pstats e <prefixo>.collapsed em output_dir.
+    """
+
+    def __init__(self, output_dir: str = DEFAULT_PROFILE_DIR, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.mode: Optional[str] = None
+        self.last_result: Optional[Dict[str, str]] = None
+        self._deterministic = False
+        self._profiles: List = []  # cProfile.Profile por thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    def start(self, duration: float = DEFAULT_PROFILE_SECONDS, mode: str = 'sampling') -> bool:
+        """Inicia uma janela de duration segundos (False se já houver uma em andamento)"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de profiling inválido: {mode} (use {', '.join(PROFILE_MODES)})")
+        with self._lock:
+            if self.mode is not None:
+                return False
+            self.mode = mode
+            self._profiles = []
+            self._stop.clear()
+            self._done.clear()
+            self._deterministic = mode == 'deterministic'
+            self._thread = threading.Thread(target=self._run, args=(duration,), name="profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"🔬 Profiling ({mode}) iniciado por {duration:.0f}s")
+        return True
+
+    def stop(self):
+        """Encerra a janela atual antes do prazo (os resultados são gravados)"""
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict[str, str]]:
+        """Espera o fim da janela atual e devolve os caminhos gravados"""
+        self._done.wait(timeout)
+        return self.last_result
+
+    def call(self, function: Callable, *args):
+        """Executa function(*args), sob cProfile se uma janela determinística estiver ativa"""
+        if not self._deterministic:
+            return function(*args)
+        profile = getattr(self._local, 'profile', None)
+        if profile is None or profile not in self._profiles:
+            import cProfile  # carregado só quando uma janela determinística é aberta
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile.runcall(function, *args)
+
+    def install_signal_handlers(self, duration: float = DEFAULT_PROFILE_SECONDS, loop=None):
+        """
+        SIGUSR1 inicia uma janela de amostragem e SIGUSR2 uma determinística.
+        Com um event loop asyncio os handlers são registrados nele.
+        """
+        for sig, mode in PROFILE_SIGNALS.items():
+            if loop is not None:
+                loop.add_signal_handler(sig, self.start, duration, mode)
+            else:
+                signal.signal(sig, lambda signum, frame, mode=mode: self.start(duration, mode))
+
+    def _run(self, duration: float):
+        stacks: Counter = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + duration
+        started = time.monotonic()
+        samples = 0
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                self._sample(stacks, me)
+                samples += 1
+                self._stop.wait(self.interval)
+        finally:
+            self._deterministic = False
+            elapsed = time.monotonic() - started
+            try:
+                self.last_result = self._dump(stacks, samples, elapsed)
+            except OSError as e:
+                logger.error(f"❌ Erro ao gravar profiling: {e}")
+                self.last_result = None
+            with self._lock:
+                self.mode = None
+            self._done.set()
+
+    def _sample(self, stacks: Counter, me: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            frames.reverse()
+            stacks[(names.get(ident, str(ident)),) + tuple(frames)] += 1
+
+    def _dump(self, stacks: Counter, samples: int, elapsed: float) -> Dict[str, str]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self.mode}")
+
+        # Pilhas colapsadas: "thread;func (arquivo:linha);... contagem"
+        collapsed_path = prefix + ".collapsed"
+        with open(collapsed_path, "w") as f:
+            for key, count in stacks.most_common():
+                frames = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for filename, line, name in key[1:])
+                f.write(f"{key[0]};{frames} {count}\n")
+
+        import pstats
+
+        stats_path = prefix + ".pstats"
+        with self._lock:
+            profiles = list(self._profiles)
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+        else:
+            stats = pstats.Stats(_SampledStats(stacks, self.interval))
+        stats.dump_stats(stats_path)
+
+        logger.info(f"📁 Profiling ({self.mode}): {samples} amostras em {elapsed:.1f}s → {prefix}.*")
+        return {"pstats": stats_path, "collapsed": collapsed_path}
@@ -4,18 +4,45 @@ SAPP Real Risk Analyzer
 Versão que se conecta com dados reais do backend e smart contract
 """
 
-import requests
 import json
+import os
 import time
-import websocket
+import asyncio
 import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple, Optional, Iterable
 from dataclasses import dataclass
 import logging
 
-# Configuração de logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import numpy as np
+
+from batch_risk import MarketRegistry, BatchRiskScores, ALERT_LEVELS, score_columns
+from risk_factors import FactorPipeline, FactorFrame, DEFAULT_PIPELINE
+from position_book import PositionBook
+from price_history import PriceHistory
+from position_index import MarketPositionIndex
+from trigger_book import TriggerBook
+from risk_state import RiskState
+from alert_pipeline import AlertPipeline, ALERT_HYSTERESIS
+from price_decoder import PriceDecoder
+from metrics import MetricsRegistry, MetricsServer, DEFAULT_METRICS_PORT
+from latency_trace import LatencyTracer
+from profiling import RuntimeProfiler, DEFAULT_PROFILE_SECONDS
+from position_sync import PositionSync, SyncResult, FetchPage
+from tick_journal import TickJournal, TickJournalReader, iter_instants
+from snapshot import Snapshot, RestoreResult, write_snapshot, DEFAULT_SNAPSHOT_INTERVAL
+from clock import SystemClock
+from backend_integration import SAPPBackendIntegration
+from volatility import VolatilityEngine, VOLATILITY_MODELS, VOLATILITY_HORIZON_SECONDS
+from covariance import CovarianceMatrix, market_exposures
+from monte_carlo import MonteCarloModel, VaRResult, run_monte_carlo
+from stress import ScenarioSet, StressResult, run_stress
+from startup import Readiness, DEFAULT_READY_TIMEOUT
+import async_websocket
+
+if TYPE_CHECKING:
+    from sharded_scoring import ShardedScoring  # multiprocessing só é carregado por start_sharding
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -44,11 +71,31 @@ class PositionData:
 class SAPPRealRiskAnalyzer:
     """Analisador de risco com dados reais do SAPP"""
     
-    def __init__(self, backend_url: str = "http://localhost:5000", ws_url: str = "ws://localhost:8080"):
+    def __init__(self, backend_url: str = "http://localhost:5000", ws_url: str = "ws://localhost:8080",
+                 clock=None, factors: Optional[FactorPipeline] = None):
         self.backend_url = backend_url
         self.ws_url = ws_url
+        self.market_registry = MarketRegistry()
+        self.price_decoder = PriceDecoder(self.market_registry)
+        self.clock = clock or SystemClock()
+        self.position_index = MarketPositionIndex()
+        self._dirty_positions: Set[int] = set()
+        self._dirty_lock = threading.Lock()
+        self._score_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # event loop do modo asyncio
+        self._loop_thread: Optional[int] = None
+        self._score_async: Optional[asyncio.Event] = None
+        self._stop_async: Optional[asyncio.Event] = None
+        self._woken_ns = 0  # primeiro pedido de reprocessamento ainda não atendido (perf_counter_ns)
+        self.risk_state = RiskState()
+        self.volatility_engine = VolatilityEngine()
+        self.volatility_model = 'spread_change'  # ou 'realized' / 'ewma' (ver VOLATILITY_MODELS)
+        self._factors = factors or DEFAULT_PIPELINE  # fatores, pesos e faixas do score (ver risk_factors)
+        self._trigger_bins = self._factors.trigger_bins()
         self.positions: Dict[int, PositionData] = {}
-        self.price_history: Dict[str, List[Tuple[datetime, float]]] = {}
+        self.price_history = PriceHistory()
+        self.covariance = CovarianceMatrix()
         self.current_prices: Dict[str, float] = {}
         self.risk_thresholds = {
             'LOW': 0.3,
@@ -56,15 +103,316 @@ class SAPPRealRiskAnalyzer:
             'HIGH': 0.7,
             'CRITICAL': 0.9
         }
+        self.alert_hysteresis = ALERT_HYSTERESIS
+        self.backend = SAPPBackendIntegration(backend_url, ws_url)
+        self.alert_pipeline = AlertPipeline(self.backend.send_alerts)
         self.running = False
         self.analysis_thread = None
         self.ws = None
         self.connected = False
+        self.readiness = Readiness()  # feed aberto, preços de todos os mercados do livro, primeiro scoring
+        self.ready_timeout = DEFAULT_READY_TIMEOUT
+        self.sync_interval = 30  # segundos entre sincronizações com o contrato
+        self.position_sync = PositionSync()
+        self.metrics_server: Optional[MetricsServer] = None
+        self.profiler = RuntimeProfiler()
+        self.sharding: Optional['ShardedScoring'] = None  # scoring em processos (start_sharding)
+        self._shard_changes: Set[int] = set()           # posições alteradas ainda não enviadas aos shards
+        self.journal: Optional[TickJournal] = None      # gravação dos ticks (start_recording)
+        self.snapshot_path: Optional[str] = None        # snapshots periódicos do estado (start_snapshots)
+        self.snapshot_interval = DEFAULT_SNAPSHOT_INTERVAL
+        self._next_snapshot = 0.0
+        self._last_tick_ns = 0  # timestamp do último preço aplicado (corte do replay após um snapshot)
+        self._register_metrics()
+        
+    def _register_metrics(self):
+        """Métricas do analisador (gauges lidos na coleta não custam nada no caminho quente)"""
+        self.metrics = MetricsRegistry()
+        metrics = self.metrics
+        self._ticks_metric = metrics.counter("ticks_total", "Mensagens de preço recebidas")
+        self._prices_metric = metrics.counter("price_updates_total", "Preços decodificados das mensagens")
+        self._decode_errors_metric = metrics.counter("tick_decode_errors_total", "Mensagens que falharam na decodificação")
+        self._decode_metric = metrics.latency_histogram("tick_decode_seconds", "Tempo de decodificação por mensagem")
+        self._rescored_metric = metrics.histogram("positions_rescored", "Posições reprocessadas por ciclo de scoring")
+        self._scoring_metric = metrics.latency_histogram("rescore_seconds", "Duração de cada ciclo de scoring")
+        self._lag_metric = metrics.latency_histogram(
+            "monitoring_loop_lag_seconds", "Atraso entre o pedido de reprocessamento e o início do scoring")
+        self._alerts_metric = metrics.counter("alerts_generated_total", "Alertas gerados pelo scoring")
+        metrics.gauge("positions", "Posições monitoradas", lambda: len(self.positions))
+        metrics.gauge("dirty_positions", "Posições aguardando reprocessamento", lambda: len(self._dirty_positions))
+        metrics.gauge("alert_queue_depth", "Alertas aguardando envio", lambda: len(self.alert_pipeline))
+        pipeline_stats = self.alert_pipeline.stats
+        metrics.counter("alerts_sent_total", "Alertas entregues ao backend", lambda: pipeline_stats['sent'])
+        metrics.counter("alerts_dropped_total", "Alertas descartados com a fila cheia", lambda: pipeline_stats['dropped'])
+        metrics.counter("alert_batch_failures_total", "Lotes de alertas recusados", lambda: pipeline_stats['failures'])
+        self._sync_metric = metrics.latency_histogram("position_sync_seconds", "Duração de cada sincronização de posições")
+        self._sync_changes_metric = metrics.counter("position_changes_total", "Alterações de posições aplicadas")
+        self.tracer = LatencyTracer(metrics)
+        self.alert_pipeline.on_delivered = self.tracer.delivered
+        
+    @property
+    def clock(self):
+        """Relógio dos prazos e timestamps do analisador (SystemClock ou VirtualClock no replay)"""
+        return self._clock
+        
+    @clock.setter
+    def clock(self, clock):
+        self._clock = clock
+        self.price_decoder.time_ns = clock.time_ns
+        
+    @property
+    def factors(self) -> FactorPipeline:
+        """Pipeline de fatores do score (pesos, faixas e fatores extras, ver FactorPipeline)"""
+        return self._factors
+        
+    @factors.setter
+    def factors(self, factors: FactorPipeline):
+        if self.sharding is not None:
+            raise ValueError("Troque os fatores antes de iniciar o scoring em shards")
+        self._factors = factors
+        self._trigger_bins = factors.trigger_bins()
+        # Níveis de gatilho e scores em cache seguiam as faixas antigas
+        self.trigger_book = self._new_trigger_book()
+        with self._dirty_lock:
+            self._dirty_positions = set(self._positions)
+        self._wake_scoring()
+        
+    def _new_trigger_book(self) -> TriggerBook:
+        """Gatilhos com as faixas do pipeline (sem faixas: ver _mark_crossed_positions)"""
+        if self._trigger_bins is None:
+            return TriggerBook()
+        spread_bins, ratio_bins = self._trigger_bins
+        return TriggerBook(spread_bins=spread_bins, ratio_bins=ratio_bins)
+        
+    def _trigger_bins_state(self) -> Optional[List[List[float]]]:
+        """Faixas dos gatilhos no formato do snapshot"""
+        return None if self._trigger_bins is None else [bins.tolist() for bins in self._trigger_bins]
+        
+    def export_latency_trace(self, path: str) -> int:
+        """Grava os traces tick → alerta no formato Chrome Trace Event (ver LatencyTracer)"""
+        return self.tracer.export_trace(path)
+        
+    def start_profiling(self, duration: float = DEFAULT_PROFILE_SECONDS, mode: str = 'sampling') -> bool:
+        """Abre uma janela de profiling sem parar o monitoramento (ver RuntimeProfiler)"""
+        return self.profiler.start(duration, mode)
+        
+    def install_profiling_signals(self, duration: float = DEFAULT_PROFILE_SECONDS, loop=None):
+        """SIGUSR1/SIGUSR2 iniciam uma janela de profiling por amostragem/determinística"""
+        self.profiler.install_signal_handlers(duration, loop)
+        
+    def start_sharding(self, workers: Optional[int] = None, timeout: float = 60.0,
+                       log_level: Optional[int] = None) -> 'ShardedScoring':
+        """
+        Passa o scoring para workers em processos separados (ver ShardedScoring):
+        este processo só decodifica os ticks e publica os preços no quadro
+        compartilhado; os alertas dos workers entram no alert_pipeline local.
+        """
+        if self.sharding is not None:
+            return self.sharding
+        from sharded_scoring import ShardedScoring
+
+        settings = {
+            'risk_thresholds': dict(self.risk_thresholds),
+            'alert_hysteresis': self.alert_hysteresis,
+            'volatility_model': self.volatility_model,
+            'factors': self.factors,
+        }
+        sharding = ShardedScoring(self.positions, workers, on_alerts=self._merge_shard_alerts, settings=settings,
+                                  log_level=log_level)
+        if self.current_prices:
+            sharding.update_prices(self.current_prices)
+        sharding.start(timeout)
+        self.sharding = sharding
+        return sharding
+        
+    def stop_sharding(self):
+        """Encerra os workers e volta ao scoring neste processo"""
+        sharding, self.sharding = self.sharding, None
+        self._shard_changes.clear()
+        if sharding is not None:
+            sharding.stop()
+            self.risk_state.clear()
+            with self._dirty_lock:
+                self._dirty_positions = set(self._positions)
+            self._wake_scoring()
+            
+    def _merge_shard_alerts(self, batch: List[Dict]):
+        """Lote de alertas de um worker (thread de alertas do ShardedScoring)"""
+        for payload in batch:
+            self._alerts_metric.inc()
+            self.alert_pipeline.submit_payload(payload)
+            
+    def start_recording(self, directory: str, **options) -> TickJournal:
+        """Grava cada lote de ticks decodificado no diário em directory (ver TickJournal)"""
+        if self.journal is None:
+            self.journal = TickJournal(directory, self.market_registry, **options)
+            logger.info(f"📼 Gravando ticks em {directory}")
+        return self.journal
+        
+    def stop_recording(self):
+        """Grava os ticks pendentes e fecha o segmento atual do diário"""
+        journal, self.journal = self.journal, None
+        if journal is not None:
+            journal.close()
+            stats = journal.stats
+            logger.info(f"📼 {stats['ticks']} ticks gravados em {stats['segments']} segmentos "
+                        f"({stats['dropped']} descartados)")
+            
+    def start_snapshots(self, path: str, interval: float = DEFAULT_SNAPSHOT_INTERVAL):
+        """Grava o estado completo em path a cada interval segundos e ao parar (ver save_snapshot)"""
+        self.snapshot_path = path
+        self.snapshot_interval = interval
+        self._next_snapshot = self._clock.monotonic() + interval
+        
+    def export_state(self) -> Dict:
+        """
+        Estado completo do analisador para snapshot: livro, preços, históricos,
+        volatilidade, covariância, scores, tiers e níveis de alerta (histerese),
+        gatilhos e cursor de sincronização. Arrays copiados: o resultado pode
+        ser gravado em outra thread enquanto o analisador segue.
+        """
+        if self.sharding is not None:
+            raise ValueError("Snapshot não suporta scoring em shards (o estado de risco fica nos workers)")
+        with self._dirty_lock:
+            dirty = np.fromiter(self._dirty_positions, dtype=np.int64, count=len(self._dirty_positions))
+        return {
+            'analyzer': {
+                'current_prices': dict(self.current_prices),
+                'risk_thresholds': dict(self.risk_thresholds),
+                'alert_hysteresis': self.alert_hysteresis,
+                'volatility_model': self.volatility_model,
+                'trigger_bins': self._trigger_bins_state(),
+                'last_tick_ns': self._last_tick_ns,
+                'dirty_positions': dirty,
+            },
+            'positions': self._positions.export_state(),
+            'risk_state': self.risk_state.export_state(),
+            'trigger_book': self.trigger_book.export_state(),
+            'price_history': self.price_history.export_state(),
+            'volatility': self.volatility_engine.export_state(),
+            'covariance': self.covariance.export_state(),
+            'position_sync': self.position_sync.export_state(),
+        }
+        
+    def save_snapshot(self, path: Optional[str] = None) -> int:
+        """Grava o snapshot (em path ou no de start_snapshots); retorna o tamanho em bytes"""
+        return write_snapshot(path or self.snapshot_path, self.export_state())
+        
+    def restore_snapshot(self, path: str, journal_dir: Optional[str] = None) -> RestoreResult:
+        """
+        Reinício a quente: mapeia o snapshot (arrays usados sem cópia),
+        substitui todo o estado do analisador, aplica os ticks do diário em
+        journal_dir posteriores ao snapshot e reprocessa as posições cujos
+        limites eles cruzaram. Ao retornar, os scores em cache valem para os
+        preços atuais.
+        """
+        if self.sharding is not None:
+            raise ValueError("Restaure o snapshot antes de iniciar o scoring em shards")
+        start = time.perf_counter()
+        snapshot = Snapshot(path)
+        state = snapshot.state
+        book = PositionBook.from_state(state['positions'])
+        self.market_registry = book.registry
+        self.price_decoder.registry = book.registry
+        if self.journal is not None:
+            self.journal.registry = book.registry
+        self._positions = book
+        book.subscribe(self._on_position_changed)
+        self.position_index.rebuild_columns(book.columns(), book.registry.names)
+        analyzer = state['analyzer']
+        self.trigger_book = self._new_trigger_book()
+        # Gatilhos gravados com outras faixas de fatores não valem: reprocessar o livro inteiro
+        same_bins = analyzer.get('trigger_bins', False) == self._trigger_bins_state()
+        if same_bins:
+            self.trigger_book.restore_state(state['trigger_book'])
+        self.risk_state.restore_state(state['risk_state'])
+        self.price_history.restore_state(state['price_history'])
+        self.volatility_engine.restore_state(state['volatility'])
+        self.covariance.restore_state(state['covariance'])
+        self.position_sync.restore_state(state['position_sync'])
+        self.current_prices.clear()
+        self.current_prices.update(analyzer['current_prices'])
+        self.risk_thresholds = analyzer['risk_thresholds']
+        self.alert_hysteresis = analyzer['alert_hysteresis']
+        self.volatility_model = analyzer['volatility_model']
+        self._last_tick_ns = analyzer['last_tick_ns']
+        with self._dirty_lock:
+            self._dirty_positions = set(analyzer['dirty_positions'].tolist()) if same_bins else set(book)
+        result = RestoreResult(positions=len(book), created_ns=snapshot.created_ns)
+        mapped = time.perf_counter()
+        result.map_seconds = mapped - start
+        
+        # Ticks recebidos depois do snapshot (gravados pelo processo anterior)
+        if journal_dir is not None and os.path.isdir(journal_dir):
+            reader = TickJournalReader(journal_dir)
+            try:
+                batches = list(reader.iter_batches(self._last_tick_ns + 1))
+                result.ticks = sum(len(batch) for batch in batches)
+                for timestamp_ns, updates in iter_instants(batches, reader.markets):
+                    self.update_prices(updates, timestamp_ns)
+                    result.instants += 1
+            finally:
+                batches = None
+                reader.close()
+        replayed = time.perf_counter()
+        result.replay_seconds = replayed - mapped
+        
+        result.rescored = self._rescore_dirty_positions()
+        result.score_seconds = time.perf_counter() - replayed
+        logger.info(f"♻️ Estado restaurado de {path}: {result.positions} posições, {result.ticks} ticks "
+                    f"reaplicados, {result.rescored} reprocessadas em {result.seconds * 1e3:.0f} ms")
+        return result
+        
+    def _save_periodic_snapshot(self):
+        """Snapshot do ciclo de monitoramento (erros só são registrados)"""
+        start = time.perf_counter()
+        try:
+            size = self.save_snapshot()
+        except Exception as e:
+            logger.error(f"❌ Erro ao gravar snapshot: {e}")
+            return
+        logger.info(f"💾 Snapshot gravado em {self.snapshot_path} ({size / 1e6:.1f} MB, "
+                    f"{(time.perf_counter() - start) * 1e3:.0f} ms)")
+            
+    def serve_metrics(self, port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1") -> MetricsServer:
+        """Expõe as métricas no formato do Prometheus em http://host:port/metrics"""
+        if self.metrics_server is None:
+            self.metrics_server = self.metrics.serve(port, host)
+            logger.info(f"📈 Métricas em http://{host}:{self.metrics_server.port}/metrics")
+        return self.metrics_server
+        
+    @property
+    def positions(self) -> PositionBook:
+        """Posições monitoradas (alterações atualizam o índice por mercado)"""
+        return self._positions
+        
+    @positions.setter
+    def positions(self, positions: Dict[int, PositionData]):
+        if isinstance(positions, PositionBook):
+            # Adotar o livro (e seu registry de mercados) sem copiar
+            self.market_registry = positions.registry
+            self.price_decoder.registry = positions.registry
+            if self.journal is not None:
+                self.journal.registry = positions.registry
+            self._positions = positions
+        else:
+            self._positions = PositionBook(positions, registry=self.market_registry)
+        self._positions.subscribe(self._on_position_changed)
+        self.position_index.rebuild_columns(self._positions.columns(), self._positions.registry.names)
+        for leg1_market, leg2_market in self.position_index.pairs():
+            self.volatility_engine.track(leg1_market, leg2_market)
+        self.trigger_book = self._new_trigger_book()
+        self.risk_state.clear()
+        with self._dirty_lock:
+            self._dirty_positions = set(self._positions)
+        self._wake_scoring()
         
     def start_monitoring(self):
         """Inicia o monitoramento contínuo"""
         logger.info("🚀 Iniciando monitoramento de risco com dados reais...")
         self.running = True
+        self._stop_event.clear()
+        self.alert_pipeline.start()
         
         # Conectar WebSocket para preços em tempo real
         self._connect_websocket()
@@ -75,21 +423,35 @@ class SAPPRealRiskAnalyzer:
         self.analysis_thread.start()
         
     def stop_monitoring(self):
-        """Para o monitoramento"""
+        """Para o monitoramento (no modo asyncio apenas sinaliza; run_async encerra sozinho)"""
         logger.info("🛑 Parando monitoramento de risco...")
+        loop = self._loop
+        if loop is not None:
+            if threading.get_ident() == self._loop_thread:
+                self._stop_async.set()
+            else:
+                loop.call_soon_threadsafe(self._stop_async.set)
+            return
         self.running = False
+        self._stop_event.set()
+        self._score_event.set()
         if self.analysis_thread:
             self.analysis_thread.join()
+        self.stop_sharding()
+        self.stop_recording()
+        self.alert_pipeline.stop()
         if self.ws:
             self.ws.close()
             
     def _connect_websocket(self):
         """Conecta ao WebSocket para preços em tempo real"""
         try:
+            import websocket  # websocket-client só é carregado pelo feed em thread (o asyncio tem o seu)
+            
             self.ws = websocket.WebSocketApp(
                 self.ws_url,
                 on_open=self._on_open,
-                on_message=self._on_message,
+                on_message=lambda ws, message: self.profiler.call(self._on_message, ws, message),
                 on_error=self._on_error,
                 on_close=self._on_close
             )
@@ -106,23 +468,44 @@ class SAPPRealRiskAnalyzer:
         """Callback de conexão aberta"""
         logger.info("🔗 WebSocket conectado - recebendo preços em tempo real")
         self.connected = True
+        self.readiness.mark('open')
         
     def _on_message(self, ws, message):
-        """Callback de mensagem recebida"""
+        """Callback de mensagem recebida (decodificada direto em ticks tipados)"""
+        self._ticks_metric.inc()
+        trace = self.tracer.received()
         try:
-            data = json.loads(message)
-            
-            # Processar dados de preços
-            if 'prices' in data:
-                self._process_price_update(data['prices'])
-            elif 'crypto' in data:
-                self._process_crypto_prices(data['crypto'])
-            elif 'commodity' in data:
-                self._process_commodity_prices(data['commodity'])
+            start = time.perf_counter_ns() if trace is None else trace.received_ns
+            try:
+                ticks = self.price_decoder.decode(message)
+            except ValueError:
+                self._decode_errors_metric.inc()
+                raise
+            decoded = time.perf_counter_ns()
+            self._decode_metric.observe(decoded - start)
+            if len(ticks):
+                self._prices_metric.inc(len(ticks))
+                journal = self.journal
+                if journal is not None:
+                    journal.append(ticks)
+                self.apply_price_ticks(ticks)
+                if not self.readiness.is_set() and self._prices_complete():
+                    self.readiness.mark('prices')
+                
+            if trace is not None:
+                trace.decoded_ns = decoded
+                sent_ns = int(ticks['timestamp_ns'][0]) if len(ticks) else None
+                with self._dirty_lock:
+                    self.tracer.indexed(trace, sent_ns, awaits_scoring=bool(self._dirty_positions))
                 
         except Exception as e:
             logger.error(f"❌ Erro ao processar mensagem WebSocket: {e}")
             
+    def _prices_complete(self) -> bool:
+        """Há preço para todos os mercados conhecidos (os das posições inclusos): snapshot completo"""
+        current_prices = self.current_prices
+        return all(market in current_prices for market in self.market_registry.names)
+        
     def _on_error(self, ws, error):
         """Callback de erro"""
         logger.error(f"❌ Erro WebSocket: {error}")
@@ -136,10 +519,12 @@ class SAPPRealRiskAnalyzer:
     def _process_price_update(self, prices: Dict):
         """Processa atualização de preços"""
         try:
+            updates = {}
             for market, price_data in prices.items():
                 if isinstance(price_data, dict) and 'price' in price_data:
-                    self.current_prices[market] = price_data['price']
-                    logger.info(f"📊 Preço atualizado: {market} = ${price_data['price']:.2f}")
+                    updates[market] = price_data['price']
+                    
+            self.update_prices(updates)
                     
         except Exception as e:
             logger.error(f"❌ Erro ao processar preços: {e}")
@@ -147,9 +532,12 @@ class SAPPRealRiskAnalyzer:
     def _process_crypto_prices(self, crypto_prices: Dict):
         """Processa preços de cripto"""
         try:
+            updates = {}
             for crypto, price_data in crypto_prices.items():
                 if isinstance(price_data, dict) and 'price' in price_data:
-                    self.current_prices[crypto] = price_data['price']
+                    updates[crypto] = price_data['price']
+                    
+            self.update_prices(updates)
                     
         except Exception as e:
             logger.error(f"❌ Erro ao processar preços de crypto: {e}")
@@ -157,116 +545,477 @@ class SAPPRealRiskAnalyzer:
     def _process_commodity_prices(self, commodity_prices: Dict):
         """Processa preços de commodities"""
         try:
+            updates = {}
             for commodity, price_data in commodity_prices.items():
                 if isinstance(price_data, dict) and 'price' in price_data:
-                    self.current_prices[commodity] = price_data['price']
+                    updates[commodity] = price_data['price']
+                    
+            self.update_prices(updates)
                     
         except Exception as e:
             logger.error(f"❌ Erro ao processar preços de commodities: {e}")
             
+    def apply_price_ticks(self, ticks: np.ndarray):
+        """Aplica registros TICK_DTYPE do PriceDecoder"""
+        names = self.market_registry.names
+        self.update_prices({
+            names[market_id]: price
+            for market_id, price in zip(ticks['market_id'].tolist(), ticks['price'].tolist())
+        }, int(ticks['timestamp_ns'][-1]))
+        
+    def update_prices(self, updates: Dict[str, float], timestamp_ns: Optional[int] = None):
+        """Aplica novos preços e marca as posições afetadas para reprocessamento"""
+        if self.sharding is not None:
+            # Histórico, volatilidade e gatilhos ficam nos workers
+            self.current_prices.update(updates)
+            self.sharding.update_prices(updates)
+            return
+        now = self._clock.time_ns() if timestamp_ns is None else timestamp_ns
+        self._last_tick_ns = now
+        for market, price in updates.items():
+            self.price_history.record(market, price, now)
+        self.covariance.update(updates, now)
+            
+        changed = {market: price for market, price in updates.items() if self.current_prices.get(market) != price}
+        self.current_prices.update(updates)
+        if changed:
+            self._mark_crossed_positions(changed)
+            
+        # Volatilidade por par: O(1) por par afetado, compartilhada entre posições
+        changed_pairs = self.volatility_engine.on_prices(updates.keys(), self.current_prices, now)
+        if changed_pairs and self.volatility_model != 'spread_change' and 'pair_volatility' in self._factors.inputs:
+            affected = self.position_index.positions_for_pairs(changed_pairs)
+            if affected:
+                with self._dirty_lock:
+                    self._dirty_positions.update(affected)
+                self._wake_scoring()
+            
+    def _mark_crossed_positions(self, changed: Dict[str, float]):
+        """Marca apenas as posições cujo limite de tier foi cruzado pelos novos preços"""
+        crossed: Set[int] = set()
+        if self._trigger_bins is None:
+            # Fator que depende dos preços fora das faixas conhecidas: todas as posições dos mercados
+            crossed.update(self.position_index.positions_for(changed.keys()))
+        for market, price in changed.items():
+            market_id = self.market_registry.get(market)
+            if market_id is not None:
+                crossed.update(self.trigger_book.crossed(market_id, price).tolist())
+                
+        if crossed:
+            with self._dirty_lock:
+                self._dirty_positions.update(crossed)
+            self._wake_scoring()
+            
+    def mark_position_dirty(self, position_id: int):
+        """Força o reprocessamento de uma posição (ex.: margem ou tamanho alterados)"""
+        with self._dirty_lock:
+            self._dirty_positions.add(position_id)
+        self._wake_scoring()
+        
+    def _wake_scoring(self):
+        """Acorda o reprocessamento (thread de análise ou corrotina do modo asyncio)"""
+        if not self._woken_ns:
+            self._woken_ns = time.perf_counter_ns()
+        self._score_event.set()
+        loop = self._loop
+        if loop is not None:
+            if threading.get_ident() == self._loop_thread:
+                self._score_async.set()
+            else:
+                loop.call_soon_threadsafe(self._score_async.set)
+        
+    def _on_position_changed(self, position_id: int, old: Optional[PositionData], new: Optional[PositionData]):
+        """Mantém o índice por mercado em dia com o dicionário de posições"""
+        if self.sharding is not None:
+            self._shard_changes.add(position_id)
+        if old is not None:
+            self.position_index.remove(position_id, old)
+            if new is None:
+                self.risk_state.remove(position_id)
+            else:
+                self.risk_state.invalidate(position_id)
+        if new is not None:
+            self.position_index.add(position_id, new)
+            self.volatility_engine.track(new.leg1_market, new.leg2_market)
+            self.mark_position_dirty(position_id)
+        else:
+            self.trigger_book.remove(position_id)
+            with self._dirty_lock:
+                self._dirty_positions.discard(position_id)
+                
+    def rescore_pending(self) -> int:
+        """
+        Reprocessa já as posições marcadas, sem esperar o próximo ciclo do
+        monitoramento (ex.: antes de get_risk_summary). Retorna quantas
+        posições foram reprocessadas.
+        """
+        return self._rescore_dirty_positions()
+
+    def _rescore_dirty_positions(self) -> int:
+        """Reprocessa apenas as posições marcadas e gera os alertas"""
+        if self.sharding is not None:
+            with self._dirty_lock:
+                self._dirty_positions.clear()  # os workers reprocessam seus shards
+            return 0
+        start = time.perf_counter_ns()
+        with self._dirty_lock:
+            dirty, self._dirty_positions = self._dirty_positions, set()
+            woken, self._woken_ns = self._woken_ns, 0
+            traces = self.tracer.take_pending()
+        if woken:
+            self._lag_metric.observe(start - woken)
+            
+        columns = self.positions.columns(np.fromiter(dirty, dtype=np.int64, count=len(dirty))) if dirty else None
+        if columns is None or not len(columns):
+            self.tracer.scored(traces, start, time.perf_counter_ns())
+            return 0
+            
+        with self._scoring_metric.time():
+            self._score_dirty_columns(columns, traces, start)
+        self._rescored_metric.observe(len(columns))
+        return len(columns)
+        
+    def _score_dirty_columns(self, columns, traces: List = (), started_ns: int = 0):
+        """
+        Scoring, níveis de gatilho, estado de risco e alertas de um conjunto de
+        posições. traces são os ticks cobertos pelo ciclo (ver LatencyTracer).
+        """
+        prices = self.market_registry.price_vector(self.current_prices)
+        scores = self._score_columns(columns, prices)
+        
+        # Recalcular os níveis de gatilho das posições reavaliadas
+        self.trigger_book.update(columns, prices)
+        
+        # Atualizar spread atual
+        valid = ~np.isnan(scores.current_spread)
+        self.positions.set_current_spreads(columns.position_ids[valid], scores.current_spread[valid])
+        
+        # Guardar score e tier (contadores por tier ajustados nas transições)
+        tiers = scores.tiers(self.risk_thresholds)
+        band_tiers = scores.tiers(self.risk_thresholds, band=self.alert_hysteresis)
+        previous, alert_tiers = self.risk_state.update(columns.position_ids, scores.total, tiers, band_tiers)
+        if traces:
+            self.tracer.scored(traces, started_ns, time.perf_counter_ns())
+        origin = traces[0] if traces else None  # tick mais antigo do ciclo
+        
+        # Gerar alertas apenas quando o nível de alerta da posição muda
+        for row in np.flatnonzero((alert_tiers != previous) & (alert_tiers > 0)):
+            position = self.positions[columns.position_ids[row]]
+            alert = self._generate_alert(position, float(scores.total[row]), ALERT_LEVELS[alert_tiers[row] - 1])
+            
+            if alert:
+                self._alerts_metric.inc()
+                if origin is not None:
+                    self.tracer.enqueued(origin, alert.position_id, alert.alert_type)
+                self._handle_alert(alert)
+            
     def _monitoring_loop(self):
         """Loop principal de monitoramento"""
+        clock = self._clock
+        next_sync = 0.0
         while self.running:
             try:
-                # Atualizar dados das posições do smart contract
-                self._update_positions_from_contract()
+                next_sync = self._monitoring_step(clock.monotonic(), next_sync)
                 
-                # Analisar cada posição
-                for position_id, position in self.positions.items():
-                    risk_score = self._calculate_risk_score(position)
-                    alert = self._generate_alert(position, risk_score)
-                    
-                    if alert:
-                        self._handle_alert(alert)
-                        
-                # Aguardar próxima análise (30 segundos)
-                time.sleep(30)
+                # Aguardar próximo tick ou próxima sincronização
+                clock.wait(self._score_event, max(0.0, next_sync - clock.monotonic()))
                 
             except Exception as e:
                 logger.error(f"❌ Erro no loop de monitoramento: {e}")
-                time.sleep(10)
+                clock.wait(self._stop_event, 10)
+                
+    def _monitoring_step(self, now: float, next_sync: float, fetch: Optional[FetchPage] = None) -> float:
+        """
+        Um ciclo do monitoramento no instante now (segundos do relógio do
+        analisador): sincroniza as posições se next_sync venceu e reprocessa
+        as posições marcadas. Retorna o prazo da próxima sincronização.
+        """
+        # Atualizar dados das posições do smart contract
+        if now >= next_sync:
+            self._update_positions_from_contract(fetch)
+            next_sync = now + self.sync_interval
+            
+        # Reprocessar apenas as posições afetadas pelos últimos ticks
+        self._score_event.clear()
+        priced = self.readiness.is_set('prices')
+        self.profiler.call(self._rescore_dirty_positions)
+        if priced:
+            self.readiness.mark('scored')
+        
+        if self.snapshot_path is not None and now >= self._next_snapshot:
+            self._save_periodic_snapshot()
+            self._next_snapshot = now + self.snapshot_interval
+        return next_sync
                 
-    def _update_positions_from_contract(self):
-        """Atualiza posições do smart contract via backend"""
+    # ----- modo asyncio -----
+    
+    async def run_async(self):
+        """
+        Modo asyncio: leitura do WebSocket, reprocessamento, envio de alertas
+        e sincronização de posições como corrotinas em um único event loop.
+        Retorna quando stop_monitoring é chamado (de qualquer thread).
+        """
+        logger.info("🚀 Iniciando monitoramento de risco (asyncio)...")
+        self._score_async = asyncio.Event()
+        self._stop_async = asyncio.Event()
+        self._loop_thread = threading.get_ident()
+        self._loop = asyncio.get_running_loop()
+        self.running = True
+        
+        alerts = asyncio.create_task(self.alert_pipeline.run_async(self.backend.send_alerts_async))
+        workers = [
+            asyncio.create_task(self._feed_async()),
+            asyncio.create_task(self._sync_async()),
+        ]
+        if self.snapshot_path is not None:
+            workers.append(asyncio.create_task(self._snapshot_async()))
+        scoring = asyncio.create_task(self._scoring_async())
         try:
-            # Em produção, faria chamada para o backend que consulta o smart contract
-            # Por enquanto, vamos simular com dados estáticos
-            # TODO: Implementar chamada real para o backend
+            await self._stop_async.wait()
+        finally:
+            self.running = False
+            for task in workers:
+                task.cancel()
+            if not self.readiness.is_set('prices'):
+                scoring.cancel()  # ainda esperando o primeiro snapshot de preços
+            self._score_async.set()
+            await asyncio.gather(*workers, scoring, return_exceptions=True)
+            if self.snapshot_path is not None:
+                self._save_periodic_snapshot()
+            self.stop_sharding()
+            self.stop_recording()
             
-            # Simular posições ativas (em produção viria do contrato)
-            if not self.positions:
-                # Adicionar posições de teste se não existirem
-                self.positions[1] = PositionData(
-                    position_id=1,
-                    leg1_market="WTI",
-                    leg2_market="Brent",
-                    leg1_size=1000,
-                    leg2_size=-1000,
-                    margin=1000000,
-                    entry_spread=-400000000000,  # -$4.00
-                    current_spread=-400000000000,  # -$4.00
-                    timestamp=datetime.now()
-                )
+            # Alertas gerados até aqui ainda são enviados
+            self.alert_pipeline.request_stop()
+            await asyncio.gather(alerts, return_exceptions=True)
+            await self.backend.close_async()
+            self._loop = None
+            self._loop_thread = None
+            logger.info("🛑 Monitoramento asyncio encerrado")
+            
+    async def _wait_stop(self, timeout: float) -> bool:
+        """Espera até timeout segundos ou até o pedido de parada (True se parou)"""
+        try:
+            await asyncio.wait_for(self._stop_async.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+            
+    async def _feed_async(self):
+        """Lê o WebSocket de preços, reconectando com espera exponencial"""
+        delay = 1.0
+        while self.running:
+            try:
+                ws = await async_websocket.connect(self.ws_url)
+            except (OSError, asyncio.TimeoutError, async_websocket.WebSocketError) as e:
+                logger.error(f"❌ Erro ao conectar WebSocket: {e}")
+                if await self._wait_stop(delay):
+                    return
+                delay = min(delay * 2, 30.0)
+                continue
+                
+            self.ws = ws
+            self._on_open(ws)
+            delay = 1.0
+            try:
+                async for message in ws:
+                    self.profiler.call(self._on_message, ws, message)
+            except (OSError, async_websocket.WebSocketError) as e:
+                self._on_error(ws, e)
+            finally:
+                await ws.close()
+                self.ws = None
+                self._on_close(ws, None, None)
+                
+    async def _scoring_async(self):
+        """Reprocessa as posições marcadas sempre que um tick ou alteração acorda o loop"""
+        # Antes do primeiro snapshot completo de preços um scoring do livro seria refeito logo em seguida
+        if not await self.readiness.wait_async('prices', self.ready_timeout):
+            logger.warning(f"⚠️ Sem preços de todos os mercados após {self.ready_timeout:.0f}s: "
+                           f"reprocessando com os disponíveis")
+        while self.running:
+            self._score_async.clear()
+            priced = self.readiness.is_set('prices')
+            try:
+                self.profiler.call(self._rescore_dirty_positions)
+                if priced:
+                    self.readiness.mark('scored')
+            except Exception as e:
+                logger.error(f"❌ Erro no loop de monitoramento: {e}")
+            await self._score_async.wait()
+            
+    async def _sync_async(self):
+        """Sincroniza as posições com o contrato a cada sync_interval segundos"""
+        while self.running:
+            await self._update_positions_from_contract_async()
+            if await self._wait_stop(self.sync_interval):
+                return
+                
+    async def _snapshot_async(self):
+        """
+        Snapshot a cada snapshot_interval segundos: o estado é copiado no
+        event loop (consistente) e gravado no executor padrão
+        """
+        loop = asyncio.get_running_loop()
+        while self.running:
+            if await self._wait_stop(self.snapshot_interval):
+                return
+            start = time.perf_counter()
+            try:
+                size = await loop.run_in_executor(None, write_snapshot, self.snapshot_path, self.export_state())
+            except Exception as e:
+                logger.error(f"❌ Erro ao gravar snapshot: {e}")
+                continue
+            logger.info(f"💾 Snapshot gravado em {self.snapshot_path} ({size / 1e6:.1f} MB, "
+                        f"{(time.perf_counter() - start) * 1e3:.0f} ms)")
                 
+    def _update_positions_from_contract(self, fetch: Optional[FetchPage] = None):
+        """
+        Aplica as posições abertas, alteradas e fechadas no backend desde a
+        última sincronização (fetch substitui a rota do backend, ex.: no replay)
+        """
+        start = time.perf_counter_ns()
+        try:
+            if fetch is None:
+                result = self.position_sync.sync(self.positions, self.backend.get_position_changes,
+                                                 self.backend.get_position_listing)
+            else:
+                result = self.position_sync.sync(self.positions, fetch)
         except Exception as e:
             logger.error(f"❌ Erro ao atualizar posições: {e}")
+            return
+        self._sync_finished(result, start)
+        
+    async def _update_positions_from_contract_async(self):
+        """Sincronização incremental das posições pelo cliente asyncio"""
+        start = time.perf_counter_ns()
+        try:
+            result = await self.position_sync.sync_async(self.positions, self.backend.get_position_changes_async,
+                                                         self.backend.get_position_listing_async)
+        except Exception as e:
+            logger.error(f"❌ Erro ao atualizar posições: {e}")
+            return
+        self._sync_finished(result, start)
+        
+    def _sync_finished(self, result: SyncResult, started_ns: int):
+        self._sync_metric.observe(time.perf_counter_ns() - started_ns)
+        self._sync_changes_metric.inc(result.applied)
+        if result.applied:
+            logger.info(f"🔄 Posições sincronizadas (versão {result.version}): {result.opened} abertas, "
+                        f"{result.changed} alteradas, {result.closed} fechadas")
+        self._forward_shard_changes()
+            
+    def _forward_shard_changes(self):
+        """Envia aos shards donos as posições abertas, alteradas ou fechadas desde o último envio"""
+        if self.sharding is None or not self._shard_changes:
+            return
+        changed, self._shard_changes = self._shard_changes, set()
+        self.sharding.update_positions(self.positions, changed)
             
     def _calculate_risk_score(self, position: PositionData) -> float:
         """Calcula score de risco para uma posição (0-1) com dados reais"""
         try:
-            # 1. Análise de volatilidade do spread (REAL)
-            volatility_score = self._calculate_volatility_risk_real(position)
+            frame = self._position_factors(position)
+            self._update_current_spread(position, frame)
+            return float(frame.total[0])
             
-            # 2. Análise de margem (REAL)
-            margin_score = self._calculate_margin_risk_real(position)
+        except Exception as e:
+            logger.error(f"❌ Erro ao calcular score de risco: {e}")
+            return 0.5  # Score neutro em caso de erro
             
-            # 3. Análise de tendência (REAL)
-            trend_score = self._calculate_trend_risk_real(position)
+    def _position_factors(self, position: PositionData) -> FactorFrame:
+        """
+        Avalia o pipeline de fatores para uma posição: preços lidos uma vez e
+        cada intermediária (spread, valor, margem necessária) calculada uma vez
+        para todos os fatores
+        """
+        pair_volatility = np.nan
+        if self.volatility_model != 'spread_change' and 'pair_volatility' in self._factors.inputs:
+            # Volatilidade realizada/EWMA do par, quando já aquecida
+            score = self.volatility_engine.score(position.leg1_market, position.leg2_market, self.volatility_model)
+            if score is not None:
+                pair_volatility = score
+        return self._factors.evaluate({
+            'leg1_price': np.array([self.current_prices.get(position.leg1_market, 0)], dtype=np.float64),
+            'leg2_price': np.array([self.current_prices.get(position.leg2_market, 0)], dtype=np.float64),
+            'leg1_size': np.array([position.leg1_size], dtype=np.int64),
+            'leg2_size': np.array([position.leg2_size], dtype=np.int64),
+            'margin': np.array([position.margin], dtype=np.int64),
+            'entry_spread': np.array([position.entry_spread], dtype=np.float64),
+            'pair_volatility': np.array([pair_volatility]),
+        })
+        
+    def _update_current_spread(self, position: PositionData, frame: FactorFrame):
+        """Atualiza o spread atual da posição (ou avisa que faltam preços)"""
+        if frame.valid[0]:
+            position.current_spread = float(frame.values['current_spread'][0])
+        else:
+            logger.warning(f"⚠️ Preços não disponíveis para {position.leg1_market} ou {position.leg2_market}")
             
-            # 4. Análise de liquidação (REAL)
-            liquidation_score = self._calculate_liquidation_risk_real(position)
+    def calculate_risk_scores_batch(self) -> BatchRiskScores:
+        """Calcula o score de risco de todas as posições de uma vez"""
+        prices = self.market_registry.price_vector(self.current_prices)
+        return self._score_columns(self.positions.columns(), prices)
+        
+    def _score_columns(self, columns, prices: np.ndarray) -> BatchRiskScores:
+        """Aplica o kernel vetorizado com o modelo de volatilidade configurado"""
+        return score_columns(columns, prices, self._volatility_row_scores(columns), self._factors)
+        
+    def _volatility_row_scores(self, columns) -> Optional[np.ndarray]:
+        """Scores de volatilidade por par (None no modelo padrão de mudança do spread)"""
+        if self.volatility_model not in VOLATILITY_MODELS:
+            raise ValueError(f"Modelo de volatilidade desconhecido: {self.volatility_model}")
+        if self.volatility_model == 'spread_change' or 'pair_volatility' not in self._factors.inputs:
+            return None
+        return self.volatility_engine.row_scores(columns, self.market_registry.names, self.volatility_model)
             
-            # Score final (média ponderada)
-            risk_score = (
-                volatility_score * 0.3 +
-                margin_score * 0.3 +
-                trend_score * 0.2 +
-                liquidation_score * 0.2
-            )
+    def portfolio_variance(self, position_ids: Optional[Iterable[int]] = None,
+                           horizon_seconds: float = VOLATILITY_HORIZON_SECONDS) -> float:
+        """Variância do P&L do conjunto de posições (todas por padrão) no horizonte"""
+        if position_ids is not None:
+            position_ids = np.fromiter(position_ids, dtype=np.int64)
+        columns = self.positions.columns(position_ids)
+        prices = self.market_registry.price_vector(self.current_prices)
+        exposures = market_exposures(columns, prices)
+        return self.covariance.variance(self.covariance.align(self.market_registry, exposures), horizon_seconds)
             
-            return min(1.0, max(0.0, risk_score))
+    def portfolio_var(self, horizon: float = VOLATILITY_HORIZON_SECONDS, confidence: float = 0.99,
+                      paths: int = 100000, seed: int = 0, workers: Optional[int] = None) -> VaRResult:
+        """
+        VaR, expected shortfall e liquidações esperadas da carteira no horizonte
+        (segundos), simulando preços correlacionados pela matriz de covariância
+        """
+        prices = self.market_registry.price_vector(self.current_prices)
+        columns = self.positions.columns()
+        valid = (prices[columns.leg1_ids] != 0) & (prices[columns.leg2_ids] != 0)
+        columns = columns.take(valid)
+        
+        # Covariância no horizonte reindexada pelo registry do livro
+        covariance_ids = np.array([
+            -1 if self.covariance.registry.get(market) is None else self.covariance.registry.get(market)
+            for market in self.market_registry.names
+        ], dtype=np.int64)
+        covariance = np.zeros((len(prices), len(prices)))
+        known = np.flatnonzero(covariance_ids >= 0)
+        covariance[np.ix_(known, known)] = self.covariance.covariance(horizon)[np.ix_(covariance_ids[known], covariance_ids[known])]
+        
+        model = MonteCarloModel.build(columns, prices, covariance)
+        return run_monte_carlo(model, paths, confidence, horizon, seed=seed, workers=workers)
             
-        except Exception as e:
-            logger.error(f"❌ Erro ao calcular score de risco: {e}")
-            return 0.5  # Score neutro em caso de erro
+    def run_stress_test(self, scenarios: ScenarioSet, top_n: int = 5) -> StressResult:
+        """Avalia todas as posições em todos os cenários a partir dos preços atuais"""
+        prices = self.market_registry.price_vector(self.current_prices)
+        columns = self.positions.columns()
+        return run_stress(columns, scenarios.price_matrix(self.market_registry, prices),
+                          self.risk_thresholds, scenarios.names, top_n, self._volatility_row_scores(columns),
+                          self._factors)
             
     def _calculate_volatility_risk_real(self, position: PositionData) -> float:
         """Calcula risco baseado na volatilidade real do spread"""
         try:
-            # Calcular spread atual baseado nos preços reais
-            leg1_price = self.current_prices.get(position.leg1_market, 0)
-            leg2_price = self.current_prices.get(position.leg2_market, 0)
-            
-            if leg1_price and leg2_price:
-                current_spread = leg1_price - leg2_price
-                spread_change = abs(current_spread - position.entry_spread)
-                spread_percentage = spread_change / abs(position.entry_spread) if position.entry_spread != 0 else 0
-                
-                # Atualizar spread atual
-                position.current_spread = current_spread
-                
-                # Volatilidade alta = risco alto
-                if spread_percentage > 0.1:  # 10% de mudança
-                    return 0.8
-                elif spread_percentage > 0.05:  # 5% de mudança
-                    return 0.6
-                elif spread_percentage > 0.02:  # 2% de mudança
-                    return 0.4
-                else:
-                    return 0.2
-            else:
-                logger.warning(f"⚠️ Preços não disponíveis para {position.leg1_market} ou {position.leg2_market}")
-                return 0.5  # Score neutro se preços não disponíveis
+            frame = self._position_factors(position)
+            self._update_current_spread(position, frame)
+            return float(frame.scores['volatility'][0])
                 
         except Exception as e:
             logger.error(f"❌ Erro ao calcular volatilidade real: {e}")
@@ -274,119 +1023,44 @@ class SAPPRealRiskAnalyzer:
             
     def _calculate_margin_risk_real(self, position: PositionData) -> float:
         """Calcula risco baseado na margem real"""
-        try:
-            # Calcular margem necessária baseada no spread atual
-            leg1_price = self.current_prices.get(position.leg1_market, 0)
-            leg2_price = self.current_prices.get(position.leg2_market, 0)
-            
-            if leg1_price and leg2_price:
-                # Calcular valor da posição
-                leg1_value = abs(position.leg1_size) * leg1_price
-                leg2_value = abs(position.leg2_size) * leg2_price
-                total_value = max(leg1_value, leg2_value)
-                
-                # Margem necessária (20% do valor da posição)
-                required_margin = total_value * 0.2
-                
-                # Calcular ratio de margem
-                margin_ratio = position.margin / required_margin if required_margin > 0 else 1.0
-                
-                # Margem baixa = risco alto
-                if margin_ratio < 1.1:  # Margem insuficiente
-                    return 0.9
-                elif margin_ratio < 1.2:  # Margem baixa
-                    return 0.7
-                elif margin_ratio < 1.5:  # Margem adequada
-                    return 0.5
-                else:
-                    return 0.3  # Margem confortável
-            else:
-                return 0.5  # Score neutro se preços não disponíveis
-                
-        except Exception as e:
-            logger.error(f"❌ Erro ao calcular margem real: {e}")
-            return 0.5
+        return self._factor_score(position, 'margin', "margem real")
             
     def _calculate_trend_risk_real(self, position: PositionData) -> float:
         """Calcula risco baseado na tendência real do spread"""
-        try:
-            # Calcular spread atual
-            leg1_price = self.current_prices.get(position.leg1_market, 0)
-            leg2_price = self.current_prices.get(position.leg2_market, 0)
-            
-            if leg1_price and leg2_price:
-                current_spread = leg1_price - leg2_price
-                spread_change = current_spread - position.entry_spread
-                spread_change_percentage = spread_change / abs(position.entry_spread) if position.entry_spread != 0 else 0
-                
-                # Tendência desfavorável = risco alto
-                if abs(spread_change_percentage) > 0.1:  # 10% de mudança
-                    return 0.8
-                elif abs(spread_change_percentage) > 0.05:  # 5% de mudança
-                    return 0.6
-                elif abs(spread_change_percentage) > 0.02:  # 2% de mudança
-                    return 0.4
-                else:
-                    return 0.2
-            else:
-                return 0.5
-                
-        except Exception as e:
-            logger.error(f"❌ Erro ao calcular tendência real: {e}")
-            return 0.5
+        return self._factor_score(position, 'trend', "tendência real")
             
     def _calculate_liquidation_risk_real(self, position: PositionData) -> float:
         """Calcula risco de liquidação baseado em dados reais"""
+        return self._factor_score(position, 'liquidation', "liquidação real")
+        
+    def _factor_score(self, position: PositionData, factor: str, label: str) -> float:
+        """Score de um fator do pipeline para uma posição (neutro em caso de erro)"""
         try:
-            # Calcular distância da liquidação
-            leg1_price = self.current_prices.get(position.leg1_market, 0)
-            leg2_price = self.current_prices.get(position.leg2_market, 0)
-            
-            if leg1_price and leg2_price:
-                # Calcular valor da posição
-                leg1_value = abs(position.leg1_size) * leg1_price
-                leg2_value = abs(position.leg2_size) * leg2_price
-                total_value = max(leg1_value, leg2_value)
-                
-                # Margem necessária (20%)
-                required_margin = total_value * 0.2
-                
-                # Distância da liquidação
-                liquidation_distance = (position.margin - required_margin) / required_margin if required_margin > 0 else 1.0
-                
-                # Distância baixa = risco alto
-                if liquidation_distance < 0.1:  # 10% de distância
-                    return 0.9
-                elif liquidation_distance < 0.2:  # 20% de distância
-                    return 0.7
-                elif liquidation_distance < 0.5:  # 50% de distância
-                    return 0.5
-                else:
-                    return 0.3  # Distância confortável
-            else:
-                return 0.5
-                
+            return float(self._position_factors(position).scores[factor][0])
         except Exception as e:
-            logger.error(f"❌ Erro ao calcular liquidação real: {e}")
+            logger.error(f"❌ Erro ao calcular {label}: {e}")
             return 0.5
             
-    def _generate_alert(self, position: PositionData, risk_score: float) -> Optional[RiskAlert]:
-        """Gera alerta baseado no score de risco"""
+    def _generate_alert(self, position: PositionData, risk_score: float,
+                        alert_type: Optional[str] = None) -> Optional[RiskAlert]:
+        """Gera alerta baseado no score de risco (ou no nível já decidido com histerese)"""
         try:
-            # Determinar tipo de alerta
-            if risk_score >= self.risk_thresholds['CRITICAL']:
+            # Determinar tipo de alerta (nível já decidido: usar o limite do próprio nível)
+            level_score = risk_score if alert_type is None else self.risk_thresholds[alert_type]
+            
+            if level_score >= self.risk_thresholds['CRITICAL']:
                 alert_type = 'CRITICAL'
                 message = f"🚨 RISCO CRÍTICO: Posição {position.position_id} em perigo extremo!"
                 recommendation = "Fechar posição imediatamente ou adicionar margem"
-            elif risk_score >= self.risk_thresholds['HIGH']:
+            elif level_score >= self.risk_thresholds['HIGH']:
                 alert_type = 'HIGH'
                 message = f"⚠️ ALTO RISCO: Posição {position.position_id} em perigo!"
                 recommendation = "Considerar fechar posição ou reduzir tamanho"
-            elif risk_score >= self.risk_thresholds['MEDIUM']:
+            elif level_score >= self.risk_thresholds['MEDIUM']:
                 alert_type = 'MEDIUM'
                 message = f"⚡ RISCO MÉDIO: Posição {position.position_id} requer atenção"
                 recommendation = "Monitorar de perto e estar preparado para ação"
-            elif risk_score >= self.risk_thresholds['LOW']:
+            elif level_score >= self.risk_thresholds['LOW']:
                 alert_type = 'LOW'
                 message = f"ℹ️ RISCO BAIXO: Posição {position.position_id} estável"
                 recommendation = "Continuar monitorando"
@@ -398,7 +1072,7 @@ class SAPPRealRiskAnalyzer:
                 alert_type=alert_type,
                 message=message,
                 risk_score=risk_score,
-                timestamp=datetime.now(),
+                timestamp=self._clock.now(),
                 recommendation=recommendation
             )
             
@@ -413,33 +1087,32 @@ class SAPPRealRiskAnalyzer:
             logger.warning(f"{alert.message} (Score: {alert.risk_score:.2f})")
             logger.info(f"💡 Recomendação: {alert.recommendation}")
             
-            # Em produção, enviaria para frontend via WebSocket
-            # Por enquanto, apenas log
+            # Envio ao backend em lote pela thread do pipeline (não bloqueia o scoring)
+            self.alert_pipeline.submit(alert)
             
         except Exception as e:
             logger.error(f"❌ Erro ao processar alerta: {e}")
             
     def get_risk_summary(self) -> Dict:
-        """Retorna resumo de risco de todas as posições"""
+        """
+        Retorna resumo de risco de todas as posições a partir dos scores em
+        cache (O(1), não recalcula). Posições ainda não reprocessadas aparecem
+        em pending_positions.
+        """
         try:
             if not self.positions:
                 return {"message": "Nenhuma posição ativa"}
                 
             total_positions = len(self.positions)
-            high_risk_positions = 0
-            critical_positions = 0
-            
-            for position in self.positions.values():
-                risk_score = self._calculate_risk_score(position)
-                if risk_score >= self.risk_thresholds['HIGH']:
-                    high_risk_positions += 1
-                if risk_score >= self.risk_thresholds['CRITICAL']:
-                    critical_positions += 1
+            tier_counts = self.sharding.tier_counts() if self.sharding is not None else self.risk_state.tier_counts
+            high_risk_positions = int(tier_counts[ALERT_LEVELS.index('HIGH') + 1:].sum())
+            critical_positions = int(tier_counts[ALERT_LEVELS.index('CRITICAL') + 1])
                     
             return {
                 "total_positions": total_positions,
                 "high_risk_positions": high_risk_positions,
                 "critical_positions": critical_positions,
+                "pending_positions": total_positions - int(tier_counts.sum()),
                 "overall_risk": "HIGH" if critical_positions > 0 else "MEDIUM" if high_risk_positions > 0 else "LOW",
                 "current_prices": self.current_prices
             }
@@ -450,10 +1123,12 @@ class SAPPRealRiskAnalyzer:
 
 def main():
     """Função principal para teste"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     logger.info("🧠 Iniciando SAPP Real Risk Analyzer...")
     
     # Criar analisador
     analyzer = SAPPRealRiskAnalyzer()
+    analyzer.install_profiling_signals()
     
     # Iniciar monitoramento
     analyzer.start_monitoring()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+SAPP Replay
+Replay acelerado de ticks gravados (TickJournal) ou sintéticos pela lógica do
+SAPPRealRiskAnalyzer, com um relógio virtual avançado pelos timestamps dos
+ticks: nada dorme, e um dia de mercado roda no tempo de CPU que ele custa.
+O relatório traz a linha do tempo dos alertas, as transições de tier e os
+tempos por etapa, e serve de checagem de regressão antes de cada deploy
+(python replay.py DIRETÓRIO --compare relatorio_anterior.json).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+import logging
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_risk import ALERT_LEVELS
+from clock import VirtualClock
+from metrics import MetricsRegistry
+from position_sync import FetchPage
+from risk_state import UNSCORED
+from tick_journal import TickJournalReader, iter_instants
+from real_risk_analyzer import SAPPRealRiskAnalyzer, RiskAlert
+
+logger = logging.getLogger(__name__)
+
+# Etapas medidas (tempo real de CPU): decodificação das mensagens, aplicação dos
+# preços (histórico, gatilhos, volatilidade) e ciclo de monitoramento
+# (sincronização, quando há fonte de alterações, scoring e alertas)
+REPLAY_STAGES = ('decode', 'prices', 'scoring')
+
+# Queda de throughput tolerada na comparação com um relatório anterior
+DEFAULT_MAX_SLOWDOWN = 0.2
+
+DEFAULT_OUTPUT = "replay_report.json"
+
+
+def _tier_name(tier: int) -> Optional[str]:
+    if tier == UNSCORED:
+        return None
+    return 'NONE' if tier == 0 else ALERT_LEVELS[tier - 1]
+
+
+@dataclass
+class TierTransition:
+    """Mudança de tier de uma posição (previous None = primeira avaliação)"""
+    timestamp_ns: int
+    position_id: int
+    previous: Optional[str]
+    tier: str
+
+
+@dataclass
+class ReplayReport:
+    """Resultado de um replay"""
+    ticks: int = 0
+    instants: int = 0        # timestamps distintos aplicados
+    cycles: int = 0          # ciclos de monitoramento executados
+    rescored: int = 0        # posições reprocessadas
+    start_ns: int = 0
+    end_ns: int = 0
+    wall_seconds: float = 0.0
+    alerts: List[RiskAlert] = field(default_factory=list)
+    transitions: List[TierTransition] = field(default_factory=list)
+    stages: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @property
+    def virtual_seconds(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    @property
+    def speedup(self) -> float:
+        """Segundos de mercado por segundo de replay"""
+        return self.virtual_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.wall_seconds if self.wall_seconds else 0.0
+
+    def alert_digest(self) -> str:
+        """Hash da linha do tempo de alertas (instante, posição, nível), independente da ordem dentro de um ciclo"""
+        digest = hashlib.sha256()
+        for timestamp, position_id, alert_type in sorted(
+                (alert.timestamp, alert.position_id, alert.alert_type) for alert in self.alerts):
+            digest.update(f"{timestamp.isoformat()}|{position_id}|{alert_type}\n".encode())
+        return digest.hexdigest()
+
+    def summary(self) -> Dict:
+        """Resumo em JSON (sem a linha do tempo completa)"""
+        alert_counts = {level: 0 for level in ALERT_LEVELS}
+        for alert in self.alerts:
+            alert_counts[alert.alert_type] += 1
+        return {
+            "ticks": self.ticks,
+            "instants": self.instants,
+            "cycles": self.cycles,
+            "rescored": self.rescored,
+            "virtual_seconds": self.virtual_seconds,
+            "wall_seconds": self.wall_seconds,
+            "speedup": self.speedup,
+            "ticks_per_second": self.ticks_per_second,
+            "alerts": alert_counts,
+            "alert_digest": self.alert_digest(),
+            "transitions": len(self.transitions),
+            "stages": self.stages
+        }
+
+
+class ReplayEngine:
+    """
+    Alimenta o analisador com ticks em ordem de tempo. A cada timestamp
+    distinto o relógio virtual avança até ele, os preços são aplicados e, se
+    scoring_interval_ns já passou desde o último ciclo, roda um ciclo de
+    monitoramento (o mesmo _monitoring_step da thread de análise). Com fetch
+    as posições são sincronizadas pela fonte dada a cada sync_interval
+    segundos virtuais; sem fetch o livro fica como está.
+
+    O analisador passa a pertencer ao replay: seu relógio vira o virtual e os
+    alertas vão para o relatório em vez do backend.
+    """
+
+    def __init__(self, analyzer: SAPPRealRiskAnalyzer, scoring_interval_ns: int = 0,
+                 fetch: Optional[FetchPage] = None):
+        if analyzer.sharding is not None:
+            raise ValueError("Replay não suporta scoring em shards")
+        self.analyzer = analyzer
+        self.scoring_interval_ns = scoring_interval_ns
+        self.fetch = fetch
+        self.clock = analyzer.clock if isinstance(analyzer.clock, VirtualClock) else VirtualClock()
+        analyzer.clock = self.clock
+        analyzer._handle_alert = self._on_alert
+        analyzer.risk_state.subscribe(self._on_transitions)
+        self.metrics: Optional[MetricsRegistry] = None  # histogramas de etapa do último replay
+        self._report: Optional[ReplayReport] = None
+
+    # ----- fontes -----
+
+    def replay_journal(self, directory: str, start_ns: Optional[int] = None,
+                       end_ns: Optional[int] = None) -> ReplayReport:
+        """Reproduz um diário gravado pelo TickJournal (intervalo opcional)"""
+        reader = TickJournalReader(directory)
+        try:
+            return self.replay_ticks(reader.iter_batches(start_ns, end_ns), reader.markets)
+        finally:
+            reader.close()
+
+    def replay_ticks(self, batches: Iterable[np.ndarray], markets: Optional[Sequence[str]] = None) -> ReplayReport:
+        """
+        Reproduz lotes de registros com market_id, price e timestamp_ns
+        (TICK_DTYPE ou RECORD_DTYPE), em ordem de tempo. markets traduz os ids
+        (ex.: nomes do diário); sem ele os ids são os do registry do analisador.
+        """
+        names = list(markets) if markets is not None else self.analyzer.market_registry.names
+        with self._run() as report:
+            def counted():
+                for batch in batches:
+                    report.ticks += len(batch)
+                    yield batch
+
+            for timestamp_ns, updates in iter_instants(counted(), names):
+                self._instant(updates, timestamp_ns)
+        return report
+
+    def replay_frames(self, frames: Iterable[str]) -> ReplayReport:
+        """Reproduz mensagens do WebSocket (decodificadas como em _on_message)"""
+        decoder = self.analyzer.price_decoder
+        names = self.analyzer.market_registry.names
+        with self._run() as report:
+            decode = self._stage_metrics['decode']  # histograma do replay atual (criado por _run)
+            for frame in frames:
+                start = time.perf_counter_ns()
+                ticks = decoder.decode(frame)
+                decode.observe(time.perf_counter_ns() - start)
+                if not len(ticks):
+                    continue
+                report.ticks += len(ticks)
+                self._instant({names[market_id]: price for market_id, price
+                               in zip(ticks['market_id'].tolist(), ticks['price'].tolist())},
+                              int(ticks['timestamp_ns'].max()))
+        return report
+
+    # ----- execução -----
+
+    @contextmanager
+    def _run(self):
+        """Um replay: relatório e histogramas de etapa novos, fechados ao fim"""
+        self._report = report = ReplayReport()
+        self.metrics = MetricsRegistry(prefix="sapp_replay_")
+        self._stage_metrics = {
+            stage: self.metrics.latency_histogram(f"{stage}_seconds", f"Duração da etapa {stage} por instante")
+            for stage in REPLAY_STAGES
+        }
+        self._first_ns = None
+        self._last_cycle_ns = None
+        self._next_sync = math.inf
+        rescored_start = self.analyzer.metrics["positions_rescored"].total
+        wall_start = time.perf_counter()
+        yield report
+
+        if self._first_ns is not None and self.analyzer._dirty_positions:
+            self._cycle(self.clock.monotonic_ns())  # posições marcadas pelo último instante
+        report.wall_seconds = time.perf_counter() - wall_start
+        report.start_ns = self._first_ns or 0
+        report.end_ns = self.clock.time_ns() if self._first_ns is not None else 0
+        report.rescored = self.analyzer.metrics["positions_rescored"].total - rescored_start
+        report.stages = {
+            stage: {"count": metric.count, "total_s": metric.total * 1e-9,
+                    "p50_ms": metric.percentile(50) * 1e3, "p99_ms": metric.percentile(99) * 1e3}
+            for stage, metric in self._stage_metrics.items()
+        }
+
+    def _instant(self, updates: Dict[str, float], timestamp_ns: int):
+        """Aplica os preços de um instante e roda o ciclo de monitoramento se for a hora"""
+        self.clock.advance_to(timestamp_ns)
+        now = self.clock.monotonic_ns()
+        if self._first_ns is None:
+            self._first_ns = now
+            if self.fetch is not None:
+                self._next_sync = 0.0
+        self._report.instants += 1
+        start = time.perf_counter_ns()
+        self.analyzer.update_prices(updates)
+        self._stage_metrics['prices'].observe(time.perf_counter_ns() - start)
+        if self._last_cycle_ns is None or now - self._last_cycle_ns >= self.scoring_interval_ns:
+            self._cycle(now)
+
+    def _cycle(self, now_ns: int):
+        start = time.perf_counter_ns()
+        self._next_sync = self.analyzer._monitoring_step(now_ns / 1e9, self._next_sync, self.fetch)
+        self._stage_metrics['scoring'].observe(time.perf_counter_ns() - start)
+        self._last_cycle_ns = now_ns
+        self._report.cycles += 1
+
+    def _on_alert(self, alert: RiskAlert):
+        self._report.alerts.append(alert)
+
+    def _on_transitions(self, position_ids: np.ndarray, previous: np.ndarray, tiers: np.ndarray):
+        if self._report is None:
+            return
+        timestamp_ns = self.clock.time_ns()
+        self._report.transitions.extend(
+            TierTransition(timestamp_ns, position_id, _tier_name(old), _tier_name(new))
+            for position_id, old, new in zip(position_ids.tolist(), previous.tolist(), tiers.tolist())
+        )
+
+
+def compare_reports(report: Dict, baseline: Dict, max_slowdown: float = DEFAULT_MAX_SLOWDOWN) -> List[str]:
+    """Diferenças que reprovam o deploy: linha do tempo de alertas diferente ou throughput menor"""
+    problems = []
+    if report["alert_digest"] != baseline["alert_digest"]:
+        problems.append(f"linha do tempo de alertas mudou: {baseline['alerts']} → {report['alerts']}")
+    if report["ticks_per_second"] < baseline["ticks_per_second"] * (1 - max_slowdown):
+        problems.append(f"throughput caiu: {baseline['ticks_per_second']:,.0f} → "
+                        f"{report['ticks_per_second']:,.0f} ticks/s")
+    return problems
+
+
+def main():
+    """Função principal"""
+    from benchmark import synthetic_book, MARKETS
+
+    parser = argparse.ArgumentParser(description="Replay de ticks gravados pelo SAPP Risk Analyzer")
+    parser.add_argument("journal", help="diretório do diário de ticks (--record-ticks)")
+    parser.add_argument("--positions", type=int, default=10000, help="posições do livro sintético")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scoring-interval-ms", type=float, default=0.0,
+                        help="intervalo mínimo entre ciclos de scoring (tempo virtual)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="arquivo JSON do relatório")
+    parser.add_argument("--compare", help="relatório anterior: sai com erro se houver regressão")
+    parser.add_argument("--max-slowdown", type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help="queda de throughput tolerada na comparação (fração)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    print("⏪ SAPP AI - REPLAY")
+    print("=" * 60)
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions = synthetic_book(args.positions, args.seed)
+    analyzer.current_prices.update(MARKETS)
+    engine = ReplayEngine(analyzer, scoring_interval_ns=int(args.scoring_interval_ms * 1e6))
+    report = engine.replay_journal(args.journal)
+    summary = report.summary()
+    summary["config"] = {"journal": args.journal, "positions": args.positions, "seed": args.seed,
+                         "scoring_interval_ms": args.scoring_interval_ms}
+    summary["timeline"] = [{"timestamp": alert.timestamp.isoformat(), "position_id": alert.position_id,
+                            "alert_type": alert.alert_type, "risk_score": alert.risk_score}
+                           for alert in report.alerts]
+    with open(args.output, "w") as handle:
+        json.dump(summary, handle, indent=2)
+
+    print(f"📊 {report.ticks:,} ticks ({report.virtual_seconds:,.0f}s de mercado) em {report.wall_seconds:.2f}s "
+          f"({report.speedup:,.0f}x, {report.ticks_per_second:,.0f} ticks/s)")
+    print(f"🚨 Alertas: {summary['alerts']}; transições de tier: {len(report.transitions):,}")
+    for stage, timing in report.stages.items():
+        print(f"⏱️ {stage:<8} {timing['total_s']:8.3f}s  p50 {timing['p50_ms']:.3f} ms  p99 {timing['p99_ms']:.3f} ms")
+    print(f"💾 Relatório gravado em {args.output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            problems = compare_reports(summary, json.load(handle), args.max_slowdown)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ Sem regressões em relação ao relatório anterior")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,17 @@ SAPP AI Risk Analyzer
 Sistema de análise de risco em tempo real para posições de spread trading
 """
 
-import requests
 import json
 import time
-import websocket
 import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 import logging
 
-# Configuração de logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from position_book import PositionBook
+from startup import Readiness
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -47,7 +46,6 @@ class SAPPRiskAnalyzer:
     def __init__(self, backend_url: str = "http://localhost:5000"):
         self.backend_url = backend_url
         self.positions: Dict[int, PositionData] = {}
-        self.price_history: Dict[str, List[Tuple[datetime, float]]] = {}
         self.risk_thresholds = {
             'LOW': 0.3,
             'MEDIUM': 0.5,
@@ -56,6 +54,16 @@ class SAPPRiskAnalyzer:
         }
         self.running = False
         self.analysis_thread = None
+        self.readiness = Readiness()  # 'scored' ao fim da primeira análise
+        
+    @property
+    def positions(self) -> PositionBook:
+        """Posições monitoradas, armazenadas em formato colunar"""
+        return self._positions
+        
+    @positions.setter
+    def positions(self, positions: Dict[int, PositionData]):
+        self._positions = PositionBook(positions)
         
     def start_monitoring(self):
         """Inicia o monitoramento contínuo"""
@@ -86,6 +94,7 @@ class SAPPRiskAnalyzer:
                     
                     if alert:
                         self._handle_alert(alert)
+                self.readiness.mark('scored')
                         
                 # Aguardar próxima análise (30 segundos)
                 time.sleep(30)
@@ -293,6 +302,7 @@ class SAPPRiskAnalyzer:
 
 def main():
     """Função principal para teste"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     logger.info("🧠 Iniciando SAPP Risk Analyzer...")
     
     # Criar analisador
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+SAPP Risk Factors
+Pipeline de fatores de risco: cada fator declara as grandezas intermediárias
+de que precisa (spread, valor da posição, margem necessária, estatísticas
+móveis do par) e cada intermediária é calculada uma única vez por avaliação,
+na ordem das dependências. Pesos, faixas e novos fatores são configuração do
+pipeline; o laço de avaliação só percorre o plano já resolvido.
+"""
+
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Faixas dos fatores padrão (mesma semântica dos métodos _calculate_*_risk_real)
+# Volatilidade e tendência usam "> limite", margem e liquidação usam "< limite"
+SPREAD_CHANGE_BINS = np.array([0.02, 0.05, 0.1])
+SPREAD_CHANGE_SCORES = np.array([0.2, 0.4, 0.6, 0.8])
+MARGIN_RATIO_BINS = np.array([1.1, 1.2, 1.5])
+MARGIN_RATIO_SCORES = np.array([0.9, 0.7, 0.5, 0.3])
+LIQUIDATION_BINS = np.array([0.1, 0.2, 0.5])
+LIQUIDATION_SCORES = np.array([0.9, 0.7, 0.5, 0.3])
+
+# Pesos do score final
+FACTOR_WEIGHTS = {
+    'volatility': 0.3,
+    'margin': 0.3,
+    'trend': 0.2,
+    'liquidation': 0.2
+}
+
+# Margem necessária (20% do valor da posição)
+MARGIN_REQUIREMENT = 0.2
+
+# Score neutro quando os preços não estão disponíveis
+NEUTRAL_SCORE = 0.5
+
+# Entradas por posição de cada avaliação (pair_volatility pode faltar: None)
+INPUTS = ('leg1_price', 'leg2_price', 'leg1_size', 'leg2_size', 'margin', 'entry_spread', 'pair_volatility')
+PRICE_INPUTS = frozenset(('leg1_price', 'leg2_price'))
+
+# Intermediárias sempre calculadas: viram campos do BatchRiskScores
+OUTPUTS = ('valid', 'current_spread', 'required_margin')
+
+
+def tier_index(values: np.ndarray, bins: np.ndarray, strict: bool) -> np.ndarray:
+    """
+    Índice da faixa por comparações (mesmo resultado de np.digitize com
+    right=strict, mas bem mais rápido para poucas faixas)
+    """
+    index = (values > bins[0]) if strict else (values >= bins[0])
+    index = index.astype(np.intp)
+    for limit in bins[1:]:
+        index += (values > limit) if strict else (values >= limit)
+    return index
+
+
+@dataclass(frozen=True)
+class Intermediate:
+    """Grandeza por posição calculada a partir de entradas ou de outras intermediárias"""
+    name: str
+    inputs: Tuple[str, ...]
+    compute: Callable[..., np.ndarray]
+
+
+@dataclass(frozen=True, eq=False)
+class Factor:
+    """
+    Fator de risco: score por posição em [0, 1] e seu peso no score final.
+    Fatores em faixas (bins/scores sobre a única entrada) dispensam compute;
+    override é uma entrada que, onde não for NaN, substitui o score da faixa.
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    weight: float
+    bins: Optional[np.ndarray] = None
+    scores: Optional[np.ndarray] = None
+    strict: bool = False
+    override: Optional[str] = None
+    compute: Optional[Callable[..., np.ndarray]] = None
+
+    @property
+    def dependencies(self) -> Tuple[str, ...]:
+        return self.inputs + ((self.override,) if self.override else ())
+
+
+# ----- intermediárias padrão (funções de módulo: o pipeline vai para os workers do scoring em shards) -----
+
+def _valid(leg1_price, leg2_price):
+    return (leg1_price != 0) & (leg2_price != 0)
+
+
+def _current_spread(leg1_price, leg2_price):
+    return leg1_price - leg2_price
+
+
+def _spread_divisor(entry_spread):
+    # Entrada zero vira divisor infinito: mudança percentual 0, como no escalar
+    abs_entry = np.abs(entry_spread)
+    return np.where(abs_entry != 0, abs_entry, np.inf)
+
+
+def _spread_change_pct(current_spread, entry_spread, spread_divisor):
+    change = np.abs(current_spread - entry_spread)
+    change /= spread_divisor
+    return change
+
+
+def _abs_size(size):
+    return np.abs(size)
+
+
+def _leg_value(abs_size, price):
+    return abs_size * price
+
+
+def _notional(leg1_value, leg2_value):
+    return np.maximum(leg1_value, leg2_value)
+
+
+def _required_margin(notional):
+    return notional * MARGIN_REQUIREMENT
+
+
+def _margin_ratio(margin, required_margin):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = margin / required_margin
+    no_requirement = required_margin <= 0
+    if no_requirement.any():
+        np.copyto(ratio, 1.0, where=no_requirement)
+    return ratio
+
+
+def _liquidation_distance(margin, required_margin):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = (margin - required_margin) / required_margin
+    no_requirement = required_margin <= 0
+    if no_requirement.any():
+        np.copyto(distance, 1.0, where=no_requirement)
+    return distance
+
+
+INTERMEDIATES = (
+    Intermediate('valid', ('leg1_price', 'leg2_price'), _valid),
+    Intermediate('current_spread', ('leg1_price', 'leg2_price'), _current_spread),
+    Intermediate('spread_divisor', ('entry_spread',), _spread_divisor),
+    Intermediate('spread_change_pct', ('current_spread', 'entry_spread', 'spread_divisor'), _spread_change_pct),
+    Intermediate('leg1_abs_size', ('leg1_size',), _abs_size),
+    Intermediate('leg2_abs_size', ('leg2_size',), _abs_size),
+    Intermediate('leg1_value', ('leg1_abs_size', 'leg1_price'), _leg_value),
+    Intermediate('leg2_value', ('leg2_abs_size', 'leg2_price'), _leg_value),
+    Intermediate('notional', ('leg1_value', 'leg2_value'), _notional),
+    Intermediate('required_margin', ('notional',), _required_margin),
+    Intermediate('margin_ratio', ('margin', 'required_margin'), _margin_ratio),
+    Intermediate('liquidation_distance', ('margin', 'required_margin'), _liquidation_distance),
+)
+
+FACTORS = (
+    Factor('volatility', ('spread_change_pct',), FACTOR_WEIGHTS['volatility'],
+           SPREAD_CHANGE_BINS, SPREAD_CHANGE_SCORES, strict=True, override='pair_volatility'),
+    Factor('margin', ('margin_ratio',), FACTOR_WEIGHTS['margin'], MARGIN_RATIO_BINS, MARGIN_RATIO_SCORES),
+    Factor('trend', ('spread_change_pct',), FACTOR_WEIGHTS['trend'],
+           SPREAD_CHANGE_BINS, SPREAD_CHANGE_SCORES, strict=True),
+    Factor('liquidation', ('liquidation_distance',), FACTOR_WEIGHTS['liquidation'],
+           LIQUIDATION_BINS, LIQUIDATION_SCORES),
+)
+
+
+class FactorPipeline:
+    """
+    Fatores e intermediárias resolvidos em um plano: só as intermediárias
+    usadas entram, em ordem topológica, e cada passo sabe de quais entradas
+    depende (para recalcular apenas o que mudou, ver FactorFrame.update).
+    """
+
+    def __init__(self, factors: Sequence[Factor] = FACTORS, intermediates: Sequence[Intermediate] = INTERMEDIATES):
+        self.factors: Tuple[Factor, ...] = tuple(_normalized(factor) for factor in factors)
+        self.intermediates: Tuple[Intermediate, ...] = tuple(intermediates)
+        if not self.factors:
+            raise ValueError("Pipeline de fatores vazio")
+        names = [factor.name for factor in self.factors]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Fatores repetidos: {names}")
+        by_name = {intermediate.name: intermediate for intermediate in self.intermediates}
+        if len(by_name) != len(self.intermediates) or set(by_name) & set(INPUTS):
+            raise ValueError("Intermediárias repetidas ou com nome de entrada")
+
+        # Plano: intermediárias alcançadas pelos fatores e pelas saídas, dependências antes
+        self._plan: List[Intermediate] = []
+        self._dependencies: Dict[str, FrozenSet[str]] = {name: frozenset((name,)) for name in INPUTS}
+        visiting: Set[str] = set()
+
+        def visit(name: str, needed_by: str):
+            if name in self._dependencies:
+                return
+            intermediate = by_name.get(name)
+            if intermediate is None:
+                raise ValueError(f"Entrada desconhecida '{name}' em '{needed_by}'")
+            if name in visiting:
+                raise ValueError(f"Dependência circular em '{name}'")
+            visiting.add(name)
+            for dependency in intermediate.inputs:
+                visit(dependency, name)
+            visiting.discard(name)
+            self._dependencies[name] = frozenset().union(*(self._dependencies[dependency]
+                                                           for dependency in intermediate.inputs))
+            self._plan.append(intermediate)
+
+        for name in OUTPUTS:
+            visit(name, 'saídas')
+        for factor in self.factors:
+            for dependency in factor.dependencies:
+                visit(dependency, factor.name)
+        self._factor_dependencies: Dict[str, FrozenSet[str]] = {
+            factor.name: frozenset().union(*(self._dependencies[dependency] for dependency in factor.dependencies))
+            for factor in self.factors
+        }
+        self.inputs: FrozenSet[str] = frozenset().union(*self._factor_dependencies.values(),
+                                                        *(self._dependencies[name] for name in OUTPUTS))
+        # Fatores com a mesma fonte e as mesmas faixas compartilham o cálculo da faixa (ex.: volatilidade e tendência)
+        self._tier_keys: Dict[str, Optional[Tuple]] = {
+            factor.name: None if factor.compute is not None else
+            (factor.inputs[0], factor.bins.tobytes(), factor.scores.tobytes(), factor.strict)
+            for factor in self.factors
+        }
+
+        # Sem retain, cada intermediária sai da memória depois do seu último uso no plano
+        # (menos temporários vivos ao mesmo tempo: o livro inteiro cabe em menos páginas)
+        kept = set(OUTPUTS).union(*(factor.dependencies for factor in self.factors))
+        last_use = {name: index for index, step in enumerate(self._plan) for name in step.inputs}
+        self._release: List[Tuple[str, ...]] = [
+            tuple(name for name in step.inputs if last_use[name] == index and name not in kept and name not in INPUTS)
+            for index, step in enumerate(self._plan)
+        ]
+
+    @property
+    def weights(self) -> Dict[str, float]:
+        return {factor.name: factor.weight for factor in self.factors}
+
+    def with_weights(self, weights: Dict[str, float]) -> 'FactorPipeline':
+        """Cópia com novos pesos (fatores não citados mantêm o seu)"""
+        return self.with_factors(**{name: {'weight': weight} for name, weight in weights.items()})
+
+    def with_factors(self, **changes: Dict) -> 'FactorPipeline':
+        """Cópia com campos de fatores trocados, ex.: with_factors(margin={'bins': ..., 'weight': 0.4})"""
+        unknown = set(changes) - {factor.name for factor in self.factors}
+        if unknown:
+            raise ValueError(f"Fatores desconhecidos: {sorted(unknown)}")
+        factors = [replace(factor, **changes[factor.name]) if factor.name in changes else factor
+                   for factor in self.factors]
+        return FactorPipeline(factors, self.intermediates)
+
+    def add_factor(self, factor: Factor, *intermediates: Intermediate) -> 'FactorPipeline':
+        """Cópia com um fator novo (e as intermediárias novas de que ele precisa)"""
+        return FactorPipeline(self.factors + (factor,), self.intermediates + intermediates)
+
+    def depends_on(self, name: str) -> FrozenSet[str]:
+        """Entradas de que uma intermediária ou um fator dependem"""
+        if name in self._factor_dependencies:
+            return self._factor_dependencies[name]
+        return self._dependencies[name]
+
+    def evaluate(self, inputs: Dict[str, Optional[np.ndarray]], retain: bool = True) -> 'FactorFrame':
+        """
+        Avalia todos os fatores (entradas ausentes contam como None). Sem
+        retain as intermediárias internas são descartadas (avaliação única,
+        sem update).
+        """
+        return FactorFrame(self, inputs, retain)
+
+    def trigger_bins(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Limites de mudança percentual do spread e de razão margem/necessária
+        em que algum fator muda de faixa (níveis do TriggerBook). None se
+        algum fator depende dos preços de outra forma: aí qualquer tick
+        reprocessa as posições do mercado.
+        """
+        spread: List[float] = []
+        ratio: List[float] = []
+        for factor in self.factors:
+            source = factor.inputs[0] if factor.compute is None else None
+            if source == 'spread_change_pct':
+                spread.extend(factor.bins)
+            elif source == 'margin_ratio':
+                ratio.extend(factor.bins)
+            elif source == 'liquidation_distance':
+                ratio.extend(np.asarray(factor.bins) + 1.0)  # distância = razão - 1
+            elif self._factor_dependencies[factor.name] & PRICE_INPUTS:
+                return None
+        return np.unique(np.array(spread, dtype=np.float64)), np.unique(np.array(ratio, dtype=np.float64))
+
+
+def _normalized(factor: Factor) -> Factor:
+    """Valida o fator; faixas viram arrays float64"""
+    if factor.compute is not None:
+        return factor
+    if len(factor.inputs) != 1 or factor.bins is None or factor.scores is None:
+        raise ValueError(f"Fator '{factor.name}' sem compute precisa de uma entrada, bins e scores")
+    bins = np.asarray(factor.bins, dtype=np.float64)
+    scores = np.asarray(factor.scores, dtype=np.float64)
+    if len(scores) != len(bins) + 1 or np.any(np.diff(bins) <= 0):
+        raise ValueError(f"Faixas inválidas no fator '{factor.name}'")
+    return replace(factor, bins=bins, scores=scores)
+
+
+class FactorFrame:
+    """
+    Uma avaliação do pipeline: entradas, intermediárias, scores por fator e
+    score final. update troca entradas e recalcula só as intermediárias e
+    os fatores que dependem delas.
+    """
+
+    def __init__(self, pipeline: FactorPipeline, inputs: Dict[str, Optional[np.ndarray]], retain: bool = True):
+        self.pipeline = pipeline
+        self.retain = retain
+        self.values: Dict[str, Optional[np.ndarray]] = dict.fromkeys(INPUTS)
+        self.values.update(inputs)
+        self._raw: Dict[str, np.ndarray] = {}
+        self.scores: Dict[str, np.ndarray] = {}
+        self.total: Optional[np.ndarray] = None
+        self.recomputed: Tuple[str, ...] = ()
+        self._compute(None)
+
+    def update(self, **inputs: Optional[np.ndarray]) -> Tuple[str, ...]:
+        """Troca entradas e recalcula o que depende delas; retorna os fatores recalculados"""
+        if not self.retain:
+            raise ValueError("Avaliação sem retain não pode ser atualizada")
+        unknown = set(inputs) - set(INPUTS)
+        if unknown:
+            raise ValueError(f"Entradas desconhecidas: {sorted(unknown)}")
+        self.values.update(inputs)
+        return self._compute(frozenset(inputs))
+
+    @property
+    def valid(self) -> np.ndarray:
+        return self.values['valid']
+
+    def _compute(self, changed: Optional[FrozenSet[str]]) -> Tuple[str, ...]:
+        pipeline = self.pipeline
+        values = self.values
+        for step, release in zip(pipeline._plan, pipeline._release):
+            if changed is None or pipeline._dependencies[step.name] & changed:
+                values[step.name] = step.compute(*(values[name] for name in step.inputs))
+                if not self.retain:
+                    for name in release:
+                        del values[name]
+
+        tiers: Dict[Tuple, np.ndarray] = {}  # faixas já calculadas nesta passada (mesma fonte e faixas)
+        recomputed = []
+        for factor in pipeline.factors:
+            if changed is None or pipeline._factor_dependencies[factor.name] & changed:
+                self._raw[factor.name] = _factor_scores(factor, pipeline._tier_keys[factor.name], values, tiers)
+                recomputed.append(factor.name)
+        self.recomputed = tuple(recomputed)
+        if changed is not None and not recomputed and not pipeline._dependencies['valid'] & changed:
+            return self.recomputed
+
+        # Score neutro se preços não disponíveis; score final = média ponderada
+        valid = values['valid']
+        all_valid = bool(valid.all())
+        total = None
+        for factor in pipeline.factors:
+            score = self._raw[factor.name]
+            if not all_valid:
+                score = np.where(valid, score, NEUTRAL_SCORE)
+            self.scores[factor.name] = score
+            if total is None:
+                total = score * factor.weight
+            else:
+                total += score * factor.weight
+        np.clip(total, 0.0, 1.0, out=total)
+        self.total = total
+        return self.recomputed
+
+
+def _factor_scores(factor: Factor, key: Optional[Tuple], values: Dict, tiers: Dict[Tuple, np.ndarray]) -> np.ndarray:
+    if key is None:
+        score = factor.compute(*(values[name] for name in factor.inputs))
+    else:
+        score = tiers.get(key)
+        if score is None:
+            score = tiers[key] = factor.scores.take(tier_index(values[key[0]], factor.bins, factor.strict))
+    override = values[factor.override] if factor.override else None
+    if override is not None:
+        score = np.where(np.isnan(override), score, override)
+    return score
+
+
+DEFAULT_PIPELINE = FactorPipeline()
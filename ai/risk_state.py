@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+SAPP Risk State
+Último score e tier de cada posição, com contadores por tier mantidos a cada transição
+"""
+
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from batch_risk import ALERT_LEVELS
+from id_index import IdIndex
+
+# Tier de posições ainda não avaliadas
+UNSCORED = -1
+
+
+class RiskState:
+    """
+    Estado de risco do livro: score e tier mais recentes por posição em
+    arrays por linha (free-list como no TriggerBook) e contagem de posições
+    por tier, ajustada apenas quando o tier de uma posição muda. O resumo de
+    risco vira uma leitura O(1) sem recalcular scores.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._rows = IdIndex()  # position_id → linha
+        self._free_rows = array('i')
+        self.tier_counts = np.zeros(len(ALERT_LEVELS) + 1, dtype=np.int64)
+        self._listeners: List[Callable] = []
+        self._allocate(initial_capacity)
+
+    def _allocate(self, capacity: int):
+        """Cria ou aumenta os arrays por posição"""
+        old = getattr(self, '_scores', None)
+        size = 0 if old is None else len(old)
+        scores = np.zeros(capacity, dtype=np.float64)
+        tiers = np.full(capacity, UNSCORED, dtype=np.int8)
+        alert_tiers = np.zeros(capacity, dtype=np.int8)
+        if old is not None:
+            scores[:size] = self._scores
+            tiers[:size] = self._tiers
+            alert_tiers[:size] = self._alert_tiers
+        self._scores, self._tiers, self._alert_tiers = scores, tiers, alert_tiers
+        self._rows.capacity = capacity
+        self._free_rows.extend(range(capacity - 1, size - 1, -1))
+
+    def _row_for(self, position_id: int) -> int:
+        row = self._rows.get(position_id)
+        if row < 0:
+            if not self._free_rows:
+                self._allocate(len(self._scores) * 2)
+            row = self._free_rows.pop()
+            self._rows.set(position_id, row)
+        return row
+
+    def __len__(self) -> int:
+        """Número de posições com score em cache"""
+        return int(self.tier_counts.sum())
+
+    def __contains__(self, position_id: int) -> bool:
+        row = self._rows.get(position_id)
+        return row >= 0 and self._tiers[row] != UNSCORED
+
+    def subscribe(self, listener: Callable):
+        """
+        Registra um callback listener(position_ids, previous, tiers) chamado
+        por update com as posições cujo tier mudou (previous = UNSCORED para
+        posições ainda sem score)
+        """
+        self._listeners.append(listener)
+
+    def update(self, position_ids: np.ndarray, scores: np.ndarray, tiers: np.ndarray,
+               band_tiers: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Grava os scores recém-calculados (ids sem repetição) e ajusta os
+        contadores. O nível de alerta sobe junto com o tier, mas só desce
+        até o tier calculado com os limites rebaixados (band_tiers), o que
+        dá histerese em torno de cada limite. Retorna o nível de alerta
+        anterior e o novo de cada posição.
+        """
+        _, rows = self._rows.lookup(position_ids)
+        for index in np.flatnonzero(rows < 0).tolist():
+            rows[index] = self._row_for(int(position_ids[index]))
+        previous = self._tiers[rows]
+        levels = len(self.tier_counts)
+        self.tier_counts -= np.bincount(previous[previous != UNSCORED], minlength=levels)
+        self.tier_counts += np.bincount(tiers, minlength=levels)
+        self._scores[rows] = scores
+        self._tiers[rows] = tiers
+        if self._listeners:
+            changed = previous != tiers
+            if changed.any():
+                for listener in self._listeners:
+                    listener(position_ids[changed], previous[changed], tiers[changed])
+
+        previous_alert = self._alert_tiers[rows]
+        alert = tiers if band_tiers is None else np.maximum(tiers, np.minimum(previous_alert, band_tiers))
+        self._alert_tiers[rows] = alert
+        return previous_alert, alert
+
+    def invalidate(self, position_id: int):
+        """Descarta o score de uma posição alterada (o nível de alerta é mantido)"""
+        row = self._rows.get(position_id)
+        if row >= 0 and self._tiers[row] != UNSCORED:
+            self.tier_counts[self._tiers[row]] -= 1
+            self._tiers[row] = UNSCORED
+
+    def remove(self, position_id: int):
+        """Descarta todo o estado de uma posição fechada"""
+        self.invalidate(position_id)
+        row = self._rows.pop(position_id)
+        if row >= 0:
+            self._alert_tiers[row] = 0
+            self._free_rows.append(row)
+
+    def clear(self):
+        """Descarta todos os scores"""
+        self._tiers[:] = UNSCORED
+        self._alert_tiers[:] = 0
+        self._rows.clear()
+        self._free_rows = array('i', range(len(self._scores) - 1, -1, -1))
+        self.tier_counts[:] = 0
+
+    def export_state(self) -> Dict:
+        """Cópia do estado para snapshot (ver snapshot.py)"""
+        position_ids, rows = self._rows.items()
+        return {
+            'scores': self._scores.copy(),
+            'tiers': self._tiers.copy(),
+            'alert_tiers': self._alert_tiers.copy(),
+            'position_ids': position_ids,
+            'rows': rows,
+            'free_rows': np.array(self._free_rows, dtype=np.int64),
+            'tier_counts': self.tier_counts.copy(),
+        }
+
+    def restore_state(self, state: Dict):
+        """Substitui o estado pelo de export_state (os arrays são usados sem cópia)"""
+        self._scores, self._tiers, self._alert_tiers = state['scores'], state['tiers'], state['alert_tiers']
+        self._rows = IdIndex.from_items(state['position_ids'], state['rows'], len(self._scores))
+        self._free_rows = array('i', state['free_rows'].astype(np.int32).tobytes())
+        self.tier_counts = np.array(state['tier_counts'], dtype=np.int64)
+
+    def score(self, position_id: int) -> Optional[float]:
+        """Último score da posição (None se ainda não avaliada)"""
+        if position_id not in self:
+            return None
+        return float(self._scores[self._rows.get(position_id)])
+
+    def tier(self, position_id: int) -> Optional[str]:
+        """Último nível de alerta da posição ('NONE', 'LOW'..'CRITICAL'; None se não avaliada)"""
+        if position_id not in self:
+            return None
+        tier = int(self._tiers[self._rows.get(position_id)])
+        return 'NONE' if tier == 0 else ALERT_LEVELS[tier - 1]
+
+    def count(self, level: str, at_least: bool = False) -> int:
+        """Posições no nível (ou no nível e acima, com at_least=True)"""
+        tier = 0 if level == 'NONE' else ALERT_LEVELS.index(level) + 1
+        return int(self.tier_counts[tier:].sum() if at_least else self.tier_counts[tier])
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+SAPP Sharded Scoring
+Scoring em vários processos: as posições são particionadas em shards e cada
+worker executa a lógica do SAPPRealRiskAnalyzer sobre o seu shard. O processo
+de ingestão publica os preços em um PriceBoard compartilhado e os alertas
+dos workers voltam por uma fila única.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from batch_risk import BookColumns, MarketRegistry
+from position_book import PositionBook
+from price_board import PriceBoard, DEFAULT_MARKET_CAPACITY, PROCESSED, POSITIONS, TIERS
+
+logger = logging.getLogger(__name__)
+
+# Espera máxima de um worker sem ser acordado antes de conferir o pedido de parada (s)
+WORKER_POLL_SECONDS = 0.1
+
+# Método de criação dos processos (spawn: sem herdar threads e sockets do processo de ingestão)
+START_METHOD = 'spawn'
+
+
+def partition(columns: BookColumns, shards: int) -> List[BookColumns]:
+    """Divide o livro por position_id % shards (estável para posições novas)"""
+    shard_of = columns.position_ids % shards
+    return [columns.take(np.flatnonzero(shard_of == shard)) for shard in range(shards)]
+
+
+def _apply_changes(changes, book: PositionBook, registry: MarketRegistry, names: List[str],
+                   last: np.ndarray) -> bool:
+    """Aplica no livro do shard as alterações de posições enviadas pelo coordenador; True se houve alguma"""
+    applied = False
+    while True:
+        try:
+            current_names, columns, removed = changes.get_nowait()
+        except queue.Empty:
+            return applied
+        for name in current_names[len(names):]:
+            # Mercado novo: preço relido do quadro no próximo ciclo
+            market_id = registry.intern(name)
+            if market_id < len(last):
+                last[market_id] = np.nan
+            names.append(name)
+        if len(columns):
+            book.insert_columns(columns)
+        for position_id in removed.tolist():
+            if position_id in book:
+                del book[position_id]
+        applied = True
+
+
+def _shard_worker(index: int, board_name: str, capacity: int, workers: int, names: List[str],
+                  columns: BookColumns, settings: Dict, wake, alerts, changes, log_level: Optional[int]):
+    """Processo worker: reprocessa o shard a cada novo instantâneo do quadro de preços"""
+    from real_risk_analyzer import SAPPRealRiskAnalyzer  # importado aqui: o analisador importa este módulo
+
+    if log_level is not None:
+        logging.getLogger().setLevel(log_level)
+    board = PriceBoard.attach(board_name, capacity, workers)
+    status = board.status[index]
+    try:
+        registry = MarketRegistry()
+        for name in names:
+            registry.intern(name)
+        book = PositionBook(registry=registry, capacity=len(columns))
+        book.insert_columns(columns)
+
+        analyzer = SAPPRealRiskAnalyzer()
+        for key, value in settings.items():
+            setattr(analyzer, key, value)
+        analyzer.positions = book
+        analyzer.alert_pipeline.send_batch = lambda batch: alerts.put((index, batch)) or True
+        status[POSITIONS] = len(book)
+
+        snapshot = np.zeros(capacity, dtype=np.float64)
+        last = np.zeros(capacity, dtype=np.float64)
+        seq = -1
+        while not board.stopping:
+            current, markets = board.read(snapshot)
+            book_changed = _apply_changes(changes, book, registry, names, last)
+            if book_changed:
+                status[POSITIONS] = len(book)
+            if current != seq or book_changed:
+                # Apenas os mercados do shard que mudaram desde o último instantâneo
+                changed = np.flatnonzero(snapshot[:markets] != last[:markets])
+                changed = changed[changed < len(names)]
+                last[:markets] = snapshot[:markets]
+                try:
+                    if len(changed):
+                        analyzer.update_prices({names[i]: float(snapshot[i]) for i in changed.tolist()})
+                    analyzer.rescore_pending()
+                    analyzer.alert_pipeline.flush()
+                except Exception as e:
+                    logger.error(f"❌ Erro no shard {index}: {e}")
+                status[TIERS:] = analyzer.risk_state.tier_counts
+                status[PROCESSED] = seq = current
+            if wake.wait(WORKER_POLL_SECONDS):
+                wake.clear()
+    finally:
+        status = None
+        board.close()
+
+
+class ShardedScoring:
+    """
+    Coordenador do scoring em processos.
+
+    O livro é particionado por position_id % workers; cada worker recebe seu
+    shard na partida e depois lê o PriceBoard; posições abertas, alteradas
+    ou fechadas depois disso chegam ao shard dono por update_positions. Os
+    workers reprocessam o instantâneo mais recente do quadro: ticks que
+    chegam durante um ciclo são combinados no próximo. Os lotes de alertas
+    dos workers são entregues a on_alerts por uma thread do coordenador.
+    """
+
+    def __init__(self, positions: PositionBook, workers: Optional[int] = None,
+                 on_alerts: Optional[Callable[[List[Dict]], None]] = None, settings: Optional[Dict] = None,
+                 market_capacity: int = DEFAULT_MARKET_CAPACITY, log_level: Optional[int] = None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.registry = positions.registry
+        self.on_alerts = on_alerts
+        self.settings = settings or {}
+        self.log_level = log_level
+        self.board = PriceBoard(max(market_capacity, len(self.registry)), self.workers)
+        self._shards = partition(positions.columns(), self.workers)
+        self._context = multiprocessing.get_context(START_METHOD)
+        self._alerts = self._context.Queue()
+        self._wake = [self._context.Event() for _ in range(self.workers)]
+        self._changes = [self._context.Queue() for _ in range(self.workers)]
+        self._processes: List = []
+        self._merger: Optional[threading.Thread] = None
+        self.stats = dict.fromkeys(('alerts', 'batches', 'published'), 0)
+
+    def start(self, timeout: float = 60.0):
+        """Inicia os workers e espera o primeiro reprocessamento completo de cada shard"""
+        names = list(self.registry.names)
+        for index, columns in enumerate(self._shards):
+            process = self._context.Process(
+                target=_shard_worker, name=f"shard-{index}", daemon=True,
+                args=(index, self.board.name, self.board.capacity, self.workers, names, columns,
+                      self.settings, self._wake[index], self._alerts, self._changes[index], self.log_level))
+            process.start()
+            self._processes.append(process)
+        self._shards = None  # os workers têm suas cópias
+        self._merger = threading.Thread(target=self._merge_alerts, name="shard-alerts", daemon=True)
+        self._merger.start()
+
+        deadline = time.monotonic() + timeout
+        while (self.board.status[:, PROCESSED] < 0).any():
+            dead = [process.name for process in self._processes if not process.is_alive()]
+            if dead:
+                self.stop()
+                raise RuntimeError(f"Workers encerrados na partida: {', '.join(dead)}")
+            if time.monotonic() > deadline:
+                self.stop()
+                raise TimeoutError(f"Workers não ficaram prontos em {timeout:.0f}s")
+            time.sleep(0.01)
+        logger.info(f"🧩 Scoring em {self.workers} processos ({int(self.board.status[:, POSITIONS].sum())} posições)")
+
+    def publish(self, ticks: np.ndarray) -> int:
+        """Publica registros TICK_DTYPE no quadro e acorda os workers; retorna o seq"""
+        seq = self.board.publish(ticks['market_id'], ticks['price'])
+        self._wake_workers()
+        return seq
+
+    def update_prices(self, updates: Dict[str, float]) -> int:
+        """Publica preços por nome de mercado"""
+        market_ids = np.fromiter((self.registry.intern(market) for market in updates), dtype=np.int32,
+                                 count=len(updates))
+        seq = self.board.publish(market_ids, np.fromiter(updates.values(), dtype=np.float64, count=len(updates)))
+        self._wake_workers()
+        return seq
+
+    def update_positions(self, positions: PositionBook, position_ids: Iterable[int]) -> int:
+        """
+        Envia ao shard dono (position_id % workers) o estado atual das
+        posições indicadas: as que estão no livro são inseridas ou
+        sobrescritas, as que saíram são removidas. Retorna quantas foram enviadas.
+        """
+        ids = np.fromiter(position_ids, dtype=np.int64)
+        if not len(ids):
+            return 0
+        present = np.fromiter((position_id in positions for position_id in ids.tolist()), dtype=bool, count=len(ids))
+        removed = ids[~present]
+        names = list(self.registry.names)
+        for shard, columns in enumerate(partition(positions.columns(ids[present]), self.workers)):
+            gone = removed[removed % self.workers == shard]
+            if len(columns) or len(gone):
+                self._changes[shard].put((names, columns, gone))
+                self._wake[shard].set()
+        return len(ids)
+
+    def _wake_workers(self):
+        self.stats['published'] += 1
+        for event in self._wake:
+            event.set()
+
+    def wait_processed(self, seq: Optional[int] = None, timeout: float = 10.0) -> bool:
+        """Espera todos os workers reprocessarem o seq (padrão: o último publicado)"""
+        seq = self.board.seq if seq is None else seq
+        deadline = time.monotonic() + timeout
+        while (self.board.status[:, PROCESSED] < seq).any():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.0005)
+        return True
+
+    def tier_counts(self) -> np.ndarray:
+        """Posições por tier (NONE, LOW..CRITICAL) somadas sobre os shards"""
+        return self.board.tier_counts()
+
+    def _merge_alerts(self):
+        """Repassa os lotes de alertas dos workers, na ordem de chegada"""
+        while True:
+            item = self._alerts.get()
+            if item is None:
+                return
+            _, batch = item
+            self.stats['batches'] += 1
+            self.stats['alerts'] += len(batch)
+            if self.on_alerts is not None:
+                try:
+                    self.on_alerts(batch)
+                except Exception as e:
+                    logger.error(f"❌ Erro ao repassar alertas dos shards: {e}")
+
+    def stop(self, timeout: float = 5.0):
+        """Para os workers, entrega os alertas restantes e libera o quadro"""
+        if self.board is None:
+            return
+        self.board.request_stop()
+        for event in self._wake:
+            event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        if self._merger is not None:
+            self._alerts.put(None)
+            self._merger.join(timeout)
+            self._merger = None
+        self._alerts.close()
+        for changes in self._changes:
+            changes.close()
+        self._processes = []
+        self.board.close()
+        self.board = None
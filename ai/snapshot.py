@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+SAPP Snapshot
+Snapshot binário do estado do analisador para reinício a quente: os arrays
+(colunas do livro, scores, tiers, níveis de gatilho, históricos) são gravados
+crus e alinhados, e voltam como views de um mmap copy-on-write, sem
+desserializar nada; o estado pequeno (preços, escalares, filas) vai em JSON.
+
+Arquivo (little-endian):
+    cabeçalho  HEADER_SIZE bytes: magic, versão do formato, seções, criação (ns),
+               posição e tamanho dos metadados
+    seções     arrays contíguos, cada um alinhado em SECTION_ALIGNMENT bytes
+    metadados  JSON: {"sections": [[dtype, forma, posição], ...], "state": {...}}
+No estado, cada array é substituído por {"__section__": n}. O arquivo é
+gravado ao lado (.tmp) e renomeado, então um snapshot nunca fica pela metade.
+"""
+
+import json
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+MAGIC = b"SAPPSNAP"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<8sHHIqQQ')       # magic, versão, reservado, seções, criação, metadados (posição, tamanho)
+HEADER_SIZE = 64
+SECTION_ALIGNMENT = 64
+
+SECTION_KEY = "__section__"
+TMP_SUFFIX = ".tmp"
+
+# Intervalo padrão entre snapshots periódicos (segundos)
+DEFAULT_SNAPSHOT_INTERVAL = 60.0
+
+
+@dataclass
+class RestoreResult:
+    """Resumo de um reinício a partir de snapshot"""
+    positions: int = 0
+    created_ns: int = 0      # criação do snapshot (relógio de parede)
+    ticks: int = 0           # ticks do diário posteriores ao snapshot
+    instants: int = 0
+    rescored: int = 0        # posições reprocessadas após o replay
+    map_seconds: float = 0.0
+    replay_seconds: float = 0.0
+    score_seconds: float = 0.0
+
+    @property
+    def seconds(self) -> float:
+        """Tempo até todos os scores em cache estarem válidos"""
+        return self.map_seconds + self.replay_seconds + self.score_seconds
+
+
+def _flatten(value: Any, sections: List[np.ndarray]) -> Any:
+    """Troca os arrays do estado por referências às seções"""
+    if isinstance(value, np.ndarray):
+        sections.append(np.ascontiguousarray(value))
+        return {SECTION_KEY: len(sections) - 1}
+    if isinstance(value, dict):
+        return {key: _flatten(item, sections) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_flatten(item, sections) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _unflatten(value: Any, sections: List[np.ndarray]) -> Any:
+    if isinstance(value, dict):
+        if SECTION_KEY in value:
+            return sections[value[SECTION_KEY]]
+        return {key: _unflatten(item, sections) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_unflatten(item, sections) for item in value]
+    return value
+
+
+def write_snapshot(path: str, state: Dict) -> int:
+    """Grava o estado (dicionário com arrays NumPy nas folhas); retorna o tamanho em bytes"""
+    sections: List[np.ndarray] = []
+    flat = _flatten(state, sections)
+    created_ns = time.time_ns()
+    table = []
+    tmp_path = path + TMP_SUFFIX
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER_SIZE)
+        offset = HEADER_SIZE
+        for array in sections:
+            padding = -offset % SECTION_ALIGNMENT
+            f.write(b"\0" * padding)
+            offset += padding
+            table.append([array.dtype.str, list(array.shape), offset])
+            if array.nbytes:
+                f.write(array.reshape(-1).view(np.uint8).data)
+            offset += array.nbytes
+        meta = json.dumps({"sections": table, "state": flat}, separators=(',', ':')).encode()
+        f.write(meta)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(sections), created_ns, offset, len(meta)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return offset + len(meta)
+
+
+class Snapshot:
+    """
+    Snapshot mapeado em memória. state traz os arrays como views graváveis
+    (mmap copy-on-write: alterações ficam no processo, o arquivo não muda).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER_SIZE:
+                raise ValueError(f"Snapshot truncado: {path}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, _, count, self.created_ns, meta_offset, meta_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Snapshot inválido: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Versão {version} do snapshot não suportada: {path}")
+        if meta_offset + meta_length > size:
+            raise ValueError(f"Snapshot truncado: {path}")
+        meta = json.loads(self._mmap[meta_offset:meta_offset + meta_length])
+        if len(meta["sections"]) != count:
+            raise ValueError(f"Snapshot inválido: {path}")
+        sections = [self._section(dtype, shape, offset) for dtype, shape, offset in meta["sections"]]
+        self.size = size
+        self.state: Dict = _unflatten(meta["state"], sections)
+
+    def _section(self, dtype: str, shape: Tuple[int, ...], offset: int) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if not count:
+            return np.empty(shape, dtype=dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset).reshape(shape)
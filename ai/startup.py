@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+SAPP Startup
+Partida do worker: marcos de prontidão do feed (WebSocket aberto, primeiro
+snapshot completo de preços, primeiro scoring com ele) no lugar de esperas
+fixas, e o tempo de cada fase desde o início do processo
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Marcos da partida, na ordem em que acontecem
+READINESS_STAGES = ('open', 'prices', 'scored')
+
+# Espera máxima pelo feed antes de seguir sem ele (segundos)
+DEFAULT_READY_TIMEOUT = 10.0
+
+
+def process_age() -> Optional[float]:
+    """Segundos desde o início do processo (Linux, resolução de um tick do kernel), ou None"""
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return max(0.0, time.clock_gettime(time.CLOCK_BOOTTIME) - started)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Readiness:
+    """
+    Marcos da partida do feed: WebSocket aberto ('open'), primeiro snapshot
+    completo de preços ('prices') e primeiro scoring com ele ('scored').
+    Cada marco guarda o instante (perf_counter) da primeira vez e pode ser
+    esperado de threads (wait) ou de corrotinas (wait_async).
+    """
+
+    def __init__(self):
+        self.marks: Dict[str, float] = {}
+        self.error: Optional[str] = None  # feed que falhou antes de ficar pronto (abort)
+        self._lock = threading.Lock()
+        self._events = {stage: threading.Event() for stage in READINESS_STAGES}
+        self._waiters: List[Tuple[str, asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def mark(self, stage: str) -> bool:
+        """Registra o marco; True só na primeira vez"""
+        if stage in self.marks:
+            return False
+        with self._lock:
+            if stage in self.marks:
+                return False
+            self.marks[stage] = time.perf_counter()
+            waiters = [waiter for waiter in self._waiters if waiter[0] == stage]
+            self._waiters = [waiter for waiter in self._waiters if waiter[0] != stage]
+        self._events[stage].set()
+        self._wake(waiters)
+        return True
+
+    def abort(self, error):
+        """Feed sem reconexão caiu antes de ficar pronto: acorda quem espera (wait retorna False)"""
+        with self._lock:
+            if self.error is None:
+                self.error = str(error)
+            waiters, self._waiters = self._waiters, []
+        for event in self._events.values():
+            event.set()
+        self._wake(waiters)
+
+    def is_set(self, stage: str = 'prices') -> bool:
+        return stage in self.marks
+
+    def wait(self, stage: str = 'prices', timeout: Optional[float] = None) -> bool:
+        """Espera o marco por até timeout segundos (False se não veio ou o feed falhou)"""
+        self._events[stage].wait(timeout)
+        return stage in self.marks
+
+    async def wait_async(self, stage: str = 'prices', timeout: Optional[float] = None) -> bool:
+        """wait para corrotinas (o marco pode vir de qualquer thread)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if stage in self.marks or self.error is not None:
+                return stage in self.marks
+            waiter = (stage, loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[2], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        return stage in self.marks
+
+    @staticmethod
+    def _wake(waiters):
+        for _, loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # event loop já encerrado
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class StartupTimer:
+    """
+    Duração de cada fase da partida. A primeira fase conta desde o início do
+    processo (interpretador e imports inclusos) quando o sistema informa.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter() - (process_age() or 0.0)
+        self.phases: List[Tuple[str, float]] = []
+        self._last = self.origin
+
+    def mark(self, phase: str, at: Optional[float] = None) -> float:
+        """Fecha a fase no instante at (perf_counter; padrão: agora) e retorna sua duração"""
+        now = time.perf_counter() if at is None else at
+        elapsed = max(0.0, now - self._last)
+        self._last = max(self._last, now)
+        self.phases.append((phase, elapsed))
+        return elapsed
+
+    @property
+    def total(self) -> float:
+        return self._last - self.origin
+
+    def report(self) -> str:
+        phases = " | ".join(f"{phase} {elapsed * 1e3:.0f} ms" for phase, elapsed in self.phases)
+        return f"{phases} | total {self.total * 1e3:.0f} ms"
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+SAPP Stress Test
+Avaliação de todas as posições sob uma matriz de cenários de preço em uma única passada
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from batch_risk import (
+    ALERT_LEVELS, BookColumns, MarketRegistry, BatchRiskScores, FactorPipeline, DEFAULT_PIPELINE, column_inputs
+)
+
+# Limite de elementos (cenários × posições) avaliados de uma vez
+MAX_STRESS_ELEMENTS = 16384
+
+
+@dataclass
+class ScenarioSet:
+    """
+    Matriz de cenários × mercados. Choques relativos multiplicam o preço atual
+    por (1 + choque); choques absolutos substituem o preço. Mercados sem choque
+    (NaN) mantêm o preço atual.
+    """
+    names: List[str]
+    markets: List[str]
+    shocks: np.ndarray    # cenários × mercados
+    relative: np.ndarray  # cenários × mercados (True = relativo, False = preço absoluto)
+
+    @classmethod
+    def from_prices(cls, names: List[str], prices: List[Dict[str, float]]) -> 'ScenarioSet':
+        """Cenários com preços absolutos (ex.: {"WTI": 60.0, "Brent": 75.0})"""
+        return cls._from_dicts(names, prices, relative=False)
+
+    @classmethod
+    def from_shocks(cls, names: List[str], shocks: List[Dict[str, float]]) -> 'ScenarioSet':
+        """Cenários com choques relativos (ex.: {"Gold": -0.3} = queda de 30%)"""
+        return cls._from_dicts(names, shocks, relative=True)
+
+    @classmethod
+    def _from_dicts(cls, names: List[str], values: List[Dict[str, float]], relative: bool) -> 'ScenarioSet':
+        markets = sorted({market for scenario in values for market in scenario})
+        shocks = np.full((len(names), len(markets)), np.nan)
+        for row, scenario in enumerate(values):
+            for market, value in scenario.items():
+                shocks[row, markets.index(market)] = value
+        return cls(list(names), markets, shocks, np.full(shocks.shape, relative))
+
+    def concat(self, other: 'ScenarioSet') -> 'ScenarioSet':
+        """Junta dois conjuntos de cenários"""
+        markets = self.markets + [market for market in other.markets if market not in self.markets]
+        shocks = np.full((len(self) + len(other), len(markets)), np.nan)
+        relative = np.zeros(shocks.shape, dtype=bool)
+        for source, rows in ((self, slice(0, len(self))), (other, slice(len(self), None))):
+            columns = [markets.index(market) for market in source.markets]
+            shocks[rows, columns] = source.shocks
+            relative[rows, columns] = source.relative
+        return ScenarioSet(self.names + other.names, markets, shocks, relative)
+
+    def price_matrix(self, registry: MarketRegistry, prices: np.ndarray) -> np.ndarray:
+        """Preços de cada cenário (cenários × mercados do registry)"""
+        matrix = np.tile(prices, (len(self), 1))
+        for column, market in enumerate(self.markets):
+            market_id = registry.get(market)
+            if market_id is None:
+                continue
+            shock = self.shocks[:, column]
+            shocked = np.where(self.relative[:, column], prices[market_id] * (1.0 + shock), shock)
+            matrix[:, market_id] = np.where(np.isnan(shock), prices[market_id], shocked)
+        return matrix
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+@dataclass
+class StressResult:
+    """Resultado do stress test por cenário"""
+    names: List[str]
+    tier_counts: np.ndarray         # cenários × 5 (sem alerta, LOW..CRITICAL)
+    worst_position_ids: np.ndarray  # cenários × top_n, do maior para o menor score
+    worst_scores: np.ndarray        # cenários × top_n
+    margin_shortfall: np.ndarray    # soma de max(margem necessária - margem, 0) por cenário
+    positions_short: np.ndarray     # posições com margem insuficiente por cenário
+
+    def scenario(self, index: int) -> Dict:
+        """Resumo de um cenário"""
+        return {
+            "name": self.names[index],
+            "tiers": {level: int(count) for level, count in zip(('NONE',) + ALERT_LEVELS, self.tier_counts[index])},
+            "worst_positions": [
+                (int(position_id), float(score))
+                for position_id, score in zip(self.worst_position_ids[index], self.worst_scores[index])
+            ],
+            "margin_shortfall": float(self.margin_shortfall[index]),
+            "positions_short": int(self.positions_short[index])
+        }
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def _top_scores(position_ids: np.ndarray, scores: np.ndarray, top_n: int):
+    """Maiores scores por linha (ordem decrescente) e os ids correspondentes"""
+    top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    ids = position_ids[top] if position_ids.ndim == 1 else np.take_along_axis(position_ids, top, axis=1)
+    return ids, np.take_along_axis(top_scores, order, axis=1)
+
+
+def run_stress(columns: BookColumns, price_matrix: np.ndarray, risk_thresholds: Dict[str, float],
+               names: Optional[List[str]] = None, top_n: int = 5,
+               volatility_scores: Optional[np.ndarray] = None,
+               pipeline: Optional[FactorPipeline] = None) -> StressResult:
+    """
+    Avalia o livro em todos os cenários. O cálculo é feito em blocos de
+    cenários × posições com até MAX_STRESS_ELEMENTS elementos, tamanho em que
+    os temporários do kernel cabem no cache. Cada bloco de posições mantém
+    sua avaliação do pipeline entre os blocos de cenários: só o que depende
+    dos preços é recalculado.
+    """
+    pipeline = pipeline or DEFAULT_PIPELINE
+    scenarios = len(price_matrix)
+    count = len(columns)
+    top_n = min(top_n, count)
+    levels = len(ALERT_LEVELS) + 1
+    thresholds = [risk_thresholds[level] for level in ALERT_LEVELS]
+    tier_counts = np.zeros((scenarios, levels), dtype=np.int64)
+    worst_position_ids = np.zeros((scenarios, top_n), dtype=np.int64)
+    worst_scores = np.zeros((scenarios, top_n))
+    margin_shortfall = np.zeros(scenarios)
+    positions_short = np.zeros(scenarios, dtype=np.int64)
+
+    position_chunk = max(1, min(count, MAX_STRESS_ELEMENTS))
+    scenario_chunk = max(1, MAX_STRESS_ELEMENTS // position_chunk)
+    chunks = [(start, min(start + scenario_chunk, scenarios)) for start in range(0, scenarios, scenario_chunk)]
+    candidate_ids: List[List[np.ndarray]] = [[] for _ in chunks]
+    candidate_scores: List[List[np.ndarray]] = [[] for _ in chunks]
+
+    for position_start in range(0, count, position_chunk):
+        position_rows = slice(position_start, position_start + position_chunk)
+        block = columns.take(position_rows)
+        block_volatility = None if volatility_scores is None else volatility_scores[position_rows]
+        frame = None
+        for chunk, (start, stop) in enumerate(chunks):
+            chunk_prices = price_matrix[start:stop]
+            if frame is None:
+                frame = pipeline.evaluate(column_inputs(block, chunk_prices, block_volatility))
+            else:
+                frame.update(leg1_price=chunk_prices[:, block.leg1_ids], leg2_price=chunk_prices[:, block.leg2_ids])
+            scores = BatchRiskScores.from_frame(block.position_ids, frame)
+            rows = stop - start
+
+            # Contagem por tier: posições com score >= cada limite, por cenário
+            at_least = np.empty((rows, levels), dtype=np.int64)
+            at_least[:, 0] = len(block)
+            for level, threshold in enumerate(thresholds, 1):
+                at_least[:, level] = np.count_nonzero(scores.total >= threshold, axis=1)
+            tier_counts[start:stop, :-1] += at_least[:, :-1] - at_least[:, 1:]
+            tier_counts[start:stop, -1] += at_least[:, -1]
+
+            # Piores posições do bloco; a seleção final junta os candidatos
+            block_top = min(top_n, len(block))
+            if block_top:
+                ids, top_scores = _top_scores(block.position_ids, scores.total, block_top)
+                candidate_ids[chunk].append(ids)
+                candidate_scores[chunk].append(top_scores)
+
+            shortfall = scores.required_margin - block.margin
+            short = shortfall > 0
+            margin_shortfall[start:stop] += np.where(short, shortfall, 0.0).sum(axis=1)
+            positions_short[start:stop] += np.count_nonzero(short, axis=1)
+
+    if top_n:
+        for chunk, (start, stop) in enumerate(chunks):
+            ids, top_scores = _top_scores(
+                np.concatenate(candidate_ids[chunk], axis=1), np.concatenate(candidate_scores[chunk], axis=1), top_n
+            )
+            worst_position_ids[start:stop] = ids
+            worst_scores[start:stop] = top_scores
+
+    return StressResult(
+        names=list(names) if names is not None else [f"scenario_{index}" for index in range(scenarios)],
+        tier_counts=tier_counts,
+        worst_position_ids=worst_position_ids,
+        worst_scores=worst_scores,
+        margin_shortfall=margin_shortfall,
+        positions_short=positions_short
+    )
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Teste do Pipeline de Alertas
+Verifica fusão por posição, envio em lote, histerese e desacoplamento do scoring
+"""
+
+import sys
+import os
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from alert_pipeline import AlertPipeline
+from batch_risk import ALERT_LEVELS
+from risk_factors import tier_index
+from risk_state import RiskState
+from real_risk_analyzer import SAPPRealRiskAnalyzer, RiskAlert
+from test_batch_risk import _random_book
+
+THRESHOLDS = np.array([0.3, 0.5, 0.7, 0.9])
+
+def _alert(position_id: int, score: float, alert_type: str = 'HIGH') -> RiskAlert:
+    return RiskAlert(position_id, alert_type, f"Posição {position_id}", score, datetime.now(), "Monitorar")
+
+def test_coalescing_and_batching():
+    """Testa a fusão por posição e os gatilhos de tamanho e de tempo"""
+    print("🧪 TESTE 1: Fusão e Lotes")
+    print("=" * 50)
+
+    batches = []
+    pipeline = AlertPipeline(lambda batch: batches.append(batch) or True,
+                             max_pending=50, batch_size=10, flush_interval=0.2)
+    for score in (0.71, 0.75, 0.93):
+        pipeline.submit(_alert(1, score))
+    assert len(pipeline) == 1 and pipeline.stats['coalesced'] == 2
+
+    # Fila limitada: alertas de posições novas além do limite são descartados
+    for position_id in range(2, 60):
+        pipeline.submit(_alert(position_id, 0.8))
+    assert len(pipeline) == 50 and pipeline.stats['dropped'] == 9
+
+    pipeline.start()
+    deadline = time.monotonic() + 5
+    while len(pipeline) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [len(batch) for batch in batches] == [10] * 5
+    assert batches[0][0]["position_id"] == 1 and batches[0][0]["risk_score"] == 0.93
+
+    # Abaixo de batch_size o envio acontece pelo gatilho de tempo
+    start = time.monotonic()
+    pipeline.submit(_alert(100, 0.8))
+    while len(batches) == 5 and time.monotonic() - start < 5:
+        time.sleep(0.01)
+    waited = time.monotonic() - start
+    pipeline.stop()
+    assert len(batches) == 6 and 0.15 <= waited < 2
+    print(f"✅ {pipeline.stats['sent']} alertas em {pipeline.stats['batches']} lotes "
+          f"(último lote após {waited * 1000:.0f} ms)")
+    print()
+
+def test_retry_after_failure():
+    """Testa que um lote recusado volta para a fila sem sobrescrever alertas mais novos"""
+    print("🧪 TESTE 2: Reenvio Após Falha")
+    print("=" * 50)
+
+    delivered = {}
+    attempts = []
+
+    def flaky(batch):
+        attempts.append(len(batch))
+        if len(attempts) == 1:
+            pipeline.submit(_alert(2, 0.95, 'CRITICAL'))  # chega durante o envio que falha
+            raise ConnectionError("backend indisponível")
+        delivered.update({alert["position_id"]: alert for alert in batch})
+        return True
+
+    pipeline = AlertPipeline(flaky, batch_size=100, flush_interval=0.05)
+    logging.disable(logging.ERROR)
+    try:
+        for position_id in (1, 2, 3):
+            pipeline.submit(_alert(position_id, 0.75))
+        pipeline.start()
+        deadline = time.monotonic() + 5
+        while len(delivered) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pipeline.stop()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert sorted(delivered) == [1, 2, 3]
+    assert delivered[2]["alert_type"] == 'CRITICAL'
+    assert pipeline.stats['failures'] == 1
+    print(f"✅ Tentativas: {attempts}, alerta mais recente preservado")
+    print()
+
+def test_hysteresis():
+    """Testa que uma posição oscilando em torno de 0.7 não gera alertas repetidos"""
+    print("🧪 TESTE 3: Histerese")
+    print("=" * 50)
+
+    state = RiskState()
+    ids = np.array([7])
+    emitted = []
+    flapping = [0.72, 0.69, 0.71, 0.68, 0.70, 0.66, 0.64, 0.69, 0.71, 0.92, 0.88, 0.84]
+    for score in flapping:
+        scores = np.array([score])
+        tiers = tier_index(scores, THRESHOLDS, strict=False).astype(np.int8)
+        band = tier_index(scores, THRESHOLDS - 0.05, strict=False).astype(np.int8)
+        previous, alert = state.update(ids, scores, tiers, band)
+        if alert[0] != previous[0]:
+            emitted.append((score, ALERT_LEVELS[alert[0] - 1]))
+
+    assert emitted == [(0.72, 'HIGH'), (0.64, 'MEDIUM'), (0.71, 'HIGH'), (0.92, 'CRITICAL'), (0.84, 'HIGH')]
+    assert state.count('MEDIUM') == 0 and state.count('HIGH') == 1  # contadores seguem o tier sem histerese
+    print(f"✅ {len(flapping)} scores, {len(emitted)} alertas: {emitted}")
+    print()
+
+def test_scoring_decoupled_from_io():
+    """Testa que um backend lento não atrasa o reprocessamento"""
+    print("🧪 TESTE 4: Scoring Desacoplado do Envio")
+    print("=" * 50)
+
+    requests_received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            requests_received.append((self.path, len(body["alerts"])))
+            time.sleep(0.2)  # backend lento
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    analyzer = SAPPRealRiskAnalyzer(backend_url=f"http://127.0.0.1:{server.server_port}")
+    analyzer.positions = _random_book(5000, seed=11)
+    analyzer.update_prices({"WTI": 63.0, "Brent": 67.5, "Gold": 3732.0, "Silver": 43.2})
+    analyzer.alert_pipeline.start()
+
+    logging.disable(logging.WARNING)
+    try:
+        start = time.perf_counter()
+        analyzer._rescore_dirty_positions()
+        elapsed = time.perf_counter() - start
+
+        submitted = analyzer.alert_pipeline.stats['submitted']
+        deadline = time.monotonic() + 30
+        while analyzer.alert_pipeline.stats['sent'] < submitted and time.monotonic() < deadline:
+            time.sleep(0.05)
+        analyzer.alert_pipeline.stop()
+    finally:
+        logging.disable(logging.NOTSET)
+        server.shutdown()
+
+    batches = len(requests_received)
+    assert submitted > 1000
+    assert all(path == "/api/alerts/batch" for path, _ in requests_received)
+    assert sum(count for _, count in requests_received) == submitted
+    assert elapsed < 0.2 * batches
+    print(f"📊 Reprocessamento de 5000 posições: {elapsed * 1000:.1f} ms; "
+          f"{submitted} alertas entregues em {batches} requisições de 200 ms")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP ALERT PIPELINE - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_coalescing_and_batching()
+        test_retry_after_failure()
+        test_hysteresis()
+        test_scoring_decoupled_from_io()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
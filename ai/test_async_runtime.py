@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Teste do Modo Asyncio
+Verifica o cliente WebSocket, o cliente HTTP asyncio e o analisador rodando
+em um único event loop contra um feed e um backend locais
+"""
+
+import sys
+import os
+import asyncio
+import json
+import logging
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import async_websocket
+from async_websocket import OP_TEXT, OP_BINARY, OP_CONTINUATION, OP_PING, OP_PONG, OP_CLOSE
+from async_http_client import AsyncBackendClient
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+from test_batch_risk import _random_book
+from test_http_client import _Backend
+
+async def _accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Lado servidor do handshake WebSocket"""
+    head = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1')
+    key = next(line.split(':', 1)[1].strip() for line in head.split("\r\n")
+               if line.lower().startswith('sec-websocket-key'))
+    writer.write(
+        b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+        b"Sec-WebSocket-Accept: " + async_websocket.accept_key(key.encode()) + b"\r\n\r\n"
+    )
+
+def _frame(opcode: int, payload: bytes, fin: bool = True) -> bytes:
+    """Frame sem máscara (servidor → cliente), opcionalmente sem FIN"""
+    frame = bytearray(async_websocket.encode_frame(opcode, payload, mask=False))
+    if not fin:
+        frame[0] &= 0x7F
+    return bytes(frame)
+
+async def _read_client_frame(reader: asyncio.StreamReader):
+    """Lê um frame mascarado enviado pelo cliente"""
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        size = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif size == 127:
+        size = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4)
+    return first & 0x0F, async_websocket.apply_mask(await reader.readexactly(size), mask)
+
+def test_websocket_framing():
+    """Testa fragmentação, ping/pong, payload grande, binário e close"""
+    print("🧪 TESTE 1: Frames WebSocket")
+    print("=" * 50)
+
+    big = "x" * 100000
+    client_frames = []
+
+    async def handler(reader, writer):
+        await _accept(reader, writer)
+        writer.write(_frame(OP_TEXT, b'{"type": "initial', fin=False))
+        writer.write(_frame(OP_PING, b"hb"))  # controle no meio de uma mensagem fragmentada
+        writer.write(_frame(OP_CONTINUATION, b'_data"}'))
+        writer.write(_frame(OP_TEXT, big.encode()))
+        writer.write(_frame(OP_BINARY, b"\x00\x01\x02"))
+        client_frames.append(await _read_client_frame(reader))  # pong
+        client_frames.append(await _read_client_frame(reader))  # mensagem do cliente
+        writer.write(_frame(OP_CLOSE, struct.pack('!H', 1000)))
+        await writer.drain()
+        client_frames.append(await _read_client_frame(reader))  # eco do close
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            ws = await async_websocket.connect(f"ws://127.0.0.1:{port}/")
+            first = await ws.recv()
+            second = await ws.recv()
+            third = await ws.recv()
+            await ws.send("olá")
+            rest = [message async for message in ws]
+            return first, second, third, rest, ws.closed
+
+    first, second, third, rest, closed = asyncio.run(scenario())
+    assert json.loads(first) == {"type": "initial_data"}
+    assert second == big and third == b"\x00\x01\x02"
+    assert rest == [] and closed
+    assert client_frames[0] == (OP_PONG, b"hb")
+    assert client_frames[1] == (OP_TEXT, "olá".encode())
+    assert client_frames[2][0] == OP_CLOSE
+    print(f"✅ Mensagem fragmentada, ping respondido, {len(big)} bytes em um frame, close limpo")
+    print()
+
+def test_async_http_client():
+    """Testa conexões reaproveitadas, single-flight e respostas chunked"""
+    print("🧪 TESTE 2: Cliente HTTP Asyncio")
+    print("=" * 50)
+
+    backend = _Backend(latency=0.05)
+
+    async def pooled():
+        client = AsyncBackendClient(backend.url, pool_size=4)
+        try:
+            results = await asyncio.gather(*(client.get_json("/api/prices/WTI", ttl=1.0) for _ in range(20)))
+            assert all(result["price"] == 10.0 for result in results)
+            assert client.stats['requests'] == 1 and client.stats['joined'] == 19
+            for _ in range(3):
+                client.invalidate()
+                await client.get_many(f"/api/risk/{index}" for index in range(12))
+            missing = await client.get_many(["/api/prices/Unknown"])
+            return client.stats, missing
+        finally:
+            await client.close()
+
+    try:
+        stats, missing = asyncio.run(pooled())
+    finally:
+        backend.close()
+    assert stats['connections'] <= 4
+    assert missing["/api/prices/Unknown"].status_code == 404
+
+    async def chunked():
+        async def handler(reader, writer):
+            for _ in range(2):  # duas requisições na mesma conexão
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+                             b"7\r\n{\"a\": [\r\n6\r\n1, 2]}\r\n0\r\n\r\n")
+            writer.close()
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        async with server:
+            client = AsyncBackendClient(f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            values = [await client.get_json("/x"), await client.get_json("/y")]
+            await client.close()
+            return values, client.stats['connections']
+
+    values, connections = asyncio.run(chunked())
+    assert values == [{"a": [1, 2]}] * 2 and connections == 1
+    print(f"✅ {stats['requests']} requisições em {stats['connections']} conexões; corpo chunked lido")
+    print()
+
+def test_analyzer_event_loop():
+    """Testa feed → scoring → alertas no mesmo loop e parada rápida a partir de outra thread"""
+    print("🧪 TESTE 3: Analisador no Event Loop")
+    print("=" * 50)
+
+    batches = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            batches.append((self.path, len(body["alerts"])))
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    ticks = [
+        {"WTI": 63.0, "Brent": 67.5, "Gold": 3732.0, "Silver": 43.2},
+        {"WTI": 61.0, "Brent": 68.9, "Copper": 4.1, "Aluminum": 2.4},
+        {"Gold": 3650.0, "Silver": 44.8, "BTC": 64000.0, "ETH": 3100.0},
+    ]
+    feed_ready = threading.Event()
+
+    async def feed(reader, writer):
+        await _accept(reader, writer)
+        for prices in ticks:
+            message = {"prices": {market: {"price": price} for market, price in prices.items()}}
+            writer.write(_frame(OP_TEXT, json.dumps(message).encode()))
+            await writer.drain()
+        try:
+            await reader.read()  # manter aberto até o cliente fechar
+        finally:
+            writer.close()
+
+    analyzer = None
+
+    async def run():
+        nonlocal analyzer
+        server = await asyncio.start_server(feed, "127.0.0.1", 0)
+        analyzer = SAPPRealRiskAnalyzer(backend_url=f"http://127.0.0.1:{http_server.server_port}",
+                                        ws_url=f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+        analyzer.positions = _random_book(3000, seed=5)
+        feed_ready.set()
+        async with server:
+            await analyzer.run_async()
+
+    logging.disable(logging.WARNING)
+    try:
+        loop_thread = threading.Thread(target=lambda: asyncio.run(run()))
+        loop_thread.start()
+        assert feed_ready.wait(5)
+
+        deadline = time.monotonic() + 10
+        pipeline = analyzer.alert_pipeline
+        while time.monotonic() < deadline and (
+                len(analyzer.current_prices) < 8 or not pipeline.stats['sent'] or len(pipeline)):
+            time.sleep(0.02)
+
+        start = time.perf_counter()
+        analyzer.stop_monitoring()
+        loop_thread.join(5)
+        stop_time = time.perf_counter() - start
+    finally:
+        logging.disable(logging.NOTSET)
+        http_server.shutdown()
+
+    assert not loop_thread.is_alive() and analyzer._loop is None
+    assert len(analyzer.current_prices) == 8
+    assert len(pipeline) == 0 and pipeline.stats['sent'] > 0
+    assert pipeline.stats['sent'] + pipeline.stats['coalesced'] == pipeline.stats['submitted']
+    assert all(path == "/api/alerts/batch" for path, _ in batches)
+    assert sum(count for _, count in batches) == pipeline.stats['sent']
+    assert stop_time < 0.5
+    print(f"📊 {len(ticks)} ticks, {pipeline.stats['sent']} alertas em {len(batches)} lotes; "
+          f"parada em {stop_time * 1000:.0f} ms")
+    print()
+
+def test_dead_connections():
+    """Testa handshake sem resposta, conexão meio aberta e POST sem retentativa"""
+    print("🧪 TESTE 4: Conexões Presas")
+    print("=" * 50)
+
+    async def silent_handshake():
+        closed = asyncio.Event()
+
+        async def handler(reader, writer):
+            await reader.read()  # EOF só quando o cliente fecha o socket
+            closed.set()
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        async with server:
+            try:
+                await async_websocket.connect(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}/", timeout=0.1)
+                raise AssertionError("handshake sem resposta deveria expirar")
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.wait_for(closed.wait(), 1.0)
+
+    asyncio.run(silent_handshake())
+    print("✅ Timeout no handshake fecha o socket")
+
+    async def half_open(answer: bool):
+        async def handler(reader, writer):
+            await _accept(reader, writer)
+            opcode, payload = await _read_client_frame(reader)
+            assert opcode == OP_PING
+            if answer:
+                writer.write(_frame(OP_PONG, payload) + _frame(OP_TEXT, b"vivo"))
+            await reader.read()
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        async with server:
+            ws = await async_websocket.connect(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}/",
+                                               idle_timeout=0.1, ping_timeout=0.1)
+            try:
+                return await ws.recv()
+            except async_websocket.WebSocketError:
+                assert ws.closed
+                return None
+            finally:
+                await ws.close()
+
+    assert asyncio.run(half_open(True)) == "vivo"
+    assert asyncio.run(half_open(False)) is None
+    print("✅ Silêncio gera ping; sem resposta a leitura falha e a conexão é fechada")
+
+    async def stale_connection():
+        requests = []
+
+        async def handler(reader, writer):
+            # Uma resposta keep-alive por conexão e depois fecha (conexão ociosa morta)
+            requests.append((await reader.readuntil(b"\r\n\r\n")).split(b" ", 1)[0])
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        async with server:
+            client = AsyncBackendClient(f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            try:
+                await client.get_json("/a")
+                await asyncio.sleep(0.05)
+                try:
+                    await client.post_json("/api/alerts/batch", {"alerts": []})
+                    raise AssertionError("POST em conexão morta não deveria ser repetido")
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    pass
+                await client.get_json("/b")
+                await asyncio.sleep(0.05)
+                await client.get_json("/c")  # conexão ociosa morta: repetida em conexão nova
+            finally:
+                await client.close()
+            return requests, client.stats['connections']
+
+    requests, connections = asyncio.run(stale_connection())
+    assert requests == [b"GET", b"GET", b"GET"] and connections == 3
+    print(f"✅ POST em conexão morta falha sem reenvio; GET repetido ({connections} conexões)")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP ASYNC RUNTIME - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_websocket_framing()
+        test_async_http_client()
+        test_analyzer_event_loop()
+        test_dead_connections()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Teste da Suíte de Benchmarks
+Verifica os dados sintéticos e o relatório em um livro pequeno
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import run_benchmarks, synthetic_book, synthetic_ticks, print_report
+
+def test_synthetic_data_is_deterministic():
+    """Testa que livros e ticks sintéticos dependem apenas da semente"""
+    print("🧪 TESTE 1: Dados Sintéticos Determinísticos")
+    print("=" * 50)
+
+    first = synthetic_book(5000, seed=1).columns()
+    second = synthetic_book(5000, seed=1).columns()
+    other = synthetic_book(5000, seed=2).columns()
+    assert np.array_equal(first.margin, second.margin)
+    assert np.array_equal(first.entry_spread, second.entry_spread)
+    assert not np.array_equal(first.margin, other.margin)
+
+    messages = synthetic_ticks(300, seed=1)
+    assert messages == synthetic_ticks(300, seed=1)
+    kinds = {next(iter(json.loads(message))) for message in messages}
+    assert kinds == {"prices", "crypto", "commodity"}
+
+    print("✅ Mesma semente, mesmos dados")
+    print()
+
+def test_report_file():
+    """Testa a execução da suíte e o arquivo de resultados"""
+    print("🧪 TESTE 2: Relatório em JSON")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "bench.json")
+        report = run_benchmarks(sizes=[1000], ticks=200, output=output, budget_seconds=2.0)
+        with open(output) as handle:
+            saved = json.load(handle)
+
+    assert saved == json.loads(json.dumps(report))
+    names = {result["name"] for result in saved["results"]}
+    assert {"score_scalar", "score_batch", "risk_summary", "on_message", "process_price_update"} <= names
+    for result in saved["results"]:
+        assert result["operations"] > 0 and result["throughput"] > 0
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"] <= result["latency_ms"]["max"]
+
+    print_report(saved, baseline=saved)
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP BENCHMARK - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_synthetic_data_is_deterministic()
+        test_report_file()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
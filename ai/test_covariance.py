@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Teste da Matriz de Covariância
+Compara a matriz incremental com o cálculo EWMA completo e com a covariância real
+"""
+
+import sys
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from covariance import CovarianceMatrix
+from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+
+MARKETS = ["WTI", "Brent", "Gold", "Silver", "Copper"]
+BASE_PRICES = np.array([63.0, 67.0, 2000.0, 25.0, 4.0])
+
+# Correlações esperadas entre os mercados
+TRUE_CORRELATION = np.array([
+    [1.0, 0.9, 0.1, 0.1, 0.3],
+    [0.9, 1.0, 0.1, 0.1, 0.3],
+    [0.1, 0.1, 1.0, 0.8, 0.2],
+    [0.1, 0.1, 0.8, 1.0, 0.2],
+    [0.3, 0.3, 0.2, 0.2, 1.0]
+])
+TRUE_STD = np.array([0.002, 0.0018, 0.001, 0.0015, 0.0025])  # por tick de 1s
+
+def _price_path(ticks: int, seed: int) -> np.ndarray:
+    """Gera preços com retornos correlacionados"""
+    rng = np.random.default_rng(seed)
+    covariance = TRUE_CORRELATION * np.outer(TRUE_STD, TRUE_STD)
+    returns = rng.multivariate_normal(np.zeros(len(MARKETS)), covariance, ticks)
+    return BASE_PRICES * np.cumprod(1.0 + returns, axis=0)
+
+def test_matches_full_ewma():
+    """Testa a matriz incremental contra o EWMA recalculado do zero"""
+    print("🧪 TESTE 1: Incremental vs EWMA Completo")
+    print("=" * 50)
+
+    rng = np.random.default_rng(1)
+    prices = _price_path(400, seed=2)
+    timestamps = np.cumsum(rng.integers(100_000_000, 3_000_000_000, len(prices)))
+    matrix = CovarianceMatrix(halflife_seconds=30.0)
+
+    # Em cada tick apenas parte dos mercados é atualizada
+    last = {}
+    products = []
+    for tick, (row, timestamp) in enumerate(zip(prices, timestamps)):
+        updated = {market: price for market, price in zip(MARKETS, row) if rng.random() < 0.6}
+        matrix.update(updated, int(timestamp))
+        returns = np.zeros(len(MARKETS))
+        for market, price in updated.items():
+            if market in last:
+                returns[MARKETS.index(market)] = price / last[market] - 1.0
+            last[market] = price
+        products.append(np.outer(returns, returns))
+
+    # Pesos exponenciais no tempo, normalizados pela soma ponderada dos intervalos
+    ages = (timestamps[-1] - timestamps) / 1e9
+    weights = 0.5 ** (ages / 30.0)
+    intervals = np.diff(timestamps) / 1e9
+    expected = np.tensordot(weights, np.array(products), axes=1) / (weights[1:] @ intervals)
+
+    order = [matrix.registry.get(market) for market in MARKETS]
+    actual = matrix.covariance()[np.ix_(order, order)]
+    assert np.allclose(actual, expected, rtol=1e-9, atol=1e-18)
+
+    print("✅ Matriz incremental idêntica ao cálculo completo")
+    print()
+
+def test_recovers_correlation():
+    """Testa que a correlação estimada converge para a real"""
+    print("🧪 TESTE 2: Correlação Estimada")
+    print("=" * 50)
+
+    prices = _price_path(20000, seed=3)
+    matrix = CovarianceMatrix(halflife_seconds=5000.0)
+    for tick, row in enumerate(prices):
+        matrix.update(dict(zip(MARKETS, row)), tick * 1_000_000_000)
+
+    order = [matrix.registry.get(market) for market in MARKETS]
+    correlation = matrix.correlation()[np.ix_(order, order)]
+    error = np.abs(correlation - TRUE_CORRELATION).max()
+    print(f"📊 WTI/Brent: {correlation[0, 1]:.3f}, Gold/Silver: {correlation[2, 3]:.3f}, erro máximo: {error:.3f}")
+    assert error < 0.1
+    print()
+
+def test_portfolio_variance():
+    """Testa a variância de carteira como forma quadrática"""
+    print("🧪 TESTE 3: Variância da Carteira")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    legs = [("WTI", "Brent", 1000, -1000), ("Gold", "Silver", 10, -800), ("Copper", "WTI", 5000, -300)]
+    for position_id in range(1, 3001):
+        leg1, leg2, size1, size2 = legs[position_id % len(legs)]
+        analyzer.positions[position_id] = PositionData(
+            position_id=position_id, leg1_market=leg1, leg2_market=leg2,
+            leg1_size=size1, leg2_size=size2, margin=1000000,
+            entry_spread=-4.0, current_spread=-4.0, timestamp=datetime.now()
+        )
+
+    for tick, row in enumerate(_price_path(3000, seed=4)):
+        analyzer.update_prices(dict(zip(MARKETS, row)), timestamp_ns=tick * 1_000_000_000)
+
+    # Forma quadrática contra o cálculo direto por mercado
+    prices = {market: analyzer.current_prices[market] for market in MARKETS}
+    exposures = np.zeros(len(analyzer.covariance))
+    for position in analyzer.positions.values():
+        for market, size in ((position.leg1_market, position.leg1_size), (position.leg2_market, position.leg2_size)):
+            exposures[analyzer.covariance.registry.get(market)] += size * prices[market]
+    expected = exposures @ analyzer.covariance.covariance(3600.0) @ exposures
+    total = analyzer.portfolio_variance()
+    assert abs(total - expected) < 1e-9 * expected
+
+    # Spread WTI/Brent correlacionado tem variância menor que as pernas isoladas
+    spread_ids = [pid for pid in analyzer.positions if pid % len(legs) == 0]
+    spread_variance = analyzer.portfolio_variance(spread_ids[:1])
+    leg_variance = analyzer.covariance.variance(
+        np.where(np.arange(len(analyzer.covariance)) == analyzer.covariance.registry.get("WTI"), 1000 * prices["WTI"], 0.0),
+        3600.0
+    )
+    assert spread_variance < leg_variance
+
+    start = time.perf_counter()
+    for _ in range(100):
+        analyzer.portfolio_variance()
+    elapsed = (time.perf_counter() - start) / 100
+    print(f"📊 Desvio da carteira em 1h: ${total ** 0.5:,.0f} ({elapsed * 1000:.2f} ms por consulta, {len(analyzer.positions)} posições)")
+    print()
+
+def test_update_cost():
+    """Mede o custo por tick com muitos mercados"""
+    print("🧪 TESTE 4: Custo por Tick")
+    print("=" * 50)
+
+    rng = np.random.default_rng(5)
+    markets = [f"M{index}" for index in range(500)]
+    prices = dict(zip(markets, 100.0 + rng.random(len(markets))))
+    matrix = CovarianceMatrix()
+    matrix.update(prices, 0)
+
+    ticks = 5000
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        market = markets[tick % len(markets)]
+        prices[market] *= 1.0 + rng.normal(0, 0.001)
+        matrix.update({market: prices[market]}, tick * 1_000_000)
+    elapsed = time.perf_counter() - start
+    print(f"📊 {len(matrix)} mercados, {elapsed / ticks * 1e6:.1f} µs por tick")
+    print()
+
+def test_long_gap():
+    """Testa um intervalo de vários dias entre ticks (ganho que chegaria a 0)"""
+    print("🧪 TESTE 5: Intervalo Longo Entre Ticks")
+    print("=" * 50)
+
+    prices = _price_path(600, seed=6)
+    timestamps = np.arange(len(prices), dtype=np.int64) * 1_000_000_000
+    timestamps[300:] += 8 * 86400 * 1_000_000_000  # 8 dias sem ticks
+    matrix = CovarianceMatrix(halflife_seconds=60.0)
+    products = []
+    for tick, (row, timestamp) in enumerate(zip(prices, timestamps)):
+        matrix.update(dict(zip(MARKETS, row)), int(timestamp))
+        returns = row / prices[tick - 1] - 1.0 if tick else np.zeros(len(MARKETS))
+        products.append(np.outer(returns, returns))
+
+    ages = (timestamps[-1] - timestamps) / 1e9
+    weights = 0.5 ** (ages / 60.0)
+    intervals = np.diff(timestamps) / 1e9
+    expected = np.tensordot(weights, np.array(products), axes=1) / (weights[1:] @ intervals)
+    order = [matrix.registry.get(market) for market in MARKETS]
+    assert np.allclose(matrix.covariance()[np.ix_(order, order)], expected, rtol=1e-9, atol=1e-18)
+
+    # O analisador continua aplicando preços depois do intervalo
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.update_prices({"WTI": 63.0, "Brent": 67.0}, timestamp_ns=0)
+    analyzer.update_prices({"WTI": 63.5}, timestamp_ns=8 * 86400 * 1_000_000_000)
+    analyzer.update_prices({"WTI": 64.0}, timestamp_ns=8 * 86400 * 1_000_000_000 + 1_000_000_000)
+    assert analyzer.current_prices["WTI"] == 64.0
+    print("✅ Histórico anterior ao intervalo descartado sem erro; preços seguem sendo aplicados")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP COVARIANCE - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_matches_full_ewma()
+        test_recovers_correlation()
+        test_portfolio_variance()
+        test_update_cost()
+        test_long_gap()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
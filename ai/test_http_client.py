@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Teste do Cliente HTTP do Backend
+Usa um backend local com latência para verificar pool, single-flight, cache e ganho por ciclo
+"""
+
+import sys
+import os
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backend_integration import SAPPBackendIntegration
+from http_client import BackendClient
+
+MARKETS = ["WTI", "Brent", "Gold", "Silver", "Copper", "Aluminum",
+           "NaturalGas", "Platinum", "Palladium", "Corn", "Wheat", "Soybeans"]
+LATENCY = 0.02
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 64  # o pool abre 16 conexões de uma vez (backlog padrão: 5)
+
+class _Backend:
+    """Backend local que imita as rotas do servidor Node com latência fixa"""
+
+    def __init__(self, latency: float = LATENCY):
+        self.requests = []
+        self.connections = set()
+        self.fail_next = 0
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                backend.requests.append(self.path)
+                backend.connections.add(self.client_address)
+                time.sleep(latency)
+                if backend.fail_next:
+                    backend.fail_next -= 1
+                    self._reply(503, {"error": "indisponível"})
+                elif self.path.startswith("/api/prices/") and self.path.rsplit("/", 1)[1] in MARKETS:
+                    market = self.path.rsplit("/", 1)[1]
+                    self._reply(200, {"market": market, "price": 10.0 + MARKETS.index(market)})
+                elif self.path == "/api/positions":
+                    self._reply(200, [{"id": str(index), "status": "Active"} for index in range(20)])
+                elif self.path.startswith("/api/risk/"):
+                    self._reply(200, {"positionId": self.path.rsplit("/", 1)[1], "riskScore": 42})
+                else:
+                    self._reply(404, {"error": "não encontrado"})
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def test_single_flight_and_cache():
+    """Testa que requisições simultâneas iguais viram uma só e que o cache expira"""
+    print("🧪 TESTE 1: Single-flight e Cache")
+    print("=" * 50)
+
+    backend = _Backend(latency=0.1)
+    client = BackendClient(backend.url)
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.get_json("/api/prices/WTI", ttl=0.3)))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 20 and all(result["price"] == 10.0 for result in results)
+        assert backend.requests == ["/api/prices/WTI"]
+        assert client.stats['joined'] == 19
+
+        client.get_json("/api/prices/WTI", ttl=0.3)
+        assert len(backend.requests) == 1 and client.stats['cache_hits'] == 1
+        time.sleep(0.35)
+        client.get_json("/api/prices/WTI", ttl=0.3)
+        assert len(backend.requests) == 2
+
+        # Erros não ficam no cache; 503 é repetido automaticamente
+        backend.fail_next = 1
+        client.invalidate()
+        assert client.get_json("/api/prices/Gold", ttl=1.0)["price"] == 12.0
+        assert backend.requests[-2:] == ["/api/prices/Gold"] * 2
+    finally:
+        client.close()
+        backend.close()
+
+    print(f"✅ 20 chamadas simultâneas → 1 requisição; estatísticas {client.stats}")
+    print()
+
+def test_integration_fallbacks():
+    """Testa os métodos da integração com respostas de erro"""
+    print("🧪 TESTE 2: Integração com o Backend")
+    print("=" * 50)
+
+    backend = _Backend(latency=0.0)
+    integration = SAPPBackendIntegration(backend_url=backend.url)
+    try:
+        assert len(integration.get_positions()) == 20
+        prices = integration.get_prices(MARKETS[:3] + ["Unknown"])
+        assert prices["Brent"]["price"] == 11.0
+        assert prices["Unknown"] is None
+        assert integration.get_price_data("Unknown") is None
+        assert integration.get_risk("7")["riskScore"] == 42
+        assert integration.send_alerts([{"position_id": 1}]) is False  # rota sem POST no backend local
+    finally:
+        integration.close()
+        backend.close()
+
+    print("✅ Respostas de erro viram valores vazios, como antes")
+    print()
+
+def test_monitoring_cycle_speedup():
+    """Compara um ciclo de monitoramento com requisições avulsas e com o cliente compartilhado"""
+    print("🧪 TESTE 3: Custo por Ciclo de Monitoramento")
+    print("=" * 50)
+
+    backend = _Backend()
+    position_ids = [str(index) for index in range(20)]
+    try:
+        # Antes: uma conexão nova por requisição, em série
+        start = time.perf_counter()
+        requests.get(f"{backend.url}/api/positions").json()
+        for market in MARKETS:
+            requests.get(f"{backend.url}/api/prices/{market}").json()
+        for position_id in position_ids:
+            requests.get(f"{backend.url}/api/risk/{position_id}").json()
+        serial = time.perf_counter() - start
+        serial_connections = len(backend.connections)
+
+        integration = SAPPBackendIntegration(backend_url=backend.url)
+        backend.connections.clear()
+        cycles = 5
+        start = time.perf_counter()
+        for _ in range(cycles):
+            integration.client.invalidate()
+            integration.get_positions()
+            integration.get_prices(MARKETS)
+            integration.get_risks(position_ids)
+        pooled = (time.perf_counter() - start) / cycles
+        pooled_connections = len(backend.connections)
+        integration.close()
+    finally:
+        backend.close()
+
+    speedup = serial / pooled
+    print(f"📊 Requisições avulsas: {serial * 1000:.0f} ms/ciclo, {serial_connections} conexões")
+    print(f"📊 Cliente compartilhado: {pooled * 1000:.0f} ms/ciclo, {pooled_connections} conexões em {cycles} ciclos")
+    print(f"📊 Ganho: {speedup:.1f}x")
+    assert pooled_connections <= integration.client.pool_size
+    assert speedup > 3
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP HTTP CLIENT - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_single_flight_and_cache()
+        test_integration_fallbacks()
+        test_monitoring_cycle_speedup()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Teste do Reprocessamento Incremental
+Verifica que cada tick reprocessa apenas as posições dos mercados alterados
+"""
+
+import sys
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+from batch_risk import BookColumns
+from position_index import MarketPositionIndex
+
+def _position(position_id: int, leg1: str, leg2: str) -> PositionData:
+    """Cria uma posição de spread simples"""
+    return PositionData(
+        position_id=position_id,
+        leg1_market=leg1,
+        leg2_market=leg2,
+        leg1_size=1000,
+        leg2_size=-1000,
+        margin=1000000,
+        entry_spread=-4.0,
+        current_spread=-4.0,
+        timestamp=datetime.now()
+    )
+
+def test_market_index():
+    """Testa o índice mercado → posições"""
+    print("🧪 TESTE 1: Índice por Mercado")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions[1] = _position(1, "WTI", "Brent")
+    analyzer.positions[2] = _position(2, "Gold", "Silver")
+    analyzer.positions[3] = _position(3, "WTI", "Copper")
+
+    assert analyzer.position_index.positions_for(["WTI"]) == {1, 3}
+    assert analyzer.position_index.positions_for(["Silver"]) == {2}
+
+    del analyzer.positions[3]
+    assert analyzer.position_index.positions_for(["WTI"]) == {1}
+    assert analyzer.position_index.positions_for(["Copper"]) == set()
+
+    print("✅ Índice atualizado em inclusões e remoções")
+    print()
+
+def test_dirty_marking():
+    """Testa que um tick marca apenas as posições afetadas"""
+    print("🧪 TESTE 2: Marcação de Posições Sujas")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions = {
+        1: _position(1, "WTI", "Brent"),
+        2: _position(2, "Gold", "Silver"),
+    }
+    analyzer.update_prices({"WTI": 63.0, "Brent": 67.0, "Gold": 3732.0, "Silver": 43.2})
+    assert analyzer._rescore_dirty_positions() == 2
+
+    # Apenas WTI mudou: só a posição 1 é reprocessada
+    analyzer._process_commodity_prices({"WTI": {"price": 64.0}})
+    assert analyzer._rescore_dirty_positions() == 1
+
+    # Preço repetido não gera trabalho
+    analyzer._process_commodity_prices({"WTI": {"price": 64.0}})
+    assert analyzer._rescore_dirty_positions() == 0
+
+    # Caminho público usado antes do resumo: nada fica pendente
+    analyzer.mark_position_dirty(2)
+    assert analyzer.rescore_pending() == 1
+    assert analyzer.get_risk_summary()["pending_positions"] == 0
+
+    print("✅ Apenas posições dos mercados alterados foram reprocessadas")
+    print()
+
+def test_tick_to_alert_latency():
+    """Mede a latência entre o tick e o alerta no loop de monitoramento"""
+    print("🧪 TESTE 3: Latência Tick → Alerta")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions = {1: _position(1, "WTI", "Brent")}
+    analyzer.current_prices = {"WTI": 63.0, "Brent": 67.0}
+
+    alerts = []
+    alert_received = threading.Event()
+
+    def handle_alert(alert):
+        alerts.append(alert)
+        alert_received.set()
+
+    analyzer._handle_alert = handle_alert
+    analyzer.running = True
+    thread = threading.Thread(target=analyzer._monitoring_loop, daemon=True)
+    thread.start()
+
+    # Aguardar a primeira passada (posição estável, sem alerta)
+    deadline = time.monotonic() + 5
+    while 1 not in analyzer.trigger_book and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not alerts
+
+    start = time.perf_counter()
+    analyzer.update_prices({"WTI": 60.0})
+    assert alert_received.wait(5)
+    latency = time.perf_counter() - start
+
+    analyzer.running = False
+    analyzer._score_event.set()
+    thread.join(5)
+    assert not thread.is_alive()
+
+    print(f"📊 Alerta {alerts[0].alert_type} recebido em {latency * 1000:.2f} ms")
+    print()
+
+def test_index_memory():
+    """Testa o índice compactado: memória por posição, consultas e alterações até a compactação"""
+    print("🧪 TESTE 4: Memória do Índice por Mercado")
+    print("=" * 50)
+
+    count = 1000000
+    names = ["WTI", "Brent", "Gold", "Silver", "Copper"]
+    rng = np.random.default_rng(4)
+    columns = BookColumns.empty(count)
+    columns.position_ids[:] = np.arange(1, count + 1)
+    columns.leg1_ids[:] = rng.integers(0, len(names), count)
+    columns.leg2_ids[:] = rng.integers(0, len(names), count)
+
+    index = MarketPositionIndex()
+    start = time.perf_counter()
+    index.rebuild_columns(columns, names)
+    wti = index.positions_for(["WTI"])
+    elapsed = time.perf_counter() - start
+    on_wti = (columns.leg1_ids == 0) | (columns.leg2_ids == 0)
+    assert wti == set(columns.position_ids[on_wti].tolist()) and len(index) == count
+    pair = (columns.leg1_ids == 2) & (columns.leg2_ids == 3)
+    assert index.positions_for_pairs([("Gold", "Silver")]) == set(columns.position_ids[pair].tolist())
+    bytes_per_position = index.nbytes / count
+    assert bytes_per_position < 40
+
+    # Alterações pendentes e compactações (limite baixo para compactar várias vezes) preservam as consultas
+    index.rebuild_ratio = 0.001
+    for position_id in range(1, 5001):
+        index.remove(position_id, None)
+    for position_id in range(count + 1, count + 3001):
+        index.add(position_id, _position(position_id, "Zinc", "WTI"))
+    index.add(7, _position(7, "Zinc", "Gold"))
+    expected = {position_id for position_id in wti if position_id > 5000} | set(range(count + 1, count + 3001))
+    assert index.positions_for(["WTI"]) == expected
+    assert index.positions_for(["Zinc"]) == set(range(count + 1, count + 3001)) | {7}
+    assert index.positions_for_pairs([("Zinc", "Gold")]) == {7}
+    assert len(index) == count - 5000 + 3001 and index._dead + len(index._added) < 1024
+    assert ("Zinc", "WTI") in index.pairs() and "Zinc" in index.markets()
+    print(f"📊 {bytes_per_position:.1f} bytes por posição; índice montado e consultado em {elapsed * 1000:.0f} ms")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP INCREMENTAL SCORING - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_market_index()
+        test_dirty_marking()
+        test_tick_to_alert_latency()
+        test_index_memory()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
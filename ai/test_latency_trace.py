@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Teste da Atribuição de Latência
+Verifica os carimbos por etapa de tick → alerta, a detecção de alertas
+CRITICAL atrasados e a exportação do trace
+"""
+
+import sys
+import os
+import json
+import logging
+import tempfile
+import time
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from latency_trace import TICK_STAGES, ALERT_STAGES
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+NETWORK_DELAY_MS = 20
+DELIVERY_DELAY = 0.05
+
+def _fresh_frames(count: int, seed: int):
+    """Mensagens do backend carimbadas NETWORK_DELAY_MS antes do recebimento"""
+    for frame in synthetic_frames(count, seed):
+        data = json.loads(frame)
+        data["timestamp"] = time.time_ns() // 1_000_000 - NETWORK_DELAY_MS
+        yield json.dumps(data)
+
+def _analyzer(size: int = 20000, seed: int = 1) -> SAPPRealRiskAnalyzer:
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.current_prices.update(MARKETS)
+    analyzer.positions = synthetic_book(size, seed)
+    analyzer._rescore_dirty_positions()
+    analyzer.alert_pipeline.flush()
+    analyzer.alert_pipeline.send_batch = lambda batch: time.sleep(DELIVERY_DELAY) or True
+    return analyzer
+
+def test_stage_attribution():
+    """Testa que cada alerta entregue tem as etapas na ordem e somando o total"""
+    print("🧪 TESTE 1: Etapas de Tick → Alerta")
+    print("=" * 50)
+
+    logging.disable(logging.ERROR)
+    try:
+        analyzer = _analyzer(size=5000)
+        for frame in _fresh_frames(30, seed=1):
+            analyzer._on_message(None, frame)
+            analyzer._rescore_dirty_positions()
+            analyzer.alert_pipeline.flush()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    tracer = analyzer.tracer
+    assert len(tracer.ticks) == 30 and len(tracer.alerts) > 0
+    for alert in tracer.alerts:
+        tick = alert.tick
+        stamps = (tick.received_ns, tick.decoded_ns, tick.indexed_ns, tick.scoring_ns,
+                  tick.scored_ns, alert.enqueued_ns, alert.delivered_ns)
+        assert all(a <= b for a, b in zip(stamps, stamps[1:])), stamps
+        stages = alert.stages()
+        assert set(stages) == set(TICK_STAGES + ALERT_STAGES)
+        assert sum(value for stage, value in stages.items() if stage != 'network') == alert.total_ns
+        assert stages['delivery'] >= DELIVERY_DELAY * 1e9
+        assert abs(stages['network'] / 1e6 - NETWORK_DELAY_MS) < 15
+
+    breakdown = tracer.breakdown()
+    assert breakdown['decode']['count'] == 30
+    assert breakdown['total']['count'] == len(tracer.alerts)
+    assert breakdown['delivery']['p50'] >= DELIVERY_DELAY * 1e3
+    for stage in ('decode', 'index', 'scoring', 'delivery', 'total'):
+        print(f"📊 {stage:>8}: p50 {breakdown[stage]['p50']:.3f} ms, p99 {breakdown[stage]['p99']:.3f} ms")
+    print(f"✅ {len(tracer.alerts)} alertas com etapas consistentes")
+    print()
+
+def test_late_critical_alert():
+    """Testa que um alerta CRITICAL atrasado aponta a etapa responsável"""
+    print("🧪 TESTE 2: Alerta CRÍTICO Atrasado")
+    print("=" * 50)
+
+    logging.disable(logging.ERROR)
+    try:
+        analyzer = _analyzer(seed=2)
+    finally:
+        logging.disable(logging.NOTSET)
+    analyzer.alert_pipeline.send_batch = lambda batch: True  # entrega imediata: o scoring domina
+    analyzer.tracer.late_alert_seconds = 0.2
+    analyzer.risk_thresholds = {'LOW': 0.3, 'MEDIUM': 0.5, 'HIGH': 0.55, 'CRITICAL': 0.6}
+    score_columns = analyzer._score_columns
+
+    def slow_score(columns, prices):
+        time.sleep(0.3)  # scoring lento
+        return score_columns(columns, prices)
+    analyzer._score_columns = slow_score
+
+    # Queda forte do WTI empurra posições WTI/Brent para CRITICAL (limites reduzidos acima)
+    frame = json.dumps({"type": "price_update", "timestamp": time.time_ns() // 1_000_000,
+                        "commodities": {"WTI": {"price": MARKETS["WTI"] * 0.8}}})
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = lambda record: warnings.append(record.getMessage())
+    tracer_logger = logging.getLogger("latency_trace")
+    tracer_logger.addHandler(handler)
+    logging.disable(logging.WARNING - 1)
+    try:
+        analyzer._on_message(None, frame)
+        analyzer._rescore_dirty_positions()
+        analyzer.alert_pipeline.flush()
+    finally:
+        logging.disable(logging.NOTSET)
+        tracer_logger.removeHandler(handler)
+
+    late = list(analyzer.tracer.late_alerts)
+    assert late and all(alert.alert_type == 'CRITICAL' for alert in late)
+    stages = late[0].stages()
+    assert max(stages, key=stages.get) == 'scoring'
+    assert warnings and "etapa mais lenta: scoring" in warnings[0]
+    critical_late = [alert for alert in analyzer.tracer.alerts
+                     if alert.alert_type == 'CRITICAL' and alert.total_ns > 0.2e9]
+    assert analyzer.metrics["late_critical_alerts_total"].get() == len(critical_late) >= len(late)
+    print(f"✅ {len(critical_late)} alertas CRÍTICOS atrasados; {warnings[0][:90]}...")
+    print()
+
+def test_trace_export():
+    """Testa a exportação no formato Chrome Trace Event"""
+    print("🧪 TESTE 3: Exportação do Trace")
+    print("=" * 50)
+
+    logging.disable(logging.ERROR)
+    try:
+        analyzer = _analyzer(size=5000, seed=3)
+        for frame in _fresh_frames(10, seed=3):
+            analyzer._on_message(None, frame)
+            analyzer._rescore_dirty_positions()
+        analyzer.alert_pipeline.flush()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.json")
+        count = analyzer.export_latency_trace(path)
+        with open(path) as f:
+            trace = json.load(f)
+
+    events = trace["traceEvents"]
+    assert count == len(events) > 0
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    names = {event["name"] for event in events}
+    assert {"decode", "index"} <= names
+    if analyzer.tracer.alerts:
+        assert {"wait", "scoring", "enqueue", "delivery", "tick_to_alert"} <= names
+    print(f"✅ {count} eventos exportados ({', '.join(sorted(names))})")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP LATENCY TRACE - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_stage_attribution()
+        test_late_critical_alert()
+        test_trace_export()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Teste das Métricas
+Verifica a precisão dos histogramas, a exposição no formato do Prometheus
+e o custo de registro no caminho quente
+"""
+
+import sys
+import os
+import logging
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from metrics import MetricsRegistry, Histogram, _bucket_index, _bucket_bounds
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+def _parse(text: str) -> dict:
+    """Amostras da exposição em texto (nome com rótulos → valor)"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+def test_histogram_accuracy():
+    """Testa buckets log-lineares, percentis e buckets cumulativos exportados"""
+    print("🧪 TESTE 1: Precisão do Histograma")
+    print("=" * 50)
+
+    # Buckets contíguos e sem sobreposição
+    for value in list(range(0, 5000)) + [2**20 - 1, 2**20, 2**35 + 12345]:
+        low, high = _bucket_bounds(_bucket_index(value))
+        assert low <= value <= high and (high - low) <= max(1, value) / 64
+
+    rng = np.random.default_rng(3)
+    values = rng.lognormal(mean=11, sigma=1.5, size=50000).astype(np.int64)  # ~60 µs típico, em ns
+    histogram = Histogram("latency", "teste", scale=1e-9, buckets=(1e-5, 1e-4, 1e-3, 1e-2))
+    for value in values.tolist():
+        histogram.observe(value)
+
+    for q in (50, 90, 99, 99.9):
+        exact = np.percentile(values, q, method='inverted_cdf') * 1e-9
+        assert abs(histogram.percentile(q) - exact) <= exact / 64 + 1e-9, q
+    assert histogram.percentile(100) == values.max() * 1e-9
+
+    samples = _parse("\n".join(histogram.samples()))
+    for bound in (1e-5, 1e-4, 1e-3, 1e-2):
+        exact = int((values * 1e-9 <= bound).sum())
+        assert abs(samples[f'latency_bucket{{le="{bound!r}"}}'] - exact) <= exact / 50 + 5
+    assert samples['latency_bucket{le="+Inf"}'] == samples['latency_count'] == len(values)
+    assert abs(samples['latency_sum'] - values.sum() * 1e-9) < 1e-6
+    print(f"✅ p50/p99 = {histogram.percentile(50) * 1e6:.1f}/{histogram.percentile(99) * 1e6:.1f} µs "
+          f"(erro ≤ 1,6%)")
+    print()
+
+def test_prometheus_endpoint():
+    """Testa as métricas do analisador servidas em /metrics"""
+    print("🧪 TESTE 2: Endpoint do Prometheus")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.current_prices.update(MARKETS)
+    analyzer.positions = synthetic_book(20000, seed=2)
+    frames = synthetic_frames(200, seed=2)
+    logging.disable(logging.ERROR)
+    try:
+        analyzer._rescore_dirty_positions()
+        for frame in frames:
+            analyzer._on_message(None, frame)
+            analyzer._rescore_dirty_positions()
+        analyzer._on_message(None, '{"type": "price_update", ')
+    finally:
+        logging.disable(logging.NOTSET)
+
+    server = analyzer.serve_metrics(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            text = response.read().decode()
+        try:
+            urllib.request.urlopen(f"{url}/outro", timeout=5)
+            assert False, "caminho desconhecido deveria responder 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.close()
+
+    samples = _parse(text)
+    assert "# TYPE sapp_tick_decode_seconds histogram" in text
+    assert samples["sapp_ticks_total"] == len(frames) + 1
+    assert samples["sapp_tick_decode_errors_total"] == 1
+    assert samples["sapp_price_updates_total"] == len(frames) * len(MARKETS)
+    assert samples["sapp_tick_decode_seconds_count"] == len(frames)
+    assert samples["sapp_positions"] == 20000
+    assert samples["sapp_positions_rescored_count"] == analyzer.metrics["rescore_seconds"].count
+    assert samples['sapp_positions_rescored_bucket{le="+Inf"}'] >= 1
+    assert samples["sapp_monitoring_loop_lag_seconds_count"] >= 1
+    assert samples["sapp_alerts_generated_total"] == analyzer.alert_pipeline.stats['submitted']
+    assert samples["sapp_alert_queue_depth"] == len(analyzer.alert_pipeline)
+    print(f"✅ {len(samples)} amostras; decodificação p99 = "
+          f"{analyzer.metrics['tick_decode_seconds'].percentile(99) * 1e6:.1f} µs")
+    print()
+
+def test_recording_overhead():
+    """Testa que o registro das métricas é desprezível frente ao custo de um tick"""
+    print("🧪 TESTE 3: Custo de Registro")
+    print("=" * 50)
+
+    registry = MetricsRegistry()
+    counter = registry.counter("ticks_total", "teste")
+    histogram = registry.latency_histogram("decode_seconds", "teste")
+    operations = 100000
+    start = time.perf_counter()
+    for _ in range(operations):
+        begin = time.perf_counter_ns()
+        counter.inc()
+        histogram.observe(time.perf_counter_ns() - begin)
+    per_tick = (time.perf_counter() - start) / operations
+
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.update_prices = lambda updates, timestamp_ns=None: None
+    frames = synthetic_frames(2000, seed=4)
+    start = time.perf_counter()
+    for frame in frames:
+        analyzer._on_message(None, frame)
+    decode_only = (time.perf_counter() - start) / len(frames)
+
+    print(f"📊 Registro por tick: {per_tick * 1e9:.0f} ns; decodificação por tick: {decode_only * 1e6:.1f} µs")
+    assert per_tick < 2e-6
+    assert per_tick < 0.1 * decode_only
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP METRICS - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_histogram_accuracy()
+        test_prometheus_endpoint()
+        test_recording_overhead()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
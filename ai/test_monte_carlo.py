@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Teste do Monte Carlo VaR
+Compara a avaliação vetorizada com a regra escalar de liquidação e mede o desempenho
+"""
+
+import sys
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_risk import BookColumns, MarketRegistry
+from monte_carlo import MonteCarloModel, simulate_block, run_monte_carlo
+from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+
+MARKETS = ["WTI", "Brent", "Gold", "Silver", "Copper"]
+BASE_PRICES = {"WTI": 63.0, "Brent": 67.0, "Gold": 2000.0, "Silver": 25.0, "Copper": 4.0}
+
+def _synthetic_model(count: int, seed: int):
+    """Livro sintético com margens próximas do limite de liquidação"""
+    rng = np.random.default_rng(seed)
+    registry = MarketRegistry()
+    for market in MARKETS:
+        registry.intern(market)
+    prices = registry.price_vector(BASE_PRICES)
+
+    columns = BookColumns.empty(count)
+    columns.position_ids[:] = np.arange(1, count + 1)
+    columns.leg1_ids[:] = rng.integers(0, len(MARKETS), count)
+    columns.leg2_ids[:] = (columns.leg1_ids + rng.integers(1, len(MARKETS), count)) % len(MARKETS)
+    columns.leg1_size[:] = rng.integers(1, 2000, count)
+    columns.leg2_size[:] = -rng.integers(1, 2000, count)
+    required = 0.2 * np.maximum(columns.leg1_size * prices[columns.leg1_ids],
+                                -columns.leg2_size * prices[columns.leg2_ids])
+    columns.margin[:] = (required * rng.uniform(1.0, 1.3, count)).astype(np.int64)
+
+    std = np.array([0.02, 0.019, 0.01, 0.015, 0.025])
+    correlation = np.full((len(MARKETS), len(MARKETS)), 0.3)
+    correlation[0, 1] = correlation[1, 0] = 0.9
+    correlation[2, 3] = correlation[3, 2] = 0.8
+    np.fill_diagonal(correlation, 1.0)
+    covariance = correlation * np.outer(std, std)
+    return columns, prices, covariance
+
+def test_matches_scalar_rule():
+    """Testa perdas e liquidações contra a avaliação por posição"""
+    print("🧪 TESTE 1: Vetorizado vs Escalar")
+    print("=" * 50)
+
+    columns, prices, covariance = _synthetic_model(500, seed=1)
+    model = MonteCarloModel.build(columns, prices, covariance)
+    seed = np.random.SeedSequence(7)
+    losses, liquidations = simulate_block(model, seed, 64)
+
+    # Reproduzir os mesmos preços finais
+    shocks = np.random.default_rng(seed).standard_normal((64, len(MARKETS)))
+    terminal = prices * np.exp(-0.5 * np.diag(covariance) + shocks @ model.factor.T)
+
+    for path in range(64):
+        expected_loss = 0.0
+        expected_liquidations = 0
+        for row in range(len(columns)):
+            leg1, leg2 = columns.leg1_ids[row], columns.leg2_ids[row]
+            size1, size2 = columns.leg1_size[row], columns.leg2_size[row]
+            pnl = size1 * (terminal[path, leg1] - prices[leg1]) + size2 * (terminal[path, leg2] - prices[leg2])
+            expected_loss -= pnl
+
+            # Mesma regra de _calculate_liquidation_risk_real sobre o patrimônio final
+            required_margin = max(abs(size1) * terminal[path, leg1], abs(size2) * terminal[path, leg2]) * 0.2
+            liquidation_distance = (columns.margin[row] + pnl - required_margin) / required_margin
+            expected_liquidations += liquidation_distance < 0
+
+        assert abs(losses[path] - expected_loss) < 1e-6 * max(1.0, abs(expected_loss))
+        assert liquidations[path] == expected_liquidations
+
+    print(f"✅ 64 caminhos × {len(columns)} posições idênticos (média de {liquidations.mean():.1f} liquidações)")
+    print()
+
+def test_deterministic_seeding():
+    """Testa que o resultado não depende do número de processos"""
+    print("🧪 TESTE 2: Sementes Determinísticas")
+    print("=" * 50)
+
+    columns, prices, covariance = _synthetic_model(2000, seed=2)
+    model = MonteCarloModel.build(columns, prices, covariance)
+    serial = run_monte_carlo(model, 10000, 0.99, 3600.0, seed=3, workers=1)
+    parallel = run_monte_carlo(model, 10000, 0.99, 3600.0, seed=3, workers=3)
+    assert serial == parallel
+    assert serial.expected_shortfall >= serial.var > 0
+
+    other = run_monte_carlo(model, 10000, 0.99, 3600.0, seed=4, workers=1)
+    assert other.var != serial.var
+
+    print(f"📊 VaR 99%: ${serial.var:,.0f}, ES: ${serial.expected_shortfall:,.0f}, "
+          f"liquidações esperadas: {serial.expected_liquidations:.1f}")
+    print("✅ Resultados idênticos com 1 e 3 processos")
+    print()
+
+def test_analyzer_portfolio_var():
+    """Testa portfolio_var no analisador com a covariância alimentada por ticks"""
+    print("🧪 TESTE 3: portfolio_var no Analisador")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    for position_id in range(1, 201):
+        analyzer.positions[position_id] = PositionData(
+            position_id=position_id, leg1_market="WTI", leg2_market="Brent",
+            leg1_size=1000, leg2_size=-1000, margin=14000 + 20 * position_id,
+            entry_spread=-4.0, current_spread=-4.0, timestamp=datetime.now()
+        )
+
+    rng = np.random.default_rng(5)
+    prices = np.array([63.0, 67.0])
+    for tick in range(2000):
+        prices *= 1.0 + rng.normal(0, 0.001, 2)
+        analyzer.update_prices({"WTI": prices[0], "Brent": prices[1]}, timestamp_ns=tick * 1_000_000_000)
+
+    short = analyzer.portfolio_var(horizon=60.0, paths=20000, workers=1)
+    long = analyzer.portfolio_var(horizon=86400.0, paths=20000, workers=1)
+    assert 0 < short.var < long.var
+    assert short.expected_liquidations <= long.expected_liquidations
+    print(f"📊 1 min: VaR ${short.var:,.0f}, 1 dia: VaR ${long.var:,.0f}, "
+          f"liquidações esperadas {long.expected_liquidations:.1f}")
+    print()
+
+def test_throughput():
+    """Mede caminhos × posições por segundo"""
+    print("🧪 TESTE 4: Desempenho")
+    print("=" * 50)
+
+    columns, prices, covariance = _synthetic_model(50000, seed=6)
+    model = MonteCarloModel.build(columns, prices, covariance)
+    paths = 4096
+    start = time.perf_counter()
+    run_monte_carlo(model, paths, 0.99, 3600.0, workers=1)
+    elapsed = time.perf_counter() - start
+    rate = paths * len(columns) / elapsed
+    print(f"📊 {paths} caminhos × {len(columns)} posições em {elapsed:.2f}s "
+          f"({rate / 1e9:.2f} bilhões de avaliações/s por processo)")
+    print()
+
+def test_invalid_arguments():
+    """Testa a validação dos argumentos antes de simular"""
+    print("🧪 TESTE 5: Argumentos Inválidos")
+    print("=" * 50)
+
+    columns, prices, covariance = _synthetic_model(100, seed=7)
+    model = MonteCarloModel.build(columns, prices, covariance)
+    for paths, confidence in ((0, 0.99), (-10, 0.99), (1000, 1.0)):
+        try:
+            run_monte_carlo(model, paths, confidence, 3600.0, workers=1)
+        except ValueError as e:
+            print(f"📊 Recusado: {e}")
+        else:
+            raise AssertionError(f"paths={paths}, confidence={confidence} deveria ser recusado")
+    print("✅ Caminhos e confiança inválidos recusados com mensagem clara")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP MONTE CARLO VAR - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_matches_scalar_rule()
+        test_deterministic_seeding()
+        test_analyzer_portfolio_var()
+        test_throughput()
+        test_invalid_arguments()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Teste do Position Book
+Verifica a interface de dicionário e o uso de memória do livro colunar
+"""
+
+import sys
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_risk import BookColumns
+from position_book import PositionBook, PositionView
+from real_risk_analyzer import PositionData
+
+def _position(position_id: int, margin: int = 1000000) -> PositionData:
+    """Cria uma posição WTI-Brent"""
+    return PositionData(
+        position_id=position_id,
+        leg1_market="WTI",
+        leg2_market="Brent",
+        leg1_size=1000,
+        leg2_size=-1000,
+        margin=margin,
+        entry_spread=-400000000000,
+        current_spread=-400000000000,
+        timestamp=datetime.now()
+    )
+
+def test_dict_interface():
+    """Testa a interface de dicionário e as views"""
+    print("🧪 TESTE 1: Interface de Dicionário")
+    print("=" * 50)
+
+    book = PositionBook()
+    book[1] = _position(1)
+    book[2] = _position(2, margin=500000)
+
+    assert len(book) == 2
+    assert 1 in book and 3 not in book
+    assert list(book) == [1, 2]
+
+    view = book[2]
+    assert isinstance(view, PositionView)
+    assert view.leg1_market == "WTI" and view.leg2_market == "Brent"
+    assert view.margin == 500000
+    assert view.entry_spread == -400000000000
+
+    # Escrita pela view altera o livro
+    view.current_spread = -450000000000
+    assert book.current_spread[book.slot(2)] == -450000000000
+    assert abs((view.timestamp - datetime.now()).total_seconds()) < 5
+
+    del book[1]
+    assert len(book) == 1 and 1 not in book
+    try:
+        book[1]
+        raise AssertionError("posição removida ainda acessível")
+    except KeyError:
+        pass
+
+    print("✅ Inclusão, leitura, escrita e remoção funcionando")
+    print()
+
+def test_free_list_and_sparse_ids():
+    """Testa reutilização de slots e ids fora da faixa densa"""
+    print("🧪 TESTE 2: Free-list e Ids Esparsos")
+    print("=" * 50)
+
+    book = PositionBook(capacity=4)
+    for position_id in range(1, 5):
+        book[position_id] = _position(position_id)
+    slot = book.slot(3)
+    del book[3]
+    book[10] = _position(10)
+    assert book.slot(10) == slot
+
+    book[2 ** 40] = _position(2 ** 40, margin=42)
+    assert book[2 ** 40].margin == 42
+    assert list(book) == [1, 2, 4, 10, 2 ** 40]
+
+    columns = book.columns()
+    assert list(columns.position_ids) == [1, 2, 4, 10, 2 ** 40]
+    assert columns.margin[-1] == 42
+
+    # Ids repetidos em uma carga em massa: vale a última ocorrência, um slot por id
+    bulk = PositionBook(capacity=4)
+    source = PositionBook(capacity=4)
+    for position_id, margin in ((7, 1), (7, 2), (8, 3)):
+        source[position_id * 10 + margin] = _position(position_id, margin=margin)
+    columns = source.columns()
+    columns.position_ids[:] = [7, 7, 8]
+    bulk.insert_columns(columns)
+    assert len(bulk) == 2 and bulk[7].margin == 2 and bulk[8].margin == 3
+    del bulk[7]
+    del bulk[8]
+    assert len(bulk) == 0 and list(bulk) == []
+
+    print("✅ Slots reutilizados, ids esparsos suportados e ids repetidos na carga em massa")
+    print()
+
+def test_change_notifications():
+    """Testa notificações de mudança nos campos do score"""
+    print("🧪 TESTE 3: Notificações de Mudança")
+    print("=" * 50)
+
+    book = PositionBook()
+    events = []
+    book.subscribe(lambda position_id, old, new: events.append((position_id, old, new)))
+
+    book[1] = _position(1)
+    book[1].margin = 2000
+    book[1].current_spread = 1.0  # não é entrada do score: sem evento
+    del book[1]
+
+    assert [e[0] for e in events] == [1, 1, 1]
+    assert events[0][1] is None
+    assert events[1][1].margin == 1000000
+    assert events[2][2] is None
+
+    print("✅ Eventos de inclusão, alteração e remoção emitidos")
+    print()
+
+def test_memory_per_position():
+    """Mede a memória por posição com 1M posições"""
+    print("🧪 TESTE 4: Memória por Posição")
+    print("=" * 50)
+
+    count = 1000000
+    book = PositionBook()
+    book.registry.intern("WTI")
+    book.registry.intern("Brent")
+    columns = BookColumns.empty(count)
+    columns.position_ids[:] = np.arange(1, count + 1)
+    columns.leg2_ids[:] = 1
+    columns.leg1_size[:] = 1000
+    columns.leg2_size[:] = -1000
+    columns.margin[:] = 1000000
+
+    start = time.perf_counter()
+    book.insert_columns(columns)
+    elapsed = time.perf_counter() - start
+
+    assert len(book) == count
+    assert book[count].leg2_market == "Brent"
+    bytes_per_position = book.nbytes / count
+    print(f"📊 {bytes_per_position:.1f} bytes por posição (carga em {elapsed * 1000:.1f} ms)")
+    assert bytes_per_position < 64
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP POSITION BOOK - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_dict_interface()
+        test_free_list_and_sparse_ids()
+        test_change_notifications()
+        test_memory_per_position()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
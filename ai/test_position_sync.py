@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Teste da Sincronização Incremental de Posições
+Usa um backend local com histórico de alterações versionado para verificar
+paginação, aplicação das diferenças no livro e o custo de um ciclo
+"""
+
+import sys
+import os
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, MARKETS
+from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+from position_sync import SyncResult, PositionPageError
+
+class _Backend:
+    """Backend local com a rota /api/positions/changes (registro mais recente de cada posição)"""
+
+    def __init__(self):
+        self.records = {}     # position_id → registro mais recente (ativo ou fechado)
+        self.version = 0
+        self.horizon = 0      # fechamentos antes desta versão foram descartados (since menor → 410)
+        self.requests = []
+        self.changes_route = 200  # 404: rota ausente; 'list': caminho casado por /api/positions/:user
+        self.listing = []     # GET /api/positions (formato do backend Node)
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                backend.requests.append(self.path)
+                if url.path == "/api/positions":
+                    self._reply(200, backend.listing)
+                    return
+                if url.path == "/api/positions/changes" and backend.changes_route != 200:
+                    if backend.changes_route == 'list':
+                        self._reply(200, [])
+                    else:
+                        self._reply(404, {"error": "não encontrado"})
+                    return
+                if url.path != "/api/positions/changes":
+                    self._reply(404, {"error": "não encontrado"})
+                    return
+                query = parse_qs(url.query)
+                since, limit = int(query["since"][0]), int(query["limit"][0])
+                full = query.get("full") == ["1"]
+                if not full and since < backend.horizon:
+                    self._reply(410, {"error": "histórico expirado"})
+                    return
+                self._reply(200, backend.changes(since, limit, full))
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def changes(self, since: int, limit: int, full: bool):
+        records = [record for record in self.records.values() if record["version"] > since
+                   and (not full or record["status"] == "Active")]
+        records.sort(key=lambda record: record["version"])
+        page = records[:limit]
+        return {"changes": page, "version": page[-1]["version"] if page else max(since, self.version),
+                "has_more": len(records) > limit}
+
+    def put(self, position_id: int, status: str = "Active", **fields):
+        self.version += 1
+        record = dict(self.records.get(position_id, {}), position_id=position_id, status=status,
+                      version=self.version, **fields)
+        self.records[position_id] = record
+        return record
+
+    def load_book(self, book):
+        """Registra as posições de um livro como já existentes no backend"""
+        columns = book.columns()
+        names = book.registry.names
+        for row, position_id in enumerate(columns.position_ids.tolist()):
+            self.put(position_id, leg1_market=names[columns.leg1_ids[row]], leg2_market=names[columns.leg2_ids[row]],
+                     leg1_size=int(columns.leg1_size[row]), leg2_size=int(columns.leg2_size[row]),
+                     margin=int(columns.margin[row]), entry_spread=float(columns.entry_spread[row]))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _analyzer(backend: _Backend) -> SAPPRealRiskAnalyzer:
+    analyzer = SAPPRealRiskAnalyzer(backend_url=backend.url)
+    analyzer.current_prices.update(MARKETS)
+    return analyzer
+
+def test_full_and_incremental_sync():
+    """Testa a carga inicial paginada, as diferenças seguintes e a ressincronização após 410"""
+    print("🧪 TESTE 1: Carga Inicial, Diferenças e 410")
+    print("=" * 50)
+
+    backend = _Backend()
+    backend.load_book(synthetic_book(2500, seed=8))
+    analyzer = _analyzer(backend)
+    analyzer.position_sync.page_size = 1000
+    # Posição local que o backend não lista: removida na carga completa
+    analyzer.positions[999999] = PositionData(999999, "WTI", "Brent", 1000, -1000, 1000000, -4.0, -4.0, datetime.now())
+    logging.disable(logging.ERROR)
+    try:
+        analyzer._update_positions_from_contract()
+        sync = analyzer.position_sync
+        assert len(analyzer.positions) == 2500 and sync.version == 2500 and 999999 not in analyzer.positions
+        assert len(backend.requests) == 3 and backend.requests[1].endswith("since=1000&limit=1000&full=1")
+        analyzer._rescore_dirty_positions()
+        assert len(analyzer.risk_state) == 2500
+
+        # Alteração de margem, abertura e fechamento
+        score = analyzer.risk_state.score(10)
+        backend.put(10, margin=1)
+        backend.put(2501, leg1_market="Gold", leg2_market="Silver", leg1_size=10, leg2_size=-800,
+                    margin=5000, entry_spread=3688.8)
+        backend.put(20, status="Closed")
+        analyzer._update_positions_from_contract()
+        assert analyzer.positions[10].margin == 1 and 2501 in analyzer.positions and 20 not in analyzer.positions
+        assert 20 not in analyzer.risk_state and 20 not in analyzer.trigger_book
+        assert 2501 in analyzer.position_index.positions_for(["Gold"])
+        assert analyzer._dirty_positions == {10, 2501}
+        assert analyzer._rescore_dirty_positions() == 2
+        assert analyzer.risk_state.score(10) > score  # score em cache refeito com a nova margem
+        assert sync.versions[10] == backend.version - 2 and sync.version == backend.version
+
+        # Abertura antiga entregue depois do fechamento: a versão do fechamento a descarta
+        late = dict(backend.records[20], status="Active", version=backend.version - 1)
+        result = SyncResult()
+        sync.apply_page(analyzer.positions, {"changes": [late], "version": late["version"]}, result)
+        assert result.stale == 1 and 20 not in analyzer.positions
+
+        # Histórico descartado: 410 leva a uma sincronização completa que remove o que sumiu
+        backend.put(30, status="Closed")
+        del backend.records[30]  # fechamento já compactado no backend
+        backend.horizon = backend.version + 1
+        backend.put(40, margin=2)
+        before = len(backend.requests)
+        analyzer._update_positions_from_contract()
+        assert backend.requests[before + 1].endswith("since=0&limit=1000&full=1")
+        assert 30 not in analyzer.positions and analyzer.positions[40].margin == 2
+        assert len(analyzer.positions) == 2499
+    finally:
+        logging.disable(logging.NOTSET)
+        backend.close()
+    print(f"✅ {len(analyzer.positions)} posições sincronizadas; versão {analyzer.position_sync.version}")
+    print()
+
+def test_sync_cost_on_large_book():
+    """Testa que 100 alterações em um livro de 500 mil posições custam ~100 posições de trabalho"""
+    print("🧪 TESTE 2: Custo de um Ciclo (500 mil posições)")
+    print("=" * 50)
+
+    size = 500000
+    backend = _Backend()
+    analyzer = _analyzer(backend)
+    analyzer.positions = synthetic_book(size, seed=9)
+    analyzer.position_sync.version = backend.version = size  # livro já sincronizado até aqui
+    analyzer.position_sync.page_size = 32
+    logging.disable(logging.ERROR)
+    try:
+        start = time.perf_counter()
+        assert analyzer._rescore_dirty_positions() == size
+        full_rescore = time.perf_counter() - start
+
+        rng = np.random.default_rng(9)
+        changed = rng.choice(np.arange(1, size + 1), 60, replace=False).tolist()
+        for position_id in changed[:50]:
+            backend.put(position_id, leg1_market="WTI", leg2_market="Brent", leg1_size=1000, leg2_size=-1000,
+                        margin=1000000, entry_spread=-4.0)
+        for position_id in changed[50:]:
+            backend.put(position_id, status="Closed")
+        for index in range(40):
+            backend.put(size + 1 + index, leg1_market="Gold", leg2_market="Silver", leg1_size=10, leg2_size=-800,
+                        margin=5000, entry_spread=3688.8)
+
+        start = time.perf_counter()
+        analyzer._update_positions_from_contract()
+        rescored = analyzer._rescore_dirty_positions()
+        cycle = time.perf_counter() - start
+    finally:
+        logging.disable(logging.NOTSET)
+        backend.close()
+
+    sync = analyzer.position_sync
+    assert len(backend.requests) == 4  # 100 alterações em páginas de 32
+    assert rescored == 90 and len(analyzer.positions) == size + 30
+    assert len(analyzer.risk_state) == size + 30
+    assert sync.version == backend.version
+    print(f"📊 Ciclo com 100 alterações: {cycle * 1e3:.1f} ms; reprocessamento completo: {full_rescore * 1e3:.0f} ms")
+    assert cycle < full_rescore / 10
+    print(f"✅ {rescored} posições reprocessadas ({cycle / full_rescore:.1%} do custo completo)")
+    print()
+
+def test_async_sync():
+    """Testa o mesmo ciclo pelo cliente asyncio"""
+    print("🧪 TESTE 3: Sincronização no Modo Asyncio")
+    print("=" * 50)
+
+    backend = _Backend()
+    backend.load_book(synthetic_book(300, seed=10))
+    analyzer = _analyzer(backend)
+    analyzer.position_sync.page_size = 100
+
+    async def run():
+        try:
+            await analyzer._update_positions_from_contract_async()
+            backend.put(5, status="Closed")
+            await analyzer._update_positions_from_contract_async()
+        finally:
+            await analyzer.backend.close_async()
+
+    logging.disable(logging.ERROR)
+    try:
+        asyncio.run(run())
+    finally:
+        logging.disable(logging.NOTSET)
+        backend.close()
+    assert len(analyzer.positions) == 299 and 5 not in analyzer.positions
+    assert analyzer.metrics["position_changes_total"].get() == 301
+    assert analyzer.metrics["position_sync_seconds"].count == 2
+    print(f"✅ {len(backend.requests)} páginas; {len(analyzer.positions)} posições")
+    print()
+
+def test_listing_fallback():
+    """Testa a sincronização pela listagem de posições quando a rota de alterações não existe"""
+    print("🧪 TESTE 4: Backend sem a Rota de Alterações")
+    print("=" * 50)
+
+    backend = _Backend()
+    backend.changes_route = 404
+    backend.listing = [
+        {"id": "1700000000001", "asset": "WTI", "side": "Long", "size": 1000, "collateral": 1000000,
+         "entry_price": 63.0, "leg2_asset": "Brent", "leg2_size": 1000, "leg2_entry_price": 67.0,
+         "timestamp": 1700000000000, "status": "Active"},
+        {"id": "1700000000002", "asset": "Gold", "side": "Short", "size": 10, "collateral": 5000,
+         "entry_price": 2000.0, "timestamp": 1700000000000, "status": "Active"},
+    ]
+    analyzer = _analyzer(backend)
+    logging.disable(logging.ERROR)
+    try:
+        analyzer._update_positions_from_contract()
+        position = analyzer.positions[1700000000001]
+        assert len(analyzer.positions) == 2 and position.leg2_market == "Brent"
+        assert (position.leg1_size, position.leg2_size, position.entry_spread) == (1000, -1000, -4.0)
+        assert analyzer.positions[1700000000002].leg1_size == -10
+        assert analyzer.position_sync.version == 0
+
+        # Listagem repetida sem mudanças não marca posições; as que saíram são removidas
+        analyzer._rescore_dirty_positions()
+        backend.listing = backend.listing[:1]
+        backend.changes_route = 'list'  # resposta fora do formato também cai na listagem
+        analyzer._update_positions_from_contract()
+        assert list(analyzer.positions) == [1700000000001] and not analyzer._dirty_positions
+
+        # Sem listagem disponível o erro é propagado (e registrado pelo analisador)
+        sync = analyzer.position_sync
+        try:
+            sync.sync(analyzer.positions, analyzer.backend.get_position_changes)
+            raise AssertionError("resposta inválida deveria falhar sem listagem")
+        except PositionPageError:
+            pass
+    finally:
+        logging.disable(logging.NOTSET)
+        backend.close()
+    print(f"✅ {len(analyzer.positions)} posição sincronizada pela listagem (404 e resposta inválida)")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP POSITION SYNC - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_full_and_incremental_sync()
+        test_sync_cost_on_large_book()
+        test_async_sync()
+        test_listing_fallback()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
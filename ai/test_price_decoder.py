@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Teste do Decodificador de Preços
+Verifica o despacho por tipo, os registros tipados e o ganho de ingestão
+"""
+
+import sys
+import os
+import json
+import logging
+import time
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import real_risk_analyzer
+from batch_risk import MarketRegistry
+from benchmark import synthetic_frames, _discarded_logs
+from price_decoder import PriceDecoder, TICK_DTYPE, JSON_BACKEND
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+def _legacy_on_message(analyzer: SAPPRealRiskAnalyzer, message: str):
+    """Caminho anterior: json.loads, seções testadas uma a uma e log por mercado"""
+    data = json.loads(message)
+    if 'prices' in data:
+        updates = {}
+        for market, price_data in data['prices'].items():
+            if isinstance(price_data, dict) and 'price' in price_data:
+                updates[market] = price_data['price']
+                real_risk_analyzer.logger.info(f"📊 Preço atualizado: {market} = ${price_data['price']:.2f}")
+        analyzer.update_prices(updates)
+
+def test_dispatch_and_records():
+    """Testa os tipos do backend, o formato antigo e entradas inválidas"""
+    print("🧪 TESTE 1: Despacho e Registros")
+    print("=" * 50)
+
+    registry = MarketRegistry()
+    registry.intern("WTI")
+    decoder = PriceDecoder(registry)
+
+    ticks = decoder.decode(json.dumps({
+        "type": "initial_data",
+        "timestamp": 1700000000123,
+        "crypto": {"BTC": {"price": 64000.5, "source": "Reflector"}, "XLM": {"price": 0, "source": "ERROR"}},
+        "commodities": {"WTI": {"price": 63}, "Gold": {"error": "timeout"}, "Corn": "n/a"},
+    }))
+    assert ticks.dtype == TICK_DTYPE
+    assert [registry.names[market_id] for market_id in ticks['market_id']] == ["BTC", "XLM", "WTI"]
+    assert ticks['price'].tolist() == [64000.5, 0.0, 63.0]
+    assert (ticks['timestamp_ns'] == 1700000000123 * 1_000_000).all()
+    assert registry.get("WTI") == 0 and "Gold" not in registry
+
+    # Formato sem 'type': apenas a primeira seção presente (prices, crypto, commodity), como antes
+    legacy = decoder.decode(b'{"commodity": {"Brent": {"price": 67.5}}, "crypto": {"ETH": {"price": 1}}}')
+    assert [registry.names[market_id] for market_id in legacy['market_id']] == ["ETH"]
+
+    # Tipos desconhecidos são ignorados até terem um decodificador registrado
+    assert len(decoder.decode('{"type": "contract_update", "positions": []}')) == 0
+    decoder.register('contract_update', lambda data, timestamp_ns: decoder._records([0], [1.0], timestamp_ns))
+    assert len(decoder.decode('{"type": "contract_update"}')) == 1
+    assert len(decoder.decode('[1, 2]')) == 0
+
+    try:
+        decoder.decode('{"type": ')
+        assert False, "JSON inválido deveria falhar"
+    except ValueError:
+        pass
+    assert decoder.stats == {'messages': 5, 'ticks': 5, 'ignored': 2}
+    print(f"✅ Registros tipados via {JSON_BACKEND}; estatísticas {decoder.stats}")
+    print()
+
+def test_analyzer_ingest():
+    """Testa que o analisador aplica as duas seções das mensagens do backend"""
+    print("🧪 TESTE 2: Ingestão no Analisador")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    for frame in synthetic_frames(5, seed=3):
+        analyzer._on_message(None, frame)
+    last = json.loads(frame)
+    expected = {market: entry["price"] for section in ("crypto", "commodities") for market, entry in last[section].items()}
+    assert analyzer.current_prices == expected
+    assert analyzer.price_history.stats("BTC")["last"] == expected["BTC"]
+
+    # O decodificador acompanha o registry adotado junto com um PositionBook
+    other = SAPPRealRiskAnalyzer()
+    other.positions = analyzer.positions
+    assert other.price_decoder.registry is analyzer.market_registry
+    print(f"✅ {len(expected)} mercados aplicados por mensagem (crypto + commodities)")
+    print()
+
+def test_decode_throughput():
+    """Compara a etapa de decodificação antiga e a nova (atualização de preços fora da medida)"""
+    print("🧪 TESTE 3: Vazão de Decodificação")
+    print("=" * 50)
+
+    frames = synthetic_frames(3000, seed=7)
+    legacy_frames = []
+    for frame in frames:
+        data = json.loads(frame)
+        legacy_frames.append(json.dumps({"prices": {**data["crypto"], **data["commodities"]}}))
+
+    analyzer = SAPPRealRiskAnalyzer()
+    applied = []
+    analyzer.update_prices = lambda updates, timestamp_ns=None: applied.append(updates)
+
+    logger = real_risk_analyzer.logger
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        with _discarded_logs():
+            start = time.perf_counter()
+            for message in legacy_frames:
+                _legacy_on_message(analyzer, message)
+            legacy = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for frame in frames:
+                analyzer._on_message(None, frame)
+            typed = time.perf_counter() - start
+    finally:
+        logger.setLevel(level)
+
+    assert applied[:len(frames)] == applied[len(frames):]
+    speedup = legacy / typed
+    print(f"📊 Antes: {len(frames) / legacy:,.0f} mensagens/s; depois: {len(frames) / typed:,.0f} mensagens/s")
+    print(f"📊 Ganho: {speedup:.1f}x")
+    assert speedup >= 5
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP PRICE DECODER - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_dispatch_and_records()
+        test_analyzer_ingest()
+        test_decode_throughput()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
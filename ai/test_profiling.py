@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Teste do Profiling em Execução
+Verifica as janelas de amostragem e determinística sobre o analisador em
+funcionamento, os arquivos gravados e o disparo por sinal
+"""
+
+import sys
+import os
+import logging
+import pstats
+import signal
+import tempfile
+import threading
+import time
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from profiling import RuntimeProfiler, PROFILE_SIGNALS
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+def _analyzer(output_dir: str) -> SAPPRealRiskAnalyzer:
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.current_prices.update(MARKETS)
+    analyzer.positions = synthetic_book(20000, seed=5)
+    analyzer._rescore_dirty_positions()
+    analyzer.alert_pipeline.send_batch = lambda batch: True
+    analyzer.profiler.output_dir = output_dir
+    analyzer.profiler.interval = 0.001
+    return analyzer
+
+def _feed(analyzer: SAPPRealRiskAnalyzer, seconds: float):
+    """Simula a thread do WebSocket e a de scoring, passando pelos pontos instrumentados"""
+    frames = synthetic_frames(500, seed=5)
+    stop = threading.Event()
+
+    def websocket_thread():
+        index = 0
+        while not stop.is_set():
+            analyzer.profiler.call(analyzer._on_message, None, frames[index % len(frames)])
+            index += 1
+
+    def scoring_thread():
+        while not stop.is_set():
+            analyzer.profiler.call(analyzer._rescore_dirty_positions)
+
+    threads = [threading.Thread(target=websocket_thread, name="ws"),
+               threading.Thread(target=scoring_thread, name="scoring")]
+    logging.disable(logging.ERROR)
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        logging.disable(logging.NOTSET)
+
+def _collapsed(path: str):
+    with open(path) as f:
+        lines = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+    return [(stack, int(count)) for stack, count in lines]
+
+def test_sampling_window():
+    """Testa a janela de amostragem: pilhas colapsadas e pstats das threads de trabalho"""
+    print("🧪 TESTE 1: Janela de Amostragem")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        analyzer = _analyzer(directory)
+        assert analyzer.start_profiling(duration=0.6, mode='sampling')
+        assert not analyzer.start_profiling(duration=0.6, mode='sampling')  # uma janela por vez
+        _feed(analyzer, 0.8)
+        result = analyzer.profiler.wait(5)
+        assert result and not analyzer.profiler.active
+
+        stacks = _collapsed(result["collapsed"])
+        threads = {stack.split(";", 1)[0] for stack, _ in stacks}
+        assert {"ws", "scoring"} <= threads
+        assert any("_on_message (real_risk_analyzer.py:" in stack for stack, _ in stacks)
+        assert any("_score_dirty_columns (real_risk_analyzer.py:" in stack for stack, _ in stacks)
+
+        stats = pstats.Stats(result["pstats"])
+        functions = {name for _, _, name in stats.stats}
+        assert {"_on_message", "_rescore_dirty_positions"} <= functions
+        samples = sum(count for _, count in stacks)
+        print(f"✅ {samples} amostras de {len(threads)} threads; {len(functions)} funções no pstats")
+    print()
+
+def test_deterministic_window():
+    """Testa a janela determinística: cProfile por thread combinado em um pstats"""
+    print("🧪 TESTE 2: Janela Determinística")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        analyzer = _analyzer(directory)
+        assert analyzer.start_profiling(duration=10, mode='deterministic')
+        _feed(analyzer, 0.5)
+        analyzer.profiler.stop()  # encerra antes do prazo
+        result = analyzer.profiler.wait(5)
+        assert result and result["pstats"].endswith("-deterministic.pstats")
+
+        stats = pstats.Stats(result["pstats"])
+        calls = {name: nc for (_, _, name), (_, nc, _, _, _) in stats.stats.items()}
+        assert calls.get("_on_message", 0) > 0 and calls.get("_rescore_dirty_positions", 0) > 0
+        assert "decode" in calls
+        assert os.path.getsize(result["collapsed"]) > 0
+
+        # Fora da janela, call() não instrumenta nada
+        assert not analyzer.profiler._deterministic
+        assert analyzer.profiler.call(lambda x: x + 1, 1) == 2
+        print(f"✅ {calls['_on_message']} mensagens e {calls['_rescore_dirty_positions']} ciclos de scoring perfilados")
+    print()
+
+def test_signal_trigger():
+    """Testa o disparo de uma janela por SIGUSR1 sem reiniciar o processo"""
+    print("🧪 TESTE 3: Disparo por Sinal")
+    print("=" * 50)
+
+    if not PROFILE_SIGNALS:
+        print("⚠️ Plataforma sem SIGUSR1/SIGUSR2")
+        return
+
+    previous = {sig: signal.getsignal(sig) for sig in PROFILE_SIGNALS}
+    with tempfile.TemporaryDirectory() as directory:
+        profiler = RuntimeProfiler(output_dir=directory, interval=0.001)
+        try:
+            profiler.install_signal_handlers(duration=0.2)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            deadline = time.monotonic() + 2
+            while not profiler.active and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert profiler.mode == 'sampling'
+            result = profiler.wait(5)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        assert result and os.path.exists(result["pstats"]) and os.path.exists(result["collapsed"])
+        assert result["pstats"].startswith(os.path.join(directory, "profile-"))
+        print(f"✅ SIGUSR1 gravou {os.path.basename(result['pstats'])}")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP PROFILING - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_sampling_window()
+        test_deterministic_window()
+        test_signal_trigger()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
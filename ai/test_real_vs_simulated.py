@@ -7,6 +7,7 @@ Compara a IA com dados simulados vs dados reais
 import sys
 import os
 import time
+import logging
 from datetime import datetime
 
 # Adicionar o diretório atual ao path
@@ -177,4 +178,5 @@ def main():
         traceback.print_exc()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Teste do Replay com Relógio Virtual
+Verifica o relógio virtual no analisador, a equivalência do replay de um
+diário gravado com o processamento ao vivo e a velocidade do replay
+"""
+
+import sys
+import os
+import json
+import logging
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from clock import VirtualClock
+from price_decoder import TICK_DTYPE
+from replay import ReplayEngine, compare_reports
+from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+
+START_NS = 1_700_000_000_000_000_000
+
+def _analyzer(book_size: int, seed: int, clock=None) -> SAPPRealRiskAnalyzer:
+    analyzer = SAPPRealRiskAnalyzer(clock=clock)
+    analyzer.positions = synthetic_book(book_size, seed)
+    analyzer.current_prices.update(MARKETS)
+    return analyzer
+
+def _shocked_frames(count: int, seed: int):
+    """Mensagens sintéticas com uma queda forte no meio e a recuperação depois"""
+    frames = synthetic_frames(count, seed)
+    shocked = []
+    for index, frame in enumerate(frames):
+        if count // 3 <= index < 2 * count // 3:
+            data = json.loads(frame)
+            for section in ("crypto", "commodities"):
+                for market, entry in data[section].items():
+                    entry["price"] = round(entry["price"] * (0.85 if market in ("WTI", "Gold", "BTC") else 1.0), 6)
+            frame = json.dumps(data)
+        shocked.append(frame)
+    return shocked
+
+def test_virtual_clock():
+    """Testa o relógio virtual nos timestamps dos alertas e no prazo de sincronização"""
+    print("🧪 TESTE 1: Relógio Virtual no Analisador")
+    print("=" * 50)
+
+    clock = VirtualClock(START_NS)
+    analyzer = SAPPRealRiskAnalyzer(clock=clock)
+    position = PositionData(1, "WTI", "Brent", 1000, -1000, 1000000, -4.0, -4.0, analyzer.clock.now())
+    alert = analyzer._generate_alert(position, 0.95)
+    assert alert.timestamp.timestamp() == START_NS / 1e9
+    assert analyzer.price_decoder.decode('{"type": "price_update", "crypto": {"BTC": {"price": 1.0}}}')[0][2] \
+        == START_NS  # mensagem sem timestamp usa o relógio do analisador
+
+    # Esperar no relógio virtual avança o tempo em vez de dormir
+    start = time.perf_counter()
+    assert not clock.wait(threading.Event(), 3600)
+    assert clock.time_ns() == START_NS + 3600 * 10**9 and time.perf_counter() - start < 0.1
+
+    # Sincronização pela fonte dada a cada sync_interval segundos virtuais
+    calls = []
+
+    def fetch(since, limit, full):
+        calls.append(clock.monotonic())
+        return {"changes": [], "version": since, "has_more": False}
+
+    next_sync = 0.0
+    start_ns = clock.time_ns()
+    for second in range(0, 100, 5):
+        clock.advance_to(start_ns + second * 10**9)
+        next_sync = analyzer._monitoring_step(clock.monotonic(), next_sync, fetch)
+    assert calls == [(start_ns + second * 10**9) / 1e9 for second in (0, 30, 60, 90)]
+    print(f"✅ Alerta às {alert.timestamp.isoformat()}; {len(calls)} sincronizações em 100s virtuais")
+    print()
+
+def test_replay_matches_live():
+    """Testa que o replay do diário gravado reproduz os alertas do processamento ao vivo"""
+    print("🧪 TESTE 2: Replay do Diário vs Ao Vivo")
+    print("=" * 50)
+
+    frames = _shocked_frames(600, seed=12)
+    directory = tempfile.mkdtemp()
+    live_alerts = []
+    logging.disable(logging.ERROR)
+    try:
+        # Ao vivo: cada mensagem é decodificada, aplicada e reprocessada, gravando os ticks
+        clock = VirtualClock()
+        live = _analyzer(5000, seed=12, clock=clock)
+        live.alert_pipeline.submit = live_alerts.append
+        live._rescore_dirty_positions()
+        live_alerts.clear()  # alertas da avaliação inicial do livro
+        live.start_recording(directory)
+        for frame in frames:
+            clock.advance_to(json.loads(frame)["timestamp"] * 1_000_000)
+            live._on_message(None, frame)
+            live._rescore_dirty_positions()
+        live.stop_recording()
+
+        reports = []
+        for _ in range(2):
+            replayed = _analyzer(5000, seed=12)
+            replayed._rescore_dirty_positions()
+            reports.append(ReplayEngine(replayed).replay_journal(directory))
+        again, report = reports
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert report.ticks == len(frames) * len(MARKETS) and report.instants == len(frames)
+    assert report.virtual_seconds == len(frames) - 1
+    assert live_alerts and sorted((a.timestamp, a.position_id, a.alert_type) for a in report.alerts) \
+        == sorted((a.timestamp, a.position_id, a.alert_type) for a in live_alerts)
+    assert report.alert_digest() == again.alert_digest()
+    assert replayed.risk_state.tier_counts.tolist() == live.risk_state.tier_counts.tolist()
+
+    # Transições: o último tier de cada posição bate com o estado final
+    final = {}
+    for transition in report.transitions:
+        final[transition.position_id] = transition.tier
+    assert all(replayed.risk_state.tier(position_id) == tier for position_id, tier in final.items())
+    assert all(transition.previous is not None for transition in report.transitions)  # livro já avaliado
+
+    summary = report.summary()
+    assert not compare_reports(summary, again.summary(), max_slowdown=0.9)
+    slower = dict(summary, ticks_per_second=summary["ticks_per_second"] * 10)
+    assert compare_reports(summary, slower) and summary["stages"]["scoring"]["count"] == report.cycles
+    print(f"✅ {len(report.alerts)} alertas idênticos; {len(report.transitions)} transições de tier")
+    print()
+
+def test_replay_frames():
+    """Testa o replay de mensagens no formato do backend e histogramas novos a cada replay"""
+    print("🧪 TESTE 3: Replay de Mensagens do WebSocket")
+    print("=" * 50)
+
+    frames = _shocked_frames(300, seed=13)
+    live_alerts = []
+    logging.disable(logging.ERROR)
+    try:
+        clock = VirtualClock()
+        live = _analyzer(3000, seed=13, clock=clock)
+        live.alert_pipeline.submit = live_alerts.append
+        live._rescore_dirty_positions()
+        live_alerts.clear()
+        for frame in frames:
+            clock.advance_to(json.loads(frame)["timestamp"] * 1_000_000)
+            live._on_message(None, frame)
+            live._rescore_dirty_positions()
+
+        replayed = _analyzer(3000, seed=13)
+        replayed._rescore_dirty_positions()
+        engine = ReplayEngine(replayed)
+        report = engine.replay_frames(frames)
+        first_metrics = engine.metrics
+        again = engine.replay_frames(frames[-10:])  # mesmo motor: relatório e histogramas novos
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert report.ticks == len(frames) * len(MARKETS) and report.instants == len(frames)
+    assert live_alerts and sorted((a.timestamp, a.position_id, a.alert_type) for a in report.alerts) \
+        == sorted((a.timestamp, a.position_id, a.alert_type) for a in live_alerts)
+    assert report.stages["decode"]["count"] == len(frames)
+    assert again.stages["decode"]["count"] == 10 and engine.metrics is not first_metrics
+    print(f"✅ {report.ticks} ticks de {len(frames)} mensagens; {len(report.alerts)} alertas idênticos ao vivo")
+    print()
+
+def _price_walk(markets, seconds: int, seed: int, batch_seconds: int = 600):
+    """Um preço por mercado por segundo (passeio aleatório, ~9% ao dia), em lotes de dez minutos"""
+    rng = np.random.default_rng(seed)
+    prices = np.array([MARKETS[market] for market in markets])
+    for first in range(0, seconds, batch_seconds):
+        steps = min(batch_seconds, seconds - first)
+        walk = prices * np.exp(np.cumsum(rng.normal(0, 0.0003, (steps, len(markets))), axis=0))
+        prices = walk[-1]
+        ticks = np.empty(steps * len(markets), dtype=TICK_DTYPE)
+        ticks['market_id'] = np.tile(np.arange(len(markets)), steps)
+        ticks['price'] = walk.ravel()
+        ticks['timestamp_ns'] = START_NS + np.repeat(np.arange(first, first + steps), len(markets)) * 10**9
+        yield ticks
+
+def test_market_hour_replay_speed():
+    """Testa a velocidade do replay em uma hora de mercado (3.600 instantes com os 12 mercados)"""
+    print("🧪 TESTE 4: Uma Hora de Mercado")
+    print("=" * 50)
+
+    markets = list(MARKETS)
+    logging.disable(logging.ERROR)
+    try:
+        analyzer = _analyzer(2000, seed=13)
+        analyzer._rescore_dirty_positions()
+        engine = ReplayEngine(analyzer)
+        report = engine.replay_ticks(_price_walk(markets, 3600, seed=13), markets)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert report.instants == 3600 and report.virtual_seconds == 3599
+    assert report.cycles == 3600 and report.transitions
+    stages = report.stages
+    print(f"📊 {report.ticks:,} ticks em {report.wall_seconds:.1f}s ({report.speedup:,.0f}x tempo real, "
+          f"{report.ticks_per_second:,.0f} ticks/s); um dia em ~{86400 / report.speedup:.0f}s")
+    print(f"📊 preços p50 {stages['prices']['p50_ms']:.3f} ms; scoring p50 {stages['scoring']['p50_ms']:.3f} ms "
+          f"p99 {stages['scoring']['p99_ms']:.3f} ms")
+    assert report.speedup > 200
+    print(f"✅ {len(report.alerts)} alertas e {len(report.transitions)} transições em uma hora")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP REPLAY - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_virtual_clock()
+        test_replay_matches_live()
+        test_replay_frames()
+        test_market_hour_replay_speed()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
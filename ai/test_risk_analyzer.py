@@ -7,6 +7,7 @@ Script para testar a IA de análise de risco
 import sys
 import os
 import time
+import logging
 from datetime import datetime, timedelta
 
 # Adicionar o diretório atual ao path
@@ -244,4 +245,5 @@ def main():
         traceback.print_exc()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     main()
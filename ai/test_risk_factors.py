@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Teste do Pipeline de Fatores de Risco
+Compara os fatores padrão com as regras escalares originais, verifica pesos,
+faixas e fatores configuráveis, o recálculo apenas do que mudou e os gatilhos
+do analisador com faixas personalizadas
+"""
+
+import sys
+import os
+import logging
+import random
+import tempfile
+import time
+from dataclasses import replace
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, MARKETS
+from batch_risk import score_columns
+from risk_factors import DEFAULT_PIPELINE, Factor, FactorPipeline, Intermediate, INTERMEDIATES
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+from stress import run_stress
+import stress
+
+def _reference_scores(prices, position):
+    """Regras escalares originais (antes do pipeline): volatilidade, margem, tendência, liquidação e total"""
+    leg1_price = prices.get(position.leg1_market, 0)
+    leg2_price = prices.get(position.leg2_market, 0)
+    if not (leg1_price and leg2_price):
+        return 0.5, 0.5, 0.5, 0.5, 0.5
+
+    current_spread = leg1_price - leg2_price
+    spread_change = abs(current_spread - position.entry_spread)
+    spread_percentage = spread_change / abs(position.entry_spread) if position.entry_spread != 0 else 0
+    spread_score = (0.8 if spread_percentage > 0.1 else 0.6 if spread_percentage > 0.05
+                    else 0.4 if spread_percentage > 0.02 else 0.2)
+
+    total_value = max(abs(position.leg1_size) * leg1_price, abs(position.leg2_size) * leg2_price)
+    required_margin = total_value * 0.2
+    margin_ratio = position.margin / required_margin if required_margin > 0 else 1.0
+    margin_score = 0.9 if margin_ratio < 1.1 else 0.7 if margin_ratio < 1.2 else 0.5 if margin_ratio < 1.5 else 0.3
+    distance = (position.margin - required_margin) / required_margin if required_margin > 0 else 1.0
+    liquidation_score = 0.9 if distance < 0.1 else 0.7 if distance < 0.2 else 0.5 if distance < 0.5 else 0.3
+
+    total = spread_score * 0.3 + margin_score * 0.3 + spread_score * 0.2 + liquidation_score * 0.2
+    return spread_score, margin_score, spread_score, liquidation_score, min(1.0, max(0.0, total))
+
+def _counting(intermediates, counts):
+    """Intermediárias que contam quantas vezes foram calculadas"""
+    def wrap(intermediate):
+        def compute(*args):
+            counts[intermediate.name] = counts.get(intermediate.name, 0) + 1
+            return intermediate.compute(*args)
+        return replace(intermediate, compute=compute)
+    return [wrap(intermediate) for intermediate in intermediates]
+
+def _leverage(notional, margin):
+    return notional / np.maximum(margin, 1)
+
+def test_default_matches_reference():
+    """Testa que o pipeline padrão reproduz exatamente as regras escalares originais"""
+    print("🧪 TESTE 1: Fatores Padrão vs Regras Originais")
+    print("=" * 50)
+
+    book = synthetic_book(3000, seed=5)
+    rng = random.Random(5)
+    for position_id in rng.sample(range(1, 3001), 300):
+        # Casos de borda: spread de entrada zero, margem zero e tamanho zero
+        choice = rng.choice(['entry_spread', 'margin', 'leg1_size'])
+        setattr(book[position_id], choice, 0)
+    prices = dict(MARKETS, SOL=0)
+    del prices["XLM"]  # sem preço: fatores neutros
+
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions = book
+    analyzer.current_prices = prices
+    logging.disable(logging.WARNING)
+    try:
+        scores = analyzer.calculate_risk_scores_batch()
+        for row, position in enumerate(analyzer.positions.values()):
+            expected = _reference_scores(prices, position)
+            batch = (scores.volatility[row], scores.margin[row], scores.trend[row],
+                     scores.liquidation[row], scores.total[row])
+            scalar = (analyzer._calculate_volatility_risk_real(position), analyzer._calculate_margin_risk_real(position),
+                      analyzer._calculate_trend_risk_real(position),
+                      analyzer._calculate_liquidation_risk_real(position), analyzer._calculate_risk_score(position))
+            assert batch == expected and scalar == expected, (position.position_id, batch, scalar, expected)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(f"✅ {len(scores)} posições idênticas às regras originais (lote e escalar)")
+    print()
+
+def test_configuration():
+    """Testa pesos, faixas e um fator novo com sua intermediária, sem mexer no laço de avaliação"""
+    print("🧪 TESTE 2: Pesos, Faixas e Fatores Configuráveis")
+    print("=" * 50)
+
+    book = synthetic_book(2000, seed=6)
+    columns = book.columns()
+    prices = book.registry.price_vector(MARKETS)
+    default = score_columns(columns, prices)
+
+    # Pesos: o total segue a nova média ponderada
+    weights = {'volatility': 0.1, 'margin': 0.5, 'trend': 0.1, 'liquidation': 0.3}
+    weighted = score_columns(columns, prices, pipeline=DEFAULT_PIPELINE.with_weights(weights))
+    expected = sum(default.factors[name] * weight for name, weight in weights.items())
+    assert np.allclose(weighted.total, np.clip(expected, 0, 1))
+
+    # Faixas: margem mais conservadora nunca reduz o score do fator
+    strict = DEFAULT_PIPELINE.with_factors(margin={'bins': [1.3, 1.6, 2.0]})
+    stricter = score_columns(columns, prices, pipeline=strict)
+    assert np.all(stricter.margin >= default.margin) and np.any(stricter.margin > default.margin)
+    assert np.array_equal(stricter.liquidation, default.liquidation)
+
+    # Fator novo: alavancagem (valor da posição / margem) a partir da intermediária 'notional'
+    leverage = DEFAULT_PIPELINE.with_weights({'volatility': 0.2, 'trend': 0.1}).add_factor(
+        Factor('leverage', ('leverage',), 0.2, bins=[3.0, 5.0, 10.0], scores=[0.1, 0.4, 0.7, 1.0]),
+        Intermediate('leverage', ('notional', 'margin'), _leverage)
+    )
+    scores = score_columns(columns, prices, pipeline=leverage)
+    notional = np.maximum(np.abs(columns.leg1_size) * prices[columns.leg1_ids],
+                          np.abs(columns.leg2_size) * prices[columns.leg2_ids])
+    ratio = notional / np.maximum(columns.margin, 1)
+    expected = np.array([0.1, 0.4, 0.7, 1.0])[np.searchsorted([3.0, 5.0, 10.0], ratio, 'right')]
+    assert np.array_equal(scores.factors['leverage'], expected)
+    assert leverage.trigger_bins() is None  # depende dos preços fora das faixas conhecidas
+
+    # Erros de configuração
+    for build in (
+        lambda: FactorPipeline(DEFAULT_PIPELINE.factors + (Factor('x', ('unknown',), 0.1, [1.0], [0.0, 1.0]),)),
+        lambda: DEFAULT_PIPELINE.add_factor(Factor('x', ('a',), 0.1, [1.0], [0.0, 1.0]),
+                                            Intermediate('a', ('b',), _leverage), Intermediate('b', ('a',), _leverage)),
+        lambda: DEFAULT_PIPELINE.with_factors(margin={'bins': [1.5, 1.2, 1.1]}),
+        lambda: DEFAULT_PIPELINE.with_weights({'gamma': 0.1}),
+    ):
+        try:
+            build()
+        except ValueError as e:
+            print(f"   recusado: {e}")
+        else:
+            raise AssertionError("configuração inválida aceita")
+
+    print(f"✅ Pesos, faixas e fator de alavancagem (média {scores.factors['leverage'].mean():.2f})")
+    print()
+
+def test_incremental_update():
+    """Testa que cada intermediária é calculada uma vez e update recalcula só o que depende da entrada"""
+    print("🧪 TESTE 3: Recalcular Apenas o Que Mudou")
+    print("=" * 50)
+
+    counts = {}
+    pipeline = FactorPipeline(DEFAULT_PIPELINE.factors, _counting(INTERMEDIATES, counts))
+    book = synthetic_book(5000, seed=7)
+    columns = book.columns()
+    prices = book.registry.price_vector(MARKETS)
+    rng = np.random.default_rng(7)
+    inputs = {
+        'leg1_price': prices[columns.leg1_ids], 'leg2_price': prices[columns.leg2_ids],
+        'leg1_size': columns.leg1_size, 'leg2_size': columns.leg2_size, 'margin': columns.margin,
+        'entry_spread': columns.entry_spread, 'pair_volatility': np.full(len(columns), np.nan),
+    }
+    frame = pipeline.evaluate(inputs)
+    assert set(counts) == {step.name for step in INTERMEDIATES} and set(counts.values()) == {1}
+
+    def check(expected_factors, expected_steps, **changes):
+        counts.clear()
+        assert frame.update(**changes) == expected_factors, frame.recomputed
+        assert set(counts) == expected_steps and set(counts.values()) <= {1}, counts
+        inputs.update(changes)
+        assert np.array_equal(frame.total, DEFAULT_PIPELINE.evaluate(inputs).total)
+
+    volatility = np.where(rng.random(len(columns)) < 0.5, rng.random(len(columns)), np.nan)
+    check(('volatility',), set(), pair_volatility=volatility)
+    check(('margin', 'liquidation'), {'margin_ratio', 'liquidation_distance'},
+          margin=(columns.margin * rng.uniform(0.8, 1.2, len(columns))).astype(np.int64))
+    check(('volatility', 'trend'), {'spread_divisor', 'spread_change_pct'},
+          entry_spread=columns.entry_spread * 1.01)
+    check(('volatility', 'margin', 'trend', 'liquidation'),
+          {'valid', 'current_spread', 'spread_change_pct', 'leg1_value', 'notional', 'required_margin',
+           'margin_ratio', 'liquidation_distance'},
+          leg1_price=inputs['leg1_price'] * rng.uniform(0.9, 1.1, len(columns)))
+
+    print("✅ Uma passada por intermediária; margem recalcula 2 fatores, volatilidade do par só 1")
+    print()
+
+def _walk(analyzer, rng, ticks: int):
+    """Passeio aleatório dos preços com reprocessamento a cada tick; retorna as reavaliações"""
+    names = list(MARKETS)
+    rescored = 0
+    for _ in range(ticks):
+        market = names[int(rng.integers(0, len(names)))]
+        price = analyzer.current_prices[market] * (1 + rng.normal(0, 0.02))
+        analyzer.update_prices({market: price})
+        rescored += analyzer._rescore_dirty_positions()
+    return rescored
+
+def _assert_consistent(analyzer):
+    """Scores em cache iguais a um recálculo completo do livro"""
+    scores = analyzer.calculate_risk_scores_batch()
+    cached = np.array([analyzer.risk_state.score(int(position_id)) for position_id in scores.position_ids])
+    assert np.array_equal(cached, scores.total), np.flatnonzero(cached != scores.total)[:5]
+
+def test_analyzer_custom_factors():
+    """Testa gatilhos do analisador com faixas personalizadas, fator fora das faixas e snapshot"""
+    print("🧪 TESTE 4: Analisador com Fatores Personalizados")
+    print("=" * 50)
+
+    count = 20000
+    custom = DEFAULT_PIPELINE.with_factors(
+        margin={'bins': [1.3, 1.6, 2.0], 'weight': 0.4},
+        trend={'bins': [0.01, 0.03, 0.08], 'weight': 0.1},
+    )
+    logging.disable(logging.WARNING)
+    try:
+        analyzer = SAPPRealRiskAnalyzer(factors=custom)
+        analyzer.current_prices.update(MARKETS)
+        analyzer.positions = synthetic_book(count, seed=8)
+        analyzer._rescore_dirty_positions()
+        assert 1.3 in analyzer.trigger_book.ratio_bins and 0.01 in analyzer.trigger_book.spread_bins
+        start = time.perf_counter()
+        rescored = _walk(analyzer, np.random.default_rng(8), 200)
+        elapsed = time.perf_counter() - start
+        _assert_consistent(analyzer)
+
+        # Snapshot com outras faixas: gatilhos descartados e livro inteiro reprocessado
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state.snap")
+            analyzer.save_snapshot(path)
+            restored = SAPPRealRiskAnalyzer()
+            result = restored.restore_snapshot(path)
+            same = SAPPRealRiskAnalyzer(factors=custom)
+            warm = same.restore_snapshot(path)
+        assert result.rescored == count and warm.rescored == 0
+        _assert_consistent(restored)
+
+        # Fator que depende dos preços fora das faixas: todas as posições dos mercados alterados
+        leverage = custom.add_factor(
+            Factor('leverage', ('leverage',), 0.1, bins=[3.0, 5.0, 10.0], scores=[0.1, 0.4, 0.7, 1.0]),
+            Intermediate('leverage', ('notional', 'margin'), _leverage)
+        )
+        analyzer.factors = leverage
+        assert analyzer._rescore_dirty_positions() == count
+        fallback = _walk(analyzer, np.random.default_rng(9), 50)
+        _assert_consistent(analyzer)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(f"📊 200 ticks em {elapsed * 1e3:.0f} ms: {rescored} reavaliações "
+          f"({rescored / 200:.0f} por tick de {count} posições)")
+    print(f"📊 Sem faixas conhecidas: {fallback / 50:.0f} reavaliações por tick")
+    print("✅ Scores incrementais idênticos ao recálculo completo; snapshot com outras faixas reprocessado")
+    print()
+
+def test_stress_custom_pipeline():
+    """Testa o stress test com pipeline personalizado e avaliação reaproveitada entre blocos de cenários"""
+    print("🧪 TESTE 5: Stress Test com Pipeline Personalizado")
+    print("=" * 50)
+
+    book = synthetic_book(3000, seed=10)
+    columns = book.columns()
+    prices = book.registry.price_vector(MARKETS)
+    rng = np.random.default_rng(10)
+    matrix = prices * (1 + rng.normal(0, 0.05, (40, len(prices))))
+    pipeline = DEFAULT_PIPELINE.with_factors(margin={'bins': [1.3, 1.6, 2.0]})
+    thresholds = {'LOW': 0.3, 'MEDIUM': 0.5, 'HIGH': 0.7, 'CRITICAL': 0.9}
+
+    limit = stress.MAX_STRESS_ELEMENTS
+    stress.MAX_STRESS_ELEMENTS = 1000  # vários blocos de posições e de cenários
+    try:
+        result = run_stress(columns, matrix, thresholds, top_n=3, pipeline=pipeline)
+    finally:
+        stress.MAX_STRESS_ELEMENTS = limit
+
+    for scenario in range(len(matrix)):
+        scores = score_columns(columns, matrix[scenario], pipeline=pipeline)
+        tiers = np.bincount(scores.tiers(thresholds), minlength=5)
+        assert np.array_equal(result.tier_counts[scenario], tiers)
+        assert np.array_equal(result.worst_scores[scenario], np.sort(scores.total)[::-1][:3])
+        shortfall = scores.required_margin - columns.margin
+        assert np.isclose(result.margin_shortfall[scenario], shortfall[shortfall > 0].sum())
+
+    print(f"✅ {len(matrix)} cenários idênticos ao score direto com o pipeline personalizado")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP RISK FACTORS - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_default_matches_reference()
+        test_configuration()
+        test_incremental_update()
+        test_analyzer_custom_factors()
+        test_stress_custom_pipeline()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
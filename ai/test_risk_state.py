@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Teste do Estado de Risco em Cache
+Verifica os contadores por tier contra o cálculo completo e o resumo O(1)
+"""
+
+import sys
+import os
+import logging
+import random
+import time
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import real_risk_analyzer
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+from test_batch_risk import _random_book
+
+BASE_PRICES = {
+    "WTI": 63.0, "Brent": 67.5, "Gold": 3732.0, "Silver": 43.2,
+    "Copper": 4.1, "Aluminum": 2.3, "BTC": 60000.0, "ETH": 3000.0
+}
+
+def _expected_counts(analyzer: SAPPRealRiskAnalyzer) -> np.ndarray:
+    """Contagem por tier recalculando todo o livro"""
+    tiers = analyzer.calculate_risk_scores_batch().tiers(analyzer.risk_thresholds)
+    return np.bincount(tiers, minlength=5)
+
+def _run_transitions():
+    """Aplica ticks e alterações no livro conferindo os contadores a cada passo"""
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions = _random_book(3000, seed=3)
+    analyzer.update_prices(BASE_PRICES)
+    analyzer._rescore_dirty_positions()
+    assert np.array_equal(analyzer.risk_state.tier_counts, _expected_counts(analyzer))
+
+    rng = random.Random(4)
+    extra = _random_book(200, seed=5)
+    prices = dict(BASE_PRICES)
+    for step in range(300):
+        for market in rng.sample(list(prices), 2):
+            prices[market] *= 1 + rng.uniform(-0.03, 0.03)
+        analyzer.update_prices({market: prices[market] for market in prices})
+
+        position_id = rng.randint(1, 3000)
+        if step % 3 == 0 and position_id in analyzer.positions:
+            del analyzer.positions[position_id]
+        elif step % 3 == 1 and position_id in analyzer.positions:
+            analyzer.positions[position_id].margin = rng.randint(1000, 2000000)
+        elif step % 3 == 2:
+            analyzer.positions[3000 + step] = extra[step % 200 + 1]
+
+        analyzer._rescore_dirty_positions()
+        assert len(analyzer.risk_state) == len(analyzer.positions)
+        assert np.array_equal(analyzer.risk_state.tier_counts, _expected_counts(analyzer))
+
+    scores = analyzer.calculate_risk_scores_batch()
+    for row in range(0, len(scores), 97):
+        assert analyzer.risk_state.score(int(scores.position_ids[row])) == scores.total[row]
+
+    summary = analyzer.get_risk_summary()
+    counts = _expected_counts(analyzer)
+    assert summary["pending_positions"] == 0
+    assert summary["high_risk_positions"] == counts[3] + counts[4]
+    assert summary["critical_positions"] == counts[4]
+    print(f"📊 {summary['total_positions']} posições, contadores {analyzer.risk_state.tier_counts.tolist()}")
+
+def test_counters_follow_transitions():
+    """Testa os contadores após ticks, aberturas, alterações e fechamentos"""
+    print("🧪 TESTE 1: Contadores por Tier")
+    print("=" * 50)
+
+    logging.disable(logging.WARNING)
+    try:
+        _run_transitions()
+    finally:
+        logging.disable(logging.NOTSET)
+    print("✅ Contadores idênticos ao recálculo completo")
+    print()
+
+def test_summary_is_constant_time():
+    """Testa que o resumo não recalcula scores e não depende do tamanho do livro"""
+    print("🧪 TESTE 2: Resumo O(1)")
+    print("=" * 50)
+
+    timings = {}
+    original = real_risk_analyzer.score_columns
+    for count in (1000, 100000):
+        analyzer = SAPPRealRiskAnalyzer()
+        analyzer.positions = _random_book(count, seed=6)
+        analyzer.update_prices(BASE_PRICES)
+        pending = analyzer.get_risk_summary()
+        assert pending["pending_positions"] == count and pending["high_risk_positions"] == 0
+
+        logging.disable(logging.WARNING)
+        try:
+            analyzer._rescore_dirty_positions()
+        finally:
+            logging.disable(logging.NOTSET)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("get_risk_summary recalculou scores")
+        real_risk_analyzer.score_columns = fail
+        try:
+            start = time.perf_counter()
+            for _ in range(1000):
+                summary = analyzer.get_risk_summary()
+            timings[count] = (time.perf_counter() - start) / 1000
+        finally:
+            real_risk_analyzer.score_columns = original
+        assert "error" not in summary and summary["pending_positions"] == 0
+
+    for count, elapsed in timings.items():
+        print(f"📊 {count:>7} posições: {elapsed * 1e6:.1f} µs por resumo")
+    assert timings[100000] < 20 * timings[1000] + 1e-4
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP RISK STATE - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_counters_follow_transitions()
+        test_summary_is_constant_time()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Teste do Scoring em Processos
+Verifica o seqlock do quadro de preços compartilhado, a equivalência do
+scoring em shards com o de um único processo e o ganho com mais workers
+"""
+
+import sys
+import os
+import json
+import logging
+import multiprocessing
+import time
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from price_board import PriceBoard, PROCESSED, POSITIONS
+from sharded_scoring import ShardedScoring, partition
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+BOARD_MARKETS = 64
+WRITES = 20000
+
+def _writer(name: str, workers: int):
+    """Processo escritor: cada publicação grava o mesmo valor em todos os mercados"""
+    board = PriceBoard.attach(name, BOARD_MARKETS, workers)
+    market_ids = np.arange(BOARD_MARKETS)
+    try:
+        for value in range(1, WRITES + 1):
+            board.publish(market_ids, np.full(BOARD_MARKETS, float(value)))
+    finally:
+        board.close()
+
+def test_price_board_seqlock():
+    """Testa que leituras concorrentes a outro processo nunca veem escritas pela metade"""
+    print("🧪 TESTE 1: Seqlock do Quadro de Preços")
+    print("=" * 50)
+
+    board = PriceBoard(BOARD_MARKETS, workers=1)
+    snapshot = np.zeros(BOARD_MARKETS)
+    reads = 0
+    last_seq = 0
+    try:
+        writer = multiprocessing.get_context('spawn').Process(target=_writer, args=(board.name, 1))
+        writer.start()
+        while writer.is_alive() or board.seq < 2 * WRITES:
+            seq, markets = board.read(snapshot)
+            assert seq % 2 == 0 and seq >= last_seq
+            if markets:
+                assert markets == BOARD_MARKETS
+                assert (snapshot == snapshot[0]).all(), "instantâneo misturou duas escritas"
+                assert snapshot[0] == seq // 2
+            last_seq = seq
+            reads += 1
+        writer.join()
+        assert writer.exitcode == 0 and board.seq == 2 * WRITES
+        assert (board.prices == WRITES).all() and (board.status[:, PROCESSED] == -1).all()
+    finally:
+        board.close()
+    print(f"✅ {reads} leituras consistentes durante {WRITES} escritas de outro processo")
+    print()
+
+def _price_steps(count: int, seed: int):
+    """Preços por passo (dicionário mercado → preço) das mensagens sintéticas"""
+    steps = []
+    for frame in synthetic_frames(count, seed):
+        data = json.loads(frame)
+        steps.append({market: entry["price"] for section in ("crypto", "commodities")
+                      for market, entry in data.get(section, {}).items()})
+    return steps
+
+def _record_alerts(analyzer: SAPPRealRiskAnalyzer, alerts: list):
+    analyzer.alert_pipeline.submit = lambda alert: alerts.append((alert.position_id, alert.alert_type))
+    analyzer.alert_pipeline.submit_payload = lambda payload: alerts.append((payload["position_id"], payload["alert_type"]))
+
+def test_sharded_matches_single_process():
+    """Testa que os shards geram os mesmos alertas e tiers que um único processo"""
+    print("🧪 TESTE 2: Shards vs Processo Único")
+    print("=" * 50)
+
+    book = synthetic_book(20000, seed=6)
+    shards = partition(book.columns(), 3)
+    assert sum(len(shard) for shard in shards) == len(book)
+    assert all((shard.position_ids % 3 == index).all() for index, shard in enumerate(shards))
+
+    steps = _price_steps(40, seed=6)
+    steps.append({market: price * 0.8 for market, price in steps[-1].items()})  # queda forte
+
+    single_alerts, sharded_alerts = [], []
+    logging.disable(logging.ERROR)
+    try:
+        single = SAPPRealRiskAnalyzer()
+        single.positions = synthetic_book(20000, seed=6)
+        _record_alerts(single, single_alerts)
+        single.update_prices(dict(MARKETS))
+        single._rescore_dirty_positions()
+        for prices in steps:
+            single.update_prices(prices)
+            single._rescore_dirty_positions()
+
+        sharded = SAPPRealRiskAnalyzer()
+        sharded.positions = book
+        _record_alerts(sharded, sharded_alerts)
+        sharded.update_prices(dict(MARKETS))
+        sharding = sharded.start_sharding(workers=3, log_level=logging.ERROR)
+        for prices in steps:
+            sharded.update_prices(prices)
+            assert sharding.wait_processed()
+            assert sharded._rescore_dirty_positions() == 0  # nada é reprocessado no processo de ingestão
+        tier_counts = sharding.tier_counts().copy()
+        summary = sharded.get_risk_summary()
+        sharded.stop_sharding()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert sharding.stats['published'] == len(steps) + 1
+    assert tier_counts.tolist() == single.risk_state.tier_counts.tolist()
+    assert summary["critical_positions"] == single.risk_state.count('CRITICAL')
+    assert summary["pending_positions"] == 0
+    assert sorted(sharded_alerts) == sorted(single_alerts) and single_alerts
+    print(f"✅ {len(sharded_alerts)} alertas idênticos em 3 shards; tiers {tier_counts.tolist()}")
+    print()
+
+def _sync_page(book, seed: int):
+    """Página da rota de alterações: posições novas (uma em mercado novo), alteradas e fechadas"""
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(np.arange(1, len(book) + 1), 600, replace=False).tolist()
+    changes = []
+    for position_id in ids[:300]:
+        position = book[position_id]
+        changes.append({"position_id": position_id, "version": 10, "status": "Active",
+                        "leg1_market": position.leg1_market, "leg2_market": position.leg2_market,
+                        "leg1_size": position.leg1_size, "leg2_size": position.leg2_size,
+                        "margin": position.margin // 4, "entry_spread": position.entry_spread})
+    changes += [{"position_id": position_id, "version": 10, "status": "Closed"} for position_id in ids[300:]]
+    for offset in range(200):
+        changes.append({"position_id": len(book) + 1 + offset, "version": 10, "status": "Active",
+                        "leg1_market": "Copper" if offset % 2 else "WTI", "leg2_market": "Brent",
+                        "leg1_size": 1000, "leg2_size": -1000, "margin": 20000, "entry_spread": -4.0})
+    return {"changes": changes, "version": 10, "has_more": False}
+
+def test_sync_reaches_shards():
+    """Testa que posições abertas, alteradas e fechadas pela sincronização chegam aos shards"""
+    print("🧪 TESTE 3: Sincronização com Shards em Execução")
+    print("=" * 50)
+
+    page = _sync_page(synthetic_book(6000, seed=8), seed=8)
+    fetch = lambda since, limit, full: page if since < 10 else {"changes": [], "version": 10, "has_more": False}
+    prices = dict(MARKETS, Copper=4.1)
+    logging.disable(logging.ERROR)
+    try:
+        single = SAPPRealRiskAnalyzer()
+        single.positions = synthetic_book(6000, seed=8)
+        single.position_sync.version = 1  # sincronização incremental
+        single.update_prices(dict(MARKETS))
+        single._update_positions_from_contract(fetch)
+        single.update_prices(prices)
+        single._rescore_dirty_positions()
+
+        sharded = SAPPRealRiskAnalyzer()
+        sharded.positions = synthetic_book(6000, seed=8)
+        sharded.position_sync.version = 1
+        sharded.update_prices(dict(MARKETS))
+        sharding = sharded.start_sharding(workers=2, log_level=logging.ERROR)
+        sharded._update_positions_from_contract(fetch)
+        sharded.update_prices(prices)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            assert sharding.wait_processed()
+            if sharding.tier_counts().tolist() == single.risk_state.tier_counts.tolist():
+                break
+            time.sleep(0.05)
+        tier_counts = sharding.tier_counts().copy()
+        positions = int(sharding.board.status[:, POSITIONS].sum())
+        sharded.stop_sharding()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert positions == len(single.positions) == 6000 - 300 + 200
+    assert tier_counts.tolist() == single.risk_state.tier_counts.tolist()
+    print(f"✅ {len(page['changes'])} alterações aplicadas nos shards; tiers {tier_counts.tolist()}")
+    print()
+
+def _throughput(book_size: int, workers: int, rounds: int) -> float:
+    """Posições reprocessadas por segundo com quedas e recuperações alternadas dos preços"""
+    book = synthetic_book(book_size, seed=7)
+    sharding = ShardedScoring(book, workers, log_level=logging.CRITICAL)
+    sharding.update_prices(dict(MARKETS))
+    sharding.start()
+    try:
+        shocked = {market: price * 0.75 for market, price in MARKETS.items()}
+        start = time.perf_counter()
+        for round_ in range(rounds):
+            sharding.update_prices(shocked if round_ % 2 == 0 else dict(MARKETS))
+            assert sharding.wait_processed(timeout=60)
+        elapsed = time.perf_counter() - start
+    finally:
+        sharding.stop()
+    return book_size * rounds / elapsed
+
+def test_scaling():
+    """Testa o ganho de throughput com mais workers (limitado pelos núcleos disponíveis)"""
+    print("🧪 TESTE 4: Escala com Workers")
+    print("=" * 50)
+
+    cores = os.cpu_count() or 1
+    workers = min(4, cores)
+    one = _throughput(50000, 1, rounds=4)
+    print(f"📊 1 worker: {one:,.0f} posições/s")
+    if workers < 2:
+        print(f"⚠️ {cores} núcleo disponível: ganho com mais workers não verificado")
+        print()
+        return
+    many = _throughput(50000, workers, rounds=4)
+    speedup = many / one
+    print(f"📊 {workers} workers: {many:,.0f} posições/s ({speedup:.2f}x)")
+    assert speedup >= 0.6 * workers
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP SHARDED SCORING - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_price_board_seqlock()
+        test_sharded_matches_single_process()
+        test_sync_reaches_shards()
+        test_scaling()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
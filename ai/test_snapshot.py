@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Teste do Snapshot e Reinício a Quente
+Verifica o formato binário, a restauração completa do estado do analisador,
+o replay dos ticks do diário posteriores ao snapshot e o tempo de
+restauração de um livro de um milhão de posições
+"""
+
+import sys
+import os
+import json
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from snapshot import Snapshot, write_snapshot, HEADER, HEADER_SIZE, TMP_SUFFIX
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+def _analyzer(book_size: int, seed: int) -> SAPPRealRiskAnalyzer:
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions = synthetic_book(book_size, seed)
+    analyzer.current_prices.update(MARKETS)
+    analyzer._rescore_dirty_positions()
+    return analyzer
+
+def _shocked_frames(count: int, seed: int):
+    """Mensagens sintéticas com uma queda forte de WTI, Gold e BTC no último terço"""
+    frames = synthetic_frames(count, seed)
+    for index in range(2 * count // 3, count):
+        data = json.loads(frames[index])
+        for section in ("crypto", "commodities"):
+            for market, entry in data[section].items():
+                if market in ("WTI", "Gold", "BTC"):
+                    entry["price"] = round(entry["price"] * 0.85, 6)
+        frames[index] = json.dumps(data)
+    return frames
+
+def _feed(analyzer: SAPPRealRiskAnalyzer, frames):
+    for frame in frames:
+        analyzer._on_message(None, frame)
+        analyzer._rescore_dirty_positions()
+
+def _cached_scores(analyzer: SAPPRealRiskAnalyzer):
+    """Score, tier e nível de alerta em cache de cada posição do livro"""
+    risk_state = analyzer.risk_state
+    return {
+        position_id: (risk_state.score(position_id), risk_state.tier(position_id),
+                      int(risk_state._alert_tiers[risk_state._rows[position_id]]))
+        for position_id in analyzer.positions
+    }
+
+def test_snapshot_format():
+    """Testa seções alinhadas, metadados JSON, views copy-on-write e validação do cabeçalho"""
+    print("🧪 TESTE 1: Formato do Snapshot")
+    print("=" * 50)
+
+    path = os.path.join(tempfile.mkdtemp(), "state.snap")
+    state = {
+        "book": {"ids": np.arange(1000, dtype=np.uint16), "matrix": np.ones((3, 5)),
+                 "empty": np.empty(0, dtype=np.int64)},
+        "rings": [{"market": "WTI", "prices": np.linspace(0, 1, 7), "queue": [[1, 2.5], [3, 4.0]]}],
+        "version": 42, "last": None, "price": np.float64(1.5), "thresholds": {"LOW": 0.3},
+    }
+    size = write_snapshot(path, state)
+    assert os.path.getsize(path) == size and not os.path.exists(path + TMP_SUFFIX)
+
+    snapshot = Snapshot(path)
+    restored = snapshot.state
+    assert restored["version"] == 42 and restored["last"] is None and restored["price"] == 1.5
+    assert restored["rings"][0]["queue"] == [[1, 2.5], [3, 4.0]] and restored["thresholds"] == {"LOW": 0.3}
+    ids = restored["book"]["ids"]
+    assert ids.dtype == np.uint16 and (ids == np.arange(1000)).all() and not ids.flags.owndata
+    assert restored["book"]["matrix"].shape == (3, 5) and restored["book"]["empty"].shape == (0,)
+    ids[:10] = 7  # copy-on-write: o arquivo não muda
+    assert (Snapshot(path).state["book"]["ids"][:10] == np.arange(10)).all()
+
+    # Cabeçalho inválido, versão desconhecida e arquivo truncado
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    magic, version, reserved, count, created_ns, meta_offset, meta_length = HEADER.unpack_from(data, 0)
+    errors = []
+    for corrupt in (b"X" + data[1:],
+                    HEADER.pack(magic, version + 1, reserved, count, created_ns, meta_offset, meta_length)
+                    + data[HEADER.size:],
+                    data[:HEADER_SIZE + 100]):
+        with open(path, "wb") as f:
+            f.write(corrupt)
+        try:
+            Snapshot(path)
+        except ValueError as e:
+            errors.append(str(e))
+    assert len(errors) == 3
+    print(f"✅ {size} bytes, {count} seções; erros: {errors}")
+    print()
+
+def test_restore_matches_original():
+    """Testa que o analisador restaurado tem o mesmo estado e segue gerando os mesmos alertas"""
+    print("🧪 TESTE 2: Estado Restaurado")
+    print("=" * 50)
+
+    frames = _shocked_frames(300, seed=21)
+    path = os.path.join(tempfile.mkdtemp(), "state.snap")
+    logging.disable(logging.ERROR)
+    try:
+        original = _analyzer(5000, seed=21)
+        original.volatility_model = 'ewma'
+        _feed(original, frames[:100])
+        # Posições fechadas (slots livres), id esparso e posições ainda por reprocessar
+        for position_id in range(1, 50):
+            del original.positions[position_id]
+        original.positions[10**12] = original.positions[100].snapshot()
+        original.positions[77] = original.positions[78].snapshot()
+        original.position_sync.version = 1234
+        original.save_snapshot(path)
+
+        restored = SAPPRealRiskAnalyzer()
+        result = restored.restore_snapshot(path)
+        original._rescore_dirty_positions()  # a restauração reprocessa as posições pendentes
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert result.positions == len(original.positions) == 4952 and result.rescored == 2
+    assert sorted(restored.positions) == sorted(original.positions)
+    assert all(restored.positions.snapshot(position_id)._replace(timestamp=None)
+               == original.positions.snapshot(position_id)._replace(timestamp=None)
+               for position_id in original.positions)
+    timestamp = original.positions.snapshot(500).timestamp
+    assert abs((restored.positions.snapshot(500).timestamp - timestamp).total_seconds()) < 1e-3
+    assert restored.current_prices == original.current_prices and restored.volatility_model == 'ewma'
+    assert restored.position_sync.version == 1234 and restored._last_tick_ns == original._last_tick_ns
+    assert restored.price_history.stats("WTI") == original.price_history.stats("WTI")
+    assert np.allclose(restored.covariance.covariance(), original.covariance.covariance())
+    assert _cached_scores(restored) == _cached_scores(original)
+    assert restored.risk_state.tier_counts.tolist() == original.risk_state.tier_counts.tolist()
+
+    # Daqui em diante os dois seguem iguais (volatilidade EWMA, histerese e gatilhos restaurados)
+    alerts = []
+    logging.disable(logging.ERROR)
+    try:
+        for analyzer in (original, restored):
+            submitted = []
+            analyzer.alert_pipeline.submit = submitted.append
+            _feed(analyzer, frames[100:])
+            alerts.append(sorted((alert.position_id, alert.alert_type) for alert in submitted))
+    finally:
+        logging.disable(logging.NOTSET)
+    assert alerts[0] and alerts[0] == alerts[1]
+    assert _cached_scores(restored) == _cached_scores(original)
+    assert restored.position_index.positions_for(["WTI"]) == original.position_index.positions_for(["WTI"])
+    print(f"✅ {result.positions} posições restauradas em {result.seconds * 1e3:.1f} ms; "
+          f"{len(alerts[0])} alertas idênticos depois")
+    print()
+
+def test_journal_catch_up():
+    """Testa o replay apenas dos ticks gravados depois do snapshot"""
+    print("🧪 TESTE 3: Replay do Diário Após o Snapshot")
+    print("=" * 50)
+
+    frames = _shocked_frames(240, seed=22)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "state.snap")
+    journal_dir = os.path.join(directory, "ticks")
+    logging.disable(logging.ERROR)
+    try:
+        live = _analyzer(5000, seed=22)
+        live.start_recording(journal_dir)
+        _feed(live, frames[:100])
+        live.save_snapshot(path)
+        _feed(live, frames[100:])
+        live.stop_recording()  # processo interrompido aqui
+
+        restored = SAPPRealRiskAnalyzer()
+        result = restored.restore_snapshot(path, journal_dir)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert result.ticks == 140 * len(MARKETS) and result.instants == 140 and result.rescored
+    assert restored.current_prices == live.current_prices and restored._last_tick_ns == live._last_tick_ns
+    assert all(restored.price_history.stats(market) == live.price_history.stats(market) for market in MARKETS)
+    scores = {position_id: values[:2] for position_id, values in _cached_scores(restored).items()}
+    assert scores == {position_id: values[:2] for position_id, values in _cached_scores(live).items()}
+    assert restored.risk_state.tier_counts.tolist() == live.risk_state.tier_counts.tolist()
+    print(f"✅ {result.ticks} ticks reaplicados ({result.instants} instantes), {result.rescored} posições "
+          f"reprocessadas; replay {result.replay_seconds * 1e3:.0f} ms")
+    print()
+
+def test_million_position_restore():
+    """Testa o tempo até o primeiro score válido com um livro de um milhão de posições"""
+    print("🧪 TESTE 4: Reinício com 1M de Posições")
+    print("=" * 50)
+
+    frames = synthetic_frames(30, seed=23)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "state.snap")
+    journal_dir = os.path.join(directory, "ticks")
+    logging.disable(logging.ERROR)
+    try:
+        start = time.perf_counter()
+        live = _analyzer(1_000_000, seed=23)
+        cold = time.perf_counter() - start
+        live.start_recording(journal_dir)
+        _feed(live, frames[:25])  # inclui um movimento que reprocessa ~20% do livro
+        start = time.perf_counter()
+        size = live.save_snapshot(path)
+        save = time.perf_counter() - start
+        _feed(live, frames[25:])
+        live.stop_recording()
+
+        restored = SAPPRealRiskAnalyzer()
+        result = restored.restore_snapshot(path, journal_dir)
+        summary = restored.get_risk_summary()
+        tier_counts = restored.risk_state.tier_counts.tolist()
+        start = time.perf_counter()
+        restored._on_message(None, synthetic_frames(31, seed=23)[-1])
+        restored._rescore_dirty_positions()
+        first_tick = time.perf_counter() - start
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(f"📊 Partida a frio (livro + scoring completo): {cold:.2f}s; snapshot {size / 1e6:.0f} MB em {save:.2f}s")
+    print(f"📊 Restauração: mmap {result.map_seconds * 1e3:.0f} ms + replay de {result.ticks} ticks "
+          f"{result.replay_seconds * 1e3:.0f} ms + scoring {result.score_seconds * 1e3:.0f} ms; "
+          f"primeiro tick depois: {first_tick * 1e3:.0f} ms")
+    assert summary["total_positions"] == 1_000_000 and summary["pending_positions"] == 0
+    assert tier_counts == live.risk_state.tier_counts.tolist()
+    assert result.ticks == 5 * len(MARKETS) and result.seconds < 1.0
+    print(f"✅ Scores válidos {result.seconds * 1e3:.0f} ms após o início da restauração")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP SNAPSHOT - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_snapshot_format()
+        test_restore_matches_original()
+        test_journal_catch_up()
+        test_million_position_restore()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
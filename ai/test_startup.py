@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Teste da Partida
+Verifica os marcos de prontidão do feed (threads e corrotinas), os imports
+adiados, a espera do scoring pelo primeiro snapshot completo de preços e o
+tempo de cada fase até o primeiro score
+"""
+
+import sys
+import os
+import asyncio
+import json
+import logging
+import subprocess
+import threading
+import time
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from backend_integration import SAPPBackendIntegration
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+from startup import Readiness, StartupTimer, process_age
+
+def test_readiness():
+    """Testa marcos vindos de outra thread, espera em threads e corrotinas e o abort"""
+    print("🧪 TESTE 1: Marcos de Prontidão")
+    print("=" * 50)
+
+    readiness = Readiness()
+    assert not readiness.wait('prices', 0.01) and not readiness.is_set()
+
+    async def waiting():
+        waiters = [asyncio.create_task(readiness.wait_async(stage, 2)) for stage in ('open', 'prices')]
+        await asyncio.sleep(0.01)
+        threading.Timer(0.02, readiness.mark, ('open',)).start()
+        threading.Timer(0.05, readiness.mark, ('prices',)).start()
+        return await asyncio.gather(*waiters), await readiness.wait_async('scored', 0.01)
+
+    start = time.perf_counter()
+    (opened, priced), scored = asyncio.run(waiting())
+    assert opened and priced and not scored and time.perf_counter() - start < 1.0
+    assert readiness.marks['open'] < readiness.marks['prices'] and not readiness.mark('prices')
+    assert readiness.wait('prices', 0)
+
+    # Feed que cai antes de ficar pronto acorda quem espera, sem esperar o timeout
+    failed = Readiness()
+    threading.Timer(0.02, failed.abort, (ConnectionRefusedError("recusada"),)).start()
+    start = time.perf_counter()
+    assert not failed.wait('prices', 5) and failed.error == "recusada"
+    assert not asyncio.run(failed.wait_async('prices', 5)) and time.perf_counter() - start < 1.0
+
+    timer = StartupTimer()
+    timer.mark('imports')
+    time.sleep(0.01)
+    timer.mark('conexão')
+    assert [phase for phase, _ in timer.phases] == ['imports', 'conexão'] and timer.phases[1][1] >= 0.01
+    assert process_age() is None or timer.phases[0][1] > 0
+    print(f"✅ Marcos em {(readiness.marks['prices'] - readiness.marks['open']) * 1e3:.0f} ms; "
+          f"abort: {failed.error}; {timer.report()}")
+    print()
+
+def test_deferred_imports():
+    """Testa que importar o sistema não carrega requests/websocket-client, multiprocessing, profilers
+    e servidor HTTP, nem configura o logging"""
+    print("🧪 TESTE 2: Imports Adiados")
+    print("=" * 50)
+
+    script = (
+        "import sys, logging, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        "system = main.SAPP_AI_Main(use_async=True)\n"
+        "loaded = [name for name in ('requests', 'websocket', 'urllib3', 'multiprocessing', 'cProfile', 'pstats',\n"
+        "                            'http.server', 'sharded_scoring') if name in sys.modules]\n"
+        "handlers = len(logging.getLogger().handlers)\n"
+        "system.backend.client.session\n"
+        "print(loaded, handlers, 'requests' in sys.modules, round(elapsed * 1e3))\n"
+    )
+    directory = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True,
+                            text=True, timeout=60, check=True).stdout.strip().splitlines()[-1]
+    loaded, handlers, session_loaded, elapsed = output.rsplit(" ", 3)
+    assert loaded == "[]" and handlers == "0" and session_loaded == "True"
+    print(f"✅ import main em {elapsed} ms sem requests/websocket/multiprocessing/cProfile/http.server; "
+          f"requests carregado no primeiro uso da Session")
+    print()
+
+def test_backend_readiness():
+    """Testa a prontidão do feed em thread (modo síncrono) no lugar da espera fixa"""
+    print("🧪 TESTE 3: Prontidão do Feed do Backend")
+    print("=" * 50)
+
+    logging.disable(logging.ERROR)
+    try:
+        backend = SAPPBackendIntegration()
+        backend._on_open(None)
+        backend._on_message(None, json.dumps({"type": "positions", "positions": []}))
+        assert backend.readiness.is_set('open') and not backend.readiness.is_set()
+        backend._on_message(None, synthetic_frames(1, seed=3)[0])
+        assert backend.readiness.wait('prices', 0)
+
+        # Backend fora do ar: a falha libera a partida na hora
+        offline = SAPPBackendIntegration(ws_url="ws://127.0.0.1:9")
+        start = time.perf_counter()
+        offline.connect_websocket()
+        ready = offline.readiness.wait('prices', 5)
+        waited = time.perf_counter() - start
+    finally:
+        logging.disable(logging.NOTSET)
+    assert not ready and offline.readiness.error and waited < 2.0
+    print(f"✅ Pronto no primeiro snapshot de preços; backend fora do ar liberado em {waited * 1e3:.0f} ms "
+          f"({offline.readiness.error})")
+    print()
+
+def test_scoring_waits_for_prices():
+    """Testa que o scoring asyncio espera os preços de todos os mercados e mede o tempo até o primeiro score"""
+    print("🧪 TESTE 4: Primeiro Score Após o Snapshot de Preços")
+    print("=" * 50)
+
+    frame = json.loads(synthetic_frames(1, seed=4)[0])
+    partial = json.dumps(dict(frame, commodities={}))
+    cycles = []
+
+    async def scenario(analyzer):
+        analyzer._score_async = asyncio.Event()
+        analyzer.running = True
+        rescore = analyzer._rescore_dirty_positions
+        analyzer._rescore_dirty_positions = lambda: cycles.append(rescore())
+        scoring = asyncio.create_task(analyzer._scoring_async())
+        await asyncio.sleep(0.05)
+        assert not cycles  # livro inteiro pendente, nenhum preço ainda
+        analyzer._on_open(None)
+        analyzer._on_message(None, partial)
+        await asyncio.sleep(0.05)
+        assert not cycles and not analyzer.readiness.is_set()
+        analyzer._on_message(None, json.dumps(frame))
+        assert await analyzer.readiness.wait_async('scored', 5)
+        analyzer.running = False
+        analyzer._score_async.set()
+        await scoring
+
+    logging.disable(logging.ERROR)
+    try:
+        analyzer = SAPPRealRiskAnalyzer()
+        analyzer.positions = synthetic_book(100_000, seed=4)
+        asyncio.run(scenario(analyzer))
+    finally:
+        logging.disable(logging.NOTSET)
+
+    marks = analyzer.readiness.marks
+    assert cycles[0] == 100_000 and analyzer.get_risk_summary()["pending_positions"] == 0
+    assert set(analyzer.current_prices) == set(MARKETS)
+    first_score = marks['scored'] - marks['prices']
+    print(f"📊 conexão → preços {(marks['prices'] - marks['open']) * 1e3:.0f} ms; "
+          f"preços → primeiro score (100k posições) {first_score * 1e3:.0f} ms")
+    print(f"✅ Um único scoring do livro, já com os {len(MARKETS)} mercados")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP STARTUP - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_readiness()
+        test_deferred_imports()
+        test_backend_readiness()
+        test_scoring_waits_for_prices()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Teste do Stress Test
+Compara a avaliação em matriz com o cálculo escalar cenário a cenário
+"""
+
+import sys
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stress import ScenarioSet
+from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+from test_batch_risk import _random_book
+
+BASE_PRICES = {"WTI": 63.0, "Brent": 67.0, "Gold": 3732.0, "Silver": 43.2}
+
+def _positions() -> dict:
+    """Posições WTI-Brent e Gold-Silver"""
+    positions = {}
+    for position_id in range(1, 41):
+        oil = position_id % 2 == 0
+        positions[position_id] = PositionData(
+            position_id=position_id,
+            leg1_market="WTI" if oil else "Gold",
+            leg2_market="Brent" if oil else "Silver",
+            leg1_size=1000 if oil else 10,
+            leg2_size=-1000 if oil else -1000,
+            margin=10000 + 1000 * position_id,
+            entry_spread=-4.0 if oil else 3688.8,
+            current_spread=-4.0 if oil else 3688.8,
+            timestamp=datetime.now()
+        )
+    return positions
+
+def test_scenarios_match_scalar():
+    """Testa tiers, piores posições e déficit de margem contra o cálculo escalar"""
+    print("🧪 TESTE 1: Matriz de Cenários vs Escalar")
+    print("=" * 50)
+
+    positions = _positions()
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.current_prices.update(BASE_PRICES)
+    analyzer.positions = positions
+    scenarios = ScenarioSet.from_prices(
+        ["Preços Estáveis", "WTI Subindo", "Volatilidade Alta"],
+        [{"WTI": 63.0, "Brent": 67.0}, {"WTI": 65.0}, {"WTI": 60.0, "Brent": 75.0}]
+    ).concat(ScenarioSet.from_shocks(
+        ["Crash Gold/Silver", "Prata dispara"],
+        [{"Gold": -0.55}, {"Silver": 0.4}]
+    ))
+    result = analyzer.run_stress_test(scenarios, top_n=3)
+
+    for index, name in enumerate(scenarios.names):
+        # Recalcular o cenário posição a posição
+        shocked = analyzer.__class__()
+        shocked.current_prices.update(BASE_PRICES)
+        for column, market in enumerate(scenarios.markets):
+            shock = scenarios.shocks[index, column]
+            if not np.isnan(shock):
+                relative = scenarios.relative[index, column]
+                shocked.current_prices[market] = BASE_PRICES[market] * (1 + shock) if relative else shock
+
+        scores = {}
+        shortfall = 0.0
+        tiers = dict.fromkeys(('NONE', 'LOW', 'MEDIUM', 'HIGH', 'CRITICAL'), 0)
+        for position_id, position in positions.items():
+            score = shocked._calculate_risk_score(position)
+            scores[position_id] = score
+            alert = shocked._generate_alert(position, score)
+            tiers[alert.alert_type if alert else 'NONE'] += 1
+            p1 = shocked.current_prices[position.leg1_market]
+            p2 = shocked.current_prices[position.leg2_market]
+            required = max(abs(position.leg1_size) * p1, abs(position.leg2_size) * p2) * 0.2
+            shortfall += max(required - position.margin, 0.0)
+
+        summary = result.scenario(index)
+        assert summary["name"] == name
+        assert summary["tiers"] == tiers
+        assert abs(summary["margin_shortfall"] - shortfall) < 1e-6 * max(1.0, shortfall)
+        expected_worst = sorted(scores.values(), reverse=True)[:3]
+        assert np.allclose([score for _, score in summary["worst_positions"]], expected_worst)
+        print(f"   {name:<20} {summary['tiers']} déficit ${summary['margin_shortfall']:,.0f}")
+
+    print("✅ Todos os cenários idênticos ao cálculo escalar")
+    print()
+
+def test_thousand_scenarios():
+    """Mede 1.000 cenários contra um livro grande"""
+    print("🧪 TESTE 2: 1.000 Cenários")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.positions = _random_book(50000, seed=9)
+    analyzer.current_prices.update({
+        "WTI": 63.0, "Brent": 67.5, "Gold": 3732.0, "Silver": 43.2,
+        "Copper": 4.1, "Aluminum": 2.3, "BTC": 60000.0, "ETH": 3000.0
+    })
+    registry = analyzer.market_registry
+
+    rng = np.random.default_rng(10)
+    shocks = rng.normal(0, 0.05, (1000, len(registry)))
+    scenarios = ScenarioSet([f"random_{index}" for index in range(1000)], list(registry.names),
+                            shocks, np.ones(shocks.shape, dtype=bool))
+
+    start = time.perf_counter()
+    result = analyzer.run_stress_test(scenarios)
+    elapsed = time.perf_counter() - start
+
+    assert result.tier_counts.sum(axis=1).tolist() == [len(analyzer.positions)] * 1000
+    worst = int(np.argmax(result.margin_shortfall))
+    print(f"📊 {len(scenarios)} cenários × {len(analyzer.positions)} posições em {elapsed:.2f}s")
+    print(f"📊 Pior cenário: {result.scenario(worst)['name']} (déficit ${result.margin_shortfall[worst]:,.0f})")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP STRESS TEST - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_scenarios_match_scalar()
+        test_thousand_scenarios()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Teste do Diário de Ticks
+Verifica a gravação dos ticks em segmentos rotativos com índice no rodapé,
+a recuperação de segmentos interrompidos, a leitura por mmap sem cópia e a
+gravação a partir do analisador
+"""
+
+import sys
+import os
+import json
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_risk import MarketRegistry
+from benchmark import synthetic_book, synthetic_frames, MARKETS
+from price_decoder import TICK_DTYPE
+from tick_journal import (TickJournal, TickJournalReader, JournalSegment, INDEX_STRIDE,
+                          FOOTER, HEADER_SIZE, SEGMENT_SUFFIX, OPEN_SUFFIX)
+from real_risk_analyzer import SAPPRealRiskAnalyzer
+
+START_NS = 1_700_000_000_000_000_000
+
+def _ticks(count: int, markets: int, seed: int, start: int = 0) -> np.ndarray:
+    """Ticks com timestamps crescentes (um por microssegundo)"""
+    rng = np.random.default_rng(seed)
+    ticks = np.empty(count, dtype=TICK_DTYPE)
+    ticks['market_id'] = rng.integers(0, markets, count)
+    ticks['price'] = rng.uniform(1, 100000, count)
+    ticks['timestamp_ns'] = START_NS + (start + np.arange(count)) * 1000
+    return ticks
+
+def _registry(markets: int) -> MarketRegistry:
+    registry = MarketRegistry()
+    for market in list(MARKETS)[:markets]:
+        registry.intern(market)
+    return registry
+
+def test_round_trip_and_rotation():
+    """Testa registros, rotação de segmentos, nomes dos mercados e busca pelo índice do rodapé"""
+    print("🧪 TESTE 1: Gravação, Rotação e Índice")
+    print("=" * 50)
+
+    directory = tempfile.mkdtemp()
+    registry = _registry(8)
+    ticks = _ticks(50000, 8, seed=1)
+    journal = TickJournal(directory, registry, segment_records=20000)
+    for start in range(0, len(ticks), 700):
+        assert journal.append(ticks[start:start + 700])
+    assert journal.flush()
+    assert journal.stats['ticks'] == len(ticks) and journal.stats['segments'] == 3
+    journal.close()
+
+    names = sorted(os.listdir(directory))
+    assert names == ["markets.json"] + [f"segment-00000{number}{SEGMENT_SUFFIX}" for number in (1, 2, 3)]
+    with open(os.path.join(directory, "segment-000001" + SEGMENT_SUFFIX), "rb") as f:
+        data = f.read()
+    assert len(data) == HEADER_SIZE + 20000 * 20 + 5 * 16 + FOOTER.size  # registros de 20 bytes
+
+    reader = TickJournalReader(directory)
+    try:
+        assert reader.markets == registry.names and len(reader) == len(ticks)
+        assert [len(segment) for segment in reader.segments] == [20000, 20000, 10000]
+        records = np.concatenate(list(reader.iter_batches()))
+        assert (records['timestamp_ns'] == ticks['timestamp_ns']).all()
+        assert (records['market_id'] == ticks['market_id']).all() and (records['price'] == ticks['price']).all()
+
+        segment = reader.segments[1]
+        assert segment.sealed and len(segment.index) == -(-20000 // INDEX_STRIDE)
+        assert segment.min_ts == int(ticks['timestamp_ns'][20000])
+        assert segment.max_ts == int(ticks['timestamp_ns'][39999])
+
+        # Intervalo atravessando dois segmentos
+        low, high = int(ticks['timestamp_ns'][12345]), int(ticks['timestamp_ns'][31000])
+        window = list(reader.iter_batches(low, high))
+        assert [len(batch) for batch in window] == [20000 - 12345, 31000 - 20000]
+        assert int(window[0]['timestamp_ns'][0]) == low and int(window[-1]['timestamp_ns'][-1]) < high
+        assert segment.position(int(ticks['timestamp_ns'][30000]) + 1) == 10001
+
+        first = next(iter(reader))
+        assert first == (int(ticks['timestamp_ns'][0]), int(ticks['market_id'][0]), float(ticks['price'][0]))
+    finally:
+        reader.close()
+
+    # Novo gravador no mesmo diretório continua a numeração
+    journal = TickJournal(directory, registry, segment_records=20000)
+    journal.append(ticks[:10])
+    journal.close()
+    assert os.path.exists(os.path.join(directory, "segment-000004" + SEGMENT_SUFFIX))
+    print(f"✅ {len(ticks)} ticks em 3 segmentos; intervalo de {sum(len(b) for b in window)} ticks pelo índice")
+    print()
+
+def test_interrupted_segment():
+    """Testa a leitura de um segmento .open e seu fechamento na próxima abertura do diário"""
+    print("🧪 TESTE 2: Segmento Interrompido")
+    print("=" * 50)
+
+    directory = tempfile.mkdtemp()
+    registry = _registry(4)
+    ticks = _ticks(10000, 4, seed=2)
+    journal = TickJournal(directory, registry)
+    journal.append(ticks)
+    assert journal.flush()
+    # Processo interrompido: o segmento fica sem índice e rodapé...
+    segment_writer, journal._segment = journal._segment, None
+    journal.close()
+    segment_writer.file.close()
+
+    # ...e com um registro incompleto no fim
+    path = os.path.join(directory, "segment-000001" + SEGMENT_SUFFIX + OPEN_SUFFIX)
+    with open(path, "ab") as f:
+        f.write(b"\x01" * 7)
+    segment = JournalSegment(path)
+    assert not segment.sealed and len(segment) == len(ticks)
+    assert segment.between(int(ticks['timestamp_ns'][9000])).shape == (1000,)
+    segment.close()
+
+    recovered = TickJournal(directory, registry)
+    recovered.close()
+    reader = TickJournalReader(directory)
+    try:
+        assert [segment.sealed for segment in reader.segments] == [True]
+        assert len(reader) == len(ticks) and reader.segments[0].max_ts == int(ticks['timestamp_ns'][-1])
+        assert (reader.segments[0].records['price'] == ticks['price']).all()
+    finally:
+        reader.close()
+
+    # Processo morto logo após criar o segmento seguinte: .open vazio não impede reabrir nem ler
+    empty = os.path.join(directory, "segment-000002" + SEGMENT_SUFFIX + OPEN_SUFFIX)
+    open(empty, "wb").close()
+    reader = TickJournalReader(directory)
+    assert len(reader) == len(ticks)
+    reader.close()
+    again = TickJournal(directory, registry)
+    again.append(ticks[:10])
+    assert again.flush()
+    header_size = os.path.getsize(again._segment.path)  # cabeçalho já em disco, registros ainda no buffer
+    again.close()
+    assert not os.path.exists(empty) and header_size >= HEADER_SIZE
+    reader = TickJournalReader(directory)
+    assert len(reader) == len(ticks) + 10
+    reader.close()
+    print(f"✅ {len(ticks)} ticks recuperados; registro incompleto e segmento vazio descartados")
+    print()
+
+def test_read_throughput():
+    """Testa a leitura por mmap sem cópia: milhões de ticks por segundo"""
+    print("🧪 TESTE 3: Throughput de Leitura")
+    print("=" * 50)
+
+    directory = tempfile.mkdtemp()
+    count = 2_000_000
+    journal = TickJournal(directory, _registry(16), segment_records=1 << 19)
+    ticks = _ticks(count, 16, seed=3)
+    for start in range(0, count, 100000):
+        journal.append(ticks[start:start + 100000])
+    journal.close()
+
+    reader = TickJournalReader(directory)
+    try:
+        start = time.perf_counter()
+        total = 0.0
+        read = 0
+        for batch in reader.iter_batches():
+            assert not batch.flags.owndata and not batch.flags.writeable  # view do mmap
+            total += float(batch['price'].sum())
+            read += len(batch)
+        batch_rate = read / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        iterated = 0
+        for timestamp_ns, market_id, price in reader:
+            iterated += 1
+        tuple_rate = iterated / (time.perf_counter() - start)
+    finally:
+        reader.close()
+
+    assert read == iterated == count and np.isclose(total, ticks['price'].sum())
+    print(f"📊 Lotes (views): {batch_rate / 1e6:,.0f} M ticks/s; tupla a tupla: {tuple_rate / 1e6:.1f} M ticks/s")
+    assert batch_rate > 50e6 and tuple_rate > 1e6
+    print()
+
+def test_analyzer_recording():
+    """Testa a gravação pelo analisador e o custo no caminho quente"""
+    print("🧪 TESTE 4: Gravação pelo Analisador")
+    print("=" * 50)
+
+    directory = tempfile.mkdtemp()
+    frames = synthetic_frames(2000, seed=4)
+    analyzers = []
+    for _ in range(2):
+        analyzer = SAPPRealRiskAnalyzer()
+        analyzer.positions = synthetic_book(2000, seed=4)
+        analyzer.current_prices.update(MARKETS)
+        analyzers.append(analyzer)
+    baseline, analyzer = analyzers
+    logging.disable(logging.ERROR)
+    try:
+        start = time.perf_counter_ns()
+        for frame in frames:
+            baseline._on_message(None, frame)
+        plain = time.perf_counter_ns() - start
+
+        analyzer.start_recording(directory)
+        start = time.perf_counter_ns()
+        for frame in frames:
+            analyzer._on_message(None, frame)
+        recording = time.perf_counter_ns() - start
+        analyzer.stop_recording()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    reader = TickJournalReader(directory)
+    try:
+        records = np.concatenate(list(reader.iter_batches()))
+        markets = reader.markets
+    finally:
+        reader.close()
+    expected = json.loads(frames[-1])
+    assert len(records) == len(frames) * len(MARKETS) and analyzer.journal is None
+    last = records[-len(MARKETS):]
+    assert {markets[market_id]: price for market_id, price in zip(last['market_id'].tolist(), last['price'].tolist())} \
+        == {market: entry["price"] for section in ("crypto", "commodities") for market, entry in expected[section].items()}
+    assert int(last['timestamp_ns'][0]) == expected["timestamp"] * 1_000_000
+    # Custo de append em si (o restante da diferença é a thread de gravação dividindo o núcleo)
+    journal = TickJournal(tempfile.mkdtemp(), analyzer.market_registry)
+    batch = records[:len(MARKETS)].astype(TICK_DTYPE)
+    start = time.perf_counter_ns()
+    for _ in range(20000):
+        journal.append(batch)
+    append_ns = (time.perf_counter_ns() - start) / 20000
+    journal.close()
+    overhead = (recording - plain) / len(frames)
+    print(f"📊 append: {append_ns:.0f} ns por lote; custo por mensagem com gravação: {overhead / 1e3:+.1f} µs")
+    assert append_ns < 5000
+    print(f"✅ {len(records)} ticks gravados de {len(frames)} mensagens")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP TICK JOURNAL - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_round_trip_and_rotation()
+        test_interrupted_segment()
+        test_read_throughput()
+        test_analyzer_recording()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Teste do Trigger Book
+Verifica que nenhuma mudança de score escapa dos níveis pré-calculados
+"""
+
+import sys
+import os
+import time
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_risk import BookColumns, MarketRegistry, score_columns
+from trigger_book import TriggerBook
+
+MARKETS = ["WTI", "Brent", "Gold", "Silver", "Copper", "NatGas"]
+BASE_PRICES = [63.0, 67.0, 3732.0, 43.2, 4.1, 2.8]
+
+def _synthetic_book(count: int, seed: int):
+    """Livro sintético com margens e spreads próximos dos limites"""
+    rng = np.random.default_rng(seed)
+    registry = MarketRegistry()
+    for market in MARKETS:
+        registry.intern(market)
+    prices = np.array(BASE_PRICES)
+
+    columns = BookColumns.empty(count)
+    columns.position_ids[:] = np.arange(1, count + 1)
+    columns.leg1_ids[:] = rng.integers(0, len(MARKETS), count)
+    columns.leg2_ids[:] = (columns.leg1_ids + rng.integers(1, len(MARKETS), count)) % len(MARKETS)
+    columns.leg1_size[:] = rng.choice([10, 100, 1000], count)
+    columns.leg2_size[:] = -rng.choice([10, 100, 1000], count)
+    notional = np.maximum(
+        np.abs(columns.leg1_size) * prices[columns.leg1_ids],
+        np.abs(columns.leg2_size) * prices[columns.leg2_ids]
+    )
+    columns.margin[:] = (notional * 0.2 * rng.uniform(0.9, 2.0, count)).astype(np.int64)
+    spread = prices[columns.leg1_ids] - prices[columns.leg2_ids]
+    columns.entry_spread[:] = spread * rng.uniform(0.85, 1.15, count)
+    return registry, columns, prices
+
+def test_no_missed_crossings():
+    """Testa que posições não disparadas mantêm exatamente o mesmo score"""
+    print("🧪 TESTE 1: Nenhum Cruzamento Perdido")
+    print("=" * 50)
+
+    registry, columns, prices = _synthetic_book(5000, seed=3)
+    rng = np.random.default_rng(11)
+    book = TriggerBook()
+    last_total = score_columns(columns, prices).total.copy()
+    book.update(columns, prices)
+
+    triggered = 0
+    for _ in range(300):
+        market_id = int(rng.integers(0, len(MARKETS)))
+        prices[market_id] *= 1 + rng.normal(0, 0.01)
+
+        crossed = book.crossed(market_id, prices[market_id])
+        rows = crossed - 1
+        current = score_columns(columns, prices).total
+
+        untouched = np.ones(len(columns), dtype=bool)
+        untouched[rows] = False
+        assert np.array_equal(current[untouched], last_total[untouched])
+
+        # Reavaliar apenas as posições disparadas
+        last_total[rows] = current[rows]
+        book.update(columns.take(rows), prices)
+        triggered += len(rows)
+
+    print(f"✅ 300 ticks, {triggered} reavaliações em vez de {300 * len(columns)}")
+    print()
+
+def test_removed_positions():
+    """Testa que posições removidas não são mais disparadas"""
+    print("🧪 TESTE 2: Remoção de Posições")
+    print("=" * 50)
+
+    registry, columns, prices = _synthetic_book(100, seed=5)
+    book = TriggerBook()
+    book.update(columns, prices)
+    for position_id in range(1, 51):
+        book.remove(position_id)
+
+    crossed = book.crossed(0, prices[0] * 10)
+    assert len(crossed) > 0
+    assert (crossed > 50).all()
+    assert len(book) == 50
+
+    print(f"✅ {len(crossed)} posições disparadas, nenhuma removida")
+    print()
+
+def test_tick_performance():
+    """Mede o custo de um tick com o livro de gatilhos"""
+    print("🧪 TESTE 3: Performance por Tick")
+    print("=" * 50)
+
+    registry, columns, prices = _synthetic_book(200000, seed=9)
+    book = TriggerBook()
+    start = time.perf_counter()
+    book.update(columns, prices)
+    book.crossed(0, prices[0])
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    crossed = book.crossed(0, prices[0] * 1.0001)
+    tick = time.perf_counter() - start
+
+    print(f"📊 Construção: {build * 1000:.1f} ms, tick: {tick * 1000:.2f} ms ({len(crossed)} disparadas)")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP TRIGGER BOOK - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_no_missed_crossings()
+        test_removed_positions()
+        test_tick_performance()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Teste do Volatility Engine
+Compara os estimadores incrementais com o cálculo completo sobre a série do spread
+"""
+
+import sys
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Adicionar o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from volatility import SpreadVolatility, VolatilityEngine
+from real_risk_analyzer import SAPPRealRiskAnalyzer, PositionData
+
+def _position(position_id: int, leg1: str, leg2: str, margin: int = 1000000) -> PositionData:
+    """Cria uma posição de spread"""
+    return PositionData(
+        position_id=position_id,
+        leg1_market=leg1,
+        leg2_market=leg2,
+        leg1_size=1000,
+        leg2_size=-1000,
+        margin=margin,
+        entry_spread=-4.0,
+        current_spread=-4.0,
+        timestamp=datetime.now()
+    )
+
+def test_estimators_match_full_computation():
+    """Testa as taxas de variância realizada e EWMA"""
+    print("🧪 TESTE 1: Estimadores Incrementais")
+    print("=" * 50)
+
+    rng = np.random.default_rng(6)
+    estimator = SpreadVolatility(window=128, halflife_seconds=60.0)
+    spreads = -4.0 + np.cumsum(rng.normal(0, 0.05, 3000))
+    timestamps = np.cumsum(rng.integers(100_000_000, 2_000_000_000, 3000))
+
+    ewma = None
+    for tick, (spread, timestamp) in enumerate(zip(spreads, timestamps)):
+        estimator.update(float(spread), 65.0, int(timestamp))
+        if tick == 0:
+            continue
+        interval = (timestamps[tick] - timestamps[tick - 1]) / 1e9
+        rate = (spreads[tick] - spreads[tick - 1]) ** 2 / interval
+        alpha = 1.0 - np.exp(-np.log(2) * interval / 60.0)
+        ewma = rate if ewma is None else ewma + alpha * (rate - ewma)
+
+        if tick % 101 == 0:
+            first = max(1, tick + 1 - estimator.window)
+            changes = np.diff(spreads[first - 1:tick + 1])
+            intervals = np.diff(timestamps[first - 1:tick + 1]) / 1e9
+            expected = (changes ** 2).sum() / intervals.sum()
+            assert abs(estimator.realized_variance_rate - expected) < 1e-9 * max(1.0, expected)
+            assert abs(estimator.ewma_variance_rate - ewma) < 1e-9 * max(1.0, ewma)
+
+    print(f"📊 Variância realizada: {estimator.realized_variance_rate:.6f}/s, EWMA: {estimator.ewma_variance_rate:.6f}/s")
+    print("✅ Estimadores idênticos ao cálculo completo")
+    print()
+
+def test_pairs_shared_between_positions():
+    """Testa que posições do mesmo par compartilham o estimador"""
+    print("🧪 TESTE 2: Estimador por Par")
+    print("=" * 50)
+
+    analyzer = SAPPRealRiskAnalyzer()
+    for position_id in range(1, 101):
+        analyzer.positions[position_id] = _position(position_id, "WTI", "Brent")
+    analyzer.positions[101] = _position(101, "BTC", "ETH")
+
+    assert len(analyzer.volatility_engine) == 2
+    assert analyzer.position_index.positions_for_pairs([("BTC", "ETH")]) == {101}
+
+    print("✅ 101 posições acompanhadas por 2 estimadores")
+    print()
+
+def test_batch_matches_scalar():
+    """Testa o fator de volatilidade realizada no batch e no cálculo escalar"""
+    print("🧪 TESTE 3: Batch vs Escalar (modelo realizado)")
+    print("=" * 50)
+
+    rng = np.random.default_rng(7)
+    analyzer = SAPPRealRiskAnalyzer()
+    analyzer.volatility_model = 'realized'
+    markets = [("WTI", "Brent"), ("BTC", "ETH"), ("Gold", "Silver")]
+    for position_id in range(1, 301):
+        leg1, leg2 = markets[position_id % len(markets)]
+        analyzer.positions[position_id] = _position(position_id, leg1, leg2, margin=int(rng.integers(5000, 200000)))
+
+    base = {"WTI": 63.0, "Brent": 67.0, "BTC": 60.0, "ETH": 30.0, "Gold": 20.0, "Silver": 18.0}
+    for tick in range(200):
+        scale = {"WTI": 0.0005, "Brent": 0.0005, "BTC": 0.05, "ETH": 0.05, "Gold": 0.001, "Silver": 0.001}
+        analyzer.update_prices({market: price + rng.normal(0, scale[market]) for market, price in base.items()},
+                               timestamp_ns=tick * 1_000_000_000)
+
+    scores = analyzer.calculate_risk_scores_batch()
+    distinct = set()
+    for row, position_id in enumerate(scores.position_ids.tolist()):
+        position = analyzer.positions[position_id]
+        expected = analyzer._calculate_volatility_risk_real(position)
+        assert scores.volatility[row] == expected
+        assert abs(scores.total[row] - analyzer._calculate_risk_score(position)) < 1e-12
+        distinct.add(expected)
+
+    assert len(distinct) > 1
+    print(f"✅ {len(scores)} posições idênticas, scores de volatilidade: {sorted(distinct)}")
+    print()
+
+def test_update_throughput():
+    """Mede o custo por tick com centenas de pares"""
+    print("🧪 TESTE 4: Custo por Tick")
+    print("=" * 50)
+
+    engine = VolatilityEngine(min_samples=1)
+    markets = [f"M{index}" for index in range(40)]
+    for leg1 in markets:
+        for leg2 in markets[:10]:
+            if leg1 != leg2:
+                engine.track(leg1, leg2)
+    prices = {market: 100.0 + index for index, market in enumerate(markets)}
+
+    rng = np.random.default_rng(8)
+    ticks = 2000
+    start = time.perf_counter()
+    for tick in range(ticks):
+        market = markets[tick % len(markets)]
+        prices[market] += rng.normal(0, 0.1)
+        engine.on_prices((market,), prices, tick * 1_000_000)
+    elapsed = time.perf_counter() - start
+
+    print(f"📊 {len(engine)} pares, {elapsed / ticks * 1e6:.1f} µs por tick")
+    print()
+
+def main():
+    """Executa todos os testes"""
+    print("🧠 SAPP VOLATILITY ENGINE - TESTES")
+    print("=" * 60)
+    print()
+
+    try:
+        test_estimators_match_full_computation()
+        test_pairs_shared_between_positions()
+        test_batch_matches_scalar()
+        test_update_throughput()
+
+        print("✅ Todos os testes concluídos com sucesso!")
+
+    except Exception as e:
+        print(f"❌ Erro durante os testes: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+SAPP Tick Journal
+Diário binário append-only dos preços recebidos pelo analisador: registros de
+largura fixa (timestamp em ns, id do mercado, preço) em segmentos rotativos
+com índice no rodapé, gravados por uma thread fora do caminho quente e lidos
+por mmap sem cópia.
+
+Segmento (little-endian):
+    cabeçalho  HEADER_SIZE bytes: magic, versão do formato, tamanho do registro,
+               número do segmento, criação (ns)
+    registros  RECORD_DTYPE, na ordem de chegada
+    índice     INDEX_DTYPE: (timestamp, número do registro) a cada INDEX_STRIDE registros
+    rodapé     FOOTER: posição e tamanho do índice, registros, menor e maior timestamp, magic
+O segmento em gravação tem a extensão .open e ainda não tem índice nem rodapé;
+ao ser fechado recebe os dois e é renomeado para .tj. Os nomes dos mercados
+(ids do MarketRegistry) ficam em markets.json no mesmo diretório.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_risk import MarketRegistry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SAPPTICK"
+FOOTER_MAGIC = b"SAPPTEND"
+FORMAT_VERSION = 1
+
+# Registro de largura fixa (20 bytes, sem alinhamento)
+RECORD_DTYPE = np.dtype([('timestamp_ns', '<i8'), ('market_id', '<i4'), ('price', '<f8')])
+
+# Entrada do índice do rodapé
+INDEX_DTYPE = np.dtype([('timestamp_ns', '<i8'), ('record', '<u8')])
+INDEX_STRIDE = 4096
+
+HEADER = struct.Struct('<8sHHIq')          # magic, versão, tamanho do registro, segmento, criação
+HEADER_SIZE = 32
+FOOTER = struct.Struct('<QQQqq8s')         # índice (posição, entradas), registros, menor/maior ts, magic
+
+SEGMENT_SUFFIX = ".tj"
+OPEN_SUFFIX = ".open"
+MARKETS_FILE = "markets.json"
+
+# Registros por segmento (~80 MB)
+DEFAULT_SEGMENT_RECORDS = 1 << 22
+
+# Intervalo máximo entre gravações em disco (s) e lotes aguardando a thread de gravação
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_PENDING = 100000
+
+# A thread de gravação esvazia a fila a cada DRAIN_INTERVAL segundos, ou antes
+# se DRAIN_BATCHES lotes se acumularem (append não acorda a thread a cada lote)
+DRAIN_INTERVAL = 0.05
+DRAIN_BATCHES = 256
+
+
+def _segment_name(number: int) -> str:
+    return f"segment-{number:06d}"
+
+
+def iter_instants(batches: Iterable[np.ndarray], markets: Sequence[str]) -> Iterator[Tuple[int, Dict[str, float]]]:
+    """
+    Agrupa lotes de registros (em ordem de tempo) por timestamp: um
+    (timestamp_ns, {mercado: preço}) por instante distinto, mesmo quando o
+    instante atravessa dois lotes. markets traduz os ids dos mercados.
+    """
+    pending: Dict[str, float] = {}
+    pending_ns = None
+    for batch in batches:
+        if not len(batch):
+            continue
+        timestamps = batch['timestamp_ns']
+        bounds = (np.flatnonzero(timestamps[1:] != timestamps[:-1]) + 1).tolist()
+        market_ids = batch['market_id'].tolist()
+        prices = batch['price'].tolist()
+        for start, end in zip([0] + bounds, bounds + [len(batch)]):
+            timestamp_ns = int(timestamps[start])
+            if timestamp_ns != pending_ns and pending:
+                yield pending_ns, pending
+                pending = {}
+            pending_ns = timestamp_ns
+            for market_id, price in zip(market_ids[start:end], prices[start:end]):
+                pending[markets[market_id]] = price
+    if pending:
+        yield pending_ns, pending
+
+
+class _SegmentWriter:
+    """Segmento em gravação (arquivo .open com escrita bufferizada)"""
+
+    def __init__(self, path: str, file, number: int):
+        self.path = path
+        self.file = file
+        self.number = number
+        self.records = 0
+        self.min_ts = np.iinfo(np.int64).max
+        self.max_ts = np.iinfo(np.int64).min
+        self.index: List[np.ndarray] = []
+
+    @classmethod
+    def create(cls, directory: str, number: int) -> '_SegmentWriter':
+        path = os.path.join(directory, _segment_name(number) + SEGMENT_SUFFIX + OPEN_SUFFIX)
+        file = open(path, "wb", buffering=1 << 20)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize, number, time.time_ns())
+        # Cabeçalho direto no disco: um processo interrompido logo após criar o segmento não deixa arquivo vazio
+        file.raw.write(header.ljust(HEADER_SIZE, b"\0"))
+        os.fsync(file.fileno())
+        return cls(path, file, number)
+
+    @classmethod
+    def recover(cls, path: str) -> '_SegmentWriter':
+        """Reabre um segmento .open deixado por um processo interrompido (registro incompleto descartado)"""
+        segment = JournalSegment(path)
+        try:
+            records = np.array(segment.records)
+            number = segment.number
+        finally:
+            segment.close()
+        file = open(path, "r+b")
+        file.truncate(HEADER_SIZE + len(records) * RECORD_DTYPE.itemsize)
+        file.seek(0, os.SEEK_END)
+        writer = cls(path, file, number)
+        writer._track(records)
+        return writer
+
+    def write(self, records: np.ndarray):
+        if not len(records):
+            return
+        self._track(records)
+        self.file.write(memoryview(records).cast('B'))
+
+    def _track(self, records: np.ndarray):
+        """Atualiza índice, limites de tempo e contagem com os registros gravados"""
+        if not len(records):
+            return
+        timestamps = records['timestamp_ns']
+        first = -self.records % INDEX_STRIDE  # primeira linha do lote que cai no passo do índice
+        rows = np.arange(first, len(records), INDEX_STRIDE)
+        if len(rows):
+            entries = np.empty(len(rows), dtype=INDEX_DTYPE)
+            entries['timestamp_ns'] = timestamps[rows]
+            entries['record'] = rows + self.records
+            self.index.append(entries)
+        self.min_ts = min(self.min_ts, int(timestamps.min()))
+        self.max_ts = max(self.max_ts, int(timestamps.max()))
+        self.records += len(records)
+
+    def seal(self) -> str:
+        """Grava índice e rodapé e renomeia para .tj"""
+        index = np.concatenate(self.index) if self.index else np.empty(0, dtype=INDEX_DTYPE)
+        index_offset = HEADER_SIZE + self.records * RECORD_DTYPE.itemsize
+        self.file.write(memoryview(index).cast('B'))
+        min_ts, max_ts = (self.min_ts, self.max_ts) if self.records else (0, 0)
+        self.file.write(FOOTER.pack(index_offset, len(index), self.records, min_ts, max_ts, FOOTER_MAGIC))
+        self.file.close()
+        path = self.path[:-len(OPEN_SUFFIX)]
+        os.replace(self.path, path)
+        return path
+
+
+def _empty_open_segment(path: str) -> bool:
+    """Segmento .open sem cabeçalho completo (processo interrompido antes de gravá-lo: sem registros)"""
+    return path.endswith(OPEN_SUFFIX) and os.path.getsize(path) < HEADER_SIZE
+
+
+def seal_open_segments(directory: str) -> int:
+    """
+    Fecha (índice e rodapé) os segmentos .open deixados por um processo
+    interrompido; os que nem chegaram a ter o cabeçalho são apagados
+    """
+    names = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX + OPEN_SUFFIX))
+    sealed = 0
+    for name in names:
+        path = os.path.join(directory, name)
+        if _empty_open_segment(path):
+            logger.warning(f"⚠️ Segmento sem cabeçalho descartado: {path}")
+            os.remove(path)
+            continue
+        _SegmentWriter.recover(path).seal()
+        sealed += 1
+    return sealed
+
+
+class TickJournal:
+    """
+    Gravador do diário. append só enfileira o lote de ticks (TICK_DTYPE do
+    PriceDecoder); a thread de gravação, acordada periodicamente, converte,
+    grava com buffer, gira segmentos a cada segment_records registros e
+    atualiza markets.json quando surgem mercados novos. Com a fila cheia o
+    lote é descartado e contado em stats['dropped'].
+    """
+
+    def __init__(self, directory: str, registry: MarketRegistry, segment_records: int = DEFAULT_SEGMENT_RECORDS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING):
+        self.directory = directory
+        self.registry = registry
+        self.segment_records = segment_records
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats = dict.fromkeys(('batches', 'ticks', 'dropped', 'segments'), 0)
+        os.makedirs(directory, exist_ok=True)
+        seal_open_segments(directory)
+        numbers = [int(name[len("segment-"):].split(".")[0]) for name in os.listdir(directory)
+                   if name.startswith("segment-") and name.endswith(SEGMENT_SUFFIX)]
+        self._next_segment = max(numbers, default=0) + 1
+        self._segment: Optional[_SegmentWriter] = None
+        self._markets_written = 0
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._flush_requested = self._flushed = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="tick-journal", daemon=True)
+        self._thread.start()
+
+    def append(self, ticks: np.ndarray) -> bool:
+        """Enfileira um lote de ticks (chamado no caminho quente; não faz I/O)"""
+        if len(self._pending) >= self.max_pending:
+            self.stats['dropped'] += len(ticks)
+            return False
+        self._pending.append(ticks)
+        if len(self._pending) == DRAIN_BATCHES:
+            with self._condition:
+                self._condition.notify()
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Grava os lotes pendentes e esvazia o buffer do arquivo (True se concluiu a tempo)"""
+        with self._condition:
+            target = self._flush_requested = self._flush_requested + 1
+            self._condition.notify()
+            return self._condition.wait_for(lambda: self._flushed >= target or not self._thread.is_alive(), timeout)
+
+    def close(self):
+        """Grava o que estiver pendente e fecha o segmento atual (índice e rodapé)"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            with self._condition:
+                if self._running and self._flushed >= self._flush_requested:
+                    self._condition.wait(DRAIN_INTERVAL)
+                running = self._running
+                requested = self._flush_requested
+            try:
+                self._drain()
+                if time.monotonic() >= next_flush or requested > self._flushed:
+                    if self._segment is not None:
+                        self._segment.file.flush()
+                    next_flush = time.monotonic() + self.flush_interval
+            except OSError as e:
+                logger.error(f"❌ Erro ao gravar o diário de ticks: {e}")
+            if requested > self._flushed:
+                with self._condition:
+                    self._flushed = requested
+                    self._condition.notify_all()
+            if not running and not self._pending:
+                break
+        try:
+            if self._segment is not None:
+                self._segment.seal()
+                self._segment = None
+        except OSError as e:
+            logger.error(f"❌ Erro ao fechar o segmento do diário de ticks: {e}")
+
+    def _drain(self):
+        pending = self._pending
+        while pending:
+            ticks = pending.popleft()
+            records = np.empty(len(ticks), dtype=RECORD_DTYPE)
+            records['timestamp_ns'] = ticks['timestamp_ns']
+            records['market_id'] = ticks['market_id']
+            records['price'] = ticks['price']
+            self.stats['batches'] += 1
+            self.stats['ticks'] += len(records)
+            while len(records):
+                if self._segment is None:
+                    self._segment = _SegmentWriter.create(self.directory, self._next_segment)
+                    self._next_segment += 1
+                    self.stats['segments'] += 1
+                room = self.segment_records - self._segment.records
+                self._segment.write(records[:room])
+                records = records[room:]
+                if self._segment.records >= self.segment_records:
+                    self._segment.seal()
+                    self._segment = None
+        if len(self.registry) > self._markets_written:
+            self._write_markets()
+
+    def _write_markets(self):
+        names = list(self.registry.names)
+        path = os.path.join(self.directory, MARKETS_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(names, f)
+        os.replace(path + ".tmp", path)
+        self._markets_written = len(names)
+
+
+class JournalSegment:
+    """Segmento mapeado em memória; records é uma view (sem cópia) dos registros"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sealed = not path.endswith(OPEN_SUFFIX)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if size < HEADER_SIZE:
+            raise ValueError(f"Segmento truncado: {path}")
+        magic, version, record_size, self.number, self.created_ns = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Segmento inválido: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Versão {version} do diário não suportada: {path}")
+
+        if self.sealed:
+            index_offset, index_count, count, self.min_ts, self.max_ts, footer_magic = \
+                FOOTER.unpack_from(self._mmap, size - FOOTER.size)
+            if footer_magic != FOOTER_MAGIC:
+                raise ValueError(f"Rodapé ausente: {path}")
+            self.index = np.frombuffer(self._mmap, dtype=INDEX_DTYPE, count=index_count, offset=index_offset)
+        else:
+            count = (size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+            self.index = None
+        self.records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+        if not self.sealed:
+            timestamps = self.records['timestamp_ns']
+            self.min_ts, self.max_ts = (int(timestamps.min()), int(timestamps.max())) if count else (0, 0)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def position(self, timestamp_ns: int) -> int:
+        """
+        Primeiro registro com timestamp >= timestamp_ns (registros em ordem de
+        chegada; o índice do rodapé limita a busca a um passo de INDEX_STRIDE)
+        """
+        start, end = 0, len(self.records)
+        if self.index is not None and len(self.index):
+            block = int(np.searchsorted(self.index['timestamp_ns'], timestamp_ns, side='left'))
+            if block:
+                start = int(self.index['record'][block - 1])
+            if block < len(self.index):
+                end = int(self.index['record'][block])
+        timestamps = self.records['timestamp_ns'][start:end]
+        return start + int(np.searchsorted(timestamps, timestamp_ns, side='left'))
+
+    def between(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> np.ndarray:
+        """View dos registros com start_ns <= timestamp < end_ns"""
+        first = 0 if start_ns is None else self.position(start_ns)
+        last = len(self.records) if end_ns is None else self.position(end_ns)
+        return self.records[first:last]
+
+    def close(self):
+        self.records = self.index = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # ainda há views dos registros em uso: o mapeamento é liberado com elas
+            self._mmap = None
+
+
+class TickJournalReader:
+    """Leitura de um diário: segmentos em ordem, com os nomes dos mercados"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        names = sorted(name for name in os.listdir(directory) if name.startswith("segment-")
+                       and (name.endswith(SEGMENT_SUFFIX) or name.endswith(SEGMENT_SUFFIX + OPEN_SUFFIX)))
+        paths = [os.path.join(directory, name) for name in names]
+        self.segments = [JournalSegment(path) for path in paths if not _empty_open_segment(path)]
+        path = os.path.join(directory, MARKETS_FILE)
+        self.markets: List[str] = []
+        if os.path.exists(path):
+            with open(path) as f:
+                self.markets = json.load(f)
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+    def iter_batches(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Views RECORD_DTYPE por segmento, restritas ao intervalo pedido (sem cópia)"""
+        for segment in self.segments:
+            if not len(segment):
+                continue
+            if (start_ns is not None and segment.max_ts < start_ns) or (end_ns is not None and segment.min_ts >= end_ns):
+                continue
+            records = segment.between(start_ns, end_ns)
+            if len(records):
+                yield records
+
+    def __iter__(self) -> Iterator[Tuple[int, int, float]]:
+        """(timestamp_ns, id do mercado, preço) de cada registro"""
+        for records in self.iter_batches():
+            for start in range(0, len(records), 65536):
+                yield from records[start:start + 65536].tolist()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+SAPP Trigger Book
+Níveis de preço pré-calculados em que o tier de risco de cada posição muda
+"""
+
+from array import array
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from batch_risk import (
+    BookColumns, SPREAD_CHANGE_BINS, MARGIN_RATIO_BINS, MARGIN_REQUIREMENT
+)
+from id_index import IdIndex
+
+# Folga relativa para que erros de arredondamento nunca escondam um cruzamento
+BOUNDARY_EPSILON = 1e-9
+
+# Menor preço válido (preço 0 = indisponível, o que também muda o score)
+MIN_VALID_PRICE = np.finfo(np.float64).tiny
+
+
+def _spread_bounds(spread: np.ndarray, entry_spread: np.ndarray,
+                   bins: np.ndarray = SPREAD_CHANGE_BINS) -> Tuple[np.ndarray, np.ndarray]:
+    """Intervalo de spread em que o tier de volatilidade/tendência não muda"""
+    abs_entry = np.abs(entry_spread)
+    deviation = spread - entry_spread
+    change_pct = np.divide(np.abs(deviation), abs_entry, out=np.zeros(len(spread)), where=abs_entry != 0)
+    tier = np.digitize(change_pct, bins, right=True)
+
+    edges = np.concatenate(([0.0], bins, [np.inf]))
+    inner = edges[tier] * abs_entry
+    outer = edges[tier + 1] * abs_entry
+
+    # No tier mais baixo o intervalo é simétrico em torno do spread de entrada
+    above = deviation >= 0
+    lower = np.where(tier == 0, entry_spread - outer, np.where(above, entry_spread + inner, entry_spread - outer))
+    upper = np.where(tier == 0, entry_spread + outer, np.where(above, entry_spread + outer, entry_spread - inner))
+
+    # Spread de entrada zero: mudança percentual sempre 0, tier constante
+    lower = np.where(abs_entry == 0, -np.inf, lower)
+    upper = np.where(abs_entry == 0, np.inf, upper)
+    return lower, upper
+
+
+def _notional_bounds(notional: np.ndarray, margin: np.ndarray,
+                     bins: np.ndarray = MARGIN_RATIO_BINS) -> Tuple[np.ndarray, np.ndarray]:
+    """Intervalo de valor da posição em que os tiers de margem e liquidação não mudam"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = margin / (notional * MARGIN_REQUIREMENT)
+    tier = np.digitize(ratio, bins)
+
+    # ratio = margem / (0.2 * valor) decresce com o valor da posição
+    edges = np.concatenate(([0.0], bins, [np.inf]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lower = margin / (MARGIN_REQUIREMENT * edges[tier + 1])
+        upper = margin / (MARGIN_REQUIREMENT * edges[tier])
+
+    # Margem não positiva ou posição sem valor: tier constante
+    constant = (margin <= 0) | (notional <= 0)
+    lower = np.where(constant, -np.inf, lower)
+    upper = np.where(constant, np.inf, upper)
+    return lower, upper
+
+
+def price_bounds(columns: BookColumns, prices: np.ndarray, spread_bins: np.ndarray = SPREAD_CHANGE_BINS,
+                 ratio_bins: np.ndarray = MARGIN_RATIO_BINS) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calcula, para cada posição, a caixa [lo1, hi1] x [lo2, hi2] de preços das
+    pernas dentro da qual nenhum fator muda de faixa (limites de mudança do
+    spread e de razão margem/necessária: ver FactorPipeline.trigger_bins)
+    """
+    leg1_price = prices[columns.leg1_ids]
+    leg2_price = prices[columns.leg2_ids]
+    leg1_abs = np.abs(columns.leg1_size).astype(np.float64)
+    leg2_abs = np.abs(columns.leg2_size).astype(np.float64)
+
+    # Spread: a folga é dividida entre as duas pernas
+    spread = leg1_price - leg2_price
+    spread_lo, spread_hi = _spread_bounds(spread, columns.entry_spread, spread_bins)
+    slack = BOUNDARY_EPSILON * (np.abs(spread) + np.abs(columns.entry_spread))
+    room_down = np.maximum(spread - spread_lo - slack, 0.0) / 2
+    room_up = np.maximum(spread_hi - spread - slack, 0.0) / 2
+    leg1_down, leg1_up = room_down.copy(), room_up.copy()
+    leg2_down, leg2_up = room_up.copy(), room_down.copy()
+
+    # Valor da posição: max(|size1| * p1, |size2| * p2)
+    leg1_value = leg1_abs * leg1_price
+    leg2_value = leg2_abs * leg2_price
+    notional = np.maximum(leg1_value, leg2_value)
+    notional_lo, notional_hi = _notional_bounds(notional, columns.margin.astype(np.float64), ratio_bins)
+    notional_lo = notional_lo * (1 + BOUNDARY_EPSILON)
+    notional_hi = notional_hi * (1 - BOUNDARY_EPSILON)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Nenhuma perna pode levar o valor acima do limite superior
+        leg1_up = np.minimum(leg1_up, np.where(leg1_abs > 0, notional_hi / leg1_abs - leg1_price, np.inf))
+        leg2_up = np.minimum(leg2_up, np.where(leg2_abs > 0, notional_hi / leg2_abs - leg2_price, np.inf))
+        # A perna dominante não pode levar o valor abaixo do limite inferior
+        leg1_dominant = leg1_value >= leg2_value
+        leg1_down = np.where(
+            leg1_dominant & (leg1_abs > 0),
+            np.minimum(leg1_down, leg1_price - notional_lo / leg1_abs), leg1_down
+        )
+        leg2_down = np.where(
+            ~leg1_dominant & (leg2_abs > 0),
+            np.minimum(leg2_down, leg2_price - notional_lo / leg2_abs), leg2_down
+        )
+
+    lo1 = np.maximum(leg1_price - np.maximum(leg1_down, 0.0), MIN_VALID_PRICE)
+    hi1 = leg1_price + np.maximum(leg1_up, 0.0)
+    lo2 = np.maximum(leg2_price - np.maximum(leg2_down, 0.0), MIN_VALID_PRICE)
+    hi2 = leg2_price + np.maximum(leg2_up, 0.0)
+
+    # Sem preço válido em alguma perna: qualquer mudança dispara reprocessamento
+    invalid = (leg1_price <= 0) | (leg2_price <= 0)
+    lo1 = np.where(invalid, leg1_price, lo1)
+    hi1 = np.where(invalid, leg1_price, hi1)
+    lo2 = np.where(invalid, leg2_price, lo2)
+    hi2 = np.where(invalid, leg2_price, hi2)
+    return lo1, hi1, lo2, hi2
+
+
+# Arrays ordenados de cada escada (as escadas nunca são alteradas no lugar, só substituídas)
+_LADDER_ARRAYS = ('lo_values', 'lo_rows', 'lo_legs', 'hi_values', 'hi_rows', 'hi_legs')
+
+
+class _MarketLadder:
+    """Níveis ordenados (lo e hi) de todas as pernas em um mercado"""
+
+    def __init__(self):
+        self.lo_values = np.empty(0, dtype=np.float64)
+        self.lo_rows = np.empty(0, dtype=np.int64)
+        self.lo_legs = np.empty(0, dtype=np.int8)
+        self.hi_values = np.empty(0, dtype=np.float64)
+        self.hi_rows = np.empty(0, dtype=np.int64)
+        self.hi_legs = np.empty(0, dtype=np.int8)
+        self.pending: List[np.ndarray] = []
+        self.pending_count = 0
+
+    def __len__(self) -> int:
+        return len(self.lo_rows)
+
+
+class TriggerBook:
+    """
+    Livro de gatilhos: para cada mercado guarda os níveis de preço em que
+    alguma posição muda de tier, permitindo achar por busca binária apenas
+    as posições cujo limite foi cruzado em um tick
+    """
+
+    def __init__(self, initial_capacity: int = 1024, rebuild_ratio: float = 0.125,
+                 spread_bins: np.ndarray = SPREAD_CHANGE_BINS, ratio_bins: np.ndarray = MARGIN_RATIO_BINS):
+        self.rebuild_ratio = rebuild_ratio
+        self.spread_bins = spread_bins
+        self.ratio_bins = ratio_bins
+        self._rows = IdIndex()  # position_id → linha
+        self._free_rows = array('i')
+        self._ladders: Dict[int, _MarketLadder] = {}
+        self._allocate(initial_capacity)
+
+    def _allocate(self, capacity: int):
+        """Cria ou aumenta os arrays por posição"""
+        old = getattr(self, '_position_ids', None)
+        size = 0 if old is None else len(old)
+        position_ids = np.full(capacity, -1, dtype=np.int64)
+        markets = np.full((2, capacity), -1, dtype=np.int32)
+        lo = np.zeros((2, capacity), dtype=np.float64)
+        hi = np.zeros((2, capacity), dtype=np.float64)
+        if old is not None:
+            position_ids[:size] = self._position_ids
+            markets[:, :size] = self._markets
+            lo[:, :size] = self._lo
+            hi[:, :size] = self._hi
+        self._position_ids, self._markets, self._lo, self._hi = position_ids, markets, lo, hi
+        self._rows.capacity = capacity
+        self._free_rows.extend(range(capacity - 1, size - 1, -1))
+
+    def _row_for(self, position_id: int) -> int:
+        row = self._rows.get(position_id)
+        if row < 0:
+            if not self._free_rows:
+                self._allocate(len(self._position_ids) * 2)
+            row = self._free_rows.pop()
+            self._rows.set(position_id, row)
+            self._position_ids[row] = position_id
+        return row
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, position_id: int) -> bool:
+        return position_id in self._rows
+
+    def update(self, columns: BookColumns, prices: np.ndarray):
+        """Recalcula os níveis das posições recém-avaliadas"""
+        if not len(columns):
+            return
+        lo1, hi1, lo2, hi2 = price_bounds(columns, prices, self.spread_bins, self.ratio_bins)
+        _, rows = self._rows.lookup(columns.position_ids)
+        for index in np.flatnonzero(rows < 0).tolist():
+            rows[index] = self._row_for(int(columns.position_ids[index]))
+        self._markets[0, rows] = columns.leg1_ids
+        self._markets[1, rows] = columns.leg2_ids
+        self._lo[0, rows], self._hi[0, rows] = lo1, hi1
+        self._lo[1, rows], self._hi[1, rows] = lo2, hi2
+
+        for market_id in np.unique(np.concatenate((columns.leg1_ids, columns.leg2_ids))):
+            touched = rows[(columns.leg1_ids == market_id) | (columns.leg2_ids == market_id)]
+            ladder = self._ladders.setdefault(int(market_id), _MarketLadder())
+            ladder.pending.append(touched)
+            ladder.pending_count += len(touched)
+
+    def remove(self, position_id: int):
+        """Remove os níveis de uma posição fechada"""
+        row = self._rows.pop(position_id)
+        if row >= 0:
+            self._markets[:, row] = -1
+            self._position_ids[row] = -1
+            self._free_rows.append(row)
+
+    def export_state(self) -> Dict:
+        """Cópia dos níveis por posição e das escadas ordenadas para snapshot"""
+        return {
+            'rebuild_ratio': self.rebuild_ratio,
+            'position_ids': self._position_ids.copy(),
+            'markets': self._markets.copy(),
+            'lo': self._lo.copy(),
+            'hi': self._hi.copy(),
+            'free_rows': np.array(self._free_rows, dtype=np.int64),
+            'ladders': [
+                dict({name: getattr(ladder, name) for name in _LADDER_ARRAYS}, market_id=market_id,
+                     pending=np.concatenate(ladder.pending) if ladder.pending else np.empty(0, dtype=np.int64))
+                for market_id, ladder in self._ladders.items()
+            ],
+        }
+
+    def restore_state(self, state: Dict):
+        """Substitui o estado pelo de export_state (os arrays são usados sem cópia)"""
+        self.rebuild_ratio = state['rebuild_ratio']
+        self._position_ids, self._markets = state['position_ids'], state['markets']
+        self._lo, self._hi = state['lo'], state['hi']
+        rows = np.flatnonzero(self._position_ids >= 0)
+        self._rows = IdIndex.from_items(self._position_ids[rows], rows, len(self._position_ids))
+        self._free_rows = array('i', state['free_rows'].astype(np.int32).tobytes())
+        self._ladders = {}
+        for ladder_state in state['ladders']:
+            ladder = self._ladders[ladder_state['market_id']] = _MarketLadder()
+            for name in _LADDER_ARRAYS:
+                setattr(ladder, name, ladder_state[name])
+            if len(ladder_state['pending']):
+                ladder.pending.append(ladder_state['pending'])
+                ladder.pending_count = len(ladder_state['pending'])
+
+    def crossed(self, market_id: int, price: float) -> np.ndarray:
+        """Ids das posições com algum limite cruzado pelo novo preço do mercado"""
+        ladder = self._ladders.get(market_id)
+        if ladder is None:
+            return np.empty(0, dtype=np.int64)
+        if ladder.pending_count > max(1024, len(ladder) * self.rebuild_ratio):
+            self._rebuild(market_id, ladder)
+
+        # Níveis inferiores acima do preço e superiores abaixo do preço
+        start = np.searchsorted(ladder.lo_values, price, side='right')
+        stop = np.searchsorted(ladder.hi_values, price, side='left')
+        candidates = [
+            self._current(market_id, ladder.lo_rows[start:], ladder.lo_legs[start:],
+                          self._lo, ladder.lo_values[start:]),
+            self._current(market_id, ladder.hi_rows[:stop], ladder.hi_legs[:stop],
+                          self._hi, ladder.hi_values[:stop]),
+        ]
+
+        # Posições atualizadas desde a última ordenação
+        if ladder.pending:
+            pending = np.concatenate(ladder.pending)
+            for leg in (0, 1):
+                mask = (self._markets[leg, pending] == market_id) & (
+                    (self._lo[leg, pending] > price) | (self._hi[leg, pending] < price)
+                )
+                candidates.append(pending[mask])
+
+        rows = np.unique(np.concatenate(candidates))
+        return self._position_ids[rows]
+
+    def _current(self, market_id: int, rows: np.ndarray, legs: np.ndarray,
+                 levels: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Descarta entradas ordenadas que foram substituídas ou removidas"""
+        if not len(rows):
+            return rows
+        valid = (self._markets[legs, rows] == market_id) & (levels[legs, rows] == values)
+        return rows[valid]
+
+    def _rebuild(self, market_id: int, ladder: _MarketLadder):
+        """Reordena os níveis do mercado incorporando as atualizações pendentes"""
+        rows = np.unique(np.concatenate([ladder.lo_rows] + ladder.pending))
+        entry_rows, entry_legs = [], []
+        for leg in (0, 1):
+            on_market = rows[self._markets[leg, rows] == market_id]
+            entry_rows.append(on_market)
+            entry_legs.append(np.full(len(on_market), leg, dtype=np.int8))
+        entry_rows = np.concatenate(entry_rows)
+        entry_legs = np.concatenate(entry_legs)
+
+        lo_values = self._lo[entry_legs, entry_rows]
+        order = np.argsort(lo_values, kind='stable')
+        ladder.lo_values, ladder.lo_rows, ladder.lo_legs = lo_values[order], entry_rows[order], entry_legs[order]
+
+        hi_values = self._hi[entry_legs, entry_rows]
+        order = np.argsort(hi_values, kind='stable')
+        ladder.hi_values, ladder.hi_rows, ladder.hi_legs = hi_values[order], entry_rows[order], entry_legs[order]
+
+        ladder.pending = []
+        ladder.pending_count = 0
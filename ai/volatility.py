@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+SAPP Volatility Engine
+Volatilidade realizada e EWMA do spread de cada par de mercados
+"""
+
+import math
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from batch_risk import BookColumns, SPREAD_CHANGE_BINS, SPREAD_CHANGE_SCORES
+
+# Modelos disponíveis para o fator de volatilidade
+VOLATILITY_MODELS = ('spread_change', 'realized', 'ewma')
+
+# Horizonte em que a volatilidade é comparada com o nível do spread
+VOLATILITY_HORIZON_SECONDS = 3600.0
+
+# Intervalo mínimo entre ticks (evita taxas infinitas em ticks simultâneos)
+MIN_TICK_INTERVAL_SECONDS = 1e-3
+
+# Piso do nível do spread, como fração do preço médio das pernas
+SPREAD_LEVEL_FLOOR = 0.01
+
+
+class SpreadVolatility:
+    """
+    Estimador incremental da volatilidade do spread de um par. Mantém a
+    variância por segundo das variações do spread de duas formas, ambas O(1)
+    por tick: média exponencial (EWMA) e soma móvel das últimas N variações.
+    """
+
+    __slots__ = ('window', 'halflife_seconds', 'samples', 'last_spread', 'last_level', 'last_timestamp_ns',
+                 'ewma_variance_rate', '_squared_changes', '_intervals', '_sum_squared', '_sum_intervals')
+
+    def __init__(self, window: int = 256, halflife_seconds: float = 300.0):
+        self.window = window
+        self.halflife_seconds = halflife_seconds
+        self.samples = 0
+        self.last_spread: Optional[float] = None
+        self.last_level = 0.0
+        self.last_timestamp_ns = 0
+        self.ewma_variance_rate = 0.0
+        self._squared_changes = np.zeros(window, dtype=np.float64)
+        self._intervals = np.zeros(window, dtype=np.float64)
+        self._sum_squared = 0.0
+        self._sum_intervals = 0.0
+
+    def update(self, spread: float, level: float, timestamp_ns: int):
+        """Incorpora um novo valor do spread"""
+        if self.last_spread is not None:
+            interval = max((timestamp_ns - self.last_timestamp_ns) / 1e9, MIN_TICK_INTERVAL_SECONDS)
+            squared = (spread - self.last_spread) ** 2
+
+            # EWMA com decaimento proporcional ao tempo decorrido
+            alpha = 1.0 - math.exp(-math.log(2) * interval / self.halflife_seconds)
+            rate = squared / interval
+            if self.samples == 0:
+                self.ewma_variance_rate = rate
+            else:
+                self.ewma_variance_rate += alpha * (rate - self.ewma_variance_rate)
+
+            # Soma móvel das últimas N variações
+            slot = self.samples % self.window
+            self._sum_squared += squared - self._squared_changes[slot]
+            self._sum_intervals += interval - self._intervals[slot]
+            self._squared_changes[slot] = squared
+            self._intervals[slot] = interval
+            self.samples += 1
+
+            # Ressincronizar as somas a cada volta completa
+            if self.samples % self.window == 0:
+                self._sum_squared = float(self._squared_changes.sum())
+                self._sum_intervals = float(self._intervals.sum())
+
+        self.last_spread = spread
+        self.last_level = level
+        self.last_timestamp_ns = timestamp_ns
+
+    @property
+    def realized_variance_rate(self) -> float:
+        """Variância realizada por segundo na janela móvel"""
+        return self._sum_squared / self._sum_intervals if self._sum_intervals > 0 else 0.0
+
+    def relative_volatility(self, model: str, horizon_seconds: float = VOLATILITY_HORIZON_SECONDS) -> float:
+        """Desvio padrão do spread no horizonte, relativo ao nível do spread"""
+        rate = self.ewma_variance_rate if model == 'ewma' else self.realized_variance_rate
+        level = max(abs(self.last_spread or 0.0), SPREAD_LEVEL_FLOOR * self.last_level)
+        if level <= 0:
+            return 0.0
+        return math.sqrt(max(rate, 0.0) * horizon_seconds) / level
+
+
+# Faixas como tuplas (bisect escalar é bem mais barato que np.digitize por par)
+_TIER_BINS = tuple(SPREAD_CHANGE_BINS.tolist())
+_TIER_SCORES = tuple(SPREAD_CHANGE_SCORES.tolist())
+
+
+def volatility_tier_score(relative_volatility: float) -> float:
+    """Converte volatilidade relativa no score do fator (mesmas faixas do spread, "> limite")"""
+    return _TIER_SCORES[bisect_left(_TIER_BINS, relative_volatility)]
+
+
+# Campos escalares de SpreadVolatility gravados no snapshot
+_ESTIMATOR_STATE = ('halflife_seconds', 'samples', 'last_spread', 'last_level', 'last_timestamp_ns',
+                    'ewma_variance_rate', '_sum_squared', '_sum_intervals')
+
+
+class VolatilityEngine:
+    """Mantém um estimador por par de pernas, compartilhado por todas as posições do par"""
+
+    def __init__(self, horizon_seconds: float = VOLATILITY_HORIZON_SECONDS, window: int = 256,
+                 halflife_seconds: float = 300.0, min_samples: int = 20):
+        self.horizon_seconds = horizon_seconds
+        self.window = window
+        self.halflife_seconds = halflife_seconds
+        self.min_samples = min_samples
+        self._pairs: Dict[Tuple[str, str], SpreadVolatility] = {}
+        self._pairs_by_market: Dict[str, List[Tuple[str, str]]] = {}
+        self._scores: Dict[str, Dict[Tuple[str, str], float]] = {'realized': {}, 'ewma': {}}
+
+    def track(self, leg1_market: str, leg2_market: str):
+        """Passa a acompanhar o spread do par"""
+        pair = (leg1_market, leg2_market)
+        if pair not in self._pairs:
+            self._pairs[pair] = SpreadVolatility(self.window, self.halflife_seconds)
+            for market in set(pair):
+                self._pairs_by_market.setdefault(market, []).append(pair)
+
+    def on_prices(self, markets: Iterable[str], prices: Dict[str, float], timestamp_ns: int) -> List[Tuple[str, str]]:
+        """Atualiza os pares afetados pelos mercados e retorna os que mudaram de faixa"""
+        touched = set()
+        for market in markets:
+            touched.update(self._pairs_by_market.get(market, ()))
+
+        changed = []
+        for pair in touched:
+            leg1_price = prices.get(pair[0], 0)
+            leg2_price = prices.get(pair[1], 0)
+            if not (leg1_price and leg2_price):
+                continue
+            estimator = self._pairs[pair]
+            estimator.update(leg1_price - leg2_price, (abs(leg1_price) + abs(leg2_price)) / 2, timestamp_ns)
+            if estimator.samples < self.min_samples:
+                continue
+            for model, scores in self._scores.items():
+                score = volatility_tier_score(estimator.relative_volatility(model, self.horizon_seconds))
+                if scores.get(pair) != score:
+                    scores[pair] = score
+                    changed.append(pair)
+        return changed
+
+    def export_state(self) -> Dict:
+        """Cópia dos estimadores e das faixas por par para snapshot"""
+        return {
+            'pairs': [
+                dict({name: getattr(estimator, name) for name in _ESTIMATOR_STATE}, pair=list(pair),
+                     squared_changes=estimator._squared_changes.copy(), intervals=estimator._intervals.copy())
+                for pair, estimator in self._pairs.items()
+            ],
+            'scores': {model: [[pair[0], pair[1], score] for pair, score in scores.items()]
+                       for model, scores in self._scores.items()},
+        }
+
+    def restore_state(self, state: Dict):
+        """Substitui os estimadores pelos de export_state (parâmetros do motor mantidos)"""
+        self._pairs = {}
+        self._pairs_by_market = {}
+        for pair_state in state['pairs']:
+            self.track(*pair_state['pair'])
+            estimator = self._pairs[tuple(pair_state['pair'])]
+            for name in _ESTIMATOR_STATE:
+                setattr(estimator, name, pair_state[name])
+            estimator._squared_changes = pair_state['squared_changes']
+            estimator._intervals = pair_state['intervals']
+            estimator.window = len(estimator._squared_changes)
+        self._scores = {model: {(leg1, leg2): score for leg1, leg2, score in scores}
+                        for model, scores in state['scores'].items()}
+
+    def estimator(self, leg1_market: str, leg2_market: str) -> Optional[SpreadVolatility]:
+        return self._pairs.get((leg1_market, leg2_market))
+
+    def score(self, leg1_market: str, leg2_market: str, model: str) -> Optional[float]:
+        """Score do fator de volatilidade do par (None durante o aquecimento)"""
+        return self._scores[model].get((leg1_market, leg2_market))
+
+    def row_scores(self, columns: BookColumns, names: List[str], model: str) -> np.ndarray:
+        """Score por posição a partir dos pares (NaN durante o aquecimento)"""
+        result = np.full(len(columns), np.nan)
+        if not len(columns):
+            return result
+        scores = self._scores[model]
+        keys = columns.leg1_ids.astype(np.int64) * (len(names) + 1) + columns.leg2_ids
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        pair_scores = np.array([
+            scores.get((names[key // (len(names) + 1)], names[key % (len(names) + 1)]), np.nan)
+            for key in unique_keys.tolist()
+        ])
+        return pair_scores[inverse]
+
+    def __len__(self) -> int:
+        return len(self._pairs)
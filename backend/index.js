@@ -26,6 +26,11 @@ app.use(express.json());
 const positionsCache = new Map();
 const pricesCache = new Map();
 const riskAlerts = new Map();
+const aiAlerts = new Map(); // alerta mais recente da IA por posição
+
+// Versão das posições: cada abertura ou fechamento recebe a próxima (rota /api/positions/changes)
+let positionsVersion = 0;
+const MAX_CHANGES_PAGE = 10000;
 
 // Configuração Stellar
 const stellarServer = new Horizon.Server('https://horizon-testnet.stellar.org');
@@ -114,6 +119,29 @@ function calculateRiskScore(position, currentPrice) {
   return Math.min(100, Math.max(0, riskScore));
 }
 
+// Registrar alteração de posição (abertura ou fechamento)
+function touchPosition(position) {
+  position.version = ++positionsVersion;
+}
+
+// Posição no formato de alterações da IA (pernas do spread; posição simples = perna única)
+function toPositionChange(position) {
+  const direction = position.side === 'Short' ? -1 : 1;
+  const spread = Boolean(position.leg2_asset);
+  return {
+    position_id: Number(position.id),
+    version: position.version,
+    status: position.status,
+    leg1_market: position.asset,
+    leg2_market: spread ? position.leg2_asset : position.asset,
+    leg1_size: direction * position.size,
+    leg2_size: spread ? -direction * position.leg2_size : 0,
+    margin: position.collateral,
+    entry_spread: spread ? position.entry_price - position.leg2_entry_price : 0,
+    timestamp: position.timestamp
+  };
+}
+
 // API Routes
 
 // Obter preços atuais
@@ -121,6 +149,23 @@ app.get('/api/prices', (req, res) => {
   res.json(Object.fromEntries(pricesCache));
 });
 
+// Alterações de posições após a versão since, em ordem de versão (full=1: apenas as ativas)
+// Declarada antes de /api/positions/:user, que também casaria com este caminho
+app.get('/api/positions/changes', (req, res) => {
+  const since = parseInt(req.query.since, 10) || 0;
+  const limit = Math.min(Math.max(parseInt(req.query.limit, 10) || 1000, 1), MAX_CHANGES_PAGE);
+  const full = req.query.full === '1';
+  const changed = Array.from(positionsCache.values())
+    .filter(pos => pos.version > since && (!full || pos.status === 'Active'))
+    .sort((a, b) => a.version - b.version);
+  const page = changed.slice(0, limit);
+  res.json({
+    changes: page.map(toPositionChange),
+    version: page.length ? page[page.length - 1].version : Math.max(since, positionsVersion),
+    has_more: changed.length > limit
+  });
+});
+
 // Obter posições do usuário
 app.get('/api/positions/:user', (req, res) => {
   const user = req.params.user;
@@ -139,7 +184,7 @@ app.get('/api/positions', (req, res) => {
 // Abrir nova posição
 app.post('/api/positions/open', async (req, res) => {
   try {
-    const { user, asset, side, size, collateral, leverage } = req.body;
+    const { user, asset, side, size, collateral, leverage, leg2_asset, leg2_size } = req.body;
     
     // Validar parâmetros
     if (!user || !asset || !side || !size || !collateral || !leverage) {
@@ -155,6 +200,12 @@ app.post('/api/positions/open', async (req, res) => {
       return res.status(400).json({ error: 'Preço não disponível para este ativo' });
     }
 
+    // Spread: segunda perna opcional, no sentido oposto
+    const leg2Price = leg2_asset ? (pricesCache.get(leg2_asset) || 0) : 0;
+    if (leg2_asset && (!leg2_size || leg2Price === 0)) {
+      return res.status(400).json({ error: 'Segunda perna sem tamanho ou sem preço disponível' });
+    }
+
     // Calcular preço de liquidação
     const liquidationPrice = side === 'Long' 
       ? currentPrice - (currentPrice * 0.8) // 20% margem
@@ -175,8 +226,14 @@ app.post('/api/positions/open', async (req, res) => {
       timestamp: Date.now(),
       status: 'Active'
     };
+    if (leg2_asset) {
+      position.leg2_asset = leg2_asset;
+      position.leg2_size = parseFloat(leg2_size);
+      position.leg2_entry_price = leg2Price;
+    }
 
     // Armazenar no cache
+    touchPosition(position);
     positionsCache.set(positionId, position);
 
     // Calcular risco inicial
@@ -215,6 +272,7 @@ app.post('/api/positions/close', (req, res) => {
 
     // Fechar posição
     position.status = 'Closed';
+    touchPosition(position);
     positionsCache.set(positionId, position);
     riskAlerts.delete(positionId);
 
@@ -247,6 +305,49 @@ app.get('/api/risk/:positionId', (req, res) => {
   });
 });
 
+// Registrar alerta enviado pela IA (falso se faltar position_id ou alert_type)
+function storeAiAlert(alert) {
+  if (!alert || alert.position_id === undefined || !alert.alert_type) {
+    return false;
+  }
+  aiAlerts.set(String(alert.position_id), {
+    type: alert.alert_type,
+    message: alert.message,
+    positionId: String(alert.position_id),
+    riskScore: alert.risk_score,
+    recommendation: alert.recommendation,
+    timestamp: alert.timestamp || Date.now()
+  });
+  return true;
+}
+
+// Receber alerta da IA
+app.post('/api/alerts', (req, res) => {
+  if (!storeAiAlert(req.body)) {
+    return res.status(400).json({ error: 'Alerta sem position_id ou alert_type' });
+  }
+  io.emit('ai_alerts', [req.body]);
+  res.json({ success: true, received: 1 });
+});
+
+// Receber lote de alertas da IA
+app.post('/api/alerts/batch', (req, res) => {
+  const alerts = req.body && req.body.alerts;
+  if (!Array.isArray(alerts)) {
+    return res.status(400).json({ error: 'Corpo deve conter a lista alerts' });
+  }
+  const accepted = alerts.filter(storeAiAlert);
+  if (accepted.length) {
+    io.emit('ai_alerts', accepted);
+  }
+  res.json({ success: true, received: accepted.length, rejected: alerts.length - accepted.length });
+});
+
+// Alertas mais recentes da IA
+app.get('/api/alerts', (req, res) => {
+  res.json(Array.from(aiAlerts.values()));
+});
+
 // WebSocket para updates em tempo real
 io.on('connection', (socket) => {
   console.log('Cliente conectado:', socket.id);